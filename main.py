@@ -3,18 +3,165 @@
 """
 VideoToNote 主要入口點
 """
+import os
 import sys
+import argparse
 from pathlib import Path
 import uvicorn
 
 from src.cli import main as cli_main
 
+def run_api(argv):
+    parser = argparse.ArgumentParser(prog="main.py api", description="啟動 VideoToNote API 伺服器")
+    parser.add_argument('--host', type=str, default="0.0.0.0", help='監聽位址 (預設: 0.0.0.0)')
+    parser.add_argument('--port', type=int, default=8000, help='監聽埠號 (預設: 8000)')
+    parser.add_argument('--workers', type=int, default=1,
+                       help='uvicorn worker 行程數；大於 1 時停用自動重新載入 (預設: 1)')
+    args = parser.parse_args(argv)
+
+    print("🚀 啟動 VideoToNote API 伺服器...")
+    if args.workers > 1:
+        # 任務狀態存放在共用的 SQLite 資料庫，多個 worker 可查詢彼此的任務；
+        # 轉錄 worker 由父行程統一啟動，API worker 只負責接收請求
+        from src.api.routers.video import job_queue
+        job_queue.start()
+        os.environ["VIDEOTONOTE_JOB_WORKERS"] = "0"
+        try:
+            uvicorn.run("src.api.main:app", host=args.host, port=args.port, workers=args.workers)
+        finally:
+            job_queue.stop()
+    else:
+        uvicorn.run("src.api.main:app", host=args.host, port=args.port, reload=True)
+
+def run_serve(argv):
+    """正式環境模式：預先載入轉錄模型後 fork 轉錄 worker (共享權重)，API 以多個 uvicorn 行程服務且不自動重新載入"""
+    parser = argparse.ArgumentParser(prog="main.py serve", description="以正式環境模式啟動 VideoToNote API 伺服器")
+    parser.add_argument('--host', type=str, default="0.0.0.0", help='監聽位址 (預設: 0.0.0.0)')
+    parser.add_argument('--port', type=int, default=8000, help='監聽埠號 (預設: 8000)')
+    parser.add_argument('--workers', type=int, default=2, help='處理 HTTP 請求的 uvicorn 行程數 (預設: 2)')
+    parser.add_argument('--job-workers', type=int, default=None,
+                       help='轉錄 worker 行程數 (預設依 CPU 核心數與記憶體自動決定)')
+    parser.add_argument('--max-tasks-per-worker', type=int, default=None,
+                       help='轉錄 worker 處理幾個任務後回收重啟 (預設使用設定檔，0 不回收)')
+    parser.add_argument('--no-preload', action='store_true', help='不預先載入模型，worker 各自載入 (spawn)')
+    args = parser.parse_args(argv)
+
+    from src.core.config import config
+    from src.api.routers.video import job_queue
+    if args.job_workers is not None:
+        job_queue.workers = args.job_workers
+    if args.max_tasks_per_worker is not None:
+        config.JOB_MAX_TASKS_PER_WORKER = args.max_tasks_per_worker
+        # 以 spawn 啟動的 worker 重新讀取設定，須經由環境變數傳遞
+        os.environ["VIDEOTONOTE_MAX_TASKS_PER_WORKER"] = str(args.max_tasks_per_worker)
+
+    print("🚀 以正式環境模式啟動 VideoToNote API 伺服器...")
+    job_queue.start(preload=not args.no_preload)
+    # 轉錄 worker 由本行程統一管理，API 行程只負責接收請求
+    os.environ["VIDEOTONOTE_JOB_WORKERS"] = "0"
+    try:
+        uvicorn.run("src.api.main:app", host=args.host, port=args.port, workers=args.workers)
+    finally:
+        job_queue.stop()
+
+def run_worker(argv):
+    """
+    只執行轉錄 worker，不啟動 API：多台機器共用同一份資料目錄 (storage.data_dir) 時，
+    各自以租約從共用佇列取出任務，當機或失聯的機器手上的任務會在租約到期後由其他機器接手
+    """
+    parser = argparse.ArgumentParser(prog="main.py worker", description="啟動 VideoToNote 轉錄 worker (不含 API)")
+    parser.add_argument('--workers', type=int, default=None,
+                       help='轉錄 worker 行程數 (預設依 CPU 核心數與記憶體自動決定)')
+    parser.add_argument('--transcribers', type=str, default=None,
+                       help='只處理這些轉錄器的任務，以逗號分隔 (例如 standard)')
+    parser.add_argument('--models', type=str, default=None,
+                       help='只處理這些筆記模型的任務，以逗號分隔 (例如 ollama)')
+    parser.add_argument('--max-tasks-per-worker', type=int, default=None,
+                       help='轉錄 worker 處理幾個任務後回收重啟 (預設使用設定檔，0 不回收)')
+    parser.add_argument('--no-preload', action='store_true', help='不預先載入模型，worker 各自載入 (spawn)')
+    args = parser.parse_args(argv)
+
+    import json
+    import signal
+    import threading
+    from src.core.config import config
+    from src.core.task_store import TaskStore
+    from src.core.job_queue import JobQueue
+
+    capabilities = {}
+    if args.transcribers is not None:
+        capabilities["transcribers"] = [name.strip() for name in args.transcribers.split(",") if name.strip()]
+    if args.models is not None:
+        capabilities["models"] = [name.strip() for name in args.models.split(",") if name.strip()]
+    if capabilities:
+        config.JOB_CAPABILITIES.update(capabilities)
+        os.environ["VIDEOTONOTE_JOB_CAPABILITIES"] = json.dumps(capabilities)
+        if args.transcribers is not None:
+            # 只預先載入此機器會用到的轉錄器
+            config.JOB_PRELOAD_TRANSCRIBERS = [name for name in config.JOB_PRELOAD_TRANSCRIBERS
+                                               if name in capabilities["transcribers"]]
+    if args.max_tasks_per_worker is not None:
+        config.JOB_MAX_TASKS_PER_WORKER = args.max_tasks_per_worker
+        os.environ["VIDEOTONOTE_MAX_TASKS_PER_WORKER"] = str(args.max_tasks_per_worker)
+
+    job_queue = JobQueue(TaskStore(), workers=args.workers)
+    if job_queue.workers <= 0:
+        print("❌ worker 數量須大於 0")
+        return
+    stopped = threading.Event()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *_: stopped.set())
+
+    print(f"🚀 啟動 VideoToNote 轉錄 worker (資料庫: {config.TASK_DB_PATH})...")
+    job_queue.start(preload=False if args.no_preload else None)
+    try:
+        stopped.wait()
+    finally:
+        print("停止轉錄 worker...")
+        job_queue.stop()
+
+def _format_time(seconds):
+    if seconds is None:
+        return "--:--:--"
+    seconds = int(seconds)
+    return f"{seconds // 3600:02d}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+
+def run_search(argv):
+    """搜尋逐字稿：先增量同步逐字稿資料夾的索引，再列出符合的片段與時間範圍"""
+    parser = argparse.ArgumentParser(prog="main.py search", description="搜尋逐字稿 (附片段時間範圍)")
+    parser.add_argument('query', nargs='?', default=None, help='搜尋字串 (多個詞以空白分隔，須同時出現)')
+    parser.add_argument('--limit', type=int, default=20, help='最多列出幾筆結果 (預設: 20)')
+    parser.add_argument('--rebuild', action='store_true', help='重新索引所有逐字稿')
+    parser.add_argument('--no-update', action='store_true', help='不同步逐字稿資料夾，直接查詢現有索引')
+    args = parser.parse_args(argv)
+
+    import time
+    from src.core.search_index import get_index
+
+    index = get_index()
+    if not args.no_update:
+        stats = index.update_library(rebuild=args.rebuild)
+        if stats["indexed"] or stats["removed"]:
+            print(f"索引已更新: 新增或變動 {stats['indexed']} 份，移除 {stats['removed']} 份")
+    if not args.query:
+        stats = index.stats()
+        print(f"索引中有 {stats['documents']} 份逐字稿、{stats['segments']} 個片段")
+        return
+
+    started = time.monotonic()
+    results = index.search(args.query, limit=args.limit)
+    elapsed = time.monotonic() - started
+    for result in results:
+        print(f"{result['source']}  [{_format_time(result['start'])} - {_format_time(result['end'])}]")
+        print(f"    {result['text']}")
+    print(f"找到 {len(results)} 筆結果 ({elapsed * 1000:.0f} ms)")
+
 def main():
-    if len(sys.argv) > 1 and sys.argv[1] == "api":
-        print("🚀 啟動 VideoToNote API 伺服器...")
-        # 移除 'api' 參數，避免影響後續的 argparse 等
-        sys.argv.pop(1)
-        uvicorn.run("src.api.main:app", host="0.0.0.0", port=8000, reload=True)
+    commands = {"api": run_api, "serve": run_serve, "worker": run_worker, "search": run_search}
+    if len(sys.argv) > 1 and sys.argv[1] in commands:
+        # 移除子命令參數，避免影響後續的 argparse 等
+        command = sys.argv.pop(1)
+        commands[command](sys.argv[1:])
     else:
         # 啟動 CLI 介面
         cli_main()
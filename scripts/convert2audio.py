@@ -1,70 +1,192 @@
 import os
+import json
+import time
 import subprocess
 import argparse
 import shutil
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
+from typing import Optional, Dict, Any, List, Tuple
 
-def batch_convert_to_mp3(input_folder, output_folder, overwrite=False):
+# 支援的影片副檔名清單
+VIDEO_EXTENSIONS = {'.m2ts', '.mp4', '.mkv', '.mov', '.avi', '.flv', '.wmv'}
+
+# 可直接複製音軌 (不重新編碼) 的編碼 → 輸出副檔名
+COPY_CONTAINERS = {'mp3': '.mp3', 'aac': '.m4a', 'alac': '.m4a', 'opus': '.opus', 'vorbis': '.ogg', 'flac': '.flac'}
+
+# 轉錄用格式：16 kHz 單聲道 PCM，轉錄時不必再重新取樣
+TRANSCRIBE_SAMPLE_RATE = 16000
+
+def probe_audio(file_path: Path) -> Optional[Dict[str, Any]]:
+    """以 ffprobe 讀取第一條音軌的編碼、取樣率、聲道數與長度；沒有音軌或讀取失敗時返回 None"""
+    command = [
+        'ffprobe', '-v', 'error', '-select_streams', 'a:0',
+        '-show_entries', 'stream=codec_name,sample_rate,channels:format=duration',
+        '-of', 'json', str(file_path)
+    ]
+    try:
+        result = subprocess.run(command, check=True, capture_output=True, text=True, timeout=60)
+        info = json.loads(result.stdout)
+    except (subprocess.SubprocessError, ValueError, OSError):
+        return None
+    streams = info.get('streams') or []
+    if not streams:
+        return None
+    stream = streams[0]
+    try:
+        duration = float((info.get('format') or {}).get('duration'))
+    except (TypeError, ValueError):
+        duration = None
+    return {
+        'codec': stream.get('codec_name'),
+        'sample_rate': int(stream.get('sample_rate') or 0),
+        'channels': int(stream.get('channels') or 0),
+        'duration': duration,
+    }
+
+def plan_conversion(probe: Dict[str, Any], for_transcription: bool = False,
+                    keep_codec: bool = False) -> Tuple[str, str, List[str]]:
+    """
+    依音軌資訊決定 (方式, 輸出副檔名, ffmpeg 音訊參數)
+
+    - 預設輸出 mp3：來源已是 mp3 時直接複製音軌，否則以 192k 重新編碼
+    - keep_codec：來源編碼可放入對應容器時一律複製音軌 (例如 aac → m4a)，不損失音質且最快
+    - for_transcription：輸出 16 kHz 單聲道 wav，來源已符合時直接複製
+    """
+    codec = probe['codec']
+    if for_transcription:
+        if codec == 'pcm_s16le' and probe['sample_rate'] == TRANSCRIBE_SAMPLE_RATE and probe['channels'] == 1:
+            return 'copy', '.wav', ['-c:a', 'copy']
+        return 'transcode', '.wav', ['-c:a', 'pcm_s16le', '-ac', '1', '-ar', str(TRANSCRIBE_SAMPLE_RATE)]
+    if codec == 'mp3' or (keep_codec and codec in COPY_CONTAINERS):
+        return 'copy', COPY_CONTAINERS[codec], ['-c:a', 'copy']
+    return 'transcode', '.mp3', ['-c:a', 'libmp3lame', '-b:a', '192k']
+
+def _is_up_to_date(out_file: Path, file_path: Path) -> bool:
+    return out_file.exists() and out_file.stat().st_mtime >= file_path.stat().st_mtime
+
+def convert_file(file_path: Path, output_path: Path, overwrite: bool = False, for_transcription: bool = False,
+                 keep_codec: bool = False) -> Dict[str, Any]:
+    """轉換單一檔案，回傳 {'file', 'status' (copy/transcode/skipped/failed), 'duration', 'error'}"""
+    summary = {'file': file_path.name, 'status': 'failed', 'duration': None, 'error': None}
+
+    # 輸出比輸入新時不必探測即可略過 (僅在輸出副檔名固定時)
+    fixed_suffix = '.wav' if for_transcription else (None if keep_codec else '.mp3')
+    if fixed_suffix and not overwrite and _is_up_to_date(output_path / f"{file_path.stem}{fixed_suffix}", file_path):
+        summary['status'] = 'skipped'
+        return summary
+
+    probe = probe_audio(file_path)
+    if probe is None:
+        summary['error'] = "ffprobe 找不到音軌"
+        return summary
+    mode, suffix, audio_args = plan_conversion(probe, for_transcription, keep_codec)
+    out_file = output_path / f"{file_path.stem}{suffix}"
+    if not overwrite and _is_up_to_date(out_file, file_path):
+        summary['status'] = 'skipped'
+        return summary
+
+    # 先寫入暫存檔再改名，中斷時不會留下看似已完成的輸出
+    tmp_file = output_path / f"{file_path.stem}.part{suffix}"
+    command = ['ffmpeg', '-nostdin', '-v', 'error', '-i', str(file_path), '-vn', '-map', '0:a:0',
+               *audio_args, '-y', str(tmp_file)]
+    try:
+        # capture_output=True 可以捕捉輸出而不直接印在終端機
+        subprocess.run(command, check=True, capture_output=True, text=True)
+        os.replace(tmp_file, out_file)
+    except subprocess.CalledProcessError as e:
+        if tmp_file.exists():
+            tmp_file.unlink()
+        summary['error'] = e.stderr.strip()
+        return summary
+    summary.update(status=mode, duration=probe['duration'])
+    return summary
+
+def _convert_group(files: List[Path], output_path: Path, overwrite: bool, for_transcription: bool,
+                   keep_codec: bool) -> List[Dict[str, Any]]:
+    return [convert_file(file_path, output_path, overwrite, for_transcription, keep_codec) for file_path in files]
+
+def batch_convert_audio(input_folder, output_folder, overwrite=False, jobs: Optional[int] = None,
+                        for_transcription=False, keep_codec=False) -> List[Dict[str, Any]]:
+    """以多個 ffmpeg 行程平行轉換資料夾內的影片，回傳各檔案的處理結果"""
     input_path = Path(input_folder)
     output_path = Path(output_folder)
-    
+
     # 檢查輸入資料夾是否存在
     if not input_path.exists() or not input_path.is_dir():
         print(f"錯誤: 找不到輸入資料夾 ({input_folder})")
-        return
+        return []
 
     # 檢查 FFmpeg 是否安裝
-    if not shutil.which('ffmpeg'):
-        print("錯誤: 找不到 ffmpeg 指令，請確保已安裝並加入到系統環境變數中。")
-        return
+    if not shutil.which('ffmpeg') or not shutil.which('ffprobe'):
+        print("錯誤: 找不到 ffmpeg / ffprobe 指令，請確保已安裝並加入到系統環境變數中。")
+        return []
 
-    # 支援的影片副檔名清單
-    video_extensions = {'.m2ts', '.mp4', '.mkv', '.mov', '.avi', '.flv', '.wmv'}
-    
     # 若輸出資料夾不存在則建立
     output_path.mkdir(parents=True, exist_ok=True)
     print(f"輸出資料夾: {output_path}")
 
-    # 遍歷資料夾中的所有檔案
-    for file_path in input_path.iterdir():
-        # 確保是檔案且副檔名符合
-        if file_path.is_file() and file_path.suffix.lower() in video_extensions:
-            # 決定輸出的檔案路徑 (.mp3)
-            out_file = output_path / f"{file_path.stem}.mp3"
-
-            # 避免重複轉檔：如果檔案已存在且不強制覆蓋，就跳過
-            if out_file.exists() and not overwrite:
-                print(f"略過: {file_path.name} (已存在)")
-                continue
-
-            print(f"正在處理: {file_path.name}...")
-
-            command = [
-                'ffmpeg',
-                '-i', str(file_path),
-                '-vn',
-                '-c:a', 'libmp3lame',
-                '-b:a', '192k',
-                '-y' if overwrite else '-n', # -y: 覆蓋, -n: 不覆蓋
-                str(out_file)
-            ]
-
-            try:
-                # capture_output=True 可以捕捉輸出而不直接印在終端機
-                result = subprocess.run(command, check=True, capture_output=True, text=True)
-                print(f"完成: {out_file.name}")
-            except subprocess.CalledProcessError as e:
-                print(f"失敗: 無法轉換 {file_path.name}")
-                print(f"詳細錯誤訊息: \n{e.stderr}")
+    files = sorted(
+        file_path for file_path in input_path.iterdir()
+        if file_path.is_file() and file_path.suffix.lower() in VIDEO_EXTENSIONS
+    )
+    jobs = max(1, jobs or os.cpu_count() or 1)
+    print(f"共 {len(files)} 個檔案，同時執行 {jobs} 個 ffmpeg")
+
+    # 檔名相同、副檔名不同的影片 (例如 a.mp4 與 a.mkv) 輸出到同一個檔案，同組依序轉換以免兩個 ffmpeg 同時寫入
+    groups: Dict[str, List[Path]] = {}
+    for file_path in files:
+        groups.setdefault(file_path.stem.lower(), []).append(file_path)
+
+    results = []
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        futures = [
+            executor.submit(_convert_group, group, output_path, overwrite, for_transcription, keep_codec)
+            for group in groups.values()
+        ]
+        for future in as_completed(futures):
+            for result in future.result():
+                results.append(result)
+                if result['status'] == 'skipped':
+                    print(f"略過: {result['file']} (輸出已是最新)")
+                elif result['status'] == 'failed':
+                    print(f"失敗: 無法轉換 {result['file']}")
+                    print(f"詳細錯誤訊息: \n{result['error']}")
+                else:
+                    print(f"完成 ({'複製音軌' if result['status'] == 'copy' else '重新編碼'}): {result['file']}")
+
+    _print_summary(results, time.monotonic() - started)
+    return results
+
+def batch_convert_to_mp3(input_folder, output_folder, overwrite=False):
+    return batch_convert_audio(input_folder, output_folder, overwrite=overwrite)
+
+def _print_summary(results: List[Dict[str, Any]], elapsed: float):
+    counts = {status: 0 for status in ('copy', 'transcode', 'skipped', 'failed')}
+    for result in results:
+        counts[result['status']] += 1
+    converted = counts['copy'] + counts['transcode']
+    audio_hours = sum(result['duration'] or 0.0 for result in results if result['status'] in ('copy', 'transcode')) / 3600
 
     print("\n--- 所有任務處理完畢 ---")
+    print(f"複製音軌 {counts['copy']}、重新編碼 {counts['transcode']}、略過 {counts['skipped']}、失敗 {counts['failed']}")
+    if converted and elapsed > 0:
+        print(f"耗時 {elapsed:.1f} 秒，{converted / elapsed:.2f} 檔案/秒，"
+              f"{audio_hours / (elapsed / 60):.2f} 音訊小時/分鐘 (共 {audio_hours:.2f} 小時)")
 
 if __name__ == '__main__':
-    parser = argparse.ArgumentParser(description="批次將影片轉換為 mp3 音檔")
+    parser = argparse.ArgumentParser(description="批次將影片轉換為音檔")
     parser.add_argument("-i", "--input", default="/Users/kuangtinghsiao/Downloads/video", help="輸入影片資料夾路徑 (預設: ./my_videos)")
     parser.add_argument("-o", "--output", default="./data/mp3", help="輸出音檔資料夾路徑 (預設: ./data/mp3)")
-    parser.add_argument("-f", "--force", action="store_true", help="如果音檔已存在，強制覆蓋轉檔")
-    
+    parser.add_argument("-f", "--force", action="store_true", help="即使輸出已是最新，仍強制覆蓋轉檔")
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="同時執行的 ffmpeg 數量 (預設: CPU 核心數)")
+    parser.add_argument("--for-transcription", action="store_true",
+                        help="直接輸出 16 kHz 單聲道 wav，轉錄時不必再重新取樣")
+    parser.add_argument("--keep-codec", action="store_true",
+                        help="來源音軌可直接放入對應容器時 (例如 aac → m4a) 複製音軌而不轉成 mp3")
+
     args = parser.parse_args()
-    
-    batch_convert_to_mp3(args.input, args.output, overwrite=args.force)
\ No newline at end of file
+
+    batch_convert_audio(args.input, args.output, overwrite=args.force, jobs=args.jobs,
+                        for_transcription=args.for_transcription, keep_codec=args.keep_codec)
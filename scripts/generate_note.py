@@ -4,25 +4,72 @@
 獨立筆記生成腳本 - 從逐字稿生成筆記
 """
 import sys
+import argparse
 from pathlib import Path
 
-# 將 src 目錄加入 Python 路徑
-src_path = Path(__file__).parent.parent / "src"
-sys.path.insert(0, str(src_path))
+# 將專案根目錄加入 Python 路徑
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
 
 from src.services.notes_generator import NotesGenerator
+from src.services.async_notes_generator import AsyncNotesGeneratorFactory, AsyncBatchNotesGenerator
+from src.services.transcript_compactor import compact_transcription
 from src.core.config import config
 
+def generate_single(transcription_path: Path, model_choice: str):
+    """為單一逐字稿生成筆記"""
+    # 讀取逐字稿內容
+    with open(transcription_path, 'r', encoding='utf-8') as f:
+        transcription_text = f.read()
+    
+    transcription = {"text": transcription_text}
+    if config.COMPACT_TRANSCRIPT:
+        transcription, stats = compact_transcription(transcription)
+        print(stats.summary())
+    
+    # 建立筆記生成器
+    notes_generator = NotesGenerator.create(model_choice=model_choice)
+    
+    # 生成筆記
+    notes = notes_generator.generate_notes(transcription)
+    
+    if notes:
+        output_path = notes_generator.save_notes(notes, str(transcription_path))
+        print(f"筆記生成完成，結果已保存到: {output_path}")
+        return True
+    print("筆記生成失敗")
+    return False
+
+def generate_directory(directory: Path, model_choice: str, concurrency: int, pattern: str, estimate_only: bool = False):
+    """並行為資料夾內所有逐字稿生成筆記"""
+    batch = AsyncBatchNotesGenerator(
+        AsyncNotesGeneratorFactory.create(model_choice=model_choice),
+        concurrency=concurrency
+    )
+    results = batch.generate_directory(str(directory), pattern=pattern, estimate_only=estimate_only)
+    if estimate_only:
+        return True
+    successful = sum(1 for output_path in results.values() if output_path)
+    print(f"\n批次筆記生成完成！成功: {successful}/{len(results)}")
+    return bool(results) and successful == len(results)
+
 def main():
-    if len(sys.argv) < 2:
-        print("用法: python generate_note.py <逐字稿路徑> [模型選擇]")
-        print("模型選擇: openai, deepseek, gemini, ollama (預設: openai)")
-        sys.exit(1)
+    parser = argparse.ArgumentParser(description='從逐字稿生成筆記（可傳入資料夾進行並行批次處理）')
+    parser.add_argument('path', type=str, help='逐字稿檔案路徑，或包含逐字稿的資料夾')
+    parser.add_argument('model', type=str, nargs='?', default='openai', choices=['openai', 'deepseek', 'gemini', 'ollama'],
+                       help='選擇用於生成筆記的模型 (預設: openai)')
+    parser.add_argument('--concurrency', '-c', type=int, default=config.NOTES_CONCURRENCY,
+                       help=f'批次模式的並行請求上限 (預設: {config.NOTES_CONCURRENCY})')
+    parser.add_argument('--pattern', type=str, default='*_transcription*.txt',
+                       help='批次模式搜尋逐字稿的檔名樣式 (預設: *_transcription*.txt)')
+    parser.add_argument('--estimate-only', action='store_true',
+                       help='批次模式僅輸出 token、成本與完成時間預估，不實際呼叫模型')
+    args = parser.parse_args()
     
-    transcription_path = sys.argv[1]
-    model_choice = sys.argv[2] if len(sys.argv) > 2 else 'openai'
+    transcription_path = Path(args.path)
+    model_choice = args.model
     
-    if not Path(transcription_path).exists():
+    if not transcription_path.exists():
         print(f"錯誤: 逐字稿檔案不存在 - {transcription_path}")
         sys.exit(1)
     
@@ -30,22 +77,11 @@ def main():
     print(f"使用模型: {model_choice}")
     
     try:
-        # 讀取逐字稿內容
-        with open(transcription_path, 'r', encoding='utf-8') as f:
-            transcription_text = f.read()
-        
-        # 建立筆記生成器
-        notes_generator = NotesGenerator(model_choice=model_choice)
-        
-        # 生成筆記
-        notes = notes_generator.generate_notes({"text": transcription_text})
-        
-        if notes:
-            output_path = notes_generator.save_notes(notes, transcription_path)
-            print(f"筆記生成完成，結果已保存到: {output_path}")
+        if transcription_path.is_dir():
+            success = generate_directory(transcription_path, model_choice, args.concurrency, args.pattern, args.estimate_only)
         else:
-            print("筆記生成失敗")
-            sys.exit(1)
+            success = generate_single(transcription_path, model_choice)
+        sys.exit(0 if success else 1)
             
     except Exception as e:
         print(f"錯誤: {e}")
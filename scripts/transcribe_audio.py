@@ -2,44 +2,186 @@
 # -*- coding: utf-8 -*-
 """
 獨立轉錄腳本 - 僅轉錄音檔，不生成筆記
+
+可傳入多個音檔、資料夾或萬用字元樣式；模型只載入一次，所有檔案共用。
 """
+import os
 import sys
+import glob
+import json
+import time
+import argparse
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from datetime import datetime
 from pathlib import Path
+from typing import List, Dict, Any, Optional
 
 # 將專案根目錄加入 Python 路徑
 project_root = Path(__file__).parent.parent
 sys.path.insert(0, str(project_root))
 
-from src.services.transcriber import SpeechTranscriber
+from src.services.transcriber import TranscriberFactory, BaseTranscriber
+from src.utils.file_manager import FileManager
 from src.core.config import config
+from src.core.search_index import index_transcript
+
+AUDIO_EXTENSIONS = {'.mp3', '.wav', '.m4a', '.flac', '.ogg', '.opus', '.aac'}
+
+# 由主行程載入的轉錄器；多個 worker 時以 fork 繼承，共享同一份模型權重
+_TRANSCRIBER: Optional[BaseTranscriber] = None
+
+def collect_audio_files(inputs: List[str]) -> List[Path]:
+    """展開音檔路徑、資料夾 (遞迴搜尋) 與萬用字元樣式，去除重複"""
+    files: Dict[str, Path] = {}
+    for item in inputs:
+        if glob.has_magic(item):
+            candidates = [Path(path) for path in glob.glob(item, recursive=True)]
+        elif Path(item).is_dir():
+            candidates = list(Path(item).rglob('*'))
+        else:
+            candidates = [Path(item)]
+        for path in candidates:
+            if path.is_file() and (path.suffix.lower() in AUDIO_EXTENSIONS or not Path(item).is_dir()):
+                files.setdefault(str(path.resolve()), path)
+    return list(files.values())
+
+def _init_worker(threads: int):
+    if "torch" in sys.modules:
+        # fork 後限制每個 worker 的運算執行緒，避免多個 worker 互搶 CPU
+        sys.modules["torch"].set_num_threads(threads)
+
+def transcribe_file(audio_path: Path, duration: Optional[float], language: Optional[str]) -> Dict[str, Any]:
+    """以已載入的模型轉錄單一檔案並保存逐字稿與片段，回傳該檔案的處理摘要"""
+    summary = {"file": str(audio_path), "duration": duration, "elapsed": None, "realtime_factor": None,
+               "status": "failed", "transcription_path": None, "error": None}
+    started = time.monotonic()
+    try:
+        result = _TRANSCRIBER.transcribe(str(audio_path), language=language)
+        if not result:
+            summary["error"] = "轉錄失敗"
+            return summary
+        summary["transcription_path"] = _TRANSCRIBER.save_transcription(result, str(audio_path))
+        index_transcript(summary["transcription_path"], _TRANSCRIBER.save_segments(result, str(audio_path)))
+        summary["status"] = "completed"
+    except Exception as e:
+        summary["error"] = str(e)
+    finally:
+        summary["elapsed"] = time.monotonic() - started
+        if duration:
+            summary["realtime_factor"] = summary["elapsed"] / duration
+    return summary
+
+def run_batch(files: List[Path], transcriber_type: str, language: Optional[str], workers: int = 1,
+              force: bool = False) -> List[Dict[str, Any]]:
+    """載入一次模型後依長度由長到短轉錄所有檔案，略過已有逐字稿的檔案"""
+    global _TRANSCRIBER
+
+    results: List[Dict[str, Any]] = []
+    pending = []
+    # 各後端的逐字稿檔名不同，只略過此轉錄器已產生逐字稿的檔案
+    transcriber_class = TranscriberFactory.transcriber_class(transcriber_type)
+    for path in files:
+        transcription_path = transcriber_class.output_path(str(path))
+        if not force and transcription_path.exists():
+            print(f"略過: {path.name} (逐字稿已存在)")
+            results.append({"file": str(path), "status": "skipped", "transcription_path": str(transcription_path)})
+        else:
+            pending.append(path)
+    if not pending:
+        return results
+
+    # 先轉錄長檔案，多個 worker 時最後不會只剩一個長檔案拖住整批 (最長處理時間優先)
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        durations = list(executor.map(FileManager.get_audio_duration, [str(path) for path in pending]))
+    jobs = sorted(zip(pending, durations), key=lambda item: item[1] or 0.0, reverse=True)
+
+    print(f"載入轉錄模型 ({transcriber_type})...")
+    _TRANSCRIBER = TranscriberFactory.create(transcriber_type=transcriber_type)
+    workers = max(1, min(workers, len(jobs)))
+    if workers > 1 and "fork" not in multiprocessing.get_all_start_methods():
+        print("此平台不支援 fork，改以單一行程轉錄")
+        workers = 1
+
+    print(f"開始轉錄 {len(jobs)} 個檔案 (worker: {workers})")
+    if workers == 1:
+        summaries = (transcribe_file(path, duration, language) for path, duration in jobs)
+        executor = None
+    else:
+        executor = ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context("fork"),
+            initializer=_init_worker, initargs=(max(1, (os.cpu_count() or 1) // workers),)
+        )
+        futures = [executor.submit(transcribe_file, path, duration, language) for path, duration in jobs]
+        summaries = (future.result() for future in futures)
+    try:
+        for index, summary in enumerate(summaries, 1):
+            results.append(summary)
+            name = Path(summary["file"]).name
+            if summary["status"] == "completed":
+                rtf = f"，即時倍率 {summary['realtime_factor']:.2f}" if summary["realtime_factor"] else ""
+                print(f"[{index}/{len(jobs)}] 完成: {name} ({summary['elapsed']:.1f} 秒{rtf})")
+            else:
+                print(f"[{index}/{len(jobs)}] 失敗: {name} - {summary['error']}")
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    return results
+
+def write_summary(results: List[Dict[str, Any]], elapsed: float, transcriber_type: str,
+                  output_path: Optional[Path] = None) -> Path:
+    """輸出本次執行的摘要 (各檔案的耗時與即時倍率) 為 JSON"""
+    completed = [result for result in results if result["status"] == "completed"]
+    audio_seconds = sum(result["duration"] or 0.0 for result in completed)
+    summary = {
+        "transcriber": transcriber_type,
+        "started_at": datetime.fromtimestamp(time.time() - elapsed).isoformat(timespec="seconds"),
+        "elapsed": elapsed,
+        "counts": {status: sum(1 for result in results if result["status"] == status)
+                   for status in ("completed", "skipped", "failed")},
+        "audio_seconds": audio_seconds,
+        "realtime_factor": elapsed / audio_seconds if audio_seconds else None,
+        "files": results,
+    }
+    if output_path is None:
+        output_path = config.TRANSCRIPTION_DIR / f"transcribe_run_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    output_path.write_text(json.dumps(summary, ensure_ascii=False, indent=2), encoding="utf-8")
+    return output_path
 
 def main():
-    if len(sys.argv) < 2:
-        print("用法: python transcribe_audio.py <音檔路徑>")
-        sys.exit(1)
-    
-    audio_path = sys.argv[1]
-    
-    if not Path(audio_path).exists():
-        print(f"錯誤: 音檔不存在 - {audio_path}")
+    parser = argparse.ArgumentParser(description='轉錄音檔（可傳入多個檔案、資料夾或萬用字元樣式）')
+    parser.add_argument('paths', nargs='+', help='音檔路徑、資料夾或樣式 (例如 "data/mp3/*.mp3")')
+    parser.add_argument('--transcriber', '-t', type=str, default='standard', choices=['fast', 'standard', 'ctranslate2', 'auto'],
+                       help='轉錄器類型 (預設: standard)')
+    parser.add_argument('--language', type=str, default=None, help='音檔語言 (預設使用設定檔)')
+    parser.add_argument('--workers', '-w', type=int, default=1,
+                       help='同時轉錄的行程數，共用同一份已載入的模型 (預設: 1)')
+    parser.add_argument('--force', action='store_true', help='即使逐字稿已存在仍重新轉錄')
+    parser.add_argument('--summary', type=str, default=None,
+                       help='執行摘要 JSON 的輸出路徑 (預設: 逐字稿資料夾下的 transcribe_run_<時間>.json)')
+    args = parser.parse_args()
+
+    files = collect_audio_files(args.paths)
+    if not files:
+        print(f"錯誤: 找不到音檔 - {' '.join(args.paths)}")
         sys.exit(1)
-    
-    print(f"開始轉錄音檔: {audio_path}")
-    
+
+    print(f"找到 {len(files)} 個音檔")
+    started = time.monotonic()
     try:
-        transcriber = SpeechTranscriber()
-        result = transcriber.transcribe(audio_path)
-        
-        if result:
-            output_path = transcriber.save_transcription(result, audio_path)
-            print(f"轉錄完成，結果已保存到: {output_path}")
-        else:
-            print("轉錄失敗")
-            sys.exit(1)
-            
+        results = run_batch(files, args.transcriber, args.language, workers=args.workers, force=args.force)
     except Exception as e:
         print(f"錯誤: {e}")
         sys.exit(1)
 
+    summary_path = write_summary(results, time.monotonic() - started, args.transcriber,
+                                 Path(args.summary) if args.summary else None)
+    failed = [result for result in results if result["status"] == "failed"]
+    completed = sum(1 for result in results if result["status"] == "completed")
+    print(f"\n轉錄完成！成功: {completed}，略過: {len(results) - completed - len(failed)}，失敗: {len(failed)}")
+    print(f"執行摘要已保存到: {summary_path}")
+    sys.exit(1 if failed else 0)
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,208 @@
+# -*- coding: utf-8 -*-
+"""
+結果檔案回應 - 以內容雜湊產生強 ETag，支援 If-None-Match、Range 與 gzip / zstd 壓縮協商
+"""
+import hashlib
+import os
+import re
+import zlib
+from collections import OrderedDict
+from pathlib import Path
+from urllib.parse import quote
+from typing import Optional, Tuple, Iterator, Callable, Dict
+from fastapi import Request
+from fastapi.responses import Response, StreamingResponse
+from src.core.metrics import metrics
+
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+
+READ_CHUNK_SIZE = 64 * 1024
+# 小於此大小的內容壓縮效益有限，直接回傳原始內容
+COMPRESS_MIN_BYTES = 1024
+_RANGE_PATTERN = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+# (路徑, 修改時間, 大小) → 內容雜湊；檔案未變動時重複請求只需 stat，不必重新讀檔
+_ETAG_CACHE: "OrderedDict[Tuple[str, int, int], str]" = OrderedDict()
+_ETAG_CACHE_SIZE = 1024
+
+def file_etag(path: Path) -> str:
+    stat = path.stat()
+    key = (str(path), stat.st_mtime_ns, stat.st_size)
+    etag = _ETAG_CACHE.get(key)
+    metrics.inc("videotonote_cache_requests_total", cache="etag", result="miss" if etag is None else "hit")
+    if etag is None:
+        hasher = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(READ_CHUNK_SIZE), b""):
+                hasher.update(chunk)
+        etag = hasher.hexdigest()[:32]
+        _ETAG_CACHE[key] = etag
+        if len(_ETAG_CACHE) > _ETAG_CACHE_SIZE:
+            _ETAG_CACHE.popitem(last=False)
+    else:
+        _ETAG_CACHE.move_to_end(key)
+    return etag
+
+def _etag_matches(header: Optional[str], etag: str) -> bool:
+    """If-None-Match 採弱比較：忽略 W/ 前綴，並接受任一壓縮版本的 ETag"""
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate.strip('"').split("-")[0] == etag:
+            return True
+    return False
+
+def _choose_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """依 Accept-Encoding 的 q 值選擇 zstd 或 gzip；都不接受時回傳 None"""
+    if not accept_encoding:
+        return None
+    weights: Dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        match = re.search(r'q=([\d.]+)', params)
+        if match:
+            try:
+                q = float(match.group(1))
+            except ValueError:
+                q = 0.0
+        weights[name.strip().lower()] = q
+    supported = (["zstd"] if ZSTD_AVAILABLE else []) + ["gzip"]
+    wildcard = weights.get("*", 0.0)
+    ranked = [(weights.get(name, wildcard), -index, name) for index, name in enumerate(supported)]
+    q, _, name = max(ranked)
+    return name if q > 0 else None
+
+def _parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """解析單一區段的 Range (bytes=a-b、a-、-n)；無法滿足時拋出 ValueError"""
+    match = _RANGE_PATTERN.match(header.strip())
+    if not match:
+        return None
+    start, end = match.groups()
+    if start:
+        first = int(start)
+        last = min(int(end), size - 1) if end else size - 1
+    elif end:
+        first = max(0, size - int(end))
+        last = size - 1
+    else:
+        return None
+    if first >= size or first > last:
+        raise ValueError("Range not satisfiable")
+    return first, last
+
+def _read_chunks(path: Path, start: int = 0, length: Optional[int] = None) -> Iterator[bytes]:
+    with open(path, "rb") as f:
+        f.seek(start)
+        remaining = length
+        while remaining is None or remaining > 0:
+            chunk = f.read(READ_CHUNK_SIZE if remaining is None else min(READ_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            if remaining is not None:
+                remaining -= len(chunk)
+            yield chunk
+
+def _compress(chunks: Iterator[bytes], encoding: str) -> Iterator[bytes]:
+    if encoding == "zstd":
+        compressor = zstandard.ZstdCompressor().compressobj()
+        flush: Callable[[], bytes] = compressor.flush
+    else:
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+        flush = compressor.flush
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield flush()
+
+def conditional_response(request: Request, etag: str, size: int, media_type: str,
+                         open_chunks: Callable[[int, Optional[int]], Iterator[bytes]],
+                         filename: Optional[str] = None) -> Response:
+    """
+    依請求標頭回傳 304、206 (Range)、壓縮或完整內容
+
+    Args:
+        etag: 內容雜湊 (不含引號)
+        size: 原始內容大小
+        open_chunks: (起點, 長度) → 內容區塊迭代器，長度為 None 表示讀到結尾
+    """
+    headers = {
+        "Cache-Control": "no-cache",
+        "Accept-Ranges": "bytes",
+        "Vary": "Accept-Encoding",
+    }
+    if filename:
+        # 檔名常含中文，依 RFC 5987 編碼
+        headers["Content-Disposition"] = f"inline; filename*=UTF-8''{quote(filename)}"
+
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=dict(headers, ETag=f'"{etag}"'))
+
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and (not if_range or if_range.strip().strip('"') == etag):
+        try:
+            byte_range = _parse_range(range_header, size)
+        except ValueError:
+            return Response(status_code=416, headers=dict(headers, **{"Content-Range": f"bytes */{size}"}))
+        if byte_range:
+            first, last = byte_range
+            headers.update({
+                "ETag": f'"{etag}"',
+                "Content-Range": f"bytes {first}-{last}/{size}",
+                "Content-Length": str(last - first + 1),
+            })
+            return StreamingResponse(open_chunks(first, last - first + 1), status_code=206,
+                                     media_type=media_type, headers=headers)
+
+    encoding = _choose_encoding(request.headers.get("accept-encoding")) if size >= COMPRESS_MIN_BYTES else None
+    if encoding:
+        # 壓縮版本與原始內容的位元組不同，強 ETag 需加上編碼區分
+        headers.update({"ETag": f'"{etag}-{encoding}"', "Content-Encoding": encoding})
+        return StreamingResponse(_compress(open_chunks(0, None), encoding), media_type=media_type, headers=headers)
+
+    headers.update({"ETag": f'"{etag}"', "Content-Length": str(size)})
+    return StreamingResponse(open_chunks(0, None), media_type=media_type, headers=headers)
+
+def file_response(request: Request, path: Path, media_type: str, filename: Optional[str] = None) -> Response:
+    """從磁碟串流回傳檔案"""
+    path = Path(path)
+    return conditional_response(
+        request, file_etag(path), os.path.getsize(path), media_type,
+        lambda start, length: _read_chunks(path, start, length),
+        filename=filename or path.name
+    )
+
+def bytes_response(request: Request, content: bytes, media_type: str, filename: Optional[str] = None,
+                   etag: Optional[str] = None) -> Response:
+    """回傳記憶體中產生的內容"""
+    etag = etag or hashlib.sha256(content).hexdigest()[:32]
+
+    def chunks(start: int, length: Optional[int]) -> Iterator[bytes]:
+        end = len(content) if length is None else start + length
+        for offset in range(start, end, READ_CHUNK_SIZE):
+            yield content[offset:min(end, offset + READ_CHUNK_SIZE)]
+
+    return conditional_response(request, etag, len(content), media_type, chunks, filename=filename)
+
+def derived_response(request: Request, source: Path, variant: str, media_type: str, render: Callable[[], bytes],
+                     filename: Optional[str] = None) -> Response:
+    """
+    回傳由來源檔案轉換而成的內容 (例如由片段轉出的 SRT)
+
+    ETag 由來源檔案雜湊與轉換種類決定，內容未變動時直接回傳 304 而不重新轉換。
+    """
+    etag = hashlib.sha256(f"{file_etag(Path(source))}:{variant}".encode()).hexdigest()[:32]
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return conditional_response(request, etag, 0, media_type, lambda start, length: iter(()), filename=filename)
+    return bytes_response(request, render(), media_type, filename=filename, etag=etag)
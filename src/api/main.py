@@ -1,11 +1,40 @@
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from src.api.routers import health, video
+from src.api.routers import health, video, uploads, metrics, search
+from src.core.config import config
+from src.core.metrics import metrics as metrics_registry
+
+async def _cleanup_expired_tasks():
+    """定期清除超過保存期限的已結束任務"""
+    while True:
+        try:
+            loop = asyncio.get_running_loop()
+            deleted = await loop.run_in_executor(None, video.task_store.cleanup_expired)
+            if deleted:
+                print(f"已清除 {deleted} 筆過期任務")
+            stale = await loop.run_in_executor(None, uploads.upload_manager.cleanup_stale)
+            if stale:
+                print(f"已清除 {stale} 筆未完成的上傳")
+        except Exception as e:
+            print(f"清除過期任務時發生錯誤: {e}")
+        await asyncio.sleep(config.TASK_CLEANUP_INTERVAL)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    cleanup_task = asyncio.create_task(_cleanup_expired_tasks())
+    metrics_registry.enable_persistence(video.task_store.db_path, process_label="api")
+    video.job_queue.start()
+    yield
+    cleanup_task.cancel()
+    video.job_queue.stop()
 
 app = FastAPI(
     title="VideoToNote API",
     description="智慧影片轉錄與筆記生成工具 API",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # CORS configuration
@@ -20,6 +49,10 @@ app.add_middleware(
 # 註冊路由
 app.include_router(health.router, prefix="/api/v1")
 app.include_router(video.router, prefix="/api/v1/video")
+app.include_router(uploads.router, prefix="/api/v1/uploads")
+app.include_router(search.router, prefix="/api/v1")
+# Prometheus 慣例的抓取路徑，不加版本前綴
+app.include_router(metrics.router)
 
 @app.get("/")
 async def root():
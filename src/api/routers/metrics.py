@@ -0,0 +1,25 @@
+import asyncio
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from src.api.routers.video import task_store
+from src.core.config import config
+from src.core.metrics import metrics, gauge
+
+router = APIRouter(tags=["Metrics"])
+
+def _render() -> str:
+    """匯出累計指標，並加上匯出當下的佇列深度、各狀態任務數與 worker 數"""
+    busy = {task["worker_id"] for task in task_store.processing_tasks() if task.get("worker_id")}
+    # 依心跳計算存活的 worker：涵蓋其他行程 (serve / api --workers) 與其他機器 (main.py worker) 啟動的 worker
+    alive = task_store.list_workers(max_age=3 * config.JOB_HEARTBEAT_INTERVAL)
+    gauges = dict([
+        gauge("videotonote_queue_depth", task_store.queue_depth()),
+        gauge("videotonote_workers", len(alive), state="alive"),
+        gauge("videotonote_workers", len(busy), state="busy"),
+    ] + [gauge("videotonote_tasks", count, status=status) for status, count in task_store.count_by_status().items()])
+    return metrics.render(gauges)
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    body = await asyncio.get_running_loop().run_in_executor(None, _render)
+    return PlainTextResponse(body, media_type="text/plain; version=0.0.4; charset=utf-8")
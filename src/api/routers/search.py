@@ -0,0 +1,16 @@
+import asyncio
+import time
+from fastapi import APIRouter, Query
+
+from src.api.schemas.requests import SearchResponse
+from src.core.search_index import get_index
+
+router = APIRouter(tags=["Search"])
+
+@router.get("/search", response_model=SearchResponse)
+async def search_transcripts(q: str = Query(..., min_length=1), limit: int = Query(20, ge=1, le=200),
+                             offset: int = Query(0, ge=0)):
+    """全文搜尋逐字稿 (中文以字元 bigram 比對)，結果依相關度排序並附片段的時間範圍"""
+    started = time.monotonic()
+    results = await asyncio.get_running_loop().run_in_executor(None, lambda: get_index().search(q, limit, offset))
+    return SearchResponse(query=q, results=results, elapsed_ms=round((time.monotonic() - started) * 1000, 2))
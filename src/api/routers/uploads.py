@@ -0,0 +1,92 @@
+import asyncio
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Header, Request, Response
+from fastapi.responses import JSONResponse
+
+from src.api.schemas.requests import UploadCreateRequest, UploadResponse
+from src.api.routers.video import task_store, job_queue
+from src.core.job_queue import QueueFullError
+from src.core.uploads import UploadManager, UploadError
+
+router = APIRouter(tags=["Uploads"])
+
+upload_manager = UploadManager(task_store, job_queue)
+
+def _error_response(error: UploadError) -> JSONResponse:
+    headers = {"Upload-Offset": str(error.offset)} if error.offset is not None else None
+    return JSONResponse(status_code=error.status_code, content={"detail": str(error), "offset": error.offset}, headers=headers)
+
+def _queue_full(error: QueueFullError):
+    # 音檔已保存，用戶端可稍後再呼叫 complete
+    raise HTTPException(status_code=429, detail=str(error), headers={"Retry-After": "30"})
+
+def _processing_options(request) -> dict:
+    return {
+        "model": request.model,
+        "transcriber": request.transcriber,
+        "language": request.language,
+        "priority": request.priority,
+    }
+
+@router.post("", response_model=UploadResponse)
+def create_upload(request: UploadCreateRequest):
+    """建立可續傳的上傳；提供 sha256 且內容已處理過時直接回傳既有任務"""
+    try:
+        return upload_manager.create(request.filename, _processing_options(request), size=request.size, sha256=request.sha256)
+    except UploadError as e:
+        return _error_response(e)
+
+@router.post("/stream", response_model=UploadResponse)
+async def stream_upload(request: Request, filename: str, model: str = "openai", transcriber: str = "fast",
+                        language: str = "chinese", priority: int = 0):
+    """單次串流上傳：請求內容即音檔 (application/octet-stream)，上傳完成後建立任務"""
+    options = {"model": model, "transcriber": transcriber, "language": language, "priority": priority}
+    size = request.headers.get("content-length")
+    try:
+        upload = await asyncio.get_running_loop().run_in_executor(
+            None, lambda: upload_manager.create(filename, options, size=int(size) if size and size.isdigit() else None)
+        )
+        if upload["status"] == "uploading":
+            upload = await upload_manager.append(upload["upload_id"], 0, request.stream())
+        if upload["status"] != "completed":
+            upload = await upload_manager.complete(upload["upload_id"])
+        return upload
+    except UploadError as e:
+        return _error_response(e)
+    except QueueFullError as e:
+        _queue_full(e)
+
+@router.get("/{upload_id}", response_model=UploadResponse)
+def get_upload(upload_id: str, response: Response):
+    """查詢上傳狀態；Upload-Offset 為續傳時應送出的起始位置"""
+    try:
+        upload = upload_manager.status(upload_id)
+    except UploadError as e:
+        return _error_response(e)
+    response.headers["Upload-Offset"] = str(upload["offset"])
+    return upload
+
+@router.patch("/{upload_id}", response_model=UploadResponse)
+async def append_upload(upload_id: str, request: Request, response: Response,
+                        upload_offset: Optional[int] = Header(None)):
+    """從 Upload-Offset 位置續傳一段內容；已知檔案大小時收到最後一段即自動完成"""
+    if upload_offset is None:
+        raise HTTPException(status_code=400, detail="Upload-Offset header is required.")
+    try:
+        upload = await upload_manager.append(upload_id, upload_offset, request.stream())
+    except UploadError as e:
+        return _error_response(e)
+    except QueueFullError as e:
+        _queue_full(e)
+    response.headers["Upload-Offset"] = str(upload["offset"])
+    return upload
+
+@router.post("/{upload_id}/complete", response_model=UploadResponse)
+async def complete_upload(upload_id: str):
+    """完成未指定大小的上傳，或在佇列已滿後重試建立任務"""
+    try:
+        return await upload_manager.complete(upload_id)
+    except UploadError as e:
+        return _error_response(e)
+    except QueueFullError as e:
+        _queue_full(e)
@@ -1,53 +1,44 @@
-from fastapi import APIRouter, BackgroundTasks
-import uuid
-from typing import Dict, Any
+import asyncio
+import json
+import time
+from pathlib import Path
+from typing import Optional, AsyncIterator, Dict, Any, List
+from fastapi import APIRouter, HTTPException, Header, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
 
-from src.api.schemas.requests import VideoProcessRequest, TaskResponse, TaskStatusResponse
-from src.core.processor import VideoProcessor
+from src.api.schemas.requests import (
+    VideoProcessRequest, TaskResponse, TaskStatusResponse, BatchProcessRequest, BatchResponse, BatchStatusResponse,
+    WorkerInfo
+)
+from src.api.file_responses import file_response, bytes_response, derived_response
+from src.services.downloader import YouTubeDownloader
+from src.utils.subtitles import to_srt
+from src.core.task_store import TaskStore
+from src.core.job_queue import JobQueue, QueueFullError
+from src.core.task_store import FINISHED_STATUSES
+from src.core.config import config
 
 router = APIRouter(tags=["Video Processing"])
 
-# Mock store for tasks status. In production this should be Redis/DB.
-tasks_db: Dict[str, Dict[str, Any]] = {}
+# 持久化的任務儲存 (SQLite WAL)，多個 worker 行程共用同一個資料庫檔案
+task_store = TaskStore()
 
-def process_video_task(task_id: str, request: VideoProcessRequest):
-    tasks_db[task_id]["status"] = "processing"
-    
-    try:
-        # initialize and run the processor
-        processor = VideoProcessor(
-            model_name=request.model,
-            transcriber_type=request.transcriber,
-            keep_audio=request.keep_audio,
-            language=request.language
-        )
-        
-        result = None
-        if request.youtube_url:
-            result = processor.process_youtube(request.youtube_url)
-        elif request.audio_path:
-            result = processor.process_audio(request.audio_path)
-            
-        tasks_db[task_id]["status"] = "completed"
-        tasks_db[task_id]["result"] = {"file_paths": result}
-    except Exception as e:
-        tasks_db[task_id]["status"] = "failed"
-        tasks_db[task_id]["error"] = str(e)
+# 有界任務佇列：由固定數量的 worker 行程取出任務處理 (於 app lifespan 中啟動)
+job_queue = JobQueue(task_store)
 
 
+# 以下非串流端點為一般函式：FastAPI 在執行緒池中執行，同步的 SQLite 與檔案存取不會阻塞事件迴圈
+
 @router.post("/process", response_model=TaskResponse)
-async def process_video(request: VideoProcessRequest, background_tasks: BackgroundTasks):
+def process_video(request: VideoProcessRequest):
     if not request.youtube_url and not request.audio_path:
         return {"task_id": "", "status": "error", "message": "Either youtube_url or audio_path must be provided."}
         
-    task_id = str(uuid.uuid4())
-    tasks_db[task_id] = {
-        "status": "pending",
-        "result": None,
-        "error": None
-    }
-    
-    background_tasks.add_task(process_video_task, task_id, request)
+    payload = request.model_dump() if hasattr(request, "model_dump") else request.dict()
+    try:
+        task_id = job_queue.submit(payload, priority=request.priority)
+    except QueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "30"})
     
     return TaskResponse(
         task_id=task_id, 
@@ -55,9 +46,53 @@ async def process_video(request: VideoProcessRequest, background_tasks: Backgrou
         message="Task submitted successfully."
     )
 
+@router.post("/process/batch", response_model=BatchResponse)
+def process_video_batch(request: BatchProcessRequest):
+    """一次送出多個來源 (可含播放清單)，各項目共用 worker 的模型並以管線方式處理"""
+    youtube_urls = list(request.youtube_urls)
+    if request.playlist_url:
+        playlist = YouTubeDownloader().list_playlist(request.playlist_url)
+        if not playlist:
+            raise HTTPException(status_code=400, detail="Playlist is empty or could not be expanded.")
+        youtube_urls.extend(playlist)
+
+    common = {
+        "model": request.model,
+        "transcriber": request.transcriber,
+        "language": request.language,
+        "keep_audio": request.keep_audio,
+        "priority": request.priority,
+    }
+    items = [dict(common, youtube_url=url) for url in youtube_urls]
+    items += [dict(common, audio_path=path) for path in request.audio_paths]
+    if not items:
+        raise HTTPException(status_code=400, detail="Provide youtube_urls, audio_paths or playlist_url.")
+    if len(items) > config.JOB_MAX_BATCH_SIZE:
+        raise HTTPException(status_code=400, detail=f"Batch exceeds {config.JOB_MAX_BATCH_SIZE} items.")
+
+    payload = request.model_dump() if hasattr(request, "model_dump") else request.dict()
+    try:
+        batch_id, task_ids = job_queue.submit_batch(items, payload, priority=request.priority)
+    except QueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "30"})
+
+    return BatchResponse(
+        batch_id=batch_id,
+        task_ids=task_ids,
+        status="pending",
+        message=f"Batch of {len(task_ids)} tasks submitted successfully."
+    )
+
+@router.get("/batch/{batch_id}", response_model=BatchStatusResponse)
+def get_batch_status(batch_id: str):
+    batch = task_store.get_batch(batch_id)
+    if not batch:
+        raise HTTPException(status_code=404, detail="Batch ID not found")
+    return BatchStatusResponse(**job_queue.batch_info(batch))
+
 @router.get("/status/{task_id}", response_model=TaskStatusResponse)
-async def get_task_status(task_id: str):
-    task = tasks_db.get(task_id)
+def get_task_status(task_id: str):
+    task = task_store.get_task(task_id)
     if not task:
         return TaskStatusResponse(task_id=task_id, status="not_found", error="Task ID not found")
         
@@ -65,5 +100,137 @@ async def get_task_status(task_id: str):
         task_id=task_id,
         status=task["status"],
         result=task.get("result"),
-        error=task.get("error")
+        error=task.get("error"),
+        stages=task.get("stages"),
+        created_at=task.get("created_at"),
+        updated_at=task.get("updated_at"),
+        **job_queue.queue_info(task)
+    )
+
+@router.delete("/tasks/{task_id}", response_model=TaskResponse)
+def cancel_task(task_id: str):
+    """取消任務：待處理任務立即取消；處理中任務由 worker 中止下載、轉錄或筆記生成並清除部分輸出"""
+    status = job_queue.cancel(task_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Task ID not found")
+    if status not in ("cancelled", "cancelling"):
+        raise HTTPException(status_code=409, detail=f"Task already finished (status: {status})")
+    message = "Task cancelled." if status == "cancelled" else "Cancellation requested."
+    return TaskResponse(task_id=task_id, status=status, message=message)
+
+@router.get("/workers", response_model=List[WorkerInfo])
+def list_workers():
+    """列出仍在回報心跳的轉錄 worker (可分布於多台機器) 及其能力與處理中的任務數"""
+    return [WorkerInfo(**worker) for worker in task_store.list_workers(max_age=3 * config.JOB_HEARTBEAT_INTERVAL)]
+
+def _result_path(task_id: str, key: str) -> Path:
+    """取得任務輸出檔案路徑；任務不存在或檔案尚未產生時回傳 404"""
+    task = task_store.get_task(task_id)
+    if not task:
+        raise HTTPException(status_code=404, detail="Task ID not found")
+    path = ((task.get("result") or {}).get("file_paths") or {}).get(key)
+    if not path or not Path(path).is_file():
+        raise HTTPException(status_code=404, detail=f"Result not available (task status: {task['status']})")
+    return Path(path)
+
+@router.get("/result/{task_id}/transcript")
+def download_transcript(task_id: str, request: Request, format: str = "txt"):
+    """下載逐字稿 (txt / json / srt)；支援 ETag、Range 與 gzip / zstd"""
+    if format == "txt":
+        return file_response(request, _result_path(task_id, "transcription_path"), "text/plain; charset=utf-8")
+    if format not in ("json", "srt"):
+        raise HTTPException(status_code=400, detail="format must be txt, json or srt")
+
+    try:
+        segments_path = _result_path(task_id, "segments_path")
+    except HTTPException:
+        if format == "srt":
+            raise
+        # 沒有片段資訊的舊任務仍可下載純文字內容的 JSON
+        text = _result_path(task_id, "transcription_path").read_text(encoding="utf-8")
+        content = json.dumps({"text": text, "segments": []}, ensure_ascii=False).encode("utf-8")
+        return bytes_response(request, content, "application/json", filename=f"{task_id}.json")
+    if format == "json":
+        return file_response(request, segments_path, "application/json")
+
+    def render() -> bytes:
+        segments = json.loads(segments_path.read_text(encoding="utf-8"))["segments"]
+        return to_srt(segments).encode("utf-8")
+
+    return derived_response(request, segments_path, "srt", "application/x-subrip", render,
+                            filename=f"{segments_path.stem}.srt")
+
+@router.get("/result/{task_id}/notes")
+def download_notes(task_id: str, request: Request):
+    """下載筆記；支援 ETag、Range 與 gzip / zstd"""
+    return file_response(request, _result_path(task_id, "notes_path"), "text/markdown; charset=utf-8")
+
+async def _task_events(task_id: str, after_id: int = 0) -> AsyncIterator[Optional[Dict[str, Any]]]:
+    """
+    依序產生任務事件，任務結束後停止；閒置超過心跳間隔時產生 None
+
+    事件由 worker 行程寫入共用的任務資料庫，此處定期讀取新事件後推送給用戶端。
+    """
+    loop = asyncio.get_running_loop()
+    last_sent = time.monotonic()
+    finished = False
+    while True:
+        events = await loop.run_in_executor(None, task_store.events_since, task_id, after_id)
+        for event in events:
+            after_id = event["event_id"]
+            last_sent = time.monotonic()
+            yield event
+            if event["event"] == "status" and event["data"].get("status") in FINISHED_STATUSES:
+                return
+        if finished:
+            return
+        if not events:
+            task = await loop.run_in_executor(None, task_store.get_task, task_id)
+            if task is None:
+                return
+            if task["status"] in FINISHED_STATUSES:
+                # 狀態與其事件分別寫入：狀態已結束時再讀一次，送出上次讀取後才寫入的最終 status 事件
+                finished = True
+                continue
+            if time.monotonic() - last_sent >= config.EVENTS_HEARTBEAT:
+                last_sent = time.monotonic()
+                yield None
+            await asyncio.sleep(config.EVENTS_POLL_INTERVAL)
+
+def _format_sse(event: Optional[Dict[str, Any]]) -> str:
+    if event is None:
+        return ": heartbeat\n\n"
+    data = json.dumps(dict(event["data"], created_at=event["created_at"]), ensure_ascii=False)
+    return f"id: {event['event_id']}\nevent: {event['event']}\ndata: {data}\n\n"
+
+@router.get("/events/{task_id}")
+async def stream_task_events(task_id: str, last_event_id: Optional[str] = Header(None)):
+    """以 Server-Sent Events 推送任務進度 (status / stage / progress / segment)，支援 Last-Event-ID 續傳"""
+    if await asyncio.get_running_loop().run_in_executor(None, task_store.get_task, task_id) is None:
+        raise HTTPException(status_code=404, detail="Task ID not found")
+    after_id = int(last_event_id) if last_event_id and last_event_id.isdigit() else 0
+
+    async def body():
+        async for event in _task_events(task_id, after_id):
+            yield _format_sse(event)
+
+    return StreamingResponse(
+        body(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
     )
+
+@router.websocket("/ws/{task_id}")
+async def task_events_websocket(websocket: WebSocket, task_id: str):
+    """以 WebSocket 推送與 SSE 相同的任務事件 (JSON 格式)"""
+    await websocket.accept()
+    if await asyncio.get_running_loop().run_in_executor(None, task_store.get_task, task_id) is None:
+        await websocket.send_json({"event": "error", "data": {"error": "Task ID not found"}})
+        await websocket.close(code=1008)
+        return
+    try:
+        async for event in _task_events(task_id):
+            await websocket.send_json(event if event is not None else {"event": "heartbeat"})
+        await websocket.close()
+    except WebSocketDisconnect:
+        pass
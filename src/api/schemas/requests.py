@@ -1,13 +1,14 @@
 from pydantic import BaseModel
-from typing import Optional
+from typing import Optional, Dict, Any, List
 
 class VideoProcessRequest(BaseModel):
     youtube_url: Optional[str] = None
     audio_path: Optional[str] = None
     model: str = "openai"
-    transcriber: str = "fast"
+    transcriber: str = "fast"  # fast / standard / ctranslate2 / auto
     language: str = "chinese"
     keep_audio: bool = False
+    priority: int = 0
 
 class TaskResponse(BaseModel):
     task_id: str
@@ -19,3 +20,81 @@ class TaskStatusResponse(BaseModel):
     status: str
     result: Optional[dict] = None
     error: Optional[str] = None
+    stages: Optional[Dict[str, Dict[str, Any]]] = None
+    created_at: Optional[float] = None
+    updated_at: Optional[float] = None
+    queue_depth: Optional[int] = None
+    queue_position: Optional[int] = None
+    queue_wait: Optional[float] = None
+
+class BatchProcessRequest(BaseModel):
+    youtube_urls: List[str] = []
+    audio_paths: List[str] = []
+    playlist_url: Optional[str] = None
+    model: str = "openai"
+    transcriber: str = "fast"  # fast / standard / ctranslate2 / auto
+    language: str = "chinese"
+    keep_audio: bool = False
+    priority: int = 0
+
+class BatchResponse(BaseModel):
+    batch_id: str
+    task_ids: List[str]
+    status: str
+    message: str
+
+class BatchStatusResponse(BaseModel):
+    batch_id: str
+    status: str
+    total: int
+    counts: Dict[str, int]
+    stages: Dict[str, int]
+    progress: float
+    elapsed: Optional[float] = None
+    throughput: Optional[float] = None
+    eta: Optional[float] = None
+    tasks: List[Dict[str, Any]]
+
+class WorkerInfo(BaseModel):
+    worker_id: str
+    hostname: str
+    capabilities: Dict[str, Any]
+    started_at: float
+    heartbeat_at: float
+    active_tasks: int
+
+class UploadCreateRequest(BaseModel):
+    filename: str
+    size: Optional[int] = None
+    sha256: Optional[str] = None
+    model: str = "openai"
+    transcriber: str = "fast"  # fast / standard / ctranslate2 / auto
+    language: str = "chinese"
+    priority: int = 0
+
+class UploadResponse(BaseModel):
+    upload_id: str
+    filename: str
+    status: str
+    offset: int
+    size: Optional[int] = None
+    sha256: Optional[str] = None
+    task_id: Optional[str] = None
+    task_status: Optional[str] = None
+    result: Optional[dict] = None
+    duplicate: bool = False
+
+class SearchResult(BaseModel):
+    source: str
+    transcription_path: str
+    segments_path: Optional[str] = None
+    position: int
+    start: Optional[float] = None
+    end: Optional[float] = None
+    text: str
+    score: float
+
+class SearchResponse(BaseModel):
+    query: str
+    results: List[SearchResult]
+    elapsed_ms: float
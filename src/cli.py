@@ -24,13 +24,17 @@ def main():
                        help='選擇用於生成筆記的模型 (預設: openai)')
     
     # 轉錄器選擇
-    parser.add_argument('--transcriber', type=str, default='fast', choices=['standard', 'fast'],
-                       help='選擇轉錄器類型 (standard: transformers, fast: pywhispercpp, 預設: fast)')
+    parser.add_argument('--transcriber', type=str, default='fast', choices=['standard', 'fast', 'ctranslate2', 'auto'],
+                       help='選擇轉錄器類型 (standard: transformers, fast: pywhispercpp, ctranslate2: faster-whisper int8, '
+                            'auto: 依本機校準結果自動選擇, 預設: fast)')
 
     # 其他選項
     parser.add_argument('--keep-audio', action='store_true', help='保留下載的音檔')
     parser.add_argument('--language', type=str, default=config.DEFAULT_LANGUAGE, 
                        help='轉錄語言（預設：chinese）')
+    parser.add_argument('--force-stage', type=str, action='append', default=[],
+                       choices=['download', 'transcribe', 'notes', 'all'],
+                       help='即使執行紀錄顯示已是最新仍重跑此階段，可重複指定 (下游階段只在輸入內容改變時重跑)')
     
     args = parser.parse_args()
     
@@ -39,13 +43,15 @@ def main():
         if args.transcriber == 'fast':
             processor = FastVideoProcessor(
                 model_choice=args.model,
-                api_key=args.api_key
+                api_key=args.api_key,
+                force_stages=args.force_stage
             )
         else:
             processor = VideoProcessor(
                 model_choice=args.model,
                 api_key=args.api_key,
-                transcriber_type='standard'
+                transcriber_type=args.transcriber,
+                force_stages=args.force_stage
             )
         
         # 根據輸入類型處理
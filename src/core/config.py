@@ -1,11 +1,12 @@
 """
 配置管理 - 統一設定管理 (由 YAML 讀取)
 """
+import json
 import os
 import yaml
 from pathlib import Path
-from dataclasses import dataclass
-from typing import Optional
+from dataclasses import dataclass, field
+from typing import Optional, Dict, Any, List
 
 # 專案根目錄
 PROJECT_ROOT = Path(__file__).parent.parent.parent
@@ -23,27 +24,128 @@ class Config:
     MP3_DIR: Path = DATA_DIR / "mp3"
     TRANSCRIPTION_DIR: Path = DATA_DIR / "transcriptions"
     NOTES_DIR: Path = DATA_DIR / "notes"
+    UPLOAD_DIR: Path = DATA_DIR / "uploads"
+    # 各輸入的執行紀錄 (CLI 重新執行時略過輸入與設定皆未變動的階段)
+    MANIFEST_DIR: Path = DATA_DIR / "manifests"
+    RUN_MANIFEST: bool = True
+    # 執行報告 (CLI 每次執行輸出各階段耗時、CPU、記憶體與即時倍率) 與轉錄階段剖析 (None / "cprofile" / "py-spy")
+    RUN_REPORT: bool = True
+    REPORT_DIR: Path = DATA_DIR / "reports"
+    PROFILE_TRANSCRIBE: Optional[str] = None
     
     # 模型設定
     WHISPER_MODEL_ID: str = "openai/whisper-small"
     DEFAULT_LANGUAGE: str = "chinese"
+    # 可取消的轉錄會以此長度的視窗逐段解碼，取消請求在下一個視窗邊界生效
+    TRANSCRIBE_WINDOW_SECONDS: float = 300.0
+    # CTranslate2 (faster-whisper) 轉錄設定：CPU 預設 int8 量化，beam_size 1 與其他後端相同為貪婪解碼，cpu_threads 0 由 CTranslate2 決定
+    CTRANSLATE2_DEVICE: str = "auto"
+    CTRANSLATE2_COMPUTE_TYPE: str = "int8"
+    CTRANSLATE2_BEAM_SIZE: int = 1
+    CTRANSLATE2_CPU_THREADS: int = 0
+    CTRANSLATE2_VAD_FILTER: bool = True
+    # 自動選擇轉錄器 (--transcriber auto)：首次使用時以校準片段量測本機可用的後端 / 模型 / 執行緒數，
+    # 選出即時倍率 (轉錄耗時 / 音檔長度) 不超過目標值中最準確的組合；結果依主機保存於 CALIBRATION_DIR
+    AUTO_TRANSCRIBER_RTF_TARGET: float = 0.5
+    AUTO_TRANSCRIBER_CALIBRATION_SECONDS: float = 30.0
+    AUTO_TRANSCRIBER_FIXTURE: Optional[str] = None
+    AUTO_TRANSCRIBER_BACKENDS: List[str] = field(default_factory=lambda: ["whisper.cpp", "ctranslate2", "transformers"])
+    AUTO_TRANSCRIBER_THREADS: List[int] = field(default_factory=list)
+    CALIBRATION_DIR: Path = DATA_DIR / "calibration"
+    
+    # 逐字稿搜尋索引 (保存逐字稿時即加入索引，python main.py search 或 GET /api/v1/search 查詢)
+    SEARCH_INDEX_ENABLED: bool = True
+    SEARCH_INDEX_PATH: Path = DATA_DIR / "search.db"
     
     # API 設定
     OPENAI_MODEL: str = "gpt-4o-mini"
     DEEPSEEK_MODEL: str = "deepseek-chat"
     GEMINI_MODEL: str = "gemini-1.5-flash"
+    # 供應商 API 位址 (可指向相容的代理或本機測試用的模擬伺服器；None 使用官方位址)
+    OPENAI_BASE_URL: Optional[str] = None
+    DEEPSEEK_BASE_URL: str = "https://api.deepseek.com"
+    GEMINI_API_ENDPOINT: Optional[str] = None
     OLLAMA_MODEL: str = "qwen3"
     OLLAMA_API_URL: str = "http://localhost:11434/api/generate"
+    OLLAMA_KEEP_ALIVE: Any = "30m"
+    OLLAMA_NUM_CTX: Optional[int] = None
+    OLLAMA_NUM_THREAD: Optional[int] = None
+    OLLAMA_PRELOAD: bool = True
+    OLLAMA_PRELOAD_TIMEOUT: float = 300.0
+    
+    # API 任務儲存設定
+    TASK_DB_PATH: Path = DATA_DIR / "tasks.db"
+    # WAL 只能在同一台機器的行程間共用；資料庫位於網路檔案系統供多台機器存取時改用 DELETE
+    TASK_DB_JOURNAL_MODE: str = "WAL"
+    TASK_TTL_HOURS: float = 72.0
+    TASK_CLEANUP_INTERVAL: float = 3600.0
+    EVENTS_POLL_INTERVAL: float = 0.5
+    EVENTS_HEARTBEAT: float = 15.0
+    
+    # 音檔上傳設定 (UPLOAD_MAX_BYTES 為 None 時不限制大小)
+    UPLOAD_CHUNK_SIZE: int = 1024 * 1024
+    UPLOAD_MAX_BYTES: Optional[int] = 10 * 1024 ** 3
+    UPLOAD_TTL_HOURS: float = 24.0
+    
+    # 任務佇列設定 (JOB_WORKERS 為 None 時依 CPU 與記憶體自動決定)
+    JOB_WORKERS: Optional[int] = None
+    JOB_THREADS_PER_WORKER: int = 4
+    JOB_MEMORY_PER_WORKER_GB: float = 2.0
+    JOB_MAX_QUEUE_DEPTH: int = 32
+    JOB_QUEUE_ORDER: str = "priority"
+    JOB_POLL_INTERVAL: float = 0.5
+    JOB_PREFETCH: int = 1
+    JOB_NOTES_THREADS: int = 2
+    JOB_MAX_BATCH_SIZE: int = 500
+    # 預先載入模型後以 fork 啟動 worker，共享模型權重 (serve 模式預設開啟)
+    JOB_PRELOAD_MODELS: bool = False
+    JOB_PRELOAD_TRANSCRIBERS: List[str] = field(default_factory=lambda: ["fast"])
+    # worker 回收條件 (0 表示不限制)：處理任務數、私有記憶體 (MB)
+    JOB_MAX_TASKS_PER_WORKER: int = 0
+    JOB_MAX_WORKER_MEMORY_MB: float = 0.0
+    # 任務租約：worker 每 JOB_HEARTBEAT_INTERVAL 秒續約，超過 JOB_LEASE_SECONDS 未續約的任務會被放回佇列
+    JOB_LEASE_SECONDS: float = 60.0
+    JOB_HEARTBEAT_INTERVAL: float = 10.0
+    # worker 可處理的轉錄器與筆記模型 (None 表示不限制)，只會取出符合的任務
+    JOB_CAPABILITIES: Dict[str, Optional[List[str]]] = field(default_factory=lambda: {"transcribers": None, "models": None})
+    # worker 建立處理器的 "模組:名稱" (None 使用 VideoProcessor)，例如壓力測試的模擬處理器
+    JOB_PROCESSOR_FACTORY: Optional[str] = None
+    
+    # 執行指標設定 (/metrics)
+    METRICS_ENABLED: bool = True
+    METRICS_FLUSH_INTERVAL: float = 5.0
     
     # 下載設定
     DOWNLOAD_RATE_LIMIT: str = "5M"
     
     # 筆記生成設定
     DEFAULT_PROMPT: str = "這是一場演講的逐字稿，請你幫我整理成500字的筆記"
+    NOTES_CONCURRENCY: int = 4
+    NOTES_EXPECTED_OUTPUT_TOKENS: int = 1024
+    NOTES_MAX_PROMPT_TOKENS: Optional[int] = None
+    NOTES_CONTEXT_SAFETY: float = 0.9
+    
+    # 限流與重試設定 (每個供應商的每分鐘請求數與 token 數，None 表示不限制)
+    RATE_LIMITS: Dict[str, Dict[str, Any]] = field(default_factory=lambda: {
+        "openai": {"requests_per_minute": 500, "tokens_per_minute": 200000},
+        "deepseek": {"requests_per_minute": 300, "tokens_per_minute": 1000000},
+        "gemini": {"requests_per_minute": 15, "tokens_per_minute": 1000000},
+        "ollama": {"requests_per_minute": None, "tokens_per_minute": None},
+    })
+    LLM_MAX_RETRIES: int = 5
+    LLM_RETRY_BASE_DELAY: float = 1.0
+    LLM_RETRY_MAX_DELAY: float = 60.0
+    
+    # 逐字稿精簡設定 (筆記生成前移除幻覺迴圈與重複)
+    COMPACT_TRANSCRIPT: bool = True
+    COMPACT_STRIP_FILLERS: bool = False
+    COMPACT_MAX_NGRAM: int = 16
+    COMPACT_MAX_REPEATS: int = 3
     
     def __post_init__(self):
         """初始化後：載入 YAML 與建立必要目錄"""
         self._load_yaml_config()
+        self._load_env_overrides()
         self._ensure_directories()
 
     def _load_yaml_config(self):
@@ -56,6 +158,12 @@ class Config:
             with open(CONFIG_PATH, 'r', encoding='utf-8') as f:
                 yaml_data = yaml.safe_load(f) or {}
                 
+            # 多台機器處理同一個佇列時，資料目錄 (音檔、逐字稿、筆記、任務資料庫) 須位於共用儲存
+            storage = yaml_data.get('storage', {})
+            if 'data_dir' in storage: self._set_data_dir(self._resolve_path(storage['data_dir']))
+            if 'manifest_dir' in storage: self.MANIFEST_DIR = self._resolve_path(storage['manifest_dir'])
+            if 'run_manifest' in storage: self.RUN_MANIFEST = bool(storage['run_manifest'])
+            
             api_keys = yaml_data.get('api_keys', {})
             # 優先讀取 YAML，若無則依舊讓 OS 環境變數當成 fallback
             self.OPENAI_API_KEY = api_keys.get('openai') or os.getenv('OPENAI_API_KEY')
@@ -67,16 +175,135 @@ class Config:
             if 'openai_model' in models: self.OPENAI_MODEL = models['openai_model']
             if 'deepseek_model' in models: self.DEEPSEEK_MODEL = models['deepseek_model']
             if 'gemini_model' in models: self.GEMINI_MODEL = models['gemini_model']
+            if 'openai_base_url' in models: self.OPENAI_BASE_URL = models['openai_base_url']
+            if 'deepseek_base_url' in models: self.DEEPSEEK_BASE_URL = models['deepseek_base_url']
+            if 'gemini_api_endpoint' in models: self.GEMINI_API_ENDPOINT = models['gemini_api_endpoint']
             if 'ollama_model' in models: self.OLLAMA_MODEL = models['ollama_model']
             if 'ollama_api_url' in models: self.OLLAMA_API_URL = models['ollama_api_url']
+            if 'ollama_keep_alive' in models: self.OLLAMA_KEEP_ALIVE = models['ollama_keep_alive']
+            if 'ollama_num_ctx' in models: self.OLLAMA_NUM_CTX = models['ollama_num_ctx'] and int(models['ollama_num_ctx'])
+            if 'ollama_num_thread' in models: self.OLLAMA_NUM_THREAD = models['ollama_num_thread'] and int(models['ollama_num_thread'])
+            if 'ollama_preload' in models: self.OLLAMA_PRELOAD = bool(models['ollama_preload'])
             if 'download_rate_limit' in models: self.DOWNLOAD_RATE_LIMIT = str(models['download_rate_limit'])
             if 'whisper_model' in models: self.WHISPER_MODEL_ID = models['whisper_model']
+            if 'transcribe_window_seconds' in models: self.TRANSCRIBE_WINDOW_SECONDS = float(models['transcribe_window_seconds'])
+            if 'notes_concurrency' in models: self.NOTES_CONCURRENCY = int(models['notes_concurrency'])
+            if 'notes_expected_output_tokens' in models: self.NOTES_EXPECTED_OUTPUT_TOKENS = int(models['notes_expected_output_tokens'])
+            if 'notes_max_prompt_tokens' in models: self.NOTES_MAX_PROMPT_TOKENS = models['notes_max_prompt_tokens'] and int(models['notes_max_prompt_tokens'])
+            
+            ctranslate2 = yaml_data.get('ctranslate2', {})
+            if 'device' in ctranslate2: self.CTRANSLATE2_DEVICE = str(ctranslate2['device'])
+            if 'compute_type' in ctranslate2: self.CTRANSLATE2_COMPUTE_TYPE = str(ctranslate2['compute_type'])
+            if 'beam_size' in ctranslate2: self.CTRANSLATE2_BEAM_SIZE = int(ctranslate2['beam_size'])
+            if 'cpu_threads' in ctranslate2: self.CTRANSLATE2_CPU_THREADS = int(ctranslate2['cpu_threads'])
+            if 'vad_filter' in ctranslate2: self.CTRANSLATE2_VAD_FILTER = bool(ctranslate2['vad_filter'])
+            
+            auto_transcriber = yaml_data.get('auto_transcriber', {})
+            if 'rtf_target' in auto_transcriber: self.AUTO_TRANSCRIBER_RTF_TARGET = float(auto_transcriber['rtf_target'])
+            if 'calibration_seconds' in auto_transcriber: self.AUTO_TRANSCRIBER_CALIBRATION_SECONDS = float(auto_transcriber['calibration_seconds'])
+            if 'fixture' in auto_transcriber: self.AUTO_TRANSCRIBER_FIXTURE = auto_transcriber['fixture']
+            if 'backends' in auto_transcriber: self.AUTO_TRANSCRIBER_BACKENDS = list(auto_transcriber['backends'] or [])
+            if 'threads' in auto_transcriber: self.AUTO_TRANSCRIBER_THREADS = [int(threads) for threads in auto_transcriber['threads'] or []]
+            if 'calibration_dir' in auto_transcriber: self.CALIBRATION_DIR = self._resolve_path(auto_transcriber['calibration_dir'])
+            
+            search = yaml_data.get('search', {})
+            if 'enabled' in search: self.SEARCH_INDEX_ENABLED = bool(search['enabled'])
+            if 'index_path' in search: self.SEARCH_INDEX_PATH = self._resolve_path(search['index_path'])
+            
+            # 限流設定：逐供應商覆寫預設值
+            for provider, limits in (yaml_data.get('rate_limits') or {}).items():
+                self.RATE_LIMITS.setdefault(provider, {}).update(limits or {})
+            retry = yaml_data.get('retry', {})
+            if 'max_retries' in retry: self.LLM_MAX_RETRIES = int(retry['max_retries'])
+            if 'base_delay' in retry: self.LLM_RETRY_BASE_DELAY = float(retry['base_delay'])
+            if 'max_delay' in retry: self.LLM_RETRY_MAX_DELAY = float(retry['max_delay'])
+            
+            api = yaml_data.get('api', {})
+            if 'task_db_path' in api: self.TASK_DB_PATH = self._resolve_path(api['task_db_path'])
+            if 'task_db_journal_mode' in api: self.TASK_DB_JOURNAL_MODE = str(api['task_db_journal_mode']).upper()
+            if 'task_ttl_hours' in api: self.TASK_TTL_HOURS = float(api['task_ttl_hours'])
+            if 'task_cleanup_interval' in api: self.TASK_CLEANUP_INTERVAL = float(api['task_cleanup_interval'])
+            if 'events_poll_interval' in api: self.EVENTS_POLL_INTERVAL = float(api['events_poll_interval'])
+            if 'events_heartbeat' in api: self.EVENTS_HEARTBEAT = float(api['events_heartbeat'])
+            
+            uploads = yaml_data.get('uploads', {})
+            if 'upload_dir' in uploads: self.UPLOAD_DIR = self._resolve_path(uploads['upload_dir'])
+            if 'chunk_size' in uploads: self.UPLOAD_CHUNK_SIZE = int(uploads['chunk_size'])
+            if 'max_bytes' in uploads: self.UPLOAD_MAX_BYTES = uploads['max_bytes'] if uploads['max_bytes'] is None else int(uploads['max_bytes'])
+            if 'ttl_hours' in uploads: self.UPLOAD_TTL_HOURS = float(uploads['ttl_hours'])
+            
+            jobs = yaml_data.get('jobs', {})
+            if 'workers' in jobs: self.JOB_WORKERS = jobs['workers'] if jobs['workers'] is None else int(jobs['workers'])
+            if 'threads_per_worker' in jobs: self.JOB_THREADS_PER_WORKER = int(jobs['threads_per_worker'])
+            if 'memory_per_worker_gb' in jobs: self.JOB_MEMORY_PER_WORKER_GB = float(jobs['memory_per_worker_gb'])
+            if 'max_queue_depth' in jobs: self.JOB_MAX_QUEUE_DEPTH = int(jobs['max_queue_depth'])
+            if 'order' in jobs: self.JOB_QUEUE_ORDER = str(jobs['order'])
+            if 'prefetch' in jobs: self.JOB_PREFETCH = int(jobs['prefetch'])
+            if 'notes_threads' in jobs: self.JOB_NOTES_THREADS = int(jobs['notes_threads'])
+            if 'max_batch_size' in jobs: self.JOB_MAX_BATCH_SIZE = int(jobs['max_batch_size'])
+            if 'preload_models' in jobs: self.JOB_PRELOAD_MODELS = bool(jobs['preload_models'])
+            if 'preload_transcribers' in jobs: self.JOB_PRELOAD_TRANSCRIBERS = list(jobs['preload_transcribers'] or [])
+            if 'max_tasks_per_worker' in jobs: self.JOB_MAX_TASKS_PER_WORKER = int(jobs['max_tasks_per_worker'])
+            if 'max_worker_memory_mb' in jobs: self.JOB_MAX_WORKER_MEMORY_MB = float(jobs['max_worker_memory_mb'])
+            if 'lease_seconds' in jobs: self.JOB_LEASE_SECONDS = float(jobs['lease_seconds'])
+            if 'heartbeat_interval' in jobs: self.JOB_HEARTBEAT_INTERVAL = float(jobs['heartbeat_interval'])
+            if 'capabilities' in jobs: self.JOB_CAPABILITIES.update(jobs['capabilities'] or {})
+            if 'processor_factory' in jobs: self.JOB_PROCESSOR_FACTORY = jobs['processor_factory']
+            
+            report = yaml_data.get('report', {})
+            if 'enabled' in report: self.RUN_REPORT = bool(report['enabled'])
+            if 'report_dir' in report: self.REPORT_DIR = self._resolve_path(report['report_dir'])
+            if 'profile_transcribe' in report: self.PROFILE_TRANSCRIBE = report['profile_transcribe']
+            
+            metrics = yaml_data.get('metrics', {})
+            if 'enabled' in metrics: self.METRICS_ENABLED = bool(metrics['enabled'])
+            if 'flush_interval' in metrics: self.METRICS_FLUSH_INTERVAL = float(metrics['flush_interval'])
+            
+            compaction = yaml_data.get('compaction', {})
+            if 'enabled' in compaction: self.COMPACT_TRANSCRIPT = bool(compaction['enabled'])
+            if 'strip_fillers' in compaction: self.COMPACT_STRIP_FILLERS = bool(compaction['strip_fillers'])
+            if 'max_ngram' in compaction: self.COMPACT_MAX_NGRAM = int(compaction['max_ngram'])
+            if 'max_repeats' in compaction: self.COMPACT_MAX_REPEATS = int(compaction['max_repeats'])
             
         except Exception as e:
             print(f"讀取 YAML 設定檔時發生錯誤: {e}")
 
+    def _load_env_overrides(self):
+        """讀取由父行程傳給子行程的環境變數設定"""
+        if os.getenv('VIDEOTONOTE_JOB_WORKERS') is not None:
+            self.JOB_WORKERS = int(os.environ['VIDEOTONOTE_JOB_WORKERS'])
+        if os.getenv('VIDEOTONOTE_MAX_QUEUE_DEPTH') is not None:
+            self.JOB_MAX_QUEUE_DEPTH = int(os.environ['VIDEOTONOTE_MAX_QUEUE_DEPTH'])
+        if os.getenv('VIDEOTONOTE_MAX_TASKS_PER_WORKER') is not None:
+            self.JOB_MAX_TASKS_PER_WORKER = int(os.environ['VIDEOTONOTE_MAX_TASKS_PER_WORKER'])
+        if os.getenv('VIDEOTONOTE_JOB_CAPABILITIES'):
+            self.JOB_CAPABILITIES.update(json.loads(os.environ['VIDEOTONOTE_JOB_CAPABILITIES']))
+        if os.getenv('VIDEOTONOTE_PROCESSOR_FACTORY'):
+            self.JOB_PROCESSOR_FACTORY = os.environ['VIDEOTONOTE_PROCESSOR_FACTORY']
+        if os.getenv('VIDEOTONOTE_DATA_DIR'):
+            self._set_data_dir(self._resolve_path(os.environ['VIDEOTONOTE_DATA_DIR']))
+
+    def _set_data_dir(self, data_dir: Path):
+        """變更資料目錄並一併更新其下的預設路徑 (個別設定的路徑於之後讀取時覆寫)"""
+        self.DATA_DIR = data_dir
+        self.MP3_DIR = data_dir / "mp3"
+        self.TRANSCRIPTION_DIR = data_dir / "transcriptions"
+        self.NOTES_DIR = data_dir / "notes"
+        self.UPLOAD_DIR = data_dir / "uploads"
+        self.MANIFEST_DIR = data_dir / "manifests"
+        self.REPORT_DIR = data_dir / "reports"
+        self.CALIBRATION_DIR = data_dir / "calibration"
+        self.SEARCH_INDEX_PATH = data_dir / "search.db"
+        self.TASK_DB_PATH = data_dir / "tasks.db"
+
+    @staticmethod
+    def _resolve_path(value: str) -> Path:
+        """相對路徑以專案根目錄為基準"""
+        path = Path(value).expanduser()
+        return path if path.is_absolute() else PROJECT_ROOT / path
+
     def _ensure_directories(self):
-        for directory in [self.DATA_DIR, self.MP3_DIR, self.TRANSCRIPTION_DIR, self.NOTES_DIR]:
+        for directory in [self.DATA_DIR, self.MP3_DIR, self.TRANSCRIPTION_DIR, self.NOTES_DIR, self.UPLOAD_DIR]:
             directory.mkdir(parents=True, exist_ok=True)
 
 # 全域設定實例
@@ -0,0 +1,606 @@
+# -*- coding: utf-8 -*-
+"""
+任務佇列 - 以固定數量的 worker 行程處理轉錄任務，並限制佇列深度以提供背壓
+"""
+import gc
+import importlib
+import multiprocessing
+import os
+import socket
+import sys
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Optional, Dict, Any, List, Tuple, Deque, Set, Callable
+from .config import config
+from .task_store import TaskStore
+from .metrics import metrics, process_memory
+from ..utils.file_manager import FileManager
+from ..utils.cancellation import CancelToken, TaskCancelled
+
+# worker 行程存活檢查間隔 (秒)
+_SUPERVISE_INTERVAL = 1.0
+# 啟動後多久輸出一次共享記憶體報告 (秒)
+_MEMORY_REPORT_DELAY = 10.0
+
+# 由父行程預先載入的轉錄器 (轉錄器類型 → 實例)，以 fork 啟動的 worker 直接沿用
+_PRELOADED_TRANSCRIBERS: Dict[str, Any] = {}
+
+class QueueFullError(Exception):
+    """佇列已達上限"""
+    pass
+
+def _total_memory_gb() -> Optional[float]:
+    try:
+        return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES') / (1024 ** 3)
+    except (ValueError, OSError, AttributeError):
+        return None
+
+def default_worker_count() -> int:
+    """依 CPU 核心數與記憶體大小決定 worker 數量，避免同時轉錄互搶資源"""
+    if config.JOB_WORKERS is not None:
+        return max(0, config.JOB_WORKERS)
+    by_cpu = max(1, (os.cpu_count() or 1) // config.JOB_THREADS_PER_WORKER)
+    memory_gb = _total_memory_gb()
+    by_memory = max(1, int(memory_gb // config.JOB_MEMORY_PER_WORKER_GB)) if memory_gb else by_cpu
+    return min(by_cpu, by_memory)
+
+def _worker_id(slot: int) -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{slot}"
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+        return True
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+
+def worker_capabilities() -> Dict[str, Any]:
+    """worker 回報的能力：可處理的轉錄器與筆記模型 (None 表示不限)、轉錄模型與預先載入的轉錄器"""
+    return {
+        "transcribers": config.JOB_CAPABILITIES.get("transcribers"),
+        "models": config.JOB_CAPABILITIES.get("models"),
+        "whisper_model": config.WHISPER_MODEL_ID,
+        "preloaded": sorted(_PRELOADED_TRANSCRIBERS),
+    }
+
+def processor_factory() -> Callable[..., Any]:
+    """worker 用來建立處理器的類別；JOB_PROCESSOR_FACTORY 為 "模組:名稱" 時改用該物件"""
+    if not config.JOB_PROCESSOR_FACTORY:
+        from .processor import VideoProcessor
+        return VideoProcessor
+    module, _, name = config.JOB_PROCESSOR_FACTORY.partition(":")
+    return getattr(importlib.import_module(module), name)
+
+class TaskRunner:
+    """
+    在 worker 行程中以管線方式執行任務
+
+    - 相同設定的任務共用同一個 VideoProcessor，模型只載入一次
+    - 轉錄目前任務時，預先取出後續任務並在背景下載 (JOB_PREFETCH)
+    - 轉錄完成後筆記交由執行緒池生成，worker 隨即開始下一個轉錄 (JOB_NOTES_THREADS)
+    - 背景執行緒輪詢取消請求，中止手上任務進行中的下載、轉錄與筆記生成
+    - 同一執行緒定期續約手上任務的租約並回報心跳；租約被收回 (例如長時間失聯) 的任務立即中止，
+      交由重新取得任務的 worker 處理
+    """
+
+    def __init__(self, store: TaskStore, worker_id: str = "", prefetch: Optional[int] = None,
+                 notes_threads: Optional[int] = None):
+        self.store = store
+        self.worker_id = worker_id
+        self.prefetch = max(0, config.JOB_PREFETCH if prefetch is None else prefetch)
+        self._processors: Dict[Tuple[str, str], Any] = {}
+        self._processors_lock = threading.Lock()
+        self._downloads = ThreadPoolExecutor(max_workers=max(1, self.prefetch), thread_name_prefix="download")
+        self._notes = ThreadPoolExecutor(
+            max_workers=max(1, config.JOB_NOTES_THREADS if notes_threads is None else notes_threads),
+            thread_name_prefix="notes"
+        )
+        self._claimed: Deque[Tuple[Dict[str, Any], Future]] = deque()
+        # 已取出且尚未結束的任務 → 取消旗標
+        self._tokens: Dict[str, CancelToken] = {}
+        self._tokens_lock = threading.Lock()
+        # 租約已被收回的任務：由其他 worker 接手，本 worker 中止後不再更新其狀態
+        self._lost: Set[str] = set()
+        self.capabilities = worker_capabilities()
+        self._register()
+        self._closed = threading.Event()
+        self._watcher = threading.Thread(target=self._watch_cancellations, name="cancel-watcher", daemon=True)
+        self._watcher.start()
+
+    def _register(self):
+        try:
+            self.store.register_worker(self.worker_id, socket.gethostname(), self.capabilities)
+        except Exception as e:
+            print(f"登記 worker 時發生錯誤: {e}")
+
+    def _watch_cancellations(self):
+        last_heartbeat = time.monotonic()
+        while not self._closed.wait(config.JOB_POLL_INTERVAL):
+            with self._tokens_lock:
+                task_ids = list(self._tokens)
+            try:
+                cancelled = self.store.cancel_requested(task_ids)
+            except Exception as e:
+                print(f"查詢取消請求時發生錯誤: {e}")
+                continue
+            for task_id in cancelled:
+                self._cancel_token(task_id, f"worker {self.worker_id} 取消任務 {task_id}")
+            if time.monotonic() - last_heartbeat >= config.JOB_HEARTBEAT_INTERVAL:
+                last_heartbeat = time.monotonic()
+                self._heartbeat(task_ids)
+
+    def _heartbeat(self, task_ids: List[str]):
+        """續約手上任務的租約並更新心跳；已不屬於本 worker 的任務視為遺失並中止"""
+        self._register()
+        if not config.JOB_LEASE_SECONDS or not task_ids:
+            return
+        try:
+            owned = set(self.store.renew_leases(self.worker_id, task_ids, config.JOB_LEASE_SECONDS))
+        except Exception as e:
+            print(f"續約任務租約時發生錯誤: {e}")
+            return
+        for task_id in task_ids:
+            if task_id in owned:
+                continue
+            with self._tokens_lock:
+                if task_id not in self._tokens:
+                    continue
+                self._lost.add(task_id)
+            self._cancel_token(task_id, f"worker {self.worker_id} 已失去任務 {task_id} 的租約，停止處理")
+
+    def _cancel_token(self, task_id: str, message: str):
+        with self._tokens_lock:
+            token = self._tokens.get(task_id)
+        if token and not token.cancelled:
+            print(message)
+            token.cancel()
+
+    def _get_processor(self, request: Dict[str, Any]):
+        key = (request.get("model", "openai"), request.get("transcriber", "fast"))
+        with self._processors_lock:
+            if key not in self._processors:
+                metrics.inc("videotonote_cache_requests_total", cache="processor", result="miss")
+                self._processors[key] = processor_factory()(
+                    model_choice=key[0], transcriber_type=key[1], transcriber=_PRELOADED_TRANSCRIBERS.get(key[1])
+                )
+            else:
+                metrics.inc("videotonote_cache_requests_total", cache="processor", result="hit")
+            return self._processors[key]
+
+    def _record_stage(self, task_id: str):
+        started: Dict[str, float] = {}
+
+        def callback(stage: str, event: str, output_path: Optional[str] = None):
+            if event == "started":
+                started[stage] = time.monotonic()
+                self.store.start_stage(task_id, stage)
+            else:
+                if stage in started:
+                    metrics.observe("videotonote_stage_duration_seconds", time.monotonic() - started.pop(stage), stage=stage)
+                self.store.finish_stage(task_id, stage, output_path)
+            self.store.add_event(task_id, "stage", {"stage": stage, "event": event, "output_path": output_path})
+        return callback
+
+    def _record_progress(self, task_id: str, stage: str):
+        """將進度寫入事件表；轉錄片段另存為 segment 事件，供用戶端即時顯示部分逐字稿"""
+        def callback(data: Dict[str, Any]):
+            data = dict(data)
+            segment = data.pop("segment", None)
+            if stage == "transcribe" and data.get("seconds") is not None and data.get("total"):
+                data["percent"] = round(min(100.0, data["seconds"] / data["total"] * 100), 1)
+            try:
+                self.store.add_event(task_id, "progress", dict(data, stage=stage))
+                if segment:
+                    self.store.add_event(task_id, "segment", segment)
+            except Exception as e:
+                print(f"記錄任務進度時發生錯誤: {e}")
+        return callback
+
+    def _finish(self, task_id: str, status: str, result: Optional[Dict[str, Any]] = None, error: Optional[str] = None):
+        if self._release_lost(task_id):
+            return
+        if not self.store.update_status(task_id, status, result=result, error=error, worker_id=self.worker_id):
+            # 心跳尚未發現租約已被收回，任務已由其他 worker 接手
+            with self._tokens_lock:
+                self._tokens.pop(task_id, None)
+            print(f"任務 {task_id} 已由其他 worker 接手，捨棄本 worker 的結果")
+            return
+        metrics.inc("videotonote_tasks_finished_total", status=status)
+        with self._tokens_lock:
+            self._tokens.pop(task_id, None)
+
+    def _release_lost(self, task_id: str) -> bool:
+        """租約已被收回的任務由其他 worker 接手 (輸出路徑相同)，不刪檔也不更新狀態"""
+        with self._tokens_lock:
+            if task_id not in self._lost:
+                return False
+            self._lost.discard(task_id)
+            self._tokens.pop(task_id, None)
+        print(f"任務 {task_id} 已由其他 worker 接手，捨棄本 worker 的結果")
+        return True
+
+    def _cancelled(self, task: Dict[str, Any], outputs: Dict[str, Optional[str]]):
+        """刪除已產生的部分輸出 (下載的音檔、逐字稿、片段與筆記) 後標記為已取消"""
+        if self._release_lost(task["task_id"]):
+            return
+        for key in ("transcription_path", "segments_path", "notes_path"):
+            if outputs.get(key):
+                FileManager.cleanup_file(outputs[key])
+        if task["request"].get("youtube_url") and outputs.get("audio_path"):
+            FileManager.cleanup_file(outputs["audio_path"])
+        print(f"任務 {task['task_id']} 已取消")
+        self._finish(task["task_id"], "cancelled")
+
+    def fill(self, order: str) -> bool:
+        """取出任務直到手上有 1 + prefetch 個，並開始背景下載；回傳是否有待處理任務"""
+        while len(self._claimed) < 1 + self.prefetch:
+            task = self.store.claim_next(
+                self.worker_id, order=order, lease_seconds=config.JOB_LEASE_SECONDS, capabilities=config.JOB_CAPABILITIES
+            )
+            if task is None:
+                break
+            self.store.add_event(task["task_id"], "status", {"status": "processing"})
+            token = CancelToken()
+            with self._tokens_lock:
+                self._tokens[task["task_id"]] = token
+            self._claimed.append((task, self._downloads.submit(self._fetch_audio, task, token)))
+        return bool(self._claimed)
+
+    def _fetch_audio(self, task: Dict[str, Any], cancel_token: CancelToken) -> Optional[str]:
+        """取得任務音檔：YouTube 來源先下載，本地音檔則確認存在；取消時拋出 TaskCancelled"""
+        request = task["request"]
+        if request.get("youtube_url"):
+            stage_callback = self._record_stage(task["task_id"])
+            stage_callback("download", "started")
+            audio_path = self._get_processor(request).downloader.download_audio(
+                request["youtube_url"], progress_callback=self._record_progress(task["task_id"], "download"),
+                cancel_token=cancel_token
+            )
+            if audio_path:
+                stage_callback("download", "finished", audio_path)
+            return audio_path
+        if request.get("audio_path") and os.path.exists(request["audio_path"]):
+            return request["audio_path"]
+        return None
+
+    def run_next(self):
+        """轉錄下一個已取出的任務，並將筆記生成交給背景執行緒"""
+        task, download = self._claimed.popleft()
+        task_id, request = task["task_id"], task["request"]
+        outputs: Dict[str, Optional[str]] = {}
+        with self._tokens_lock:
+            cancel_token = self._tokens.get(task_id) or CancelToken()
+        print(f"worker {self.worker_id} 開始處理任務 {task_id}")
+        try:
+            audio_path = download.result()
+            if not audio_path:
+                self._finish(task_id, "failed", error="Download failed." if request.get("youtube_url") else "Audio file not found.")
+                return
+            outputs["audio_path"] = audio_path
+            cancel_token.raise_if_cancelled()
+
+            processor = self._get_processor(request)
+            stage_callback = self._record_stage(task_id)
+            stage_callback("transcribe", "started")
+            transcription, paths = processor.transcribe_audio(
+                audio_path, language=request.get("language"),
+                progress_callback=self._record_progress(task_id, "transcribe"), cancel_token=cancel_token
+            )
+            if not transcription:
+                self._cleanup_audio(request, audio_path)
+                self._finish(task_id, "failed", result={"file_paths": outputs}, error="Processing failed.")
+                return
+            stage_callback("transcribe", "finished", paths["transcription_path"])
+            outputs.update(paths)
+            self._notes.submit(self._create_notes, task, processor, transcription, outputs, cancel_token)
+        except TaskCancelled:
+            self._cancelled(task, outputs)
+        except Exception as e:
+            self._finish(task_id, "failed", result={"file_paths": outputs}, error=str(e))
+
+    def _create_notes(self, task: Dict[str, Any], processor, transcription: Dict[str, Any], outputs: Dict[str, Optional[str]],
+                      cancel_token: CancelToken):
+        task_id, request = task["task_id"], task["request"]
+        try:
+            stage_callback = self._record_stage(task_id)
+            stage_callback("notes", "started")
+            notes_path = processor.create_notes(
+                transcription, outputs["audio_path"], progress_callback=self._record_progress(task_id, "notes"),
+                cancel_token=cancel_token
+            )
+            if notes_path:
+                outputs["notes_path"] = notes_path
+            cancel_token.raise_if_cancelled()
+            if notes_path:
+                stage_callback("notes", "finished", notes_path)
+            self._cleanup_audio(request, outputs["audio_path"])
+            self._finish(task_id, "completed", result={"file_paths": outputs})
+        except TaskCancelled:
+            self._cancelled(task, outputs)
+        except Exception as e:
+            self._finish(task_id, "failed", result={"file_paths": outputs}, error=str(e))
+
+    @staticmethod
+    def _cleanup_audio(request: Dict[str, Any], audio_path: str):
+        if request.get("youtube_url") and not request.get("keep_audio", False):
+            FileManager.cleanup_file(audio_path)
+
+    def close(self):
+        """
+        等待進行中的筆記完成；已取出但尚未開始轉錄的任務放回佇列
+
+        進行中的下載先以取消旗標中止 yt-dlp 並等它結束才放回，避免其他 worker 接手後同時寫入相同的輸出路徑。
+        """
+        while self._claimed:
+            task, download = self._claimed.popleft()
+            if not download.cancel():
+                self._cancel_token(task["task_id"], f"worker {self.worker_id} 結束，中止任務 {task['task_id']} 的下載")
+                try:
+                    download.result()
+                except Exception:
+                    pass
+            with self._tokens_lock:
+                self._tokens.pop(task["task_id"], None)
+            self.store.requeue_task(task["task_id"], worker_id=self.worker_id)
+        self._downloads.shutdown(wait=True)
+        self._notes.shutdown(wait=True)
+        self._closed.set()
+        try:
+            self.store.unregister_worker(self.worker_id)
+        except Exception as e:
+            print(f"註銷 worker 時發生錯誤: {e}")
+
+def worker_main(slot: int, db_path: str, stop_event, threads: int):
+    """worker 行程進入點：持續從任務儲存取出待處理任務"""
+    # 限制每個 worker 的運算執行緒，避免多個 worker 同時轉錄時超額使用 CPU
+    for name in ("OMP_NUM_THREADS", "MKL_NUM_THREADS"):
+        os.environ.setdefault(name, str(threads))
+    if "torch" in sys.modules:
+        # 以 fork 啟動時 torch 已在父行程載入，環境變數不再生效
+        sys.modules["torch"].set_num_threads(threads)
+
+    store = TaskStore(db_path)
+    metrics.enable_persistence(db_path, process_label=f"worker-{slot}")
+    worker_id = _worker_id(slot)
+    runner = TaskRunner(store, worker_id)
+    parent_pid = os.getppid()
+    tasks_done = 0
+    print(f"轉錄 worker {worker_id} 已啟動")
+
+    try:
+        while not stop_event.is_set() and os.getppid() == parent_pid:
+            try:
+                has_task = runner.fill(config.JOB_QUEUE_ORDER)
+            except Exception as e:
+                print(f"取得任務時發生錯誤: {e}")
+                has_task = False
+            if not has_task:
+                stop_event.wait(config.JOB_POLL_INTERVAL)
+                continue
+            runner.run_next()
+            tasks_done += 1
+            reason = _recycle_reason(tasks_done)
+            if reason:
+                # 結束後由父行程補上新的 worker；手上預先取出的任務於 close() 放回佇列
+                print(f"轉錄 worker {worker_id} {reason}，回收重啟")
+                break
+    finally:
+        runner.close()
+        metrics.flush()
+
+def _recycle_reason(tasks_done: int) -> Optional[str]:
+    if config.JOB_MAX_TASKS_PER_WORKER and tasks_done >= config.JOB_MAX_TASKS_PER_WORKER:
+        return f"已處理 {tasks_done} 個任務"
+    if config.JOB_MAX_WORKER_MEMORY_MB:
+        # 只計私有記憶體，與父行程共享的模型權重不算在內
+        usage = process_memory()
+        private = usage.get("private", usage.get("rss"))
+        if private and private / 1024 ** 2 > config.JOB_MAX_WORKER_MEMORY_MB:
+            return f"私有記憶體 {private / 1024 ** 2:.0f}MB 超過上限"
+    return None
+
+def preload_transcribers(transcriber_types: Optional[List[str]] = None):
+    """在父行程載入轉錄模型；之後以 fork 啟動的 worker 透過寫入時複製共享權重"""
+    from ..services.transcriber import TranscriberFactory
+
+    for transcriber_type in transcriber_types if transcriber_types is not None else config.JOB_PRELOAD_TRANSCRIBERS:
+        if transcriber_type not in _PRELOADED_TRANSCRIBERS:
+            print(f"預先載入轉錄模型 ({transcriber_type})...")
+            _PRELOADED_TRANSCRIBERS[transcriber_type] = TranscriberFactory.create(transcriber_type=transcriber_type)
+
+class JobQueue:
+    """
+    有界任務佇列
+
+    任務存放於 TaskStore (status='pending')，由固定數量的 worker 行程依優先權或先進先出取出處理；
+    佇列深度達上限時拒絕新任務，讓呼叫端收到 429 後稍後重試。
+    """
+
+    def __init__(self, store: TaskStore, workers: Optional[int] = None, max_depth: Optional[int] = None):
+        self.store = store
+        self.workers = default_worker_count() if workers is None else workers
+        self.max_depth = config.JOB_MAX_QUEUE_DEPTH if max_depth is None else max_depth
+        self.order = config.JOB_QUEUE_ORDER
+        self._context = multiprocessing.get_context("spawn")
+        self._stop_event = None
+        self._processes: List[multiprocessing.Process] = []
+        self._threads = 1
+        self._supervisor: Optional[threading.Thread] = None
+
+    def submit(self, request: Dict[str, Any], priority: int = 0, dedupe_key: Optional[str] = None) -> str:
+        """加入任務並回傳 task_id；佇列已滿時拋出 QueueFullError"""
+        task_id = str(uuid.uuid4())
+        if not self.store.enqueue_task(task_id, request, priority=priority, max_depth=self.max_depth, dedupe_key=dedupe_key):
+            raise QueueFullError(f"Queue is full ({self.max_depth} pending tasks).")
+        self.store.add_event(task_id, "status", {"status": "pending"})
+        return task_id
+
+    def submit_batch(self, items: List[Dict[str, Any]], request: Dict[str, Any], priority: int = 0) -> Tuple[str, List[str]]:
+        """加入一整批任務並回傳 (batch_id, 各項目 task_id)；佇列已滿時拋出 QueueFullError"""
+        batch_id = str(uuid.uuid4())
+        tasks = [(str(uuid.uuid4()), item) for item in items]
+        if not self.store.enqueue_batch(batch_id, request, tasks, priority=priority, max_depth=self.max_depth):
+            raise QueueFullError(f"Queue is full ({self.max_depth} pending tasks).")
+        for task_id, _ in tasks:
+            self.store.add_event(task_id, "status", {"status": "pending"})
+        return batch_id, [task_id for task_id, _ in tasks]
+
+    def cancel(self, task_id: str) -> Optional[str]:
+        """
+        取消任務，回傳 'cancelled' (尚未開始，已直接取消)、'cancelling' (處理中，等待 worker 中止)、
+        已結束任務的原狀態，或任務不存在時回傳 None
+        """
+        status = self.store.request_cancel(task_id)
+        if status == "processing":
+            self.store.add_event(task_id, "cancel_requested", {})
+            return "cancelling"
+        return status
+
+    def batch_info(self, batch: Dict[str, Any]) -> Dict[str, Any]:
+        """彙總批次進度：各狀態數量、各階段完成數、吞吐量 (每分鐘完成項目數) 與預估剩餘時間"""
+        tasks = batch["tasks"]
+        counts: Dict[str, int] = {}
+        for task in tasks:
+            counts[task["status"]] = counts.get(task["status"], 0) + 1
+        finished = [task for task in tasks if task["finished_at"]]
+        started = [task["started_at"] for task in tasks if task["started_at"]]
+        done = len(finished) == batch["total"]
+
+        elapsed = None
+        throughput = None
+        eta = None
+        if started:
+            end = max(task["finished_at"] for task in finished) if done else time.time()
+            elapsed = end - min(started)
+            if finished and elapsed > 0:
+                throughput = len(finished) / elapsed * 60
+                eta = 0.0 if done else (batch["total"] - len(finished)) / throughput * 60
+        return {
+            "batch_id": batch["batch_id"],
+            "status": "completed" if done else ("processing" if started else "pending"),
+            "total": batch["total"],
+            "counts": counts,
+            "stages": batch["stages"],
+            "progress": len(finished) / batch["total"] if batch["total"] else 1.0,
+            "elapsed": elapsed,
+            "throughput": throughput,
+            "eta": eta,
+            "tasks": [
+                {"task_id": task["task_id"], "status": task["status"], "error": task["error"]}
+                for task in tasks
+            ],
+        }
+
+    def queue_info(self, task: Dict[str, Any]) -> Dict[str, Any]:
+        """回傳佇列深度、任務位置與等待時間"""
+        pending = task["status"] == "pending"
+        if pending:
+            queue_wait = time.time() - task["created_at"]
+        elif task.get("started_at"):
+            queue_wait = task["started_at"] - task["created_at"]
+        else:
+            queue_wait = None
+        return {
+            "queue_depth": self.store.queue_depth(),
+            "queue_position": self.store.queue_position(task, self.order) if pending else None,
+            "queue_wait": queue_wait,
+        }
+
+    def start(self, preload: Optional[bool] = None):
+        """
+        啟動 worker 行程，並將上次異常中止而遺留的任務放回佇列
+
+        preload 開啟時先在本行程載入轉錄模型再以 fork 啟動 worker，所有 worker 共享同一份權重；
+        結束或被回收的 worker 由監控執行緒補上。
+        """
+        if self.workers <= 0 or self._processes:
+            return
+        preload = config.JOB_PRELOAD_MODELS if preload is None else preload
+        if preload and "fork" in multiprocessing.get_all_start_methods():
+            preload_transcribers()
+            self._context = multiprocessing.get_context("fork")
+            # 凍結目前物件，避免子行程的垃圾回收寫入這些物件而複製共享頁面
+            gc.freeze()
+        self._requeue_orphaned()
+        self._stop_event = self._context.Event()
+        self._threads = max(1, (os.cpu_count() or 1) // self.workers)
+        self._processes = [self._spawn(slot) for slot in range(self.workers)]
+        self._supervisor = threading.Thread(target=self._supervise, name="worker-supervisor", daemon=True)
+        self._supervisor.start()
+        mode = "fork，共享預先載入的模型" if _PRELOADED_TRANSCRIBERS and self._context.get_start_method() == "fork" else "spawn"
+        print(f"已啟動 {self.workers} 個轉錄 worker ({mode}；佇列上限 {self.max_depth}，排序 {self.order})")
+
+    def _spawn(self, slot: int) -> multiprocessing.Process:
+        process = self._context.Process(
+            target=worker_main,
+            args=(slot, str(self.store.db_path), self._stop_event, self._threads),
+            name=f"videotonote-worker-{slot}",
+            daemon=True
+        )
+        process.start()
+        return process
+
+    def _supervise(self):
+        """補上結束 (回收或異常中止) 的 worker，並於啟動後輸出一次記憶體共享報告"""
+        started = time.monotonic()
+        reported = False
+        while not self._stop_event.wait(_SUPERVISE_INTERVAL):
+            for slot, process in enumerate(self._processes):
+                if process.is_alive() or self._stop_event.is_set():
+                    continue
+                if process.exitcode != 0:
+                    print(f"轉錄 worker {slot} 異常結束 (exit code {process.exitcode})")
+                    self._requeue_orphaned()
+                self._processes[slot] = self._spawn(slot)
+            if not reported and _PRELOADED_TRANSCRIBERS and time.monotonic() - started >= _MEMORY_REPORT_DELAY:
+                reported = True
+                self.print_memory_report()
+
+    def memory_report(self) -> List[Dict[str, Any]]:
+        """各 worker 的記憶體用量 (bytes)；rss 與 pss 的差即為與其他行程共享而省下的部分"""
+        report = []
+        for slot, process in enumerate(self._processes):
+            if process.is_alive():
+                report.append(dict(process_memory(process.pid), slot=slot, pid=process.pid))
+        return report
+
+    def print_memory_report(self):
+        report = self.memory_report()
+        if not report or any("pss" not in usage for usage in report):
+            return
+        mb = 1024 ** 2
+        for usage in report:
+            print(f"worker {usage['slot']} (pid {usage['pid']}): RSS {usage['rss'] / mb:.0f}MB，"
+                  f"共享 {usage['shared'] / mb:.0f}MB，私有 {usage['private'] / mb:.0f}MB，PSS {usage['pss'] / mb:.0f}MB")
+        saved = sum(usage["rss"] - usage["pss"] for usage in report)
+        print(f"共享模型權重為 {len(report)} 個 worker 約省下 {saved / mb:.0f}MB 記憶體 "
+              f"(平均每個 worker {saved / len(report) / mb:.0f}MB)")
+
+    def alive_workers(self) -> int:
+        return sum(1 for process in self._processes if process.is_alive())
+
+    def stop(self, timeout: float = 5.0):
+        if self._stop_event is None:
+            return
+        self._stop_event.set()
+        if self._supervisor is not None:
+            self._supervisor.join(timeout)
+            self._supervisor = None
+        for process in self._processes:
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+        self._processes = []
+
+    def _requeue_orphaned(self):
+        hostname = socket.gethostname()
+        for task in self.store.processing_tasks():
+            parts = (task.get("worker_id") or "").split(":")
+            if len(parts) == 3 and parts[0] == hostname and parts[1].isdigit() and not _pid_alive(int(parts[1])):
+                print(f"將中斷的任務 {task['task_id']} 重新放回佇列")
+                self.store.requeue_task(task["task_id"], worker_id=task["worker_id"])
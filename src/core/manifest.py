@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+"""
+執行紀錄 (manifest) - 記錄每個輸入各階段的輸出、輸入內容雜湊與設定雜湊
+
+重新執行時只重跑輸入內容或設定有變動的階段 (類似建置系統)：例如只有筆記生成失敗時，
+再次執行會沿用既有的逐字稿而不重新下載與轉錄。
+"""
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+from typing import Optional, Dict, Any, Iterable, Set
+from .config import config
+from ..utils.file_manager import FileManager
+
+STAGES = ("download", "transcribe", "notes")
+
+_HASH_CHUNK_SIZE = 1024 * 1024
+
+def settings_hash(settings: Dict[str, Any]) -> str:
+    return hashlib.sha256(json.dumps(settings, sort_keys=True, ensure_ascii=False, default=str).encode()).hexdigest()
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+class RunManifest:
+    """
+    單一輸入 (本地音檔或 YouTube 連結) 的執行紀錄
+
+    檔案雜湊以 (大小, 修改時間) 快取在紀錄中，檔案未變動時重新執行不必重新讀取大型音檔。
+    """
+
+    def __init__(self, source: str, path: Path, force_stages: Optional[Iterable[str]] = None):
+        self.source = source
+        self.path = path
+        self.force_stages: Set[str] = set(force_stages or ())
+        self.data: Dict[str, Any] = {"source": source, "stages": {}, "files": {}}
+        if path.exists():
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    loaded = json.load(f)
+                if loaded.get("source") == source:
+                    self.data.update(loaded)
+            except (OSError, ValueError) as e:
+                print(f"讀取執行紀錄失敗，將重新執行所有階段: {e}")
+
+    @classmethod
+    def for_source(cls, source: str, force_stages: Optional[Iterable[str]] = None) -> "RunManifest":
+        """依輸入取得執行紀錄；本地檔案以絕對路徑識別，其他 (例如 YouTube 連結) 以原字串識別"""
+        is_file = os.path.exists(source)
+        key = str(Path(source).resolve()) if is_file else source
+        stem = FileManager.get_base_name(source) if is_file else "youtube"
+        name = f"{stem}_{hashlib.sha1(key.encode('utf-8')).hexdigest()[:12]}.json"
+        return cls(key, config.MANIFEST_DIR / name, force_stages=force_stages)
+
+    def fresh(self, stage: str, input_hash: Optional[str], settings: Dict[str, Any],
+              check_outputs: bool = True) -> Optional[Dict[str, Any]]:
+        """
+        階段是否可略過：輸入雜湊與設定雜湊皆與上次相同、且輸出檔案仍存在時回傳上次的紀錄，否則回傳 None
+
+        Args:
+            check_outputs: 是否要求輸出檔案存在 (例如下載的音檔在轉錄後可能已刪除)
+        """
+        if stage in self.force_stages or input_hash is None:
+            return None
+        record = self.data["stages"].get(stage)
+        if not record or record.get("input_hash") != input_hash or record.get("settings_hash") != settings_hash(settings):
+            return None
+        if check_outputs and not all(path and os.path.exists(path) for path in record.get("outputs", {}).values()):
+            return None
+        return record
+
+    def record(self, stage: str, input_hash: str, settings: Dict[str, Any], outputs: Dict[str, Optional[str]],
+               output_hash: Optional[str] = None):
+        """記錄階段完成並寫入檔案"""
+        self.data["stages"][stage] = {
+            "input_hash": input_hash,
+            "settings_hash": settings_hash(settings),
+            "settings": settings,
+            "outputs": {key: path for key, path in outputs.items() if path},
+            "output_hash": output_hash,
+            "completed_at": time.time(),
+        }
+        self.save()
+
+    def get(self, stage: str) -> Optional[Dict[str, Any]]:
+        return self.data["stages"].get(stage)
+
+    def file_hash(self, path: str) -> Optional[str]:
+        """檔案內容的 SHA-256；大小與修改時間未變時沿用紀錄中的值"""
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        key = str(Path(path).resolve())
+        cached = self.data["files"].get(key)
+        if cached and cached["size"] == stat.st_size and cached["mtime_ns"] == stat.st_mtime_ns:
+            return cached["sha256"]
+        hasher = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(_HASH_CHUNK_SIZE), b""):
+                hasher.update(chunk)
+        digest = hasher.hexdigest()
+        self.data["files"][key] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": digest}
+        return digest
+
+    def files_hash(self, paths: Iterable[Optional[str]]) -> Optional[str]:
+        """多個檔案合併的內容雜湊；任一檔案不存在時回傳 None"""
+        hashes = []
+        for path in paths:
+            if not path:
+                continue
+            digest = self.file_hash(path)
+            if digest is None:
+                return None
+            hashes.append(digest)
+        return text_hash(":".join(hashes)) if hashes else None
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
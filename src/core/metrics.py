@@ -0,0 +1,289 @@
+# -*- coding: utf-8 -*-
+"""
+執行指標 - 以 Prometheus 文字格式匯出各階段延遲、即時倍率、LLM 用量與快取命中率
+
+各行程 (API 與轉錄 worker) 先在記憶體累計，再定期把增量寫入任務資料庫的 metrics 表，
+因此任何一個 API 行程都能匯出所有行程合計的數值。未啟用持久化時 (例如 CLI) 只保留在記憶體。
+"""
+import json
+import math
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Optional, Dict, Any, List, Tuple
+from .config import config
+
+# 指標名稱 → (類型, 說明, 直方圖區間)
+_STAGE_BUCKETS = (1, 5, 10, 30, 60, 120, 300, 600, 1800, 3600)
+_METRICS: Dict[str, Tuple[str, str, Tuple[float, ...]]] = {
+    "videotonote_stage_duration_seconds": ("histogram", "Duration of each pipeline stage.", _STAGE_BUCKETS),
+    "videotonote_transcribe_realtime_factor": (
+        "histogram", "Transcription wall time divided by audio duration.",
+        (0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1, 1.5, 2, 5)
+    ),
+    "videotonote_audio_seconds_total": ("counter", "Seconds of audio transcribed.", ()),
+    "videotonote_tasks_finished_total": ("counter", "Tasks finished by final status.", ()),
+    "videotonote_llm_requests_total": ("counter", "Successful LLM requests.", ()),
+    "videotonote_llm_tokens_total": ("counter", "LLM tokens sent (prompt) and received (output).", ()),
+    "videotonote_llm_errors_total": ("counter", "LLM request errors by kind (retry, rate_limited, failure).", ()),
+    "videotonote_llm_request_duration_seconds": (
+        "histogram", "Duration of LLM requests including retries.", (0.5, 1, 2, 5, 10, 30, 60, 120, 300)
+    ),
+    "videotonote_cache_requests_total": ("counter", "Cache lookups by cache and result (hit, miss).", ()),
+    "videotonote_process_resident_memory_bytes": ("gauge", "Resident memory of each process.", ()),
+    "videotonote_process_shared_memory_bytes": (
+        "gauge", "Resident memory shared with other processes (e.g. preloaded model weights).", ()
+    ),
+    "videotonote_queue_depth": ("gauge", "Pending tasks in the job queue.", ()),
+    "videotonote_tasks": ("gauge", "Tasks in the task store by status.", ()),
+    "videotonote_workers": ("gauge", "Transcription worker processes by state (alive, busy).", ()),
+}
+
+# 各行程自行回報的 gauge (以 pid 區分)；行程結束後不再更新，超過 _PROCESS_GAUGE_TTL 個寫入間隔即移除
+_PROCESS_GAUGES = ("videotonote_process_resident_memory_bytes", "videotonote_process_shared_memory_bytes")
+_PROCESS_GAUGE_TTL = 3
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+def _label_key(labels: Dict[str, Any]) -> LabelKey:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(labels: LabelKey) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels) + "}"
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+def process_rss_bytes() -> Optional[int]:
+    """目前行程的常駐記憶體；非 Linux 平台改用 getrusage 的峰值"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return peak_rss_bytes()
+
+def peak_rss_bytes() -> Optional[int]:
+    """目前行程至今的常駐記憶體峰值"""
+    try:
+        import resource
+        import sys
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return rss if sys.platform == "darwin" else rss * 1024
+    except (ImportError, AttributeError):
+        return None
+
+def process_memory(pid: Any = "self") -> Dict[str, int]:
+    """
+    從 /proc/<pid>/smaps_rollup 讀取記憶體用量 (bytes)：rss、pss (共享頁面依共用行程數分攤)、
+    shared (與其他行程共享) 與 private；無法讀取時僅回傳目前行程的 rss
+    """
+    fields = {"Rss": "rss", "Pss": "pss", "Shared_Clean": "shared", "Shared_Dirty": "shared",
+              "Private_Clean": "private", "Private_Dirty": "private"}
+    usage: Dict[str, int] = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                name, _, rest = line.partition(":")
+                if name in fields:
+                    key = fields[name]
+                    usage[key] = usage.get(key, 0) + int(rest.split()[0]) * 1024
+    except (OSError, ValueError, IndexError):
+        rss = process_rss_bytes() if pid == "self" else None
+        return {"rss": rss} if rss is not None else {}
+    return usage
+
+class MetricsRegistry:
+    """
+    行程內的指標累計
+
+    counter 與 histogram 以增量累計，flush() 時加總進持久化儲存；gauge 以最新值覆寫。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._deltas: Dict[Tuple[str, LabelKey], float] = {}
+        self._gauges: Dict[Tuple[str, LabelKey], float] = {}
+        # 未啟用持久化時的累計值
+        self._totals: Dict[Tuple[str, LabelKey], float] = {}
+        self._db_path: Optional[Path] = None
+        self._process_label: Optional[str] = None
+        self._local = threading.local()
+        self._flusher_pid: Optional[int] = None
+
+    def enable_persistence(self, db_path: Path = None, process_label: str = "api"):
+        """將指標寫入共用的 SQLite 資料庫，並啟動定期寫入的背景執行緒"""
+        if not config.METRICS_ENABLED:
+            return
+        if self._flusher_pid is not None and self._flusher_pid != os.getpid():
+            # fork 出的子行程繼承了父行程尚未寫入的增量，捨棄以免重複計算
+            with self._lock:
+                self._deltas.clear()
+                self._gauges.clear()
+        self._db_path = Path(db_path or config.TASK_DB_PATH)
+        self._process_label = process_label
+        conn = self._connect()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS metrics ("
+            "name TEXT NOT NULL, labels TEXT NOT NULL, value REAL NOT NULL, updated_at REAL, "
+            "PRIMARY KEY (name, labels))"
+        )
+        if "updated_at" not in {row[1] for row in conn.execute("PRAGMA table_info(metrics)")}:
+            conn.execute("ALTER TABLE metrics ADD COLUMN updated_at REAL")
+        if self._flusher_pid != os.getpid():
+            self._flusher_pid = os.getpid()
+            threading.Thread(target=self._flush_loop, name="metrics-flush", daemon=True).start()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            conn = sqlite3.connect(str(self._db_path), timeout=30, isolation_level=None)
+            conn.execute(f"PRAGMA journal_mode={config.TASK_DB_JOURNAL_MODE}")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(config.METRICS_FLUSH_INTERVAL)
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"寫入執行指標時發生錯誤: {e}")
+
+    def inc(self, name: str, value: float = 1.0, **labels):
+        if not config.METRICS_ENABLED:
+            return
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._deltas[key] = self._deltas.get(key, 0.0) + value
+
+    def observe(self, name: str, value: float, **labels):
+        """記錄一筆直方圖觀測值 (累計至 _bucket / _sum / _count)"""
+        if not config.METRICS_ENABLED or value is None:
+            return
+        buckets = _METRICS[name][2]
+        label_key = _label_key(labels)
+        with self._lock:
+            # 未落入的區間也寫入 0，讓每個區間都出現在輸出中
+            for bound in buckets + (math.inf,):
+                key = (f"{name}_bucket", label_key + (("le", _format_value(bound)),))
+                self._deltas[key] = self._deltas.get(key, 0.0) + (1 if value <= bound else 0)
+            for suffix, amount in (("_sum", value), ("_count", 1.0)):
+                key = (f"{name}{suffix}", label_key)
+                self._deltas[key] = self._deltas.get(key, 0.0) + amount
+
+    def set_gauge(self, name: str, value: float, **labels):
+        if not config.METRICS_ENABLED or value is None:
+            return
+        with self._lock:
+            self._gauges[(name, _label_key(labels))] = float(value)
+
+    def flush(self):
+        """把累計的增量與 gauge 寫入儲存"""
+        if self._process_label:
+            usage = process_memory()
+            labels = {"process": self._process_label, "pid": os.getpid()}
+            self.set_gauge("videotonote_process_resident_memory_bytes", usage.get("rss"), **labels)
+            self.set_gauge("videotonote_process_shared_memory_bytes", usage.get("shared"), **labels)
+        with self._lock:
+            deltas, self._deltas = self._deltas, {}
+            gauges, self._gauges = self._gauges, {}
+        if self._db_path is None:
+            with self._lock:
+                for key, value in deltas.items():
+                    self._totals[key] = self._totals.get(key, 0.0) + value
+                self._totals.update(gauges)
+            return
+        if not deltas and not gauges:
+            return
+        conn = self._connect()
+        now = time.time()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.executemany(
+                "INSERT INTO metrics (name, labels, value, updated_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(name, labels) DO UPDATE SET value = value + excluded.value, updated_at = excluded.updated_at",
+                [(name, json.dumps(labels), value, now) for (name, labels), value in deltas.items()]
+            )
+            conn.executemany(
+                "INSERT INTO metrics (name, labels, value, updated_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(name, labels) DO UPDATE SET value = excluded.value, updated_at = excluded.updated_at",
+                [(name, json.dumps(labels), value, now) for (name, labels), value in gauges.items()]
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            # 寫入失敗時保留增量，下次再寫
+            with self._lock:
+                for key, value in deltas.items():
+                    self._deltas[key] = self._deltas.get(key, 0.0) + value
+                for key, value in gauges.items():
+                    self._gauges.setdefault(key, value)
+            raise
+
+    def snapshot(self) -> Dict[Tuple[str, LabelKey], float]:
+        """寫入目前增量後回傳所有行程合計的數值"""
+        self.flush()
+        if self._db_path is None:
+            with self._lock:
+                return dict(self._totals)
+        conn = self._connect()
+        # 移除已結束行程 (包含回收的 worker) 留下的 gauge
+        conn.execute(
+            f"DELETE FROM metrics WHERE name IN ({', '.join('?' * len(_PROCESS_GAUGES))}) "
+            "AND (updated_at IS NULL OR updated_at < ?)",
+            _PROCESS_GAUGES + (time.time() - _PROCESS_GAUGE_TTL * config.METRICS_FLUSH_INTERVAL,)
+        )
+        rows = conn.execute("SELECT name, labels, value FROM metrics")
+        return {(name, tuple(tuple(pair) for pair in json.loads(labels))): value for name, labels, value in rows}
+
+    def render(self, gauges: Optional[Dict[Tuple[str, LabelKey], float]] = None) -> str:
+        """
+        以 Prometheus 文字格式輸出
+
+        Args:
+            gauges: 匯出當下才計算的 gauge (佇列深度、worker 數等)，不寫入儲存
+        """
+        values = self.snapshot()
+        values.update(gauges or {})
+        series: Dict[str, List[Tuple[str, LabelKey, float]]] = {}
+        for (name, labels), value in values.items():
+            base = name
+            for suffix in ("_bucket", "_sum", "_count"):
+                if name.endswith(suffix) and name[:-len(suffix)] in _METRICS:
+                    base = name[:-len(suffix)]
+            series.setdefault(base, []).append((name, labels, value))
+
+        lines = []
+        for base in sorted(series):
+            kind, help_text, _ = _METRICS.get(base, ("untyped", "", ()))
+            lines.append(f"# HELP {base} {help_text}")
+            lines.append(f"# TYPE {base} {kind}")
+
+            def order(item):
+                name, labels, _ = item
+                plain = tuple(pair for pair in labels if pair[0] != "le")
+                le = dict(labels).get("le")
+                suffix = ("_bucket", "_sum", "_count").index(name[len(base):]) if name != base else 0
+                return (plain, suffix, float(le) if le is not None else 0.0)
+
+            for name, labels, value in sorted(series[base], key=order):
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+def gauge(name: str, value: float, **labels) -> Tuple[Tuple[str, LabelKey], float]:
+    """組出 render() 使用的即時 gauge 項目"""
+    return (name, _label_key(labels)), float(value)
+
+# 行程共用的指標實例
+metrics = MetricsRegistry()
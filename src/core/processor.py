@@ -2,27 +2,59 @@
 """
 核心處理器 - 統合所有功能
 """
+import json
 import os
-from typing import List, Optional
+import time
+from typing import List, Optional, Dict, Any, Callable, Tuple, Iterable
 from ..services.downloader import YouTubeDownloader
-from ..services.transcriber import TranscriberFactory
+from ..services.transcriber import TranscriberFactory, BaseTranscriber
 from ..services.notes_generator import NotesGeneratorFactory
+from ..services.transcript_compactor import compact_transcription
 from ..utils.file_manager import FileManager
+from ..utils.cancellation import CancelToken
+from .config import config
+from .metrics import metrics
+from .manifest import RunManifest, STAGES, text_hash
+from .run_report import RunReport, profile_stage
+from .search_index import index_transcript
+
+# 階段回呼: (階段名稱, 事件 'started' / 'finished', 輸出路徑)
+StageCallback = Callable[[str, str, Optional[str]], None]
+# 進度回呼: (階段名稱, 進度內容)，例如下載百分比、已轉錄秒數與片段、筆記請求數
+ProgressCallback = Callable[[str, Dict[str, Any]], None]
 
 class VideoProcessor:
-    def __init__(self, model_choice: str = 'openai', api_key: Optional[str] = None, transcriber_type: str = 'fast'):
+    def __init__(self, model_choice: str = 'openai', api_key: Optional[str] = None, transcriber_type: str = 'fast',
+                 language: Optional[str] = None, stage_callback: Optional[StageCallback] = None,
+                 progress_callback: Optional[ProgressCallback] = None,
+                 transcriber: Optional[BaseTranscriber] = None, force_stages: Optional[Iterable[str]] = None):
         """
         初始化影片處理器
         
         Args:
             model_choice: 筆記生成模型選擇
             api_key: API 金鑰
-            transcriber_type: 轉錄器類型 ('standard' 或 'fast'，預設: 'fast')
+            transcriber_type: 轉錄器類型 ('standard'、'fast'、'ctranslate2' 或 'auto'，預設: 'fast')
+            language: 轉錄語言 (預設使用設定檔的 DEFAULT_LANGUAGE)
+            stage_callback: 各處理階段開始與結束時的回呼
+            progress_callback: 各處理階段進行中的進度回呼
+            transcriber: 已載入的轉錄器 (例如由父行程預先載入、與 worker 共享權重)，未提供時依 transcriber_type 建立
+            force_stages: 即使執行紀錄顯示已是最新仍強制重跑的階段 ('download' / 'transcribe' / 'notes' / 'all')
         """
+        self.language = language
+        self.stage_callback = stage_callback
+        self.progress_callback = progress_callback
+        # 最近一次處理的輸出路徑 (audio_path, transcription_path, notes_path)
+        self.last_outputs: Dict[str, Optional[str]] = {}
+        force_stages = set(force_stages or ())
+        self.force_stages = set(STAGES) if "all" in force_stages else force_stages
+        # 各階段的耗時與資源量測；process_* 每次執行 (或整批) 結束時輸出報告
+        self.report = RunReport()
+        self._in_batch = False
         self.downloader = YouTubeDownloader()
         
         # 使用 TranscriberFactory 建立轉錄器
-        self.transcriber = TranscriberFactory.create(transcriber_type=transcriber_type)
+        self.transcriber = transcriber or TranscriberFactory.create(transcriber_type=transcriber_type)
             
         # 使用 NotesGeneratorFactory 建立筆記生成器
         self.notes_generator = NotesGeneratorFactory.create(
@@ -41,32 +73,26 @@ class VideoProcessor:
         Returns:
             處理是否成功
         """
+        return self._tracked(url, lambda: self._process_youtube_video(url, keep_audio))
+
+    def _process_youtube_video(self, url: str, keep_audio: bool) -> bool:
         print(f"\n處理影片: {url}")
+        self.last_outputs = {}
+        manifest = self._open_manifest(url)
         
-        # 1. 下載音檔
-        audio_path = self.downloader.download_audio(url)
+        # 1. 下載音檔 (先前已下載、且音檔仍在或逐字稿已是最新時略過)
+        audio_path, audio_hash = self._run_download(manifest, url)
         if not audio_path:
             print("下載失敗，跳過此影片")
             return False
+        self.last_outputs["audio_path"] = audio_path
         
         try:
-            # 2. 轉錄
-            transcription = self.transcriber.transcribe(audio_path)
-            if not transcription:
-                print("轉錄失敗")
+            # 2. 轉錄並保存逐字稿，3. 精簡逐字稿後生成筆記
+            if not self._run_stages(manifest, audio_path, audio_hash):
                 return False
             
-            # 3. 保存轉錄結果
-            transcription_path = self.transcriber.save_transcription(transcription, audio_path)
-            
-            # 4. 生成筆記
-            notes = self.notes_generator.generate_notes(transcription)
-            if notes:
-                notes_path = self.notes_generator.save_notes(notes, audio_path)
-            else:
-                print("生成筆記失敗")
-            
-            # 5. 清理臨時檔案
+            # 4. 清理臨時檔案
             if not keep_audio:
                 self._cleanup_audio_file(audio_path)
             
@@ -90,29 +116,22 @@ class VideoProcessor:
         Returns:
             處理是否成功
         """
+        return self._tracked(audio_path, lambda: self._process_audio_file(audio_path))
+
+    def _process_audio_file(self, audio_path: str) -> bool:
         print(f"\n處理音檔: {audio_path}")
+        self.last_outputs = {"audio_path": audio_path}
         
         if not os.path.exists(audio_path):
             print("音檔不存在")
             return False
         
         try:
-            # 1. 轉錄
-            transcription = self.transcriber.transcribe(audio_path)
-            if not transcription:
-                print("轉錄失敗")
+            # 1. 轉錄並保存逐字稿，2. 精簡逐字稿後生成筆記 (輸入與設定未變動的階段沿用上次輸出)
+            manifest = self._open_manifest(audio_path)
+            if not self._run_stages(manifest, audio_path, manifest.file_hash(audio_path) if manifest else None):
                 return False
             
-            # 2. 保存轉錄結果
-            transcription_path = self.transcriber.save_transcription(transcription, audio_path)
-            
-            # 3. 生成筆記
-            notes = self.notes_generator.generate_notes(transcription)
-            if notes:
-                notes_path = self.notes_generator.save_notes(notes, audio_path)
-            else:
-                print("生成筆記失敗")
-            
             print("音檔處理完成！")
             return True
             
@@ -132,15 +151,236 @@ class VideoProcessor:
             每個影片的處理結果列表
         """
         results = []
-        for url in urls:
-            result = self.process_youtube_video(url, keep_audio)
-            results.append(result)
+        self.report = RunReport(name="batch")
+        self._in_batch = True
+        try:
+            for url in urls:
+                result = self.process_youtube_video(url, keep_audio)
+                results.append(result)
+        finally:
+            self._in_batch = False
+            self._write_report()
         
         successful = sum(results)
         total = len(results)
         print(f"\n批次處理完成！成功: {successful}/{total}")
         return results
     
+    def transcribe_audio(self, audio_path: str, language: Optional[str] = None,
+                         progress_callback: Optional[Callable[[Dict[str, Any]], None]] = None,
+                         cancel_token: Optional[CancelToken] = None
+                         ) -> Tuple[Optional[Dict[str, Any]], Dict[str, Optional[str]]]:
+        """
+        轉錄並保存逐字稿與帶時間戳記的片段 (不觸發階段回呼，可供任務佇列在多個任務間共用)
+        
+        Returns:
+            (轉錄結果, {"transcription_path", "segments_path"})，失敗時轉錄結果為 None；
+            取消時拋出 TaskCancelled
+        """
+        started = time.monotonic()
+        self.transcriber.last_decode_seconds = None
+        with self.report.span("transcribe") as span:
+            with profile_stage("transcribe", span):
+                transcription = self.transcriber.transcribe(
+                    audio_path, language=language or self.language, progress_callback=progress_callback,
+                    cancel_token=cancel_token
+                )
+        if not transcription:
+            print("轉錄失敗")
+            return None, {}
+        duration = self._record_realtime_factor(audio_path, transcription, time.monotonic() - started)
+        if span is not None:
+            span.attrs["audio_seconds"] = duration
+            if self.transcriber.last_decode_seconds is not None:
+                # 解碼與轉錄交錯進行，解碼時間包含在轉錄階段內
+                self.report.add_span("decode", self.transcriber.last_decode_seconds, parent="transcribe")
+        with self.report.span("save"):
+            paths = {
+                "transcription_path": self.transcriber.save_transcription(transcription, audio_path),
+                "segments_path": self.transcriber.save_segments(transcription, audio_path),
+            }
+            index_transcript(paths["transcription_path"], paths["segments_path"])
+            return transcription, paths
+    
+    def create_notes(self, transcription: Dict[str, Any], audio_path: str,
+                     progress_callback: Optional[Callable[[Dict[str, Any]], None]] = None,
+                     cancel_token: Optional[CancelToken] = None) -> Optional[str]:
+        """精簡逐字稿後生成並保存筆記，回傳筆記路徑；可在多個執行緒同時呼叫，取消時拋出 TaskCancelled"""
+        notes = self.notes_generator.generate_notes(
+            self._compact_transcription(transcription), progress_callback=progress_callback,
+            cancel_token=cancel_token
+        )
+        if not notes:
+            print("生成筆記失敗")
+            return None
+        return self.notes_generator.save_notes(notes, audio_path)
+    
+    def _record_realtime_factor(self, audio_path: str, transcription: Dict[str, Any], elapsed: float) -> Optional[float]:
+        """記錄轉錄耗時與音檔長度的比值並回傳音檔長度；無法取得長度時以最後一個片段的結束時間估計"""
+        duration = FileManager.get_audio_duration(audio_path)
+        if not duration:
+            ends = [chunk["timestamp"][1] for chunk in transcription.get("chunks") or []
+                    if chunk.get("timestamp") and chunk["timestamp"][1] is not None]
+            duration = max(ends) * self.transcriber.timestamp_scale if ends else None
+        if not duration:
+            return None
+        labels = {"backend": self.transcriber.backend, "model": self.transcriber.model_id}
+        metrics.inc("videotonote_audio_seconds_total", duration, **labels)
+        metrics.observe("videotonote_transcribe_realtime_factor", elapsed / duration, **labels)
+        return duration
+
+    def _tracked(self, source: str, run: Callable[[], bool]) -> bool:
+        """在執行報告中記錄單一輸入；不在批次中時結束後即輸出報告"""
+        if not self._in_batch:
+            self.report = RunReport()
+        self.report.begin_item(source)
+        success = False
+        try:
+            success = run()
+            return success
+        finally:
+            self.report.end_item(success)
+            if not self._in_batch:
+                self._write_report()
+
+    def _write_report(self):
+        if not config.RUN_REPORT:
+            return
+        try:
+            self.report.write()
+        except Exception as e:
+            print(f"寫入執行報告時發生錯誤: {e}")
+
+    def _open_manifest(self, source: str) -> Optional[RunManifest]:
+        return RunManifest.for_source(source, force_stages=self.force_stages) if config.RUN_MANIFEST else None
+
+    def _transcribe_settings(self) -> Dict[str, Any]:
+        return {
+            "transcriber": type(self.transcriber).__name__,
+            "model": self.transcriber.model_id,
+            "language": self.language or config.DEFAULT_LANGUAGE,
+        }
+
+    def _notes_settings(self) -> Dict[str, Any]:
+        return {
+            "provider": self.notes_generator.provider,
+            "model": self.notes_generator.model_name,
+            "prompt": config.DEFAULT_PROMPT,
+            "max_prompt_tokens": config.NOTES_MAX_PROMPT_TOKENS,
+            "compaction": [config.COMPACT_TRANSCRIPT, config.COMPACT_STRIP_FILLERS,
+                           config.COMPACT_MAX_NGRAM, config.COMPACT_MAX_REPEATS],
+        }
+
+    def _run_download(self, manifest: Optional[RunManifest], url: str) -> Tuple[Optional[str], Optional[str]]:
+        """下載音檔並回傳 (音檔路徑, 內容雜湊)；紀錄顯示可沿用時不重新下載"""
+        url_hash = text_hash(url)
+        record = manifest.fresh("download", url_hash, {}, check_outputs=False) if manifest else None
+        if record:
+            audio_path = record["outputs"].get("audio_path")
+            transcribed = manifest.fresh("transcribe", record["output_hash"], self._transcribe_settings())
+            if audio_path and (os.path.exists(audio_path) or transcribed):
+                print("音檔已下載過，略過下載")
+                self.report.skip("download")
+                self._notify("download", "finished", audio_path)
+                return audio_path, record["output_hash"]
+
+        self._notify("download", "started")
+        with self.report.span("download"):
+            audio_path = self.downloader.download_audio(url, progress_callback=self._progress("download"))
+        if not audio_path:
+            return None, None
+        self._notify("download", "finished", audio_path)
+        audio_hash = None
+        if manifest:
+            audio_hash = manifest.file_hash(audio_path)
+            manifest.record("download", url_hash, {}, {"audio_path": audio_path}, output_hash=audio_hash)
+        return audio_path, audio_hash
+
+    def _run_stages(self, manifest: Optional[RunManifest], audio_path: str, audio_hash: Optional[str]) -> bool:
+        """執行轉錄與筆記階段；執行紀錄中輸入與設定皆未變動的階段直接沿用上次的輸出"""
+        transcription = None
+        transcribe_settings = self._transcribe_settings()
+        record = manifest.fresh("transcribe", audio_hash, transcribe_settings) if manifest else None
+        if record:
+            print("逐字稿已是最新，略過轉錄")
+            self.report.skip("transcribe")
+            paths = record["outputs"]
+        else:
+            self._notify("transcribe", "started")
+            transcription, paths = self.transcribe_audio(audio_path, progress_callback=self._progress("transcribe"))
+            if not transcription:
+                return False
+            if manifest:
+                manifest.record("transcribe", audio_hash, transcribe_settings, paths)
+        self._notify("transcribe", "finished", paths["transcription_path"])
+        self.last_outputs.update(paths)
+
+        notes_settings = self._notes_settings()
+        transcript_hash = manifest.files_hash(paths.values()) if manifest else None
+        record = manifest.fresh("notes", transcript_hash, notes_settings) if manifest else None
+        if record:
+            print("筆記已是最新，略過筆記生成")
+            self.report.skip("notes")
+            notes_path = record["outputs"]["notes_path"]
+        else:
+            self._notify("notes", "started")
+            if transcription is None:
+                transcription = self._load_transcription(paths)
+            with self.report.span("notes"):
+                notes_path = self.create_notes(transcription, audio_path, progress_callback=self._progress("notes"))
+            if notes_path and manifest:
+                manifest.record("notes", transcript_hash, notes_settings, {"notes_path": notes_path})
+        if notes_path:
+            self._notify("notes", "finished", notes_path)
+            self.last_outputs["notes_path"] = notes_path
+        return True
+
+    def _load_transcription(self, paths: Dict[str, Optional[str]]) -> Dict[str, Any]:
+        """讀取先前保存的逐字稿；片段檔與逐字稿內容一致時一併還原片段 (供精簡逐字稿使用)"""
+        with open(paths["transcription_path"], "r", encoding="utf-8") as f:
+            text = f.read()
+        transcription: Dict[str, Any] = {"text": text}
+        if paths.get("segments_path") and os.path.exists(paths["segments_path"]):
+            with open(paths["segments_path"], "r", encoding="utf-8") as f:
+                saved = json.load(f)
+            if saved.get("text") == text:
+                scale = self.transcriber.timestamp_scale
+                transcription["chunks"] = [
+                    {"timestamp": [t / scale if t is not None else None for t in (segment["start"], segment["end"])],
+                     "text": segment["text"]}
+                    for segment in saved.get("segments", [])
+                ]
+        return transcription
+
+    def _notify(self, stage: str, event: str, output_path: Optional[str] = None):
+        """通知階段回呼；回呼失敗不影響處理流程"""
+        if not self.stage_callback:
+            return
+        try:
+            self.stage_callback(stage, event, output_path)
+        except Exception as e:
+            print(f"階段回呼發生錯誤 ({stage}/{event}): {e}")
+    
+    def _progress(self, stage: str) -> Optional[Callable[[Dict[str, Any]], None]]:
+        """建立單一階段的進度回呼；回呼失敗不影響處理流程"""
+        if not self.progress_callback:
+            return None
+
+        def callback(data: Dict[str, Any]):
+            try:
+                self.progress_callback(stage, data)
+            except Exception as e:
+                print(f"進度回呼發生錯誤 ({stage}): {e}")
+        return callback
+    
+    def _compact_transcription(self, transcription: Dict[str, Any]) -> Dict[str, Any]:
+        """移除幻覺迴圈與重複段落，減少送往 LLM 的 token 數"""
+        if not config.COMPACT_TRANSCRIPT:
+            return transcription
+        compacted, stats = compact_transcription(transcription)
+        print(stats.summary())
+        return compacted
+    
     def _cleanup_audio_file(self, audio_path: str):
         """清理臨時音檔"""
         if FileManager.cleanup_file(audio_path):
@@ -149,8 +389,8 @@ class VideoProcessor:
 
 # 為了向後相容，保留 FastVideoProcessor 的別名
 class FastVideoProcessor(VideoProcessor):
-    def __init__(self, model_choice: str = 'openai', api_key: Optional[str] = None):
-        super().__init__(model_choice=model_choice, api_key=api_key, transcriber_type='fast')
+    def __init__(self, model_choice: str = 'openai', api_key: Optional[str] = None, **kwargs):
+        super().__init__(model_choice=model_choice, api_key=api_key, transcriber_type='fast', **kwargs)
 
 class SpeechRecognizer(VideoProcessor):
     """向後相容的類別名稱"""
@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+"""
+執行報告 - 以 span 記錄各階段 (下載、解碼、轉錄、保存、筆記) 的耗時、CPU 時間、記憶體峰值增量與即時倍率，
+每次執行 (單一輸入或整批) 輸出一份 JSON 報告
+"""
+import cProfile
+import json
+import os
+import shutil
+import signal
+import subprocess
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Optional, Dict, Any, List, Iterator
+from .config import config
+from .metrics import peak_rss_bytes
+
+class Span:
+    """單一階段的量測結果；attrs 可在量測結束後補上 (例如音檔長度)"""
+
+    def __init__(self, name: str, **attrs):
+        self.name = name
+        self.attrs: Dict[str, Any] = dict(attrs)
+        self.wall_seconds = 0.0
+        self.cpu_seconds: Optional[float] = None
+        self.peak_rss_delta_bytes: Optional[int] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = {
+            "name": self.name,
+            "wall_seconds": round(self.wall_seconds, 4),
+            "cpu_seconds": round(self.cpu_seconds, 4) if self.cpu_seconds is not None else None,
+            "peak_rss_delta_bytes": self.peak_rss_delta_bytes,
+        }
+        audio_seconds = self.attrs.get("audio_seconds")
+        if audio_seconds:
+            data["realtime_factor"] = round(self.wall_seconds / audio_seconds, 4)
+        data.update(self.attrs)
+        return data
+
+class RunReport:
+    """
+    一次執行 (可包含多個輸入) 的階段量測
+
+    CPU 時間為整個行程 (含模型推論的執行緒)；記憶體為行程峰值 RSS 在該階段內的增加量，
+    先前階段已達到的峰值不會重複計入。
+    """
+
+    def __init__(self, name: str = "run"):
+        self.name = name
+        self.started_at = time.time()
+        self._started_wall = time.monotonic()
+        self._started_cpu = time.process_time()
+        self.items: List[Dict[str, Any]] = []
+        self._current: Optional[Dict[str, Any]] = None
+
+    def begin_item(self, source: str):
+        self._current = {"source": source, "success": False, "spans": [], "skipped_stages": []}
+        self.items.append(self._current)
+
+    def end_item(self, success: bool):
+        if self._current is not None:
+            self._current["success"] = success
+            self._current = None
+
+    def skip(self, stage: str):
+        """記錄因執行紀錄已是最新而略過的階段"""
+        if self._current is not None:
+            self._current["skipped_stages"].append(stage)
+
+    @contextmanager
+    def span(self, name: str, **attrs) -> Iterator[Optional[Span]]:
+        """量測 with 區塊；沒有進行中的輸入時不記錄 (例如任務佇列直接呼叫處理器的情況)"""
+        if self._current is None:
+            yield None
+            return
+        span = Span(name, **attrs)
+        wall = time.monotonic()
+        cpu = time.process_time()
+        peak = peak_rss_bytes()
+        try:
+            yield span
+        finally:
+            span.wall_seconds = time.monotonic() - wall
+            span.cpu_seconds = time.process_time() - cpu
+            end_peak = peak_rss_bytes()
+            if peak is not None and end_peak is not None:
+                span.peak_rss_delta_bytes = end_peak - peak
+            self._current["spans"].append(span)
+
+    def add_span(self, name: str, wall_seconds: float, **attrs):
+        """加入在其他位置量測的階段 (例如轉錄器內部累計的解碼時間)"""
+        if self._current is not None:
+            span = Span(name, **attrs)
+            span.wall_seconds = wall_seconds
+            self._current["spans"].append(span)
+
+    def to_dict(self) -> Dict[str, Any]:
+        totals: Dict[str, Dict[str, float]] = {}
+        items = []
+        for item in self.items:
+            spans = [span.to_dict() for span in item["spans"]]
+            audio_seconds = next((span["audio_seconds"] for span in spans if span.get("audio_seconds")), None)
+            items.append(dict(item, spans=spans, audio_seconds=audio_seconds))
+            for span in spans:
+                total = totals.setdefault(span["name"], {"count": 0, "wall_seconds": 0.0, "cpu_seconds": 0.0})
+                total["count"] += 1
+                total["wall_seconds"] = round(total["wall_seconds"] + span["wall_seconds"], 4)
+                total["cpu_seconds"] = round(total["cpu_seconds"] + (span["cpu_seconds"] or 0.0), 4)
+        audio_seconds = sum(item["audio_seconds"] or 0.0 for item in items)
+        elapsed = time.monotonic() - self._started_wall
+        return {
+            "name": self.name,
+            "started_at": datetime.fromtimestamp(self.started_at).isoformat(timespec="seconds"),
+            "elapsed_seconds": round(elapsed, 4),
+            "cpu_seconds": round(time.process_time() - self._started_cpu, 4),
+            "peak_rss_bytes": peak_rss_bytes(),
+            "audio_seconds": audio_seconds or None,
+            "realtime_factor": round(elapsed / audio_seconds, 4) if audio_seconds else None,
+            "totals": totals,
+            "items": items,
+        }
+
+    def write(self, output_path: Optional[Path] = None) -> Optional[Path]:
+        """寫入 JSON 報告 (預設: REPORT_DIR/<名稱>_<時間>.json) 並輸出各階段耗時摘要"""
+        if not self.items:
+            return None
+        report = self.to_dict()
+        if output_path is None:
+            output_path = config.REPORT_DIR / f"{self.name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        output_path.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+
+        stages = "，".join(f"{name} {total['wall_seconds']:.1f}s" for name, total in report["totals"].items())
+        stages = stages or "所有階段皆沿用先前的輸出"
+        rtf = f"，即時倍率 {report['realtime_factor']:.2f}" if report["realtime_factor"] else ""
+        print(f"執行報告: 共 {report['elapsed_seconds']:.1f}s ({stages}){rtf}")
+        print(f"執行報告已保存到: {output_path}")
+        return output_path
+
+@contextmanager
+def profile_stage(name: str, span: Optional[Span] = None) -> Iterator[None]:
+    """
+    依 PROFILE_TRANSCRIBE 設定剖析 with 區塊
+
+    - cprofile: 以 cProfile 剖析目前執行緒，輸出 .prof (可用 snakeviz / pstats 檢視)
+    - py-spy: 以 py-spy 取樣整個行程 (含原生推論執行緒)，輸出 speedscope 格式；須已安裝 py-spy 且有 ptrace 權限
+    輸出路徑記錄在 span 的 profile 欄位。
+    """
+    mode = (config.PROFILE_TRANSCRIBE or "").lower()
+    if mode not in ("cprofile", "py-spy"):
+        yield
+        return
+    config.REPORT_DIR.mkdir(parents=True, exist_ok=True)
+    stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+
+    if mode == "cprofile":
+        path = config.REPORT_DIR / f"{name}_{stamp}.prof"
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            profiler.dump_stats(str(path))
+            if span is not None:
+                span.attrs["profile"] = str(path)
+        return
+
+    if not shutil.which("py-spy"):
+        print("找不到 py-spy，略過剖析")
+        yield
+        return
+    path = config.REPORT_DIR / f"{name}_{stamp}.speedscope.json"
+    process = subprocess.Popen(
+        ["py-spy", "record", "--pid", str(os.getpid()), "--native", "--format", "speedscope", "--output", str(path)],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        yield
+    finally:
+        # py-spy 收到 SIGINT 時寫出已取樣的結果
+        process.send_signal(signal.SIGINT)
+        try:
+            process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            process.kill()
+        if span is not None:
+            span.attrs["profile"] = str(path)
@@ -0,0 +1,305 @@
+# -*- coding: utf-8 -*-
+"""
+逐字稿搜尋索引 - 以 SQLite FTS5 建立倒排索引，搜尋結果對應到逐字稿與片段的時間範圍
+
+中日韓文字沒有空白分詞，索引時以字元 bigram 切分 (每段連續文字的最後一個字另外收錄單字)，
+其他語言以詞為單位；查詢字串以相同方式切分後組成片語查詢，結果即為原文中連續出現的片段。
+逐字稿保存時即加入索引，既有的逐字稿可由 update_library 依檔案大小與修改時間增量補上。
+"""
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from pathlib import Path
+from typing import Optional, Dict, Any, List, Tuple
+from .config import config
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    doc_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    path TEXT NOT NULL UNIQUE,
+    segments_path TEXT,
+    source TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    segments_mtime_ns INTEGER,
+    indexed_at REAL NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS segments (
+    segment_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    doc_id INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    start REAL,
+    end REAL,
+    text TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_segments_doc ON segments(doc_id, position);
+
+CREATE VIRTUAL TABLE IF NOT EXISTS segment_terms USING fts5(terms, content='', tokenize='unicode61');
+"""
+# 切分方式改變時遞增：不保存內容的 FTS5 表須以原始詞彙刪除，舊版索引無法沿用，開啟時清空後由 update_library 重建
+_INDEX_VERSION = 2
+
+# 平假名、片假名、中日韓統一表意文字 (含擴充 A) 與韓文音節
+_CJK_CHARS = '぀-ヿ㐀-䶿一-鿿가-힯'
+# 中日韓文字與其他文字 (字母、數字) 相連時在交界處分開，例如「用Python寫」→ 用 / python / 寫
+_TOKEN = re.compile(rf'[{_CJK_CHARS}]+|[^\W_{_CJK_CHARS}]+')
+_CJK = re.compile(rf'[{_CJK_CHARS}]+')
+# 沒有片段時間資訊的逐字稿依句尾標點切分，每段約此字數
+_SEGMENT_CHARS = 200
+_SENTENCE_END = re.compile(r'(?<=[。！？!?\.])\s*|\n+')
+_TRANSCRIPTION_MARKER = "_transcription"
+
+def _normalize(text: str) -> str:
+    return unicodedata.normalize("NFKC", text).lower()
+
+def index_terms(text: str) -> List[str]:
+    """索引用的詞彙：中日韓文字取字元 bigram 並收錄每段連續文字的最後一個字，其他文字以詞為單位"""
+    terms = []
+    for token in _TOKEN.findall(_normalize(text)):
+        if _CJK.fullmatch(token):
+            terms.extend(token[i:i + 2] for i in range(len(token) - 1))
+            terms.append(token[-1])
+        else:
+            terms.append(token)
+    return terms
+
+def match_expression(query: str) -> Optional[str]:
+    """
+    將查詢字串轉為 FTS5 查詢：中日韓文字片段以連續 bigram 組成片語 (單字以字首查詢)，
+    其他詞彙需完整出現；所有部分須同時符合。查詢字串沒有可搜尋的文字時返回 None
+    """
+    parts = []
+    for token in _TOKEN.findall(_normalize(query)):
+        if _CJK.fullmatch(token) and len(token) > 1:
+            parts.append('"' + " ".join(token[i:i + 2] for i in range(len(token) - 1)) + '"')
+        elif _CJK.fullmatch(token):
+            # 單字出現在 bigram 的開頭或一段文字的結尾
+            parts.append(f'"{token}"*')
+        else:
+            parts.append(f'"{token}"')
+    return " AND ".join(parts) or None
+
+def split_text(text: str) -> List[Dict[str, Any]]:
+    """將沒有時間資訊的逐字稿依句子切成約 _SEGMENT_CHARS 字的片段"""
+    segments = []
+    current = ""
+    for sentence in _SENTENCE_END.split(text):
+        sentence = sentence.strip()
+        if not sentence:
+            continue
+        if current and len(current) + len(sentence) > _SEGMENT_CHARS:
+            segments.append({"start": None, "end": None, "text": current})
+            current = ""
+        current = f"{current} {sentence}" if current else sentence
+    if current:
+        segments.append({"start": None, "end": None, "text": current})
+    return segments
+
+def segments_path_for(transcription_path: Path) -> Optional[Path]:
+    """逐字稿 (<名稱>_transcription*.txt) 對應的片段檔 (<名稱>_segments.json)"""
+    base, marker, _ = transcription_path.stem.rpartition(_TRANSCRIPTION_MARKER)
+    if not marker:
+        return None
+    return transcription_path.with_name(f"{base}_segments.json")
+
+def _load_segments(transcription_path: Path, segments_path: Optional[Path]) -> Tuple[List[Dict[str, Any]], Optional[Path]]:
+    """讀取逐字稿的片段；片段檔不存在或內容與逐字稿不一致 (例如由其他轉錄器覆寫) 時依句子切分"""
+    text = transcription_path.read_text(encoding="utf-8")
+    if segments_path and segments_path.exists():
+        try:
+            with open(segments_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("text", "").strip() == text.strip() and data.get("segments"):
+                return [segment for segment in data["segments"] if segment.get("text")], segments_path
+        except (OSError, ValueError) as e:
+            print(f"讀取片段檔失敗，改依句子切分: {segments_path} ({e})")
+    return split_text(text), None
+
+class TranscriptIndex:
+    """
+    逐字稿全文索引
+
+    與任務儲存相同，每個執行緒 (與每個 fork 出來的行程) 各自持有連線，WAL 模式下多個 worker
+    可同時寫入新的逐字稿、API 同時查詢。
+    """
+
+    def __init__(self, db_path: Path = None):
+        self.db_path = Path(db_path or config.SEARCH_INDEX_PATH)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        with self._connect() as conn:
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            if version < _INDEX_VERSION:
+                conn.executescript(
+                    "DROP TABLE IF EXISTS segment_terms; DROP TABLE IF EXISTS segments; DROP TABLE IF EXISTS documents;"
+                )
+            conn.executescript(_SCHEMA)
+            conn.execute(f"PRAGMA user_version = {_INDEX_VERSION}")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            conn = sqlite3.connect(str(self.db_path), timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            # 索引與任務資料庫同在共用的資料目錄，網路檔案系統上同樣不能使用 WAL
+            conn.execute(f"PRAGMA journal_mode={config.TASK_DB_JOURNAL_MODE}")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _delete_document(self, conn: sqlite3.Connection, doc_id: int):
+        # 不保存內容的 FTS5 表須以原始詞彙刪除
+        for row in conn.execute("SELECT segment_id, text FROM segments WHERE doc_id = ?", (doc_id,)).fetchall():
+            conn.execute("INSERT INTO segment_terms (segment_terms, rowid, terms) VALUES ('delete', ?, ?)",
+                         (row["segment_id"], " ".join(index_terms(row["text"]))))
+        conn.execute("DELETE FROM segments WHERE doc_id = ?", (doc_id,))
+        conn.execute("DELETE FROM documents WHERE doc_id = ?", (doc_id,))
+
+    def add(self, transcription_path: str, segments_path: Optional[str] = None) -> int:
+        """
+        加入 (或重新索引) 一份逐字稿
+
+        Args:
+            transcription_path: 逐字稿路徑
+            segments_path: 帶時間戳記的片段檔 (未提供時依檔名尋找)
+
+        Returns:
+            索引的片段數
+        """
+        path = Path(transcription_path).resolve()
+        segments_file = Path(segments_path).resolve() if segments_path else segments_path_for(path)
+        segments, segments_file = _load_segments(path, segments_file)
+        stat = path.stat()
+        base, marker, _ = path.stem.rpartition(_TRANSCRIPTION_MARKER)
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT doc_id FROM documents WHERE path = ?", (str(path),)).fetchone()
+            if row:
+                self._delete_document(conn, row["doc_id"])
+            doc_id = conn.execute(
+                "INSERT INTO documents (path, segments_path, source, size, mtime_ns, segments_mtime_ns, indexed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (str(path), str(segments_file) if segments_file else None, base if marker else path.stem,
+                 stat.st_size, stat.st_mtime_ns, segments_file.stat().st_mtime_ns if segments_file else None, time.time())
+            ).lastrowid
+            for position, segment in enumerate(segments):
+                segment_id = conn.execute(
+                    "INSERT INTO segments (doc_id, position, start, end, text) VALUES (?, ?, ?, ?, ?)",
+                    (doc_id, position, segment.get("start"), segment.get("end"), segment["text"])
+                ).lastrowid
+                conn.execute("INSERT INTO segment_terms (rowid, terms) VALUES (?, ?)",
+                             (segment_id, " ".join(index_terms(segment["text"]))))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return len(segments)
+
+    def remove(self, transcription_path: str) -> bool:
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT doc_id FROM documents WHERE path = ?",
+                               (str(Path(transcription_path).resolve()),)).fetchone()
+            if row:
+                self._delete_document(conn, row["doc_id"])
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return row is not None
+
+    def update_library(self, directory: Path = None, pattern: str = "*_transcription*.txt",
+                       rebuild: bool = False) -> Dict[str, int]:
+        """
+        增量同步資料夾中的逐字稿：新增或變動 (大小、修改時間，含片段檔) 的重新索引，已刪除的移出索引
+
+        Returns:
+            {"indexed", "removed", "unchanged"} 各自的檔案數
+        """
+        directory = Path(directory or config.TRANSCRIPTION_DIR)
+        known = {row["path"]: row for row in self._connect().execute(
+            "SELECT path, size, mtime_ns, segments_mtime_ns FROM documents"
+        )}
+        stats = {"indexed": 0, "removed": 0, "unchanged": 0}
+        seen = set()
+        for path in sorted(directory.glob(pattern)) if directory.is_dir() else []:
+            path = path.resolve()
+            seen.add(str(path))
+            stat = path.stat()
+            segments_file = segments_path_for(path)
+            segments_mtime = segments_file.stat().st_mtime_ns if segments_file and segments_file.exists() else None
+            row = known.get(str(path))
+            if (not rebuild and row and row["size"] == stat.st_size and row["mtime_ns"] == stat.st_mtime_ns
+                    and (row["segments_mtime_ns"] is None or row["segments_mtime_ns"] == segments_mtime)):
+                stats["unchanged"] += 1
+                continue
+            try:
+                self.add(str(path))
+                stats["indexed"] += 1
+            except (OSError, UnicodeDecodeError) as e:
+                print(f"索引逐字稿失敗: {path} ({e})")
+        for path in known:
+            if path not in seen and Path(path).parent == directory.resolve():
+                self.remove(path)
+                stats["removed"] += 1
+        return stats
+
+    def search(self, query: str, limit: int = 20, offset: int = 0) -> List[Dict[str, Any]]:
+        """
+        搜尋逐字稿片段，依相關度排序
+
+        Returns:
+            片段列表，每筆含 source、transcription_path、segments_path、start、end (秒，無時間資訊時為 None) 與 text
+        """
+        expression = match_expression(query)
+        if expression is None:
+            return []
+        rows = self._connect().execute(
+            "SELECT d.source, d.path, d.segments_path, s.position, s.start, s.end, s.text, t.rank "
+            "FROM segment_terms t JOIN segments s ON s.segment_id = t.rowid JOIN documents d ON d.doc_id = s.doc_id "
+            "WHERE segment_terms MATCH ? ORDER BY t.rank LIMIT ? OFFSET ?",
+            (expression, limit, offset)
+        ).fetchall()
+        return [{
+            "source": row["source"],
+            "transcription_path": row["path"],
+            "segments_path": row["segments_path"],
+            "position": row["position"],
+            "start": row["start"],
+            "end": row["end"],
+            "text": row["text"],
+            "score": round(-row["rank"], 4),
+        } for row in rows]
+
+    def stats(self) -> Dict[str, int]:
+        conn = self._connect()
+        return {
+            "documents": conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0],
+            "segments": conn.execute("SELECT COUNT(*) FROM segments").fetchone()[0],
+        }
+
+_INDEX: Optional[TranscriptIndex] = None
+
+def get_index() -> TranscriptIndex:
+    """本行程共用的索引 (連線依執行緒與行程各自建立)"""
+    global _INDEX
+    if _INDEX is None or _INDEX.db_path != Path(config.SEARCH_INDEX_PATH):
+        _INDEX = TranscriptIndex()
+    return _INDEX
+
+def index_transcript(transcription_path: Optional[str], segments_path: Optional[str] = None):
+    """逐字稿保存後加入搜尋索引；索引失敗不影響轉錄結果"""
+    if not config.SEARCH_INDEX_ENABLED or not transcription_path:
+        return
+    try:
+        get_index().add(transcription_path, segments_path)
+    except Exception as e:
+        print(f"加入搜尋索引失敗: {e}")
@@ -0,0 +1,571 @@
+# -*- coding: utf-8 -*-
+"""
+任務儲存 - 以 SQLite (WAL 模式) 持久化 API 任務狀態，供多個 worker 行程共用
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Optional, Dict, Any, List, Tuple
+from .config import config
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    task_id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    request TEXT NOT NULL,
+    result TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_tasks_status ON tasks(status);
+CREATE INDEX IF NOT EXISTS idx_tasks_created_at ON tasks(created_at);
+
+CREATE TABLE IF NOT EXISTS task_stages (
+    task_id TEXT NOT NULL,
+    stage TEXT NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    output_path TEXT,
+    PRIMARY KEY (task_id, stage)
+);
+
+CREATE TABLE IF NOT EXISTS task_events (
+    event_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    task_id TEXT NOT NULL,
+    event TEXT NOT NULL,
+    data TEXT,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_task_events_task ON task_events(task_id, event_id);
+
+CREATE TABLE IF NOT EXISTS uploads (
+    upload_id TEXT PRIMARY KEY,
+    filename TEXT NOT NULL,
+    size INTEGER,
+    received INTEGER NOT NULL DEFAULT 0,
+    status TEXT NOT NULL,
+    request TEXT NOT NULL,
+    sha256 TEXT,
+    task_id TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS workers (
+    worker_id TEXT PRIMARY KEY,
+    hostname TEXT NOT NULL,
+    capabilities TEXT NOT NULL,
+    started_at REAL NOT NULL,
+    heartbeat_at REAL NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS batches (
+    batch_id TEXT PRIMARY KEY,
+    request TEXT NOT NULL,
+    total INTEGER NOT NULL,
+    created_at REAL NOT NULL
+);
+"""
+
+# 後續版本新增的欄位，於開啟舊資料庫時補上
+_COLUMNS = {
+    "tasks": {
+        "priority": "INTEGER NOT NULL DEFAULT 0",
+        "started_at": "REAL",
+        "finished_at": "REAL",
+        "worker_id": "TEXT",
+        "batch_id": "TEXT",
+        "dedupe_key": "TEXT",
+        "cancel_requested_at": "REAL",
+        "lease_expires_at": "REAL",
+    },
+}
+
+_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS idx_tasks_queue ON tasks(status, priority DESC, created_at)",
+    "CREATE INDEX IF NOT EXISTS idx_tasks_batch ON tasks(batch_id)",
+    "CREATE INDEX IF NOT EXISTS idx_tasks_dedupe ON tasks(dedupe_key)",
+]
+
+FINISHED_STATUSES = ("completed", "failed", "cancelled")
+
+class TaskStore:
+    """
+    SQLite 任務儲存
+
+    每個執行緒 (與每個 fork 出來的行程) 各自持有連線；WAL 模式讓讀取不會被寫入阻塞，
+    因此多個 uvicorn worker 可同時存取同一個資料庫檔案。
+    """
+
+    def __init__(self, db_path: Path = None):
+        self.db_path = Path(db_path or config.TASK_DB_PATH)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+            self._migrate(conn)
+
+    @staticmethod
+    def _migrate(conn: sqlite3.Connection):
+        for table, columns in _COLUMNS.items():
+            existing = {row["name"] for row in conn.execute(f"PRAGMA table_info({table})")}
+            for name, definition in columns.items():
+                if name not in existing:
+                    conn.execute(f"ALTER TABLE {table} ADD COLUMN {name} {definition}")
+        for statement in _INDEXES:
+            conn.execute(statement)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            conn = sqlite3.connect(str(self.db_path), timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute(f"PRAGMA journal_mode={config.TASK_DB_JOURNAL_MODE}")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def create_task(self, task_id: str, request: Dict[str, Any], status: str = "pending", priority: int = 0,
+                    batch_id: Optional[str] = None, dedupe_key: Optional[str] = None):
+        now = time.time()
+        self._connect().execute(
+            "INSERT INTO tasks (task_id, status, request, priority, batch_id, dedupe_key, created_at, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (task_id, status, json.dumps(request, ensure_ascii=False), priority, batch_id, dedupe_key, now, now)
+        )
+
+    def enqueue_task(self, task_id: str, request: Dict[str, Any], priority: int = 0, max_depth: Optional[int] = None,
+                     dedupe_key: Optional[str] = None) -> bool:
+        """在佇列未滿時新增待處理任務；佇列已滿則回傳 False"""
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if max_depth is not None:
+                depth = conn.execute("SELECT COUNT(*) FROM tasks WHERE status = 'pending'").fetchone()[0]
+                if depth >= max_depth:
+                    conn.execute("ROLLBACK")
+                    return False
+            self.create_task(task_id, request, priority=priority, dedupe_key=dedupe_key)
+            conn.execute("COMMIT")
+            return True
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def enqueue_batch(self, batch_id: str, request: Dict[str, Any], items: List[Tuple[str, Dict[str, Any]]],
+                      priority: int = 0, max_depth: Optional[int] = None) -> bool:
+        """
+        一次加入整批任務 (全部成功或全部不加入)
+
+        批次只在佇列未滿時受理，受理後所有項目一併排入，不因批次大小而被部分拒絕。
+        """
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if max_depth is not None:
+                depth = conn.execute("SELECT COUNT(*) FROM tasks WHERE status = 'pending'").fetchone()[0]
+                if depth >= max_depth:
+                    conn.execute("ROLLBACK")
+                    return False
+            conn.execute(
+                "INSERT INTO batches (batch_id, request, total, created_at) VALUES (?, ?, ?, ?)",
+                (batch_id, json.dumps(request, ensure_ascii=False), len(items), time.time())
+            )
+            for task_id, item in items:
+                self.create_task(task_id, item, priority=priority, batch_id=batch_id)
+            conn.execute("COMMIT")
+            return True
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def find_duplicate(self, dedupe_key: str) -> Optional[Dict[str, Any]]:
+        """尋找相同內容與設定、已完成或仍在處理中的任務 (已完成者優先)"""
+        row = self._connect().execute(
+            "SELECT task_id FROM tasks WHERE dedupe_key = ? AND status IN ('pending', 'processing', 'completed') "
+            "ORDER BY status = 'completed' DESC, created_at DESC LIMIT 1",
+            (dedupe_key,)
+        ).fetchone()
+        return self.get_task(row["task_id"]) if row else None
+
+    def create_upload(self, upload_id: str, filename: str, request: Dict[str, Any], size: Optional[int] = None):
+        now = time.time()
+        self._connect().execute(
+            "INSERT INTO uploads (upload_id, filename, size, status, request, created_at, updated_at) "
+            "VALUES (?, ?, ?, 'uploading', ?, ?, ?)",
+            (upload_id, filename, size, json.dumps(request, ensure_ascii=False), now, now)
+        )
+
+    def get_upload(self, upload_id: str) -> Optional[Dict[str, Any]]:
+        row = self._connect().execute("SELECT * FROM uploads WHERE upload_id = ?", (upload_id,)).fetchone()
+        if row is None:
+            return None
+        upload = dict(row)
+        upload["request"] = json.loads(upload["request"])
+        return upload
+
+    def update_upload(self, upload_id: str, **fields):
+        """更新上傳狀態欄位 (received, status, sha256, task_id)"""
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        self._connect().execute(
+            f"UPDATE uploads SET {assignments}, updated_at = ? WHERE upload_id = ?",
+            (*fields.values(), time.time(), upload_id)
+        )
+
+    def claim_upload(self, upload_id: str, expected: str, status: str) -> bool:
+        """僅在上傳仍為 expected 狀態時改為 status；多個 API worker 同時處理時只有一個會成功"""
+        return self._connect().execute(
+            "UPDATE uploads SET status = ?, updated_at = ? WHERE upload_id = ? AND status = ?",
+            (status, time.time(), upload_id, expected)
+        ).rowcount == 1
+
+    def stale_uploads(self, ttl_seconds: float) -> List[str]:
+        """回傳超過保存期限仍未完成的上傳"""
+        rows = self._connect().execute(
+            "SELECT upload_id FROM uploads WHERE status != 'completed' AND updated_at < ?",
+            (time.time() - ttl_seconds,)
+        )
+        return [row["upload_id"] for row in rows]
+
+    def delete_upload(self, upload_id: str):
+        self._connect().execute("DELETE FROM uploads WHERE upload_id = ?", (upload_id,))
+
+    def get_batch(self, batch_id: str) -> Optional[Dict[str, Any]]:
+        """查詢批次與各項目的狀態、時間及已完成的階段"""
+        conn = self._connect()
+        row = conn.execute("SELECT * FROM batches WHERE batch_id = ?", (batch_id,)).fetchone()
+        if row is None:
+            return None
+        batch = dict(row)
+        batch["request"] = json.loads(batch["request"])
+        batch["tasks"] = [
+            dict(task) for task in conn.execute(
+                "SELECT task_id, status, error, created_at, started_at, finished_at FROM tasks "
+                "WHERE batch_id = ? ORDER BY created_at, rowid", (batch_id,)
+            )
+        ]
+        batch["stages"] = {
+            stage["stage"]: stage["count"] for stage in conn.execute(
+                "SELECT s.stage, COUNT(*) AS count FROM task_stages s JOIN tasks t ON t.task_id = s.task_id "
+                "WHERE t.batch_id = ? AND s.finished_at IS NOT NULL GROUP BY s.stage", (batch_id,)
+            )
+        }
+        return batch
+
+    def claim_next(self, worker_id: str, order: str = "priority", lease_seconds: Optional[float] = None,
+                   capabilities: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        """
+        取出下一個待處理任務並標記為處理中 (priority: 優先權高者先，同優先權先進先出；fifo: 僅依建立時間)
+
+        Args:
+            lease_seconds: 租約長度；持有者須在到期前續約，否則任務會被其他 worker 放回佇列
+            capabilities: 只取出 worker 能處理的任務 ({"transcribers": [...], "models": [...]}，None 表示不限)
+        """
+        order_by = "priority DESC, created_at, rowid" if order == "priority" else "created_at, rowid"
+        conditions = ["status = 'pending'"]
+        params: List[Any] = []
+        for field, key, default in (("transcribers", "transcriber", "fast"), ("models", "model", "openai")):
+            allowed = (capabilities or {}).get(field)
+            if allowed is not None:
+                conditions.append(
+                    f"COALESCE(json_extract(request, '$.{key}'), '{default}') IN ({', '.join('?' for _ in allowed) or 'NULL'})"
+                )
+                params.extend(allowed)
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            now = time.time()
+            self._requeue_expired_leases(conn, now)
+            row = conn.execute(
+                f"SELECT task_id FROM tasks WHERE {' AND '.join(conditions)} ORDER BY {order_by} LIMIT 1", params
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            conn.execute(
+                "UPDATE tasks SET status = 'processing', started_at = ?, worker_id = ?, lease_expires_at = ?, "
+                "updated_at = ? WHERE task_id = ?",
+                (now, worker_id, now + lease_seconds if lease_seconds else None, now, row["task_id"])
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return self.get_task(row["task_id"])
+
+    def _requeue_expired_leases(self, conn: sqlite3.Connection, now: float) -> List[str]:
+        """將租約已過期 (持有的 worker 當機或失聯) 的任務放回佇列；須在交易中呼叫"""
+        expired = [(row["task_id"], row["worker_id"]) for row in conn.execute(
+            "SELECT task_id, worker_id FROM tasks WHERE status = 'processing' AND lease_expires_at < ?", (now,)
+        )]
+        for task_id, worker_id in expired:
+            if not self.requeue_task(task_id, worker_id=worker_id):
+                continue
+            print(f"任務 {task_id} 的租約已過期，重新放回佇列")
+            status = conn.execute("SELECT status FROM tasks WHERE task_id = ?", (task_id,)).fetchone()["status"]
+            self.add_event(task_id, "status", {"status": status, "requeued": True})
+        return [task_id for task_id, _ in expired]
+
+    def renew_leases(self, worker_id: str, task_ids: List[str], lease_seconds: float) -> List[str]:
+        """延長 worker 持有任務的租約，回傳仍由該 worker 持有的任務"""
+        if not task_ids:
+            return []
+        placeholders = ", ".join("?" for _ in task_ids)
+        conn = self._connect()
+        conn.execute(
+            f"UPDATE tasks SET lease_expires_at = ? WHERE task_id IN ({placeholders}) "
+            "AND status = 'processing' AND worker_id = ?",
+            (time.time() + lease_seconds, *task_ids, worker_id)
+        )
+        rows = conn.execute(
+            f"SELECT task_id FROM tasks WHERE task_id IN ({placeholders}) AND status = 'processing' AND worker_id = ?",
+            (*task_ids, worker_id)
+        )
+        return [row["task_id"] for row in rows]
+
+    def register_worker(self, worker_id: str, hostname: str, capabilities: Dict[str, Any]):
+        """登記或更新 worker 的心跳與能力 (轉錄器、後端、模型)"""
+        now = time.time()
+        self._connect().execute(
+            "INSERT INTO workers (worker_id, hostname, capabilities, started_at, heartbeat_at) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT(worker_id) DO UPDATE SET capabilities = excluded.capabilities, heartbeat_at = excluded.heartbeat_at",
+            (worker_id, hostname, json.dumps(capabilities, ensure_ascii=False), now, now)
+        )
+
+    def unregister_worker(self, worker_id: str):
+        self._connect().execute("DELETE FROM workers WHERE worker_id = ?", (worker_id,))
+
+    def list_workers(self, max_age: Optional[float] = None) -> List[Dict[str, Any]]:
+        """列出心跳在 max_age 秒內的 worker 與各自處理中的任務數"""
+        cutoff = time.time() - max_age if max_age is not None else 0
+        rows = self._connect().execute(
+            "SELECT w.*, (SELECT COUNT(*) FROM tasks t WHERE t.worker_id = w.worker_id AND t.status = 'processing') "
+            "AS active_tasks FROM workers w WHERE heartbeat_at >= ? ORDER BY hostname, worker_id",
+            (cutoff,)
+        )
+        return [dict(row, capabilities=json.loads(row["capabilities"])) for row in rows]
+
+    def requeue_task(self, task_id: str, worker_id: Optional[str] = None) -> bool:
+        """
+        放回待處理佇列；已請求取消的任務直接標記為已取消
+
+        指定 worker_id 時只放回仍由該 worker 處理中的任務 (已被其他 worker 接手則不動)，回傳是否已放回。
+        """
+        now = time.time()
+        query = (
+            "UPDATE tasks SET status = CASE WHEN cancel_requested_at IS NULL THEN 'pending' ELSE 'cancelled' END, "
+            "finished_at = CASE WHEN cancel_requested_at IS NULL THEN NULL ELSE ? END, "
+            "started_at = NULL, worker_id = NULL, lease_expires_at = NULL, updated_at = ? WHERE task_id = ?"
+        )
+        params: List[Any] = [now, now, task_id]
+        if worker_id is not None:
+            query += " AND worker_id = ? AND status = 'processing'"
+            params.append(worker_id)
+        return self._connect().execute(query, params).rowcount == 1
+
+    def request_cancel(self, task_id: str) -> Optional[str]:
+        """
+        請求取消任務，回傳取消後的狀態 (任務不存在時回傳 None)
+
+        待處理的任務直接標記為 cancelled；處理中的任務記錄取消請求，
+        由持有該任務的 worker 中止進行中的步驟後標記為 cancelled。
+        """
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT status FROM tasks WHERE task_id = ?", (task_id,)).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            status = row["status"]
+            now = time.time()
+            if status == "pending":
+                status = "cancelled"
+                conn.execute(
+                    "UPDATE tasks SET status = 'cancelled', cancel_requested_at = ?, finished_at = ?, updated_at = ? "
+                    "WHERE task_id = ?",
+                    (now, now, now, task_id)
+                )
+                self.add_event(task_id, "status", {"status": "cancelled", "result": None, "error": None})
+            elif status == "processing":
+                conn.execute(
+                    "UPDATE tasks SET cancel_requested_at = COALESCE(cancel_requested_at, ?), updated_at = ? WHERE task_id = ?",
+                    (now, now, task_id)
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return status
+
+    def cancel_requested(self, task_ids: List[str]) -> List[str]:
+        """傳回其中已請求取消且仍在處理中的任務"""
+        if not task_ids:
+            return []
+        placeholders = ", ".join("?" for _ in task_ids)
+        rows = self._connect().execute(
+            f"SELECT task_id FROM tasks WHERE task_id IN ({placeholders}) "
+            "AND status = 'processing' AND cancel_requested_at IS NOT NULL",
+            list(task_ids)
+        )
+        return [row["task_id"] for row in rows]
+
+    def processing_tasks(self) -> List[Dict[str, Any]]:
+        rows = self._connect().execute("SELECT task_id, worker_id, started_at FROM tasks WHERE status = 'processing'")
+        return [dict(row) for row in rows]
+
+    def queue_depth(self) -> int:
+        return self._connect().execute("SELECT COUNT(*) FROM tasks WHERE status = 'pending'").fetchone()[0]
+
+    def queue_position(self, task: Dict[str, Any], order: str = "priority") -> int:
+        """任務在待處理佇列中的位置 (0 表示下一個被取出)"""
+        if order == "priority":
+            query = ("SELECT COUNT(*) FROM tasks WHERE status = 'pending' AND "
+                     "(priority > ? OR (priority = ? AND created_at < ?))")
+            params = (task["priority"], task["priority"], task["created_at"])
+        else:
+            query = "SELECT COUNT(*) FROM tasks WHERE status = 'pending' AND created_at < ?"
+            params = (task["created_at"],)
+        return self._connect().execute(query, params).fetchone()[0]
+
+    def update_status(self, task_id: str, status: str, result: Optional[Dict[str, Any]] = None, error: Optional[str] = None,
+                      worker_id: Optional[str] = None) -> bool:
+        """
+        更新任務狀態並記錄對應的 status 事件 (同一交易)，回傳是否已更新
+
+        worker 寫入結果時應傳入自己的 worker_id：租約過期後任務若已被其他 worker 接手，
+        舊 worker 的結果不會覆寫新持有者的狀態 (回傳 False，應視為已失去任務)。
+        事件串流看到結束狀態時，最終的 status 事件也已寫入。
+        """
+        now = time.time()
+        query = (
+            "UPDATE tasks SET status = ?, result = COALESCE(?, result), error = COALESCE(?, error), updated_at = ?, "
+            "finished_at = ? WHERE task_id = ?"
+        )
+        params: List[Any] = [status, json.dumps(result, ensure_ascii=False) if result is not None else None, error, now,
+                             now if status in FINISHED_STATUSES else None, task_id]
+        if worker_id is not None:
+            query += " AND worker_id = ? AND status = 'processing'"
+            params.append(worker_id)
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            updated = conn.execute(query, params).rowcount == 1
+            if updated:
+                self.add_event(task_id, "status", {"status": status, "result": result, "error": error})
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return updated
+
+    def start_stage(self, task_id: str, stage: str):
+        self._connect().execute(
+            "INSERT OR REPLACE INTO task_stages (task_id, stage, started_at) VALUES (?, ?, ?)",
+            (task_id, stage, time.time())
+        )
+
+    def finish_stage(self, task_id: str, stage: str, output_path: Optional[str] = None):
+        now = time.time()
+        conn = self._connect()
+        updated = conn.execute(
+            "UPDATE task_stages SET finished_at = ?, output_path = ? WHERE task_id = ? AND stage = ?",
+            (now, output_path, task_id, stage)
+        ).rowcount
+        if not updated:
+            conn.execute(
+                "INSERT INTO task_stages (task_id, stage, started_at, finished_at, output_path) VALUES (?, ?, ?, ?, ?)",
+                (task_id, stage, now, now, output_path)
+            )
+
+    def add_event(self, task_id: str, event: str, data: Optional[Dict[str, Any]] = None) -> int:
+        """記錄任務進度事件 (階段切換、下載百分比、轉錄片段等)，回傳事件編號"""
+        return self._connect().execute(
+            "INSERT INTO task_events (task_id, event, data, created_at) VALUES (?, ?, ?, ?)",
+            (task_id, event, json.dumps(data or {}, ensure_ascii=False), time.time())
+        ).lastrowid
+
+    def events_since(self, task_id: str, after_id: int = 0, limit: int = 500) -> List[Dict[str, Any]]:
+        """取得編號大於 after_id 的事件，供串流端點續傳"""
+        rows = self._connect().execute(
+            "SELECT event_id, event, data, created_at FROM task_events WHERE task_id = ? AND event_id > ? "
+            "ORDER BY event_id LIMIT ?",
+            (task_id, after_id, limit)
+        )
+        return [
+            {"event_id": row["event_id"], "event": row["event"], "data": json.loads(row["data"] or "{}"), "created_at": row["created_at"]}
+            for row in rows
+        ]
+
+    def get_task(self, task_id: str) -> Optional[Dict[str, Any]]:
+        """以主鍵查詢任務，並附上各階段時間與輸出路徑"""
+        conn = self._connect()
+        row = conn.execute("SELECT * FROM tasks WHERE task_id = ?", (task_id,)).fetchone()
+        if row is None:
+            return None
+        task = dict(row)
+        task["request"] = json.loads(task["request"])
+        task["result"] = json.loads(task["result"]) if task["result"] else None
+        task["stages"] = {
+            stage["stage"]: {
+                "started_at": stage["started_at"],
+                "finished_at": stage["finished_at"],
+                "duration": stage["finished_at"] - stage["started_at"] if stage["finished_at"] and stage["started_at"] else None,
+                "output_path": stage["output_path"],
+            }
+            for stage in conn.execute(
+                "SELECT * FROM task_stages WHERE task_id = ? ORDER BY started_at", (task_id,)
+            )
+        }
+        return task
+
+    def list_tasks(self, status: Optional[str] = None, limit: int = 100) -> List[Dict[str, Any]]:
+        conn = self._connect()
+        if status:
+            rows = conn.execute(
+                "SELECT task_id, status, created_at, updated_at FROM tasks WHERE status = ? ORDER BY created_at DESC LIMIT ?",
+                (status, limit)
+            )
+        else:
+            rows = conn.execute(
+                "SELECT task_id, status, created_at, updated_at FROM tasks ORDER BY created_at DESC LIMIT ?", (limit,)
+            )
+        return [dict(row) for row in rows]
+
+    def count_by_status(self) -> Dict[str, int]:
+        rows = self._connect().execute("SELECT status, COUNT(*) AS count FROM tasks GROUP BY status")
+        return {row["status"]: row["count"] for row in rows}
+
+    def cleanup_expired(self, ttl_seconds: float = None) -> int:
+        """刪除超過保存期限且已結束的任務，回傳刪除筆數"""
+        ttl_seconds = config.TASK_TTL_HOURS * 3600 if ttl_seconds is None else ttl_seconds
+        cutoff = time.time() - ttl_seconds
+        placeholders = ", ".join("?" for _ in FINISHED_STATUSES)
+        # 保存期限自任務結束起算 (舊資料沒有 finished_at 時以最後更新時間代替)，排隊或處理很久的任務結束後仍可查詢
+        expired = f"COALESCE(finished_at, updated_at) < ? AND status IN ({placeholders})"
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for table in ("task_stages", "task_events"):
+                conn.execute(
+                    f"DELETE FROM {table} WHERE task_id IN (SELECT task_id FROM tasks WHERE {expired})",
+                    (cutoff, *FINISHED_STATUSES)
+                )
+            deleted = conn.execute(f"DELETE FROM tasks WHERE {expired}", (cutoff, *FINISHED_STATUSES)).rowcount
+            conn.execute("DELETE FROM uploads WHERE status = 'completed' AND updated_at < ?", (cutoff,))
+            conn.execute("DELETE FROM workers WHERE heartbeat_at < ?", (cutoff,))
+            conn.execute(
+                "DELETE FROM batches WHERE created_at < ? AND NOT EXISTS "
+                "(SELECT 1 FROM tasks WHERE tasks.batch_id = batches.batch_id)",
+                (cutoff,)
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return deleted
@@ -0,0 +1,285 @@
+# -*- coding: utf-8 -*-
+"""
+音檔上傳 - 以固定大小區塊串流寫入磁碟，邊上傳邊計算雜湊，支援續傳與重複內容去重
+"""
+import asyncio
+import hashlib
+import os
+import uuid
+from pathlib import Path
+from typing import Optional, Dict, Any, AsyncIterator, Tuple, BinaryIO
+
+try:
+    import fcntl
+except ImportError:  # Windows：不鎖定，同一上傳的並行請求需由用戶端避免
+    fcntl = None
+from .config import config
+from .task_store import TaskStore
+from .job_queue import JobQueue
+from .metrics import metrics
+
+class UploadError(Exception):
+    """上傳請求無效；status_code 對應 HTTP 狀態碼"""
+
+    def __init__(self, message: str, status_code: int = 400, offset: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.offset = offset
+
+def dedupe_key(sha256: str, request: Dict[str, Any]) -> str:
+    """相同音檔且相同轉錄與筆記設定才視為重複"""
+    return ":".join([sha256, request.get("model", "openai"), request.get("transcriber", "fast"), request.get("language") or ""])
+
+class UploadManager:
+    """
+    可續傳的音檔上傳
+
+    上傳流程：建立上傳 → 以 Upload-Offset 依序送出內容 (可中斷後從目前位置續傳) → 完成。
+    完成時依內容雜湊尋找已處理過的相同音檔，找到則直接回傳既有任務，否則建立新任務。
+    部分檔案的大小即為目前位置，因此任何 API worker 都能接續同一個上傳；
+    寫入期間以 flock 鎖定部分檔案，同一上傳的並行請求 (即使在不同 worker 行程) 會收到 409。
+    """
+
+    def __init__(self, store: TaskStore, job_queue: JobQueue, upload_dir: Path = None):
+        self.store = store
+        self.job_queue = job_queue
+        self.upload_dir = Path(upload_dir or config.UPLOAD_DIR)
+        self.partial_dir = self.upload_dir / "partial"
+        self.partial_dir.mkdir(parents=True, exist_ok=True)
+        # 各上傳目前的雜湊狀態 (僅存在本行程；遺失時由部分檔案重新計算)
+        self._hashers: Dict[str, Tuple[int, Any]] = {}
+
+    def _partial_path(self, upload_id: str) -> Path:
+        return self.partial_dir / upload_id
+
+    def _target_path(self, upload: Dict[str, Any]) -> Path:
+        return self.upload_dir / f"{upload['sha256']}{Path(upload['filename']).suffix.lower()}"
+
+    def _received(self, upload_id: str) -> int:
+        path = self._partial_path(upload_id)
+        return path.stat().st_size if path.exists() else 0
+
+    def _lock_partial(self, upload_id: str) -> Optional[BinaryIO]:
+        """
+        開啟部分檔案並取得排他鎖 (關閉檔案即釋放)
+
+        部分檔案已被完成的上傳移走時回傳 None；其他請求正在寫入時拋出 409。
+        """
+        path = self._partial_path(upload_id)
+        try:
+            # 不建立檔案：部分檔案只在 create 時建立
+            f = os.fdopen(os.open(path, os.O_WRONLY | os.O_APPEND), "ab")
+        except FileNotFoundError:
+            return None
+        try:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            # 取得鎖之前檔案可能已被完成的上傳移走，此時開啟的是已移走的檔案
+            try:
+                moved = not os.path.samestat(os.fstat(f.fileno()), os.stat(path))
+            except FileNotFoundError:
+                moved = True
+            if moved:
+                f.close()
+                return None
+        except BlockingIOError:
+            f.close()
+            raise UploadError("Upload is in progress in another request.", status_code=409, offset=self._received(upload_id))
+        except Exception:
+            f.close()
+            raise
+        return f
+
+    def _get_upload(self, upload_id: str) -> Dict[str, Any]:
+        upload = self.store.get_upload(upload_id)
+        if upload is None:
+            raise UploadError("Upload ID not found", status_code=404)
+        return upload
+
+    def describe(self, upload: Dict[str, Any], duplicate: bool = False) -> Dict[str, Any]:
+        task = self.store.get_task(upload["task_id"]) if upload.get("task_id") else None
+        return {
+            "upload_id": upload["upload_id"],
+            "filename": upload["filename"],
+            "status": upload["status"],
+            "offset": self._received(upload["upload_id"]) if upload["status"] == "uploading" else upload["received"],
+            "size": upload["size"],
+            "sha256": upload["sha256"],
+            "task_id": upload["task_id"],
+            "task_status": task["status"] if task else None,
+            "result": task["result"] if task else None,
+            "duplicate": duplicate,
+        }
+
+    def create(self, filename: str, request: Dict[str, Any], size: Optional[int] = None,
+               sha256: Optional[str] = None) -> Dict[str, Any]:
+        """
+        建立上傳；若用戶端事先提供 sha256 且已有相同音檔的任務，直接回傳該任務而不需上傳
+
+        Args:
+            filename: 原始檔名 (用於保留副檔名)
+            request: 處理設定 (model, transcriber, language, priority)
+            size: 檔案大小；提供時收到最後一個位元組即自動完成
+            sha256: 用戶端計算的內容雜湊
+        """
+        if size is not None and config.UPLOAD_MAX_BYTES and size > config.UPLOAD_MAX_BYTES:
+            raise UploadError(f"File exceeds {config.UPLOAD_MAX_BYTES} bytes.", status_code=413)
+        upload_id = str(uuid.uuid4())
+        self.store.create_upload(upload_id, Path(filename).name or "audio", request, size=size)
+        if sha256:
+            duplicate = self._find_duplicate(dedupe_key(sha256.lower(), request))
+            if duplicate:
+                self.store.update_upload(upload_id, status="completed", sha256=sha256.lower(), task_id=duplicate["task_id"])
+                return self.describe(self._get_upload(upload_id), duplicate=True)
+        # 部分檔案在建立時即存在，之後只開啟不建立，完成後移走的檔案不會被其他請求重新建立
+        self._partial_path(upload_id).touch()
+        return self.describe(self._get_upload(upload_id))
+
+    def status(self, upload_id: str) -> Dict[str, Any]:
+        return self.describe(self._get_upload(upload_id))
+
+    async def append(self, upload_id: str, offset: int, body: AsyncIterator[bytes]) -> Dict[str, Any]:
+        """
+        從 offset 續寫上傳內容；offset 必須等於目前已接收的大小
+
+        內容以 UPLOAD_CHUNK_SIZE 為單位寫入磁碟並更新雜湊，不會把整個檔案留在記憶體。
+        """
+        loop = asyncio.get_running_loop()
+        upload, f, hasher = await loop.run_in_executor(None, self._begin_append, upload_id, offset)
+        received = offset
+        limit = upload["size"] if upload["size"] is not None else config.UPLOAD_MAX_BYTES
+        buffer = bytearray()
+        try:
+            async for data in body:
+                buffer.extend(data)
+                if limit and received + len(buffer) > limit:
+                    raise UploadError(f"Upload exceeds {limit} bytes.", status_code=413, offset=received)
+                while len(buffer) >= config.UPLOAD_CHUNK_SIZE:
+                    chunk = bytes(buffer[:config.UPLOAD_CHUNK_SIZE])
+                    del buffer[:config.UPLOAD_CHUNK_SIZE]
+                    await loop.run_in_executor(None, self._write, f, hasher, chunk)
+                    received += len(chunk)
+        finally:
+            # 連線中斷時也保留已收到的內容，讓用戶端從目前位置續傳
+            if buffer and not (limit and received + len(buffer) > limit):
+                await loop.run_in_executor(None, self._write, f, hasher, bytes(buffer))
+                received += len(buffer)
+            self._hashers[upload_id] = (received, hasher)
+            await loop.run_in_executor(None, self._end_append, upload_id, f, received)
+
+        if upload["size"] is not None and received == upload["size"]:
+            return await self.complete(upload_id)
+        return await loop.run_in_executor(None, self.status, upload_id)
+
+    def _begin_append(self, upload_id: str, offset: int) -> Tuple[Dict[str, Any], BinaryIO, Any]:
+        """鎖定部分檔案並確認 offset；回傳 (上傳資料, 已鎖定的檔案, 雜湊狀態)"""
+        upload = self._get_upload(upload_id)
+        f = self._lock_partial(upload_id) if upload["status"] == "uploading" else None
+        if f is None:
+            upload = self._get_upload(upload_id)
+            raise UploadError("Upload is already complete.", status_code=409, offset=upload["received"])
+        try:
+            received = os.fstat(f.fileno()).st_size
+            if offset != received:
+                raise UploadError(f"Upload offset mismatch: expected {received}.", status_code=409, offset=received)
+            return upload, f, self._hasher(upload_id, received)
+        except Exception:
+            f.close()
+            raise
+
+    def _end_append(self, upload_id: str, f: BinaryIO, received: int):
+        try:
+            self.store.update_upload(upload_id, received=received)
+        finally:
+            f.close()
+
+    @staticmethod
+    def _write(f, hasher, chunk: bytes):
+        f.write(chunk)
+        hasher.update(chunk)
+
+    def _hasher(self, upload_id: str, received: int):
+        """取得與已接收內容一致的雜湊狀態；不一致時由部分檔案重新計算"""
+        cached = self._hashers.get(upload_id)
+        if cached and cached[0] == received:
+            return cached[1]
+        hasher = hashlib.sha256()
+        path = self._partial_path(upload_id)
+        if path.exists():
+            with open(path, "rb") as f:
+                for chunk in iter(lambda: f.read(config.UPLOAD_CHUNK_SIZE), b""):
+                    hasher.update(chunk)
+        return hasher
+
+    async def complete(self, upload_id: str) -> Dict[str, Any]:
+        """完成上傳：相同音檔已處理過則回傳既有任務，否則建立轉錄任務 (佇列已滿時拋出 QueueFullError，可稍後重試)"""
+        return await asyncio.get_running_loop().run_in_executor(None, self._complete, upload_id)
+
+    def _complete(self, upload_id: str) -> Dict[str, Any]:
+        upload = self._get_upload(upload_id)
+        if upload["status"] == "uploading":
+            f = self._lock_partial(upload_id)
+            if f is None:
+                # 另一個請求剛完成上傳並移走部分檔案
+                upload = self._get_upload(upload_id)
+                if upload["status"] == "uploading":
+                    raise UploadError("Upload is being completed by another request.", status_code=409,
+                                      offset=upload["received"])
+            else:
+                with f:
+                    received = os.fstat(f.fileno()).st_size
+                    if upload["size"] is not None and received != upload["size"]:
+                        raise UploadError(f"Upload incomplete: {received}/{upload['size']} bytes.", status_code=409, offset=received)
+                    if received == 0:
+                        raise UploadError("Upload is empty.", status_code=400, offset=0)
+                    hasher = self._hasher(upload_id, received)
+                    upload.update(sha256=hasher.hexdigest(), received=received, status="uploaded")
+                    self._store_file(upload)
+                    self.store.update_upload(upload_id, status="uploaded", sha256=upload["sha256"], received=received)
+                    self._hashers.pop(upload_id, None)
+
+        # 以條件式更新取得建立任務的權利，避免多個 worker 為同一上傳重複建立任務
+        if upload["status"] != "uploaded" or not self.store.claim_upload(upload_id, "uploaded", "submitting"):
+            return self.describe(self._get_upload(upload_id))
+        try:
+            key = dedupe_key(upload["sha256"], upload["request"])
+            duplicate = self._find_duplicate(key)
+            if duplicate:
+                print(f"上傳 {upload_id} 與任務 {duplicate['task_id']} 內容相同，略過重新處理")
+                self.store.update_upload(upload_id, status="completed", task_id=duplicate["task_id"])
+                return self.describe(self._get_upload(upload_id), duplicate=True)
+
+            request = dict(upload["request"], audio_path=str(self._target_path(upload)))
+            task_id = self.job_queue.submit(request, priority=request.get("priority", 0), dedupe_key=key)
+        except Exception:
+            # 佇列已滿等失敗時恢復狀態，讓用戶端可重試 complete
+            self.store.update_upload(upload_id, status="uploaded")
+            raise
+        self.store.update_upload(upload_id, status="completed", task_id=task_id)
+        return self.describe(self._get_upload(upload_id))
+
+    def _find_duplicate(self, key: str) -> Optional[Dict[str, Any]]:
+        duplicate = self.store.find_duplicate(key)
+        metrics.inc("videotonote_cache_requests_total", cache="dedupe", result="hit" if duplicate else "miss")
+        return duplicate
+
+    def _store_file(self, upload: Dict[str, Any]):
+        """依內容雜湊命名保存，相同內容只保留一份"""
+        partial = self._partial_path(upload["upload_id"])
+        target = self._target_path(upload)
+        if target.exists():
+            partial.unlink()
+        else:
+            os.replace(partial, target)
+
+    def cleanup_stale(self, ttl_seconds: float = None) -> int:
+        """刪除超過保存期限仍未完成的上傳與其部分檔案"""
+        ttl_seconds = config.UPLOAD_TTL_HOURS * 3600 if ttl_seconds is None else ttl_seconds
+        stale = self.store.stale_uploads(ttl_seconds)
+        for upload_id in stale:
+            path = self._partial_path(upload_id)
+            if path.exists():
+                path.unlink()
+            self._hashers.pop(upload_id, None)
+            self.store.delete_upload(upload_id)
+        return len(stale)
@@ -0,0 +1,265 @@
+# -*- coding: utf-8 -*-
+"""
+非同步筆記生成服務 - 以 asyncio 並行處理多份逐字稿
+"""
+import asyncio
+import time
+import httpx
+import google.generativeai as genai
+from openai import AsyncOpenAI
+from pathlib import Path
+from typing import Optional, Dict, Any, List
+from abc import abstractmethod
+from ..core.config import config
+from .notes_generator import BaseNotesGenerator, OllamaGenerator, configure_gemini
+from .rate_limiter import get_rate_limiter, acall_with_retry
+from .transcript_compactor import compact_transcription
+from .token_estimator import estimate_batch, print_batch_estimate
+
+class AsyncBaseNotesGenerator(BaseNotesGenerator):
+    """非同步筆記生成器基底類別，同時保留同步的 generate_notes 介面"""
+
+    @abstractmethod
+    async def _arequest(self, full_prompt: str) -> str:
+        """送出單一請求並回傳模型輸出"""
+        pass
+
+    def _make_client(self):
+        """建立非同步用戶端 (無用戶端的供應商回傳 None)"""
+        return None
+
+    @property
+    def client(self):
+        """
+        目前事件迴圈專用的用戶端
+
+        用戶端的連線池綁定建立時的事件迴圈，換到新的事件迴圈 (例如另一次 asyncio.run) 時重新建立。
+        """
+        loop = asyncio.get_running_loop()
+        if getattr(self, "_client_loop", None) is not loop:
+            self._client = self._make_client()
+            self._client_loop = loop
+        return self._client
+
+    def _request(self, full_prompt: str) -> str:
+        async def request() -> str:
+            try:
+                return await self._arequest(full_prompt)
+            finally:
+                await self.aclose()
+        return asyncio.run(request())
+
+    async def agenerate_notes(self, transcription: Dict[str, Any], prompt: str = None) -> Optional[str]:
+        """從轉錄結果非同步生成筆記（經供應商限流，暫時性錯誤會退避重試；超出上下文時各段並行生成再整合）"""
+        try:
+            budget = self.plan(transcription, prompt)
+            if budget.mode == "single":
+                return await self._acall(self._get_full_prompt(transcription, prompt))
+
+            print(f"{self.display_name}: {budget.describe()}")
+            sections = self.token_estimator.split_text(self._get_text(transcription), budget.input_budget)
+            partial_notes = await asyncio.gather(*(
+                self._acall(self._get_section_prompt(section, index, len(sections)))
+                for index, section in enumerate(sections, 1)
+            ))
+            while True:
+                groups = self._group_partial_notes(list(partial_notes), budget.input_budget)
+                if len(groups) == 1:
+                    return await self._acall(self._get_merge_prompt(groups[0], prompt))
+                partial_notes = await asyncio.gather(*(
+                    self._acall(self._get_merge_prompt(group, final=False)) for group in groups
+                ))
+        except Exception as e:
+            print(f"生成筆記時發生錯誤 ({self.display_name}): {e}")
+            return None
+
+    async def _acall(self, full_prompt: str) -> str:
+        prompt_tokens = self.token_estimator.count(full_prompt)
+        started = time.monotonic()
+        output = await acall_with_retry(
+            get_rate_limiter(self.provider),
+            prompt_tokens,
+            lambda: self._arequest(full_prompt)
+        )
+        self._record_usage(prompt_tokens, output, time.monotonic() - started)
+        return output
+
+    async def aclose(self):
+        """釋放目前事件迴圈用戶端的連線；之後的請求會建立新的用戶端"""
+        client = getattr(self, "_client", None)
+        if client is not None and getattr(self, "_client_loop", None) is asyncio.get_running_loop():
+            await self._close_client(client)
+        self._client = self._client_loop = None
+
+    async def _close_client(self, client):
+        await client.close()
+
+class AsyncOpenAIGenerator(AsyncBaseNotesGenerator):
+    provider = "openai"
+    display_name = "OpenAI"
+
+    def __init__(self, api_key: str = None):
+        self.api_key = api_key or config.OPENAI_API_KEY
+        if not self.api_key:
+            raise ValueError("OpenAI API Key not found.")
+        self.base_url = config.OPENAI_BASE_URL
+        self.model_name = config.OPENAI_MODEL
+
+    def _make_client(self):
+        return AsyncOpenAI(api_key=self.api_key, base_url=self.base_url, max_retries=0)
+
+    async def _arequest(self, full_prompt: str) -> str:
+        response = await self.client.chat.completions.create(
+            model=self.model_name,
+            messages=[
+                {"role": "system", "content": "你是一個專業的筆記整理專家"},
+                {"role": "user", "content": full_prompt}
+            ]
+        )
+        return response.choices[0].message.content
+
+class AsyncDeepSeekGenerator(AsyncOpenAIGenerator):
+    provider = "deepseek"
+    display_name = "DeepSeek"
+
+    def __init__(self, api_key: str = None):
+        self.api_key = api_key or config.DEEPSEEK_API_KEY
+        if not self.api_key:
+            raise ValueError("DeepSeek API Key not found.")
+        self.base_url = config.DEEPSEEK_BASE_URL
+        self.model_name = config.DEEPSEEK_MODEL
+
+class AsyncGeminiGenerator(AsyncBaseNotesGenerator):
+    provider = "gemini"
+    display_name = "Gemini"
+
+    def __init__(self, api_key: str = None):
+        self.api_key = api_key or config.GEMINI_API_KEY
+        if not self.api_key:
+            raise ValueError("Gemini API Key not found.")
+        configure_gemini(self.api_key)
+        self.model_name = config.GEMINI_MODEL
+
+    async def _arequest(self, full_prompt: str) -> str:
+        model = genai.GenerativeModel(self.model_name)
+        response = await model.generate_content_async(full_prompt)
+        return response.text
+
+class AsyncOllamaGenerator(AsyncBaseNotesGenerator, OllamaGenerator):
+    provider = "ollama"
+    display_name = "Ollama"
+
+    def __init__(self, preload: bool = None):
+        OllamaGenerator.__init__(self, preload=preload)
+
+    def _make_client(self):
+        # 本地推論可能耗時數分鐘，不設定讀取逾時
+        return httpx.AsyncClient(timeout=httpx.Timeout(None, connect=10.0))
+
+    async def _arequest(self, full_prompt: str) -> str:
+        response = await self.client.post(self.api_url, json=self._build_payload(full_prompt))
+        response.raise_for_status()
+        data = response.json()
+        self._report_timings(data)
+        return data.get('response', '')
+
+    async def _close_client(self, client):
+        await client.aclose()
+
+class AsyncNotesGeneratorFactory:
+    @staticmethod
+    def create(model_choice: str = 'openai', api_key: Optional[str] = None) -> AsyncBaseNotesGenerator:
+        model_choice = model_choice.lower()
+        if model_choice == 'openai':
+            return AsyncOpenAIGenerator(api_key=api_key)
+        elif model_choice == 'deepseek':
+            return AsyncDeepSeekGenerator(api_key=api_key)
+        elif model_choice == 'gemini':
+            return AsyncGeminiGenerator(api_key=api_key)
+        elif model_choice == 'ollama':
+            return AsyncOllamaGenerator()
+        else:
+            raise ValueError(f"Unsupported model choice: {model_choice}")
+
+class AsyncBatchNotesGenerator:
+    """在並行上限內同時為多份逐字稿生成筆記"""
+
+    def __init__(self, generator: AsyncBaseNotesGenerator, concurrency: int = None):
+        self.generator = generator
+        self.concurrency = max(1, concurrency or config.NOTES_CONCURRENCY)
+
+    async def agenerate_batch(self, transcription_paths: List[Path], prompt: str = None) -> Dict[str, Optional[str]]:
+        """
+        並行處理多份逐字稿並保存筆記
+
+        Args:
+            transcription_paths: 逐字稿檔案路徑列表
+            prompt: 自訂提示詞
+
+        Returns:
+            逐字稿路徑對應筆記保存路徑的字典，失敗者為 None
+        """
+        semaphore = asyncio.Semaphore(self.concurrency)
+        total = len(transcription_paths)
+        done = 0
+
+        async def _run(path: Path) -> Optional[str]:
+            nonlocal done
+            async with semaphore:
+                loop = asyncio.get_running_loop()
+                transcription = await loop.run_in_executor(None, self._load_transcription, path)
+                notes = await self.generator.agenerate_notes(transcription, prompt)
+                output_path = None
+                if notes:
+                    output_path = await loop.run_in_executor(None, self.generator.save_notes, notes, str(path))
+                done += 1
+                print(f"[{done}/{total}] {'完成' if output_path else '失敗'}: {path.name}")
+                return output_path
+
+        results = await asyncio.gather(*(_run(path) for path in transcription_paths))
+
+        stats = get_rate_limiter(self.generator.provider).stats()
+        print(
+            f"限流統計 ({stats['provider']}): 請求 {stats['requests']} 次，被節流 {stats['throttled']} 次，"
+            f"平均排隊 {stats['avg_wait']:.2f}s，最長排隊 {stats['max_wait']:.2f}s，"
+            f"429 次數 {stats['rate_limited']}，重試 {stats['retries']} 次，最終失敗 {stats['failures']} 次"
+        )
+        return {str(path): result for path, result in zip(transcription_paths, results)}
+
+    @staticmethod
+    def _load_transcription(path: Path) -> Dict[str, Any]:
+        """讀取逐字稿，並依設定先行精簡"""
+        transcription = {"text": path.read_text(encoding='utf-8')}
+        if config.COMPACT_TRANSCRIPT:
+            transcription, stats = compact_transcription(transcription)
+            print(f"{path.name}: {stats.summary()}")
+        return transcription
+
+    def generate_batch(self, transcription_paths: List[Path], prompt: str = None) -> Dict[str, Optional[str]]:
+        async def run() -> Dict[str, Optional[str]]:
+            try:
+                return await self.agenerate_batch(transcription_paths, prompt)
+            finally:
+                # 用戶端綁定這次 asyncio.run 的事件迴圈，須在迴圈結束前關閉；下次呼叫會建立新的用戶端
+                await self.generator.aclose()
+        return asyncio.run(run())
+
+    def estimate(self, transcription_paths: List[Path], prompt: str = None) -> Dict[str, Any]:
+        """在送出請求前預估整批的 token、成本與完成時間"""
+        texts = [(path.name, path.read_text(encoding='utf-8')) for path in transcription_paths]
+        if config.COMPACT_TRANSCRIPT:
+            texts = [(name, compact_transcription({"text": text})[0]['text']) for name, text in texts]
+        return estimate_batch(texts, self.generator.provider, self.generator.model_name, prompt, self.concurrency)
+
+    def generate_directory(self, directory: str, pattern: str = "*_transcription*.txt", prompt: str = None,
+                           estimate_only: bool = False) -> Dict[str, Optional[str]]:
+        """為資料夾中所有符合樣式的逐字稿生成筆記"""
+        transcription_paths = sorted(Path(directory).glob(pattern))
+        if not transcription_paths:
+            print(f"在 {directory} 中找不到符合 {pattern} 的逐字稿")
+            return {}
+        print(f"找到 {len(transcription_paths)} 份逐字稿，並行上限: {self.concurrency}")
+        print_batch_estimate(self.estimate(transcription_paths, prompt))
+        if estimate_only:
+            return {}
+        return self.generate_batch(transcription_paths, prompt)
@@ -4,22 +4,36 @@ YouTube 下載服務
 """
 import subprocess
 import os
+import re
+import threading
 import time
 from pathlib import Path
-from typing import Optional
+from typing import Optional, Dict, Any, Callable, List
 from ..core.config import config
 from ..utils.file_manager import FileManager
+from ..utils.cancellation import CancelToken, TaskCancelled
+
+# 以固定前綴輸出 yt-dlp 下載進度，便於從一般輸出中辨識
+_PROGRESS_PREFIX = "[videotonote-progress]"
+_PROGRESS_TEMPLATE = f"download:{_PROGRESS_PREFIX} %(progress._percent_str)s %(progress.downloaded_bytes)s %(progress.total_bytes)s"
+_PERCENT_PATTERN = re.compile(r'([\d.]+)%')
+
+# 進度回呼: 收到 {"percent", "downloaded_bytes", "total_bytes"}
+ProgressCallback = Callable[[Dict[str, Any]], None]
 
 class YouTubeDownloader:
     def __init__(self):
         self.output_dir = config.MP3_DIR
         
-    def download_audio(self, url: str) -> Optional[str]:
+    def download_audio(self, url: str, progress_callback: Optional[ProgressCallback] = None,
+                       cancel_token: Optional[CancelToken] = None) -> Optional[str]:
         """
         下載 YouTube 影片音檔
         
         Args:
             url: YouTube 影片連結
+            progress_callback: 下載進度回呼 (每前進 1% 呼叫一次)
+            cancel_token: 取消時終止 yt-dlp 並刪除未完成的檔案 (拋出 TaskCancelled)
             
         Returns:
             下載的音檔路徑，失敗則返回 None
@@ -38,18 +52,13 @@ class YouTubeDownloader:
                 '--output-na-placeholder', '',
                 url
             ]
+            if progress_callback:
+                command[-1:-1] = ['--progress', '--newline', '--progress-template', _PROGRESS_TEMPLATE]
 
             print(f"正在下載: {url}")
             print(f"執行命令: {' '.join(command)}")
             
-            result = subprocess.run(
-                command,
-                check=True,
-                capture_output=True,
-                text=True,
-                encoding='utf-8',
-                errors='replace'
-            )
+            result = self._run(command, progress_callback, cancel_token)
             
             if result.stderr:
                 print(f"警告: {result.stderr}")
@@ -82,6 +91,8 @@ class YouTubeDownloader:
                 print(f"下載失敗: yt-dlp 未返回任何輸出。完整輸出: {result.stdout}")
                 return None
             
+        except TaskCancelled:
+            raise
         except subprocess.CalledProcessError as e:
             self._handle_download_error(e)
             return None
@@ -89,6 +100,109 @@ class YouTubeDownloader:
             print(f"發生未預期的錯誤: {str(e)}")
             return None
     
+    def list_playlist(self, url: str) -> List[str]:
+        """
+        展開播放清單為各影片連結 (不下載)
+        
+        Args:
+            url: YouTube 播放清單連結
+            
+        Returns:
+            影片連結列表，失敗則返回空列表
+        """
+        command = ['yt-dlp', '--flat-playlist', '--no-warnings', '--print', 'url', url]
+        try:
+            result = subprocess.run(command, check=True, capture_output=True, text=True, encoding='utf-8', errors='replace')
+        except subprocess.CalledProcessError as e:
+            self._handle_download_error(e)
+            return []
+        except OSError as e:
+            print(f"發生未預期的錯誤: {str(e)}")
+            return []
+        urls = [line.strip() for line in result.stdout.splitlines() if line.strip().startswith('http')]
+        print(f"播放清單共 {len(urls)} 部影片: {url}")
+        return urls
+
+    def _run(self, command: List[str], progress_callback: Optional[ProgressCallback],
+             cancel_token: Optional[CancelToken] = None) -> subprocess.CompletedProcess:
+        """執行 yt-dlp，逐行讀取輸出以回報進度；進度行不計入回傳的輸出"""
+        if cancel_token:
+            cancel_token.raise_if_cancelled()
+        process = subprocess.Popen(
+            command,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+            encoding='utf-8',
+            errors='replace'
+        )
+        stdout_lines: List[str] = []
+        stderr_lines: List[str] = []
+        last_percent = [-1.0]
+
+        def consume(stream, lines: List[str]):
+            for line in stream:
+                if line.startswith(_PROGRESS_PREFIX):
+                    self._report_progress(line, last_percent, progress_callback)
+                else:
+                    lines.append(line)
+
+        # stderr 另以執行緒讀取，避免任一管線寫滿而互相阻塞
+        stderr_reader = threading.Thread(target=consume, args=(process.stderr, stderr_lines), daemon=True)
+        stderr_reader.start()
+        unregister = cancel_token.on_cancel(process.kill) if cancel_token else None
+        try:
+            consume(process.stdout, stdout_lines)
+            returncode = process.wait()
+            stderr_reader.join()
+        finally:
+            if unregister:
+                unregister()
+
+        if cancel_token and cancel_token.cancelled:
+            self._remove_partial_files(stdout_lines)
+            raise TaskCancelled()
+
+        stdout, stderr = ''.join(stdout_lines), ''.join(stderr_lines)
+        if returncode != 0:
+            raise subprocess.CalledProcessError(returncode, command, stdout, stderr)
+        return subprocess.CompletedProcess(command, returncode, stdout, stderr)
+
+    def _remove_partial_files(self, stdout_lines: List[str]):
+        """刪除被中斷的下載留下的暫存檔 (yt-dlp 於下載前輸出的檔名)"""
+        for line in stdout_lines:
+            filename = line.strip()
+            if not filename:
+                continue
+            base = os.path.splitext(filename)[0]
+            for candidate in (filename, f"{filename}.part", f"{filename}.ytdl", f"{base}.mp3"):
+                if os.path.exists(candidate):
+                    FileManager.cleanup_file(candidate)
+
+    @staticmethod
+    def _report_progress(line: str, last_percent: List[float], progress_callback: Optional[ProgressCallback]):
+        parts = line[len(_PROGRESS_PREFIX):].split()
+        match = _PERCENT_PATTERN.search(parts[0]) if parts else None
+        if not match or not progress_callback:
+            return
+        percent = float(match.group(1))
+        # yt-dlp 每個區塊都會輸出一行，僅在前進至少 1% 或完成時回報
+        if percent - last_percent[0] < 1 and (percent < 100 or last_percent[0] >= 100):
+            return
+        last_percent[0] = percent
+
+        def as_int(value: str) -> Optional[int]:
+            return int(float(value)) if value.replace('.', '', 1).isdigit() else None
+
+        try:
+            progress_callback({
+                "percent": percent,
+                "downloaded_bytes": as_int(parts[1]) if len(parts) > 1 else None,
+                "total_bytes": as_int(parts[2]) if len(parts) > 2 else None,
+            })
+        except Exception as e:
+            print(f"下載進度回呼發生錯誤: {e}")
+
     def _handle_download_error(self, error: subprocess.CalledProcessError):
         """處理下載錯誤"""
         error_msg = error.stderr if error.stderr else error.stdout
@@ -2,20 +2,156 @@
 """
 筆記生成服務 - 支援多種 AI 模型
 """
+import json
+import threading
+import time
 import requests
 import google.generativeai as genai
 from openai import OpenAI
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List, Callable, Iterator
 from abc import ABC, abstractmethod
 from ..core.config import config
+from ..core.metrics import metrics
 from ..utils.file_manager import FileManager
+from ..utils.cancellation import CancelToken, TaskCancelled
+from .rate_limiter import get_rate_limiter, call_with_retry
+from .token_estimator import TokenEstimator, PromptBudget, plan_prompt
+
+def configure_gemini(api_key: str):
+    """設定 Gemini SDK；指定 GEMINI_API_ENDPOINT (代理或模擬伺服器) 時改用 REST 連線"""
+    if config.GEMINI_API_ENDPOINT:
+        genai.configure(api_key=api_key, transport="rest", client_options={"api_endpoint": config.GEMINI_API_ENDPOINT})
+    else:
+        genai.configure(api_key=api_key)
 
 class BaseNotesGenerator(ABC):
+    provider: str = ""
+    display_name: str = ""
+    model_name: str = ""
+    # 每完成一次請求回呼 {"mode", "requests_done", "requests_planned", "output_tokens"}
+    progress_callback: Optional[Callable[[Dict[str, Any]], None]] = None
+    # 進度狀態依執行緒分開保存，同一個生成器可同時處理多份逐字稿
+    _progress_local = threading.local()
+
     @abstractmethod
-    def generate_notes(self, transcription: Dict[str, Any], prompt: str = None) -> Optional[str]:
-        """從轉錄結果生成筆記"""
+    def _request(self, full_prompt: str) -> str:
+        """送出單一請求並回傳模型輸出"""
         pass
 
+    def _stream(self, full_prompt: str, cancel_token: CancelToken) -> Optional[Iterator[str]]:
+        """以串流方式送出請求並逐段產生輸出；不支援串流的供應商回傳 None"""
+        return None
+
+    @property
+    def token_estimator(self) -> TokenEstimator:
+        if getattr(self, '_token_estimator', None) is None:
+            self._token_estimator = TokenEstimator(self.provider, self.model_name)
+        return self._token_estimator
+
+    def plan(self, transcription: Dict[str, Any], prompt: str = None) -> PromptBudget:
+        """估算 prompt 大小並決定單次或分段生成"""
+        return plan_prompt(self._get_text(transcription), self.provider, self.model_name, prompt)
+
+    def generate_notes(self, transcription: Dict[str, Any], prompt: str = None,
+                       progress_callback: Optional[Callable[[Dict[str, Any]], None]] = None,
+                       cancel_token: Optional[CancelToken] = None) -> Optional[str]:
+        """
+        從轉錄結果生成筆記（經供應商限流，暫時性錯誤會退避重試；超出上下文時分段生成再整合）
+
+        提供 cancel_token 時改以串流請求，取消後立即中斷進行中的請求並拋出 TaskCancelled。
+        """
+        try:
+            budget = self.plan(transcription, prompt)
+            print(f"正在使用 {self.display_name} 模型生成筆記... ({budget.describe()})")
+            self._progress_local.callback = progress_callback or self.progress_callback
+            self._progress_local.cancel_token = cancel_token
+            self._progress_local.state = {
+                "mode": budget.mode,
+                "requests_done": 0,
+                "requests_planned": budget.chunk_count + (1 if budget.mode == "chunked" else 0),
+                "output_tokens": 0,
+            }
+            if budget.mode == "single":
+                return self._call(self._get_full_prompt(transcription, prompt))
+
+            sections = self.token_estimator.split_text(self._get_text(transcription), budget.input_budget)
+            partial_notes = []
+            for index, section in enumerate(sections, 1):
+                print(f"生成第 {index}/{len(sections)} 段筆記...")
+                partial_notes.append(self._call(self._get_section_prompt(section, index, len(sections))))
+            while True:
+                groups = self._group_partial_notes(partial_notes, budget.input_budget)
+                if len(groups) == 1:
+                    return self._call(self._get_merge_prompt(groups[0], prompt))
+                partial_notes = [self._call(self._get_merge_prompt(group, final=False)) for group in groups]
+        except TaskCancelled:
+            print("筆記生成已取消")
+            raise
+        except requests.exceptions.RequestException as e:
+            print(f"連接 {self.display_name} API 時發生錯誤: {e}")
+            return None
+        except Exception as e:
+            print(f"生成筆記時發生錯誤: {e}")
+            return None
+
+    def _call(self, full_prompt: str) -> str:
+        cancel_token = getattr(self._progress_local, 'cancel_token', None)
+        if cancel_token:
+            cancel_token.raise_if_cancelled()
+        prompt_tokens = self.token_estimator.count(full_prompt)
+        started = time.monotonic()
+        output = call_with_retry(
+            get_rate_limiter(self.provider),
+            prompt_tokens,
+            lambda: self._request_cancellable(full_prompt, cancel_token) if cancel_token else self._request(full_prompt)
+        )
+        self._record_usage(prompt_tokens, output, time.monotonic() - started)
+        self._report_progress(output)
+        return output
+
+    def _record_usage(self, prompt_tokens: int, output: str, elapsed: float):
+        labels = {"provider": self.provider, "model": self.model_name}
+        metrics.inc("videotonote_llm_requests_total", **labels)
+        metrics.inc("videotonote_llm_tokens_total", prompt_tokens, direction="prompt", **labels)
+        metrics.inc("videotonote_llm_tokens_total", self.token_estimator.count(output or ""), direction="output", **labels)
+        metrics.observe("videotonote_llm_request_duration_seconds", elapsed, **labels)
+
+    def _request_cancellable(self, full_prompt: str, cancel_token: CancelToken) -> str:
+        """串流送出請求，每收到一段輸出即檢查取消；取消造成的連線錯誤一律轉為 TaskCancelled 以免被重試"""
+        try:
+            stream = self._stream(full_prompt, cancel_token)
+            if stream is None:
+                output = self._request(full_prompt)
+                cancel_token.raise_if_cancelled()
+                return output
+            parts = []
+            try:
+                for part in stream:
+                    cancel_token.raise_if_cancelled()
+                    parts.append(part)
+            finally:
+                stream.close()
+            cancel_token.raise_if_cancelled()
+            return "".join(parts)
+        except TaskCancelled:
+            raise
+        except Exception:
+            if cancel_token.cancelled:
+                raise TaskCancelled()
+            raise
+
+    def _report_progress(self, output: str):
+        callback = getattr(self._progress_local, 'callback', None)
+        progress = getattr(self._progress_local, 'state', None)
+        if not callback or progress is None:
+            return
+        progress["requests_done"] += 1
+        progress["output_tokens"] += self.token_estimator.count(output)
+        try:
+            callback(dict(progress))
+        except Exception as e:
+            print(f"筆記進度回呼發生錯誤: {e}")
+
     def save_notes(self, notes: str, audio_path: str) -> str:
         """保存生成的筆記"""
         output_path = FileManager.generate_output_path(
@@ -27,103 +163,203 @@ class BaseNotesGenerator(ABC):
             return str(output_path)
         return None
 
+    @staticmethod
+    def _get_text(transcription: Dict[str, Any]) -> str:
+        return transcription.get('text', str(transcription)) if isinstance(transcription, dict) else str(transcription)
+
     def _get_full_prompt(self, transcription: Dict[str, Any], prompt: str = None) -> str:
-        text = transcription.get('text', str(transcription)) if isinstance(transcription, dict) else str(transcription)
+        text = self._get_text(transcription)
         prompt = prompt or config.DEFAULT_PROMPT
         return f"{prompt}\n\n逐字稿內容:\n{text}"
 
+    def _get_section_prompt(self, section: str, index: int, total: int) -> str:
+        return (
+            f"以下是一份長逐字稿的第 {index}/{total} 段，請條列整理這一段的重點與關鍵細節，"
+            f"稍後會與其他段落的筆記整合。\n\n逐字稿內容:\n{section}"
+        )
+
+    def _get_merge_prompt(self, partial_notes: List[str], prompt: str = None, final: bool = True) -> str:
+        joined = "\n\n".join(f"第 {index} 段筆記:\n{notes}" for index, notes in enumerate(partial_notes, 1))
+        instruction = f"\n{prompt or config.DEFAULT_PROMPT}" if final else ""
+        return f"以下是同一份逐字稿依序分段整理出的筆記，請合併成一份完整、不重複的筆記。{instruction}\n\n{joined}"
+
+    def _group_partial_notes(self, partial_notes: List[str], max_tokens: int) -> List[List[str]]:
+        """將分段筆記分組，使每組合併時不超過輸入預算"""
+        groups: List[List[str]] = [[]]
+        group_tokens = 0
+        for notes in partial_notes:
+            tokens = self.token_estimator.count(notes)
+            if groups[-1] and group_tokens + tokens > max_tokens:
+                groups.append([])
+                group_tokens = 0
+            groups[-1].append(notes)
+            group_tokens += tokens
+        # 每組至少兩份才能收斂，避免無窮遞迴
+        if len(groups) == len(partial_notes) and len(groups) > 1:
+            groups = [partial_notes[i:i + 2] for i in range(0, len(partial_notes), 2)]
+        return groups
+
 class OpenAIGenerator(BaseNotesGenerator):
+    provider = "openai"
+    display_name = "OpenAI"
+
     def __init__(self, api_key: str = None):
         self.api_key = api_key or config.OPENAI_API_KEY
         if not self.api_key:
             raise ValueError("OpenAI API Key not found.")
-        self.client = OpenAI(api_key=self.api_key)
+        # 重試交由限流器處理，關閉 SDK 內建重試以免重複退避
+        self.client = OpenAI(api_key=self.api_key, base_url=config.OPENAI_BASE_URL, max_retries=0)
         self.model_name = config.OPENAI_MODEL
 
-    def generate_notes(self, transcription: Dict[str, Any], prompt: str = None) -> Optional[str]:
+    def _request(self, full_prompt: str) -> str:
+        response = self.client.chat.completions.create(
+            model=self.model_name,
+            messages=[
+                {"role": "system", "content": "你是一個專業的筆記整理專家"},
+                {"role": "user", "content": full_prompt}
+            ]
+        )
+        return response.choices[0].message.content
+
+    def _stream(self, full_prompt: str, cancel_token: CancelToken) -> Iterator[str]:
+        stream = self.client.chat.completions.create(
+            model=self.model_name,
+            messages=[
+                {"role": "system", "content": "你是一個專業的筆記整理專家"},
+                {"role": "user", "content": full_prompt}
+            ],
+            stream=True
+        )
+        # 關閉串流即中斷 HTTP 連線，伺服器端隨之停止生成
+        unregister = cancel_token.on_cancel(stream.close)
         try:
-            full_prompt = self._get_full_prompt(transcription, prompt)
-            print("正在使用 OpenAI 模型生成筆記...")
-            response = self.client.chat.completions.create(
-                model=self.model_name,
-                messages=[
-                    {"role": "system", "content": "你是一個專業的筆記整理專家"},
-                    {"role": "user", "content": full_prompt}
-                ]
-            )
-            return response.choices[0].message.content
-        except Exception as e:
-            print(f"生成筆記時發生錯誤: {e}")
-            return None
+            for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        finally:
+            unregister()
+            stream.close()
+
+class DeepSeekGenerator(OpenAIGenerator):
+    provider = "deepseek"
+    display_name = "DeepSeek"
 
-class DeepSeekGenerator(BaseNotesGenerator):
     def __init__(self, api_key: str = None):
         self.api_key = api_key or config.DEEPSEEK_API_KEY
         if not self.api_key:
             raise ValueError("DeepSeek API Key not found.")
-        self.client = OpenAI(api_key=self.api_key, base_url="https://api.deepseek.com")
+        self.client = OpenAI(api_key=self.api_key, base_url=config.DEEPSEEK_BASE_URL, max_retries=0)
         self.model_name = config.DEEPSEEK_MODEL
 
-    def generate_notes(self, transcription: Dict[str, Any], prompt: str = None) -> Optional[str]:
-        try:
-            full_prompt = self._get_full_prompt(transcription, prompt)
-            print("正在使用 DeepSeek 模型生成筆記...")
-            response = self.client.chat.completions.create(
-                model=self.model_name,
-                messages=[
-                    {"role": "system", "content": "你是一個專業的筆記整理專家"},
-                    {"role": "user", "content": full_prompt}
-                ]
-            )
-            return response.choices[0].message.content
-        except Exception as e:
-            print(f"生成筆記時發生錯誤: {e}")
-            return None
-
 class GeminiGenerator(BaseNotesGenerator):
+    provider = "gemini"
+    display_name = "Gemini"
+
     def __init__(self, api_key: str = None):
         self.api_key = api_key or config.GEMINI_API_KEY
         if not self.api_key:
             raise ValueError("Gemini API Key not found.")
-        genai.configure(api_key=self.api_key)
+        configure_gemini(self.api_key)
         self.model_name = config.GEMINI_MODEL
 
-    def generate_notes(self, transcription: Dict[str, Any], prompt: str = None) -> Optional[str]:
-        try:
-            full_prompt = self._get_full_prompt(transcription, prompt)
-            print("正在使用 Gemini 模型生成筆記...")
-            model = genai.GenerativeModel(self.model_name)
-            response = model.generate_content(full_prompt)
-            return response.text
-        except Exception as e:
-            print(f"生成筆記時發生錯誤: {e}")
-            return None
+    def _request(self, full_prompt: str) -> str:
+        model = genai.GenerativeModel(self.model_name)
+        response = model.generate_content(full_prompt)
+        return response.text
+
+    def _stream(self, full_prompt: str, cancel_token: CancelToken) -> Iterator[str]:
+        model = genai.GenerativeModel(self.model_name)
+        for chunk in model.generate_content(full_prompt, stream=True):
+            if chunk.parts:
+                yield chunk.text
 
 class OllamaGenerator(BaseNotesGenerator):
-    def __init__(self):
+    provider = "ollama"
+    display_name = "Ollama"
+
+    def __init__(self, preload: bool = None):
         self.model_name = config.OLLAMA_MODEL
         self.api_url = config.OLLAMA_API_URL
+        self.last_timings: Dict[str, float] = {}
+        if config.OLLAMA_PRELOAD if preload is None else preload:
+            self.preload()
 
-    def generate_notes(self, transcription: Dict[str, Any], prompt: str = None) -> Optional[str]:
+    def _build_payload(self, full_prompt: str = None, stream: bool = False) -> Dict[str, Any]:
+        """組出帶有 keep_alive 與推論選項的請求內容；不帶 prompt 時僅載入模型"""
+        payload = {
+            "model": self.model_name,
+            "stream": stream,
+            "keep_alive": config.OLLAMA_KEEP_ALIVE
+        }
+        if full_prompt is not None:
+            payload["prompt"] = full_prompt
+        options = {}
+        if config.OLLAMA_NUM_CTX:
+            options["num_ctx"] = config.OLLAMA_NUM_CTX
+        if config.OLLAMA_NUM_THREAD:
+            options["num_thread"] = config.OLLAMA_NUM_THREAD
+        if options:
+            payload["options"] = options
+        return payload
+
+    def preload(self) -> bool:
+        """預先載入模型並依 keep_alive 常駐，避免第一份筆記承擔載入時間"""
         try:
-            full_prompt = self._get_full_prompt(transcription, prompt)
-            print("正在使用 Ollama 模型生成筆記...")
-            response = requests.post(
-                self.api_url,
-                json={
-                    "model": self.model_name,
-                    "prompt": full_prompt,
-                    "stream": False
-                }
-            )
+            response = requests.post(self.api_url, json=self._build_payload(), timeout=config.OLLAMA_PRELOAD_TIMEOUT)
             response.raise_for_status()
-            return response.json().get('response', '')
+            timings = self._record_timings(response.json())
+            print(f"Ollama 模型 {self.model_name} 已預先載入 (載入 {timings['load']:.2f}s，常駐時間 {config.OLLAMA_KEEP_ALIVE})")
+            return True
         except requests.exceptions.RequestException as e:
-            print(f"連接 Ollama API 時發生錯誤: {e}")
-            return None
-        except Exception as e:
-            print(f"生成筆記時發生錯誤: {e}")
-            return None
+            print(f"預先載入 Ollama 模型失敗: {e}")
+            return False
+
+    def _record_timings(self, data: Dict[str, Any]) -> Dict[str, float]:
+        """從 Ollama 回應的中繼資料 (奈秒) 取出載入、prompt 評估與生成時間"""
+        timings = {
+            "load": data.get("load_duration", 0) / 1e9,
+            "prompt_eval": data.get("prompt_eval_duration", 0) / 1e9,
+            "eval": data.get("eval_duration", 0) / 1e9,
+            "total": data.get("total_duration", 0) / 1e9,
+            "prompt_tokens": data.get("prompt_eval_count", 0),
+            "eval_tokens": data.get("eval_count", 0),
+        }
+        self.last_timings = timings
+        return timings
+
+    def _report_timings(self, data: Dict[str, Any]):
+        timings = self._record_timings(data)
+        eval_speed = timings["eval_tokens"] / timings["eval"] if timings["eval"] else 0.0
+        print(
+            f"Ollama 計時: 載入 {timings['load']:.2f}s，prompt 評估 {timings['prompt_eval']:.2f}s "
+            f"({timings['prompt_tokens']} tokens)，生成 {timings['eval']:.2f}s "
+            f"({timings['eval_tokens']} tokens, {eval_speed:.1f} tok/s)"
+        )
+
+    def _request(self, full_prompt: str) -> str:
+        response = requests.post(self.api_url, json=self._build_payload(full_prompt))
+        response.raise_for_status()
+        data = response.json()
+        self._report_timings(data)
+        return data.get('response', '')
+
+    def _stream(self, full_prompt: str, cancel_token: CancelToken) -> Iterator[str]:
+        """逐行讀取 Ollama 的 NDJSON 串流；關閉連線時 Ollama 會停止生成並釋放推論資源"""
+        with requests.post(self.api_url, json=self._build_payload(full_prompt, stream=True), stream=True) as response:
+            response.raise_for_status()
+            unregister = cancel_token.on_cancel(response.close)
+            try:
+                for line in response.iter_lines():
+                    if not line:
+                        continue
+                    data = json.loads(line)
+                    if data.get('response'):
+                        yield data['response']
+                    if data.get('done'):
+                        self._report_timings(data)
+                        break
+            finally:
+                unregister()
 
 class NotesGeneratorFactory:
     @staticmethod
@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+"""
+API 限流服務 - 依供應商以令牌桶控管每分鐘請求數與 token 數，並提供退避重試
+"""
+import asyncio
+import random
+import threading
+import time
+from typing import Optional, Dict, Any, Callable, Awaitable, TypeVar
+from ..core.config import config
+from ..core.metrics import metrics
+from ..utils.cancellation import TaskCancelled
+
+T = TypeVar("T")
+
+# 限流器統計項目 → 執行指標的錯誤種類
+_ERROR_KINDS = {"retries": "retry", "rate_limited": "rate_limited", "failures": "failure"}
+
+class TokenBucket:
+    """每分鐘補充固定額度的令牌桶，允許預支並回傳需等待的秒數"""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60.0
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+
+    def reserve(self, amount: float, now: float) -> float:
+        """預留額度並回傳在 now 之後需等待的秒數"""
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+        # 單次超過桶容量的請求視為用滿整桶，避免永遠等不到
+        self.tokens -= min(amount, self.capacity)
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+class ProviderRateLimiter:
+    """單一供應商的限流器，同時以請求數與 token 數兩個令牌桶控管"""
+
+    def __init__(self, provider: str, requests_per_minute: Optional[float] = None, tokens_per_minute: Optional[float] = None):
+        self.provider = provider
+        self.request_bucket = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.token_bucket = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self._lock = threading.Lock()
+        self._stats = {
+            "requests": 0,
+            "tokens": 0,
+            "throttled": 0,
+            "retries": 0,
+            "rate_limited": 0,
+            "failures": 0,
+            "total_wait": 0.0,
+            "max_wait": 0.0,
+        }
+
+    def _reserve(self, tokens: int) -> float:
+        with self._lock:
+            now = time.monotonic()
+            wait = 0.0
+            if self.request_bucket:
+                wait = max(wait, self.request_bucket.reserve(1, now))
+            if self.token_bucket:
+                wait = max(wait, self.token_bucket.reserve(tokens, now))
+            self._stats["requests"] += 1
+            self._stats["tokens"] += tokens
+            if wait > 0:
+                self._stats["throttled"] += 1
+                self._stats["total_wait"] += wait
+                self._stats["max_wait"] = max(self._stats["max_wait"], wait)
+            return wait
+
+    async def acquire(self, tokens: int = 0) -> float:
+        """等待直到可送出請求，回傳排隊等待秒數"""
+        wait = self._reserve(tokens)
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return wait
+
+    def acquire_sync(self, tokens: int = 0) -> float:
+        """同步版本的 acquire"""
+        wait = self._reserve(tokens)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    def record(self, key: str):
+        with self._lock:
+            self._stats[key] += 1
+        if key in _ERROR_KINDS:
+            metrics.inc("videotonote_llm_errors_total", provider=self.provider, kind=_ERROR_KINDS[key])
+
+    def stats(self) -> Dict[str, Any]:
+        """回傳累計統計，包含平均與最大排隊等待時間"""
+        with self._lock:
+            stats = dict(self._stats)
+        stats["provider"] = self.provider
+        stats["avg_wait"] = stats["total_wait"] / stats["requests"] if stats["requests"] else 0.0
+        return stats
+
+_limiters: Dict[str, ProviderRateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+def get_rate_limiter(provider: str) -> ProviderRateLimiter:
+    """取得供應商共用的限流器（同一行程內共享額度）"""
+    with _limiters_lock:
+        if provider not in _limiters:
+            limits = config.RATE_LIMITS.get(provider, {})
+            _limiters[provider] = ProviderRateLimiter(
+                provider,
+                requests_per_minute=limits.get("requests_per_minute"),
+                tokens_per_minute=limits.get("tokens_per_minute"),
+            )
+        return _limiters[provider]
+
+_RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504, 529}
+_RETRYABLE_NAMES = ("RateLimit", "ResourceExhausted", "ServiceUnavailable", "Timeout", "Connection", "DeadlineExceeded", "InternalServerError")
+
+def _status_code(error: Exception) -> Optional[int]:
+    for candidate in (getattr(error, "status_code", None), getattr(getattr(error, "response", None), "status_code", None), getattr(error, "code", None)):
+        if isinstance(candidate, int):
+            return candidate
+    return None
+
+def is_rate_limited(error: Exception) -> bool:
+    return _status_code(error) == 429 or "RateLimit" in type(error).__name__ or "ResourceExhausted" in type(error).__name__
+
+def is_retryable(error: Exception) -> bool:
+    """判斷錯誤是否為暫時性（限流、逾時、連線或伺服器錯誤）"""
+    status = _status_code(error)
+    if status is not None:
+        return status in _RETRYABLE_STATUS
+    return any(name in type(error).__name__ for name in _RETRYABLE_NAMES)
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    """從錯誤的 HTTP 回應標頭讀取 Retry-After（秒）"""
+    headers = getattr(getattr(error, "response", None), "headers", None)
+    if not headers:
+        return None
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000.0
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except (TypeError, ValueError):
+        # HTTP-date 格式的 Retry-After 交由指數退避處理
+        return None
+    return None
+
+def backoff_delay(attempt: int, retry_after: Optional[float] = None) -> float:
+    """Full-jitter 指數退避；若伺服器指定 Retry-After 則至少等待該秒數"""
+    ceiling = min(config.LLM_RETRY_MAX_DELAY, config.LLM_RETRY_BASE_DELAY * (2 ** attempt))
+    delay = random.uniform(0, ceiling)
+    if retry_after is not None:
+        delay = max(delay, retry_after)
+    return delay
+
+def _next_delay(limiter: ProviderRateLimiter, error: Exception, attempt: int) -> Optional[float]:
+    if attempt >= config.LLM_MAX_RETRIES or not is_retryable(error):
+        limiter.record("failures")
+        return None
+    if is_rate_limited(error):
+        limiter.record("rate_limited")
+    limiter.record("retries")
+    delay = backoff_delay(attempt, retry_after_seconds(error))
+    print(f"{limiter.provider} 請求失敗 ({type(error).__name__})，{delay:.1f} 秒後重試 ({attempt + 1}/{config.LLM_MAX_RETRIES})")
+    return delay
+
+async def acall_with_retry(limiter: ProviderRateLimiter, tokens: int, func: Callable[[], Awaitable[T]]) -> T:
+    """經限流後呼叫非同步函式，暫時性錯誤時以退避重試"""
+    attempt = 0
+    while True:
+        await limiter.acquire(tokens)
+        try:
+            return await func()
+        except Exception as e:
+            delay = _next_delay(limiter, e, attempt)
+            if delay is None:
+                raise
+            attempt += 1
+            await asyncio.sleep(delay)
+
+def call_with_retry(limiter: ProviderRateLimiter, tokens: int, func: Callable[[], T]) -> T:
+    """同步版本的 acall_with_retry"""
+    attempt = 0
+    while True:
+        limiter.acquire_sync(tokens)
+        try:
+            return func()
+        except TaskCancelled:
+            raise
+        except Exception as e:
+            delay = _next_delay(limiter, e, attempt)
+            if delay is None:
+                raise
+            attempt += 1
+            time.sleep(delay)
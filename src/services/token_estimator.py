@@ -0,0 +1,286 @@
+# -*- coding: utf-8 -*-
+"""
+Token 估算服務 - 離線估算各模型的 prompt 大小，規劃單次或分段生成並預估成本與延遲
+"""
+import hashlib
+import os
+import re
+import tempfile
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+from typing import Optional, Dict, Any, List, Tuple
+from ..core.config import config
+
+try:
+    import tiktoken
+    TIKTOKEN_AVAILABLE = True
+except ImportError:
+    TIKTOKEN_AVAILABLE = False
+
+_CJK_PATTERN = re.compile(r'[぀-ヿ㐀-䶿一-鿿가-힯豈-﫿]')
+_SENTENCE_PATTERN = re.compile(r'[^。！？!?\.\n]*[。！？!?\.\n]+|[^。！？!?\.\n]+')
+# tiktoken 下載 BPE 檔案的位置；快取檔名為此網址的 SHA-1
+_TIKTOKEN_BLOB_URL = "https://openaipublic.blob.core.windows.net/encodings/{}.tiktoken"
+
+@dataclass(frozen=True)
+class ModelProfile:
+    """單一模型的 tokenizer 校正係數、上下文長度、價格與吞吐量"""
+    prefix: str
+    cjk_tokens_per_char: float
+    other_tokens_per_char: float
+    context_window: int
+    max_output_tokens: int
+    input_price_per_m: float = 0.0
+    output_price_per_m: float = 0.0
+    prefill_tokens_per_sec: float = 2000.0
+    output_tokens_per_sec: float = 60.0
+    first_token_latency: float = 0.5
+    tiktoken_encoding: Optional[str] = None
+
+# 依模型名稱前綴比對，較精確的前綴須放在前面；價格單位為每百萬 tokens 美元
+MODEL_PROFILES: Dict[str, List[ModelProfile]] = {
+    "openai": [
+        ModelProfile("gpt-4o-mini", 0.75, 0.25, 128000, 16384, 0.15, 0.60, 5000, 80, 0.4, "o200k_base"),
+        ModelProfile("gpt-4o", 0.75, 0.25, 128000, 16384, 2.50, 10.00, 3000, 60, 0.5, "o200k_base"),
+        ModelProfile("gpt-4.1-mini", 0.75, 0.25, 1047576, 32768, 0.40, 1.60, 5000, 80, 0.4, "o200k_base"),
+        ModelProfile("gpt-4.1", 0.75, 0.25, 1047576, 32768, 2.00, 8.00, 3000, 60, 0.5, "o200k_base"),
+        ModelProfile("gpt-3.5", 1.20, 0.25, 16385, 4096, 0.50, 1.50, 5000, 80, 0.4, "cl100k_base"),
+        ModelProfile("", 0.75, 0.25, 128000, 16384, 2.50, 10.00, 3000, 60, 0.5, "o200k_base"),
+    ],
+    "deepseek": [
+        ModelProfile("deepseek-reasoner", 0.60, 0.30, 65536, 8192, 0.55, 2.19, 2000, 25, 2.0),
+        ModelProfile("", 0.60, 0.30, 65536, 8192, 0.27, 1.10, 2000, 30, 1.0),
+    ],
+    "gemini": [
+        ModelProfile("gemini-1.5-pro", 0.75, 0.25, 2097152, 8192, 1.25, 5.00, 4000, 60, 0.8),
+        ModelProfile("gemini-2.5-pro", 0.75, 0.25, 1048576, 65536, 1.25, 10.00, 4000, 60, 2.0),
+        ModelProfile("gemini-2.5-flash", 0.75, 0.25, 1048576, 65536, 0.30, 2.50, 8000, 150, 0.6),
+        ModelProfile("", 0.75, 0.25, 1048576, 8192, 0.075, 0.30, 8000, 150, 0.5),
+    ],
+    "ollama": [
+        ModelProfile("qwen", 0.68, 0.25, 4096, 4096, 0.0, 0.0, 200, 20, 0.2),
+        ModelProfile("llama", 1.00, 0.25, 4096, 4096, 0.0, 0.0, 200, 20, 0.2),
+        ModelProfile("", 0.90, 0.27, 4096, 4096, 0.0, 0.0, 200, 20, 0.2),
+    ],
+}
+
+def get_model_profile(provider: str, model_name: str = "") -> ModelProfile:
+    """依供應商與模型名稱取得最符合的設定檔"""
+    profiles = MODEL_PROFILES.get(provider) or MODEL_PROFILES["openai"]
+    model_name = (model_name or "").lower()
+    for profile in profiles:
+        if model_name.startswith(profile.prefix):
+            return profile
+    return profiles[-1]
+
+def _tiktoken_cache_path(name: str) -> Optional[Path]:
+    """tiktoken 快取的 BPE 檔案路徑 (與 tiktoken 相同的快取目錄規則)；停用快取時回傳 None"""
+    if "TIKTOKEN_CACHE_DIR" in os.environ:
+        cache_dir = os.environ["TIKTOKEN_CACHE_DIR"]
+    elif "DATA_GYM_CACHE_DIR" in os.environ:
+        cache_dir = os.environ["DATA_GYM_CACHE_DIR"]
+    else:
+        cache_dir = os.path.join(tempfile.gettempdir(), "data-gym-cache")
+    if not cache_dir:
+        return None
+    return Path(cache_dir) / hashlib.sha1(_TIKTOKEN_BLOB_URL.format(name).encode()).hexdigest()
+
+@lru_cache(maxsize=None)
+def _load_encoding(name: str):
+    """僅使用本機已快取的 tiktoken 編碼，載入失敗時改用校正估算"""
+    if not TIKTOKEN_AVAILABLE or not name:
+        return None
+    # get_encoding 在快取不存在時會下載且沒有逾時，離線或網路緩慢時會卡住估算
+    cache_path = _tiktoken_cache_path(name)
+    if cache_path is None or not cache_path.is_file():
+        return None
+    try:
+        return tiktoken.get_encoding(name)
+    except Exception:
+        return None
+
+def estimate_tokens(text: str, provider: str = None, model_name: str = None) -> int:
+    """估算文字的 token 數；未指定模型時使用通用係數"""
+    if not text:
+        return 0
+    if provider is None:
+        cjk_count = len(_CJK_PATTERN.findall(text))
+        return cjk_count + (len(text) - cjk_count + 3) // 4
+    return TokenEstimator(provider, model_name).count(text)
+
+class TokenEstimator:
+    """單一模型的 token 計數器：有本機 tiktoken 編碼時精確計數，否則以字元類別校正估算"""
+
+    def __init__(self, provider: str, model_name: str = None):
+        self.provider = provider
+        self.model_name = model_name or ""
+        self.profile = get_model_profile(provider, self.model_name)
+        self.encoding = _load_encoding(self.profile.tiktoken_encoding) if self.profile.tiktoken_encoding else None
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+        if self.encoding is not None:
+            return len(self.encoding.encode(text, disallowed_special=()))
+        cjk_count = len(_CJK_PATTERN.findall(text))
+        other_count = len(text) - cjk_count
+        return int(cjk_count * self.profile.cjk_tokens_per_char + other_count * self.profile.other_tokens_per_char) + 1
+
+    @property
+    def context_window(self) -> int:
+        # Ollama 的實際上下文長度由 num_ctx 決定，超出部分會被靜默截斷
+        if self.provider == "ollama" and config.OLLAMA_NUM_CTX:
+            return config.OLLAMA_NUM_CTX
+        return self.profile.context_window
+
+    def split_text(self, text: str, max_tokens: int) -> List[str]:
+        """以句子為界將文字切成每段不超過 max_tokens 的片段"""
+        chunks: List[str] = []
+        current: List[str] = []
+        current_tokens = 0
+        for sentence in _SENTENCE_PATTERN.findall(text):
+            sentence_tokens = self.count(sentence)
+            # 單句超過上限時依比例硬切
+            while sentence_tokens > max_tokens:
+                cut = max(1, int(len(sentence) * max_tokens / sentence_tokens))
+                if current:
+                    chunks.append(''.join(current))
+                    current, current_tokens = [], 0
+                chunks.append(sentence[:cut])
+                sentence = sentence[cut:]
+                sentence_tokens = self.count(sentence)
+            if current and current_tokens + sentence_tokens > max_tokens:
+                chunks.append(''.join(current))
+                current, current_tokens = [], 0
+            current.append(sentence)
+            current_tokens += sentence_tokens
+        if current:
+            chunks.append(''.join(current))
+        return chunks
+
+@dataclass
+class PromptBudget:
+    provider: str
+    model_name: str
+    prompt_tokens: int
+    output_tokens: int
+    context_window: int
+    input_budget: int
+    mode: str
+    chunk_count: int
+    estimated_cost: float
+    estimated_latency: float
+
+    def describe(self) -> str:
+        mode = "單次生成" if self.mode == "single" else f"分段生成 ({self.chunk_count} 段)"
+        return (
+            f"{self.model_name}: prompt 約 {self.prompt_tokens} tokens / 上下文 {self.context_window}，{mode}，"
+            f"預估成本 ${self.estimated_cost:.4f}，預估延遲 {self.estimated_latency:.1f}s"
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        return dict(self.__dict__)
+
+def plan_prompt(text: str, provider: str, model_name: str = None, prompt: str = None) -> PromptBudget:
+    """
+    依模型上下文長度規劃單次或分段生成，並預估成本與延遲
+
+    Args:
+        text: 逐字稿內容
+        provider: 供應商 (openai, deepseek, gemini, ollama)
+        model_name: 模型名稱
+        prompt: 自訂提示詞
+
+    Returns:
+        PromptBudget
+    """
+    estimator = TokenEstimator(provider, model_name)
+    profile = estimator.profile
+    instruction_tokens = estimator.count(prompt or config.DEFAULT_PROMPT) + 32
+    text_tokens = estimator.count(text)
+    prompt_tokens = instruction_tokens + text_tokens
+    output_tokens = min(config.NOTES_EXPECTED_OUTPUT_TOKENS, profile.max_output_tokens)
+
+    context_window = estimator.context_window
+    input_budget = int((context_window - output_tokens) * config.NOTES_CONTEXT_SAFETY) - instruction_tokens
+    if config.NOTES_MAX_PROMPT_TOKENS:
+        input_budget = min(input_budget, config.NOTES_MAX_PROMPT_TOKENS)
+    input_budget = max(input_budget, 256)
+
+    if text_tokens <= input_budget:
+        mode, chunk_count = "single", 1
+        total_input, total_output, sequential_calls = prompt_tokens, output_tokens, 1
+    else:
+        mode = "chunked"
+        chunk_count = -(-text_tokens // input_budget)
+        # 各段筆記加上最後一次整合的請求
+        total_input = text_tokens + instruction_tokens * (chunk_count + 1) + output_tokens * chunk_count
+        total_output = output_tokens * (chunk_count + 1)
+        sequential_calls = 2
+
+    cost = (total_input * profile.input_price_per_m + total_output * profile.output_price_per_m) / 1_000_000
+    per_call_input = total_input / (chunk_count + (1 if mode == "chunked" else 0))
+    latency = sequential_calls * (
+        profile.first_token_latency
+        + per_call_input / profile.prefill_tokens_per_sec
+        + output_tokens / profile.output_tokens_per_sec
+    )
+    return PromptBudget(
+        provider=provider,
+        model_name=model_name or "",
+        prompt_tokens=prompt_tokens,
+        output_tokens=total_output,
+        context_window=context_window,
+        input_budget=input_budget,
+        mode=mode,
+        chunk_count=chunk_count,
+        estimated_cost=cost,
+        estimated_latency=latency,
+    )
+
+def estimate_batch(texts: List[Tuple[str, str]], provider: str, model_name: str = None, prompt: str = None,
+                   concurrency: int = None) -> Dict[str, Any]:
+    """
+    預估一批逐字稿的總 token、成本與完成時間
+
+    Args:
+        texts: (名稱, 逐字稿內容) 列表
+        concurrency: 並行請求上限
+
+    Returns:
+        包含每份規劃與彙總數值的字典
+    """
+    concurrency = max(1, concurrency or config.NOTES_CONCURRENCY)
+    plans = [(name, plan_prompt(text, provider, model_name, prompt)) for name, text in texts]
+    total_tokens = sum(plan.prompt_tokens for _, plan in plans)
+    total_requests = sum(plan.chunk_count + (1 if plan.mode == "chunked" else 0) for _, plan in plans)
+    total_cost = sum(plan.estimated_cost for _, plan in plans)
+    serial_latency = sum(plan.estimated_latency for _, plan in plans)
+
+    # 完成時間受並行數與每分鐘額度中較緊者限制
+    limits = config.RATE_LIMITS.get(provider, {})
+    wall_time = serial_latency / concurrency
+    if limits.get("tokens_per_minute"):
+        wall_time = max(wall_time, total_tokens / limits["tokens_per_minute"] * 60)
+    if limits.get("requests_per_minute"):
+        wall_time = max(wall_time, total_requests / limits["requests_per_minute"] * 60)
+
+    return {
+        "plans": plans,
+        "total_prompt_tokens": total_tokens,
+        "total_requests": total_requests,
+        "chunked": sum(1 for _, plan in plans if plan.mode == "chunked"),
+        "estimated_cost": total_cost,
+        "estimated_wall_time": wall_time,
+    }
+
+def print_batch_estimate(estimate: Dict[str, Any]):
+    """輸出批次預估摘要"""
+    for name, plan in estimate["plans"]:
+        print(f"  - {name}: {plan.describe()}")
+    print(
+        f"批次預估: {len(estimate['plans'])} 份逐字稿，共約 {estimate['total_prompt_tokens']} prompt tokens，"
+        f"{estimate['total_requests']} 次請求 (其中 {estimate['chunked']} 份需分段)，"
+        f"預估成本 ${estimate['estimated_cost']:.4f}，預估完成時間 {estimate['estimated_wall_time']:.1f}s"
+    )
@@ -1,14 +1,19 @@
 # -*- coding: utf-8 -*-
 """
-語音轉錄服務 - 使用 OpenAI Whisper
+語音轉錄服務 - 使用 OpenAI Whisper (transformers / whisper.cpp / CTranslate2，或依本機校準自動選擇)
 """
+import json
+import time
 import torch
 from transformers import AutoModelForSpeechSeq2Seq, AutoProcessor, pipeline
 from pathlib import Path
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Callable
 from abc import ABC, abstractmethod
 from ..core.config import config
+from ..core.metrics import metrics
 from ..utils.file_manager import FileManager
+from ..utils.audio import SAMPLE_RATE, can_stream_windows, iter_audio_windows
+from ..utils.cancellation import CancelToken, TaskCancelled
 
 try:
     from pywhispercpp.model import Model as WhisperCppModel
@@ -16,21 +21,125 @@ try:
 except ImportError:
     PYWHISPERCPP_AVAILABLE = False
 
+try:
+    from faster_whisper import WhisperModel as CTranslate2Model
+    FASTER_WHISPER_AVAILABLE = True
+except ImportError:
+    FASTER_WHISPER_AVAILABLE = False
+
+# 轉錄進度回呼: 收到 {"seconds", "total", "segment"}，segment 為剛解碼完成的片段
+ProgressCallback = Callable[[Dict[str, Any]], None]
+# 單一視窗的轉錄函式: (取樣, 視窗起始秒數) → {"text", "chunks"} (時間戳記相對於視窗起點)
+WindowTranscriber = Callable[[Any, float], Dict[str, Any]]
+
 class BaseTranscriber(ABC):
+    # 轉錄結果 chunks 時間戳記的單位 (秒)
+    timestamp_scale: float = 1.0
+    # 推論後端名稱 (用於執行指標)
+    backend: str = ""
+    model_id: str = ""
+    # 逐字稿檔名後綴，各後端不同，避免互相覆寫
+    transcription_suffix: str = "_transcription"
+    # 最近一次逐視窗轉錄中等待 ffmpeg 解碼的秒數 (供執行報告使用)
+    last_decode_seconds: Optional[float] = None
+
     @abstractmethod
-    def transcribe(self, audio_path: str, language: str = None, return_timestamps: bool = True) -> Optional[Dict[str, Any]]:
+    def transcribe(self, audio_path: str, language: str = None, return_timestamps: bool = True,
+                   progress_callback: Optional[ProgressCallback] = None,
+                   cancel_token: Optional[CancelToken] = None) -> Optional[Dict[str, Any]]:
         pass
         
     @abstractmethod
     def save_transcription(self, result: Dict[str, Any], audio_path: str) -> str:
         pass
 
+    @classmethod
+    def output_path(cls, audio_path: str) -> Path:
+        """此後端保存逐字稿的路徑"""
+        return FileManager.generate_output_path(audio_path, config.TRANSCRIPTION_DIR, cls.transcription_suffix)
+
+    def _transcribe_windows(self, audio_path: str, transcribe_window: WindowTranscriber, cancel_token: CancelToken,
+                            on_window: Optional[Callable[[list], None]] = None) -> Dict[str, Any]:
+        """逐視窗轉錄並合併結果；每個視窗開始前檢查取消請求，取消時拋出 TaskCancelled"""
+        texts = []
+        chunks = []
+        has_chunks = False
+        windows = iter_audio_windows(audio_path, config.TRANSCRIBE_WINDOW_SECONDS)
+        decode_seconds = 0.0
+        try:
+            while True:
+                # 解碼時間 (等待 ffmpeg 輸出下一個視窗) 與轉錄分開統計
+                decode_started = time.monotonic()
+                item = next(windows, None)
+                decode_seconds += time.monotonic() - decode_started
+                if item is None:
+                    break
+                offset, samples = item
+                cancel_token.raise_if_cancelled()
+                window = transcribe_window(samples, offset)
+                shift = offset / self.timestamp_scale
+                window_chunks = []
+                for chunk in window.get('chunks') or []:
+                    timestamp = chunk.get('timestamp')
+                    if timestamp:
+                        chunk = dict(chunk, timestamp=[t + shift if t is not None else None for t in timestamp])
+                    window_chunks.append(chunk)
+                has_chunks = has_chunks or 'chunks' in window
+                texts.append(window.get('text', '').strip())
+                chunks.extend(window_chunks)
+                if on_window:
+                    on_window(window_chunks)
+        finally:
+            windows.close()
+            self.last_decode_seconds = decode_seconds
+            metrics.observe("videotonote_stage_duration_seconds", decode_seconds, stage="decode")
+        cancel_token.raise_if_cancelled()
+        result = {"text": " ".join(text for text in texts if text)}
+        if has_chunks:
+            result["chunks"] = chunks
+        return result
+
+    def save_segments(self, result: Dict[str, Any], audio_path: str) -> Optional[str]:
+        """
+        保存帶時間戳記的片段 (JSON，時間單位統一為秒)，供下載 JSON / SRT 格式的逐字稿
+        
+        Returns:
+            保存的檔案路徑，沒有片段資訊時返回 None
+        """
+        chunks = result.get('chunks') if isinstance(result, dict) else None
+        if not chunks:
+            return None
+        segments = []
+        for chunk in chunks:
+            start, end = (chunk.get('timestamp') or (None, None))[:2]
+            segments.append({
+                "start": start * self.timestamp_scale if start is not None else None,
+                "end": end * self.timestamp_scale if end is not None else None,
+                "text": chunk.get('text', '').strip()
+            })
+        output_path = FileManager.generate_output_path(audio_path, config.TRANSCRIPTION_DIR, "_segments", ".json")
+        content = json.dumps({"text": result.get('text', ''), "segments": segments}, ensure_ascii=False, indent=2)
+        if FileManager.save_text_file(content, output_path):
+            return str(output_path)
+        return None
+
 
 class SpeechTranscriber(BaseTranscriber):
-    def __init__(self, model_id: str = None, device: str = None):
+    backend = "transformers"
+
+    def __init__(self, model_id: str = None, device: str = None, compute_type: str = None):
+        """
+        Args:
+            model_id: Hugging Face 模型名稱
+            device: 推論裝置 (預設: 有 GPU 時使用 cuda:0)
+            compute_type: 權重精度 ('float16' / 'float32'，預設: 有 GPU 時使用 float16，否則 float32)
+        """
         self.model_id = model_id or config.WHISPER_MODEL_ID
         self.device = device if device else ("cuda:0" if torch.cuda.is_available() else "cpu")
-        self.torch_dtype = torch.float16 if torch.cuda.is_available() else torch.float32
+        if compute_type:
+            self.torch_dtype = getattr(torch, compute_type)
+        else:
+            self.torch_dtype = torch.float16 if torch.cuda.is_available() else torch.float32
         
         self._load_model()
         
@@ -61,7 +170,9 @@ class SpeechTranscriber(BaseTranscriber):
         
         print("語音辨識模型載入完成")
 
-    def transcribe(self, audio_path: str, language: str = None, return_timestamps: bool = True) -> Optional[Dict[str, Any]]:
+    def transcribe(self, audio_path: str, language: str = None, return_timestamps: bool = True,
+                   progress_callback: Optional[ProgressCallback] = None,
+                   cancel_token: Optional[CancelToken] = None) -> Optional[Dict[str, Any]]:
         """
         轉錄音檔為文字
         
@@ -69,6 +180,8 @@ class SpeechTranscriber(BaseTranscriber):
             audio_path: 音檔路徑
             language: 目標語言
             return_timestamps: 是否包含時間戳記
+            progress_callback: 轉錄進度回呼 (pipeline 批次解碼，於整份或每個視窗完成後依片段回報)
+            cancel_token: 提供時逐視窗解碼，取消請求於下一個視窗邊界生效
             
         Returns:
             轉錄結果字典
@@ -84,19 +197,45 @@ class SpeechTranscriber(BaseTranscriber):
                 "task": "transcribe",
                 "condition_on_prev_tokens": False
             }
-                
-            result = self.pipe(
-                audio_path,
-                return_timestamps=return_timestamps,
-                generate_kwargs=generate_kwargs
-            )
+
+            def run(media):
+                return self.pipe(
+                    media,
+                    return_timestamps=return_timestamps,
+                    generate_kwargs=generate_kwargs
+                )
+
+            total = FileManager.get_audio_duration(audio_path) if progress_callback else None
+            if cancel_token and can_stream_windows():
+                result = self._transcribe_windows(
+                    audio_path,
+                    lambda samples, offset: run({"raw": samples, "sampling_rate": SAMPLE_RATE}),
+                    cancel_token,
+                    on_window=lambda chunks: self._report_chunks(chunks, total, progress_callback)
+                )
+            else:
+                if cancel_token:
+                    cancel_token.raise_if_cancelled()
+                result = run(audio_path)
+                self._report_chunks(result.get("chunks") or [], total, progress_callback)
             print("轉錄完成")
             return result
             
+        except TaskCancelled:
+            print("轉錄已取消")
+            raise
         except Exception as e:
             print(f"轉錄過程中發生錯誤: {e}")
             return None
 
+    @staticmethod
+    def _report_chunks(chunks: list, total: Optional[float], progress_callback: Optional[ProgressCallback]):
+        if not progress_callback:
+            return
+        for chunk in chunks:
+            end = chunk["timestamp"][1] if chunk.get("timestamp") else None
+            progress_callback({"seconds": end, "total": total, "segment": chunk})
+
     def save_transcription(self, result: Dict[str, Any], audio_path: str) -> str:
         """
         保存轉錄結果
@@ -108,11 +247,7 @@ class SpeechTranscriber(BaseTranscriber):
         Returns:
             保存的檔案路徑
         """
-        output_path = FileManager.generate_output_path(
-            audio_path, 
-            config.TRANSCRIPTION_DIR, 
-            "_transcription"
-        )
+        output_path = self.output_path(audio_path)
         
         content = result.get('text', str(result)) if isinstance(result, dict) else str(result)
         
@@ -127,14 +262,19 @@ class FastSpeechTranscriber(BaseTranscriber):
     使用 pywhispercpp 的快速語音轉錄服務
     功能完全對照 SpeechTranscriber，但使用 C++ 實現以獲得更好的性能
     """
+    # whisper.cpp 的片段時間單位為 10ms
+    timestamp_scale = 0.01
+    backend = "whisper.cpp"
+    transcription_suffix = "_transcription_fast"
     
-    def __init__(self, model_id: str = None, device: str = None):
+    def __init__(self, model_id: str = None, device: str = None, threads: int = None):
         """
         初始化快速語音轉錄器
         
         Args:
             model_id: 模型名稱 (tiny, base, small, medium, large)
             device: 設備參數 (在 pywhispercpp 中不直接使用，但保持介面一致性)
+            threads: 推論執行緒數 (None 使用 pywhispercpp 預設值)
         """
         if not PYWHISPERCPP_AVAILABLE:
             raise ImportError("pywhispercpp 未安裝。請執行: pip install pywhispercpp")
@@ -152,6 +292,7 @@ class FastSpeechTranscriber(BaseTranscriber):
         
         self.model_id = model_id or config.WHISPER_MODEL_ID
         self.device = device  # 保持介面一致性
+        self.model_params = {"n_threads": threads} if threads else {}
         
         # 轉換模型名稱
         if self.model_id in model_mapping:
@@ -182,27 +323,29 @@ class FastSpeechTranscriber(BaseTranscriber):
         print(f"嘗試載入模型: {self.cpp_model_name}")
         
         try:
-            self.model = WhisperCppModel(self.cpp_model_name)
+            self.model = WhisperCppModel(self.cpp_model_name, **self.model_params)
             print("快速語音辨識模型載入完成")
         except Exception as e:
             print(f"載入模型 '{self.cpp_model_name}' 失敗: {e}")
             print("嘗試使用備用模型 'base'...")
             try:
-                self.model = WhisperCppModel("base")
+                self.model = WhisperCppModel("base", **self.model_params)
                 self.cpp_model_name = "base"
                 print("使用備用模型 'base' 載入完成")
             except Exception as e2:
                 print(f"載入備用模型也失敗: {e2}")
                 print("嘗試使用最小模型 'tiny'...")
                 try:
-                    self.model = WhisperCppModel("tiny")
+                    self.model = WhisperCppModel("tiny", **self.model_params)
                     self.cpp_model_name = "tiny"
                     print("使用最小模型 'tiny' 載入完成")
                 except Exception as e3:
                     print(f"所有模型載入都失敗: {e3}")
                     raise RuntimeError("無法載入任何 Whisper 模型，請檢查 pywhispercpp 安裝")
 
-    def transcribe(self, audio_path: str, language: str = None, return_timestamps: bool = True) -> Optional[Dict[str, Any]]:
+    def transcribe(self, audio_path: str, language: str = None, return_timestamps: bool = True,
+                   progress_callback: Optional[ProgressCallback] = None,
+                   cancel_token: Optional[CancelToken] = None) -> Optional[Dict[str, Any]]:
         """
         轉錄音檔為文字
         
@@ -210,6 +353,8 @@ class FastSpeechTranscriber(BaseTranscriber):
             audio_path: 音檔路徑
             language: 目標語言
             return_timestamps: 是否包含時間戳記
+            progress_callback: 轉錄進度回呼 (每解碼出一個片段即回報)
+            cancel_token: 提供時逐視窗解碼，取消請求於下一個視窗邊界生效
             
         Returns:
             轉錄結果字典，格式與 SpeechTranscriber 一致
@@ -226,37 +371,71 @@ class FastSpeechTranscriber(BaseTranscriber):
             }
             if language in ["chinese", "zh"]:
                 transcribe_kwargs["initial_prompt"] = "這是一段普通的中文語音紀錄，包含會議、課程或對話內容。"
-                
-            segments = self.model.transcribe(audio_path, **transcribe_kwargs)
-            
-            # 組織結果以匹配 SpeechTranscriber 的輸出格式
-            full_text = ""
-            chunks = []
-            
-            for segment in segments:
-                full_text += segment.text + " "
-                
-                if return_timestamps:
-                    chunk = {
-                        "timestamp": [segment.t0, segment.t1],  # 修正：使用 t0, t1 而非 start, end
-                        "text": segment.text
-                    }
-                    chunks.append(chunk)
-            
-            result = {
-                "text": full_text.strip()
-            }
-            
-            if return_timestamps:
-                result["chunks"] = chunks
+            total = FileManager.get_audio_duration(audio_path) if progress_callback else None
+
+            def run(media, offset: float = 0.0):
+                kwargs = dict(transcribe_kwargs)
+                if progress_callback:
+                    kwargs["new_segment_callback"] = self._segment_callback(total, progress_callback, offset)
+                return self._to_result(self.model.transcribe(media, **kwargs), return_timestamps)
+
+            if cancel_token and can_stream_windows():
+                result = self._transcribe_windows(audio_path, run, cancel_token)
+            else:
+                if cancel_token:
+                    cancel_token.raise_if_cancelled()
+                result = run(audio_path)
             
             print("轉錄完成")
             return result
             
+        except TaskCancelled:
+            print("轉錄已取消")
+            raise
         except Exception as e:
             print(f"轉錄過程中發生錯誤: {e}")
             return None
 
+    @staticmethod
+    def _to_result(segments, return_timestamps: bool) -> Dict[str, Any]:
+        """組織結果以匹配 SpeechTranscriber 的輸出格式"""
+        full_text = ""
+        chunks = []
+        
+        for segment in segments:
+            full_text += segment.text + " "
+            
+            if return_timestamps:
+                chunk = {
+                    "timestamp": [segment.t0, segment.t1],  # 修正：使用 t0, t1 而非 start, end
+                    "text": segment.text
+                }
+                chunks.append(chunk)
+        
+        result = {
+            "text": full_text.strip()
+        }
+        
+        if return_timestamps:
+            result["chunks"] = chunks
+        return result
+
+    @staticmethod
+    def _segment_callback(total: Optional[float], progress_callback: ProgressCallback, offset: float = 0.0):
+        """將 whisper.cpp 的片段 (時間單位 10ms，相對於視窗起點) 轉為進度事件"""
+        shift = offset / FastSpeechTranscriber.timestamp_scale
+
+        def callback(segment):
+            try:
+                progress_callback({
+                    "seconds": segment.t1 * FastSpeechTranscriber.timestamp_scale + offset,
+                    "total": total,
+                    "segment": {"timestamp": [segment.t0 + shift, segment.t1 + shift], "text": segment.text}
+                })
+            except Exception as e:
+                print(f"轉錄進度回呼發生錯誤: {e}")
+        return callback
+
     def save_transcription(self, result: Dict[str, Any], audio_path: str) -> str:
         """
         保存轉錄結果
@@ -268,11 +447,7 @@ class FastSpeechTranscriber(BaseTranscriber):
         Returns:
             保存的檔案路徑
         """
-        output_path = FileManager.generate_output_path(
-            audio_path, 
-            config.TRANSCRIPTION_DIR, 
-            "_transcription_fast"
-        )
+        output_path = self.output_path(audio_path)
         
         content = result.get('text', str(result)) if isinstance(result, dict) else str(result)
         
@@ -282,7 +457,297 @@ class FastSpeechTranscriber(BaseTranscriber):
         return None
 
 
+class CTranslate2Transcriber(BaseTranscriber):
+    """
+    使用 faster-whisper (CTranslate2) 的語音轉錄服務
+    CPU 上以 int8 量化推論，內建 VAD 略過靜音段落；輸出格式與 SpeechTranscriber 一致
+    """
+    backend = "ctranslate2"
+    transcription_suffix = "_transcription_ct2"
+
+    def __init__(self, model_id: str = None, device: str = None, compute_type: str = None,
+                 beam_size: int = None, cpu_threads: int = None, vad_filter: bool = None):
+        """
+        Args:
+            model_id: 模型名稱 (tiny, base, small, medium, large-v3, distil-large-v3)、
+                      Hugging Face 名稱 (openai/whisper-small 會對應到 small) 或已轉換的 CTranslate2 模型路徑
+            device: 推論裝置 ('cpu' / 'cuda' / 'auto'，預設: CTRANSLATE2_DEVICE)
+            compute_type: 推論精度 ('int8' / 'int8_float32' / 'float32'，GPU 可用 'float16' / 'int8_float16')
+            beam_size: beam search 寬度 (1 為貪婪解碼)
+            cpu_threads: CPU 推論執行緒數 (0 由 CTranslate2 決定)
+            vad_filter: 是否以內建的 Silero VAD 略過沒有語音的段落
+        """
+        if not FASTER_WHISPER_AVAILABLE:
+            raise ImportError("faster-whisper 未安裝。請執行: pip install faster-whisper")
+
+        self.model_id = model_id or config.WHISPER_MODEL_ID
+        self.ct2_model_name = self.model_id
+        if self.model_id.startswith("openai/whisper-"):
+            # openai/whisper-small → small；openai/whisper-large 沒有對應的 CTranslate2 模型，改用 large-v3
+            name = self.model_id[len("openai/whisper-"):]
+            self.ct2_model_name = "large-v3" if name == "large" else name
+        self.device = device or config.CTRANSLATE2_DEVICE
+        self.compute_type = compute_type or config.CTRANSLATE2_COMPUTE_TYPE
+        self.beam_size = beam_size or config.CTRANSLATE2_BEAM_SIZE
+        self.cpu_threads = config.CTRANSLATE2_CPU_THREADS if cpu_threads is None else cpu_threads
+        self.vad_filter = config.CTRANSLATE2_VAD_FILTER if vad_filter is None else vad_filter
+
+        self._load_model()
+
+    def _load_model(self):
+        """載入語音辨識模型 (首次使用時自動下載已轉換的模型)"""
+        print(f"正在載入 CTranslate2 語音辨識模型: {self.ct2_model_name} ({self.device}, {self.compute_type})...")
+        self.model = CTranslate2Model(
+            self.ct2_model_name,
+            device=self.device,
+            compute_type=self.compute_type,
+            cpu_threads=self.cpu_threads
+        )
+        print("CTranslate2 語音辨識模型載入完成")
+
+    @staticmethod
+    def _language_code(language: str) -> str:
+        """faster-whisper 只接受語言代碼 (chinese → zh)"""
+        try:
+            from transformers.models.whisper.tokenization_whisper import TO_LANGUAGE_CODE
+        except ImportError:
+            TO_LANGUAGE_CODE = {"chinese": "zh", "english": "en", "japanese": "ja", "korean": "ko"}
+        return TO_LANGUAGE_CODE.get(language.lower(), language)
+
+    def transcribe(self, audio_path: str, language: str = None, return_timestamps: bool = True,
+                   progress_callback: Optional[ProgressCallback] = None,
+                   cancel_token: Optional[CancelToken] = None) -> Optional[Dict[str, Any]]:
+        """
+        轉錄音檔為文字
+
+        Args:
+            audio_path: 音檔路徑
+            language: 目標語言
+            return_timestamps: 是否包含時間戳記
+            progress_callback: 轉錄進度回呼 (每解碼出一個片段即回報)
+            cancel_token: 提供時逐視窗解碼，並於每個片段之間檢查取消請求
+
+        Returns:
+            轉錄結果字典，格式與 SpeechTranscriber 一致
+        """
+        try:
+            language = language or config.DEFAULT_LANGUAGE
+
+            print(f"開始轉錄音檔: {audio_path}")
+
+            transcribe_kwargs = {
+                "language": self._language_code(language),
+                "task": "transcribe",
+                "beam_size": self.beam_size,
+                "vad_filter": self.vad_filter,
+                # 與其他後端相同：不以前文作為提示，避免幻覺字詞延續到後續片段
+                "condition_on_previous_text": False
+            }
+            if language in ["chinese", "zh"]:
+                transcribe_kwargs["initial_prompt"] = "這是一段普通的中文語音紀錄，包含會議、課程或對話內容。"
+            total = FileManager.get_audio_duration(audio_path) if progress_callback else None
+
+            def run(media, offset: float = 0.0):
+                # segments 為延遲產生的迭代器，逐段解碼
+                segments, _ = self.model.transcribe(media, **transcribe_kwargs)
+                texts = []
+                chunks = []
+                for segment in segments:
+                    if cancel_token:
+                        cancel_token.raise_if_cancelled()
+                    texts.append(segment.text.strip())
+                    chunks.append({"timestamp": [segment.start, segment.end], "text": segment.text})
+                    if progress_callback:
+                        self._report_segment(segment, offset, total, progress_callback)
+                result = {"text": " ".join(text for text in texts if text)}
+                if return_timestamps:
+                    result["chunks"] = chunks
+                return result
+
+            if cancel_token and can_stream_windows():
+                result = self._transcribe_windows(audio_path, run, cancel_token)
+            else:
+                if cancel_token:
+                    cancel_token.raise_if_cancelled()
+                result = run(audio_path)
+
+            print("轉錄完成")
+            return result
+
+        except TaskCancelled:
+            print("轉錄已取消")
+            raise
+        except Exception as e:
+            print(f"轉錄過程中發生錯誤: {e}")
+            return None
+
+    @staticmethod
+    def _report_segment(segment, offset: float, total: Optional[float], progress_callback: ProgressCallback):
+        try:
+            progress_callback({
+                "seconds": segment.end + offset,
+                "total": total,
+                "segment": {"timestamp": [segment.start + offset, segment.end + offset], "text": segment.text}
+            })
+        except Exception as e:
+            print(f"轉錄進度回呼發生錯誤: {e}")
+
+    def save_transcription(self, result: Dict[str, Any], audio_path: str) -> str:
+        """
+        保存轉錄結果
+
+        Args:
+            result: 轉錄結果
+            audio_path: 原始音檔路徑
+
+        Returns:
+            保存的檔案路徑
+        """
+        output_path = self.output_path(audio_path)
+
+        content = result.get('text', str(result)) if isinstance(result, dict) else str(result)
+
+        if FileManager.save_text_file(content, output_path):
+            return str(output_path)
+
+        return None
+
+
+class AutoTranscriber(BaseTranscriber):
+    """
+    自動選擇轉錄器：首次轉錄時以音檔開頭 (或設定的校準音檔) 量測本機可用的後端 / 模型 / 執行緒數，
+    選用符合即時倍率目標中最準確的組合，之後的轉錄皆交由選出的轉錄器處理
+
+    本機已有有效的校準結果時，建立時即載入選出的轉錄器 (可由父行程預先載入後與 worker 共享)。
+    """
+
+    def __init__(self, model_id: str = None, device: str = None):
+        """
+        Args:
+            model_id: 僅為介面一致性保留 (模型由校準結果決定)
+            device: 推論裝置 (傳給 transformers 後端)
+        """
+        self.device = device
+        self.delegate: Optional[BaseTranscriber] = None
+        self.calibration: Optional[Dict[str, Any]] = None
+        # 各語言的校準結果與選出的轉錄器；不同語言選出相同組合時共用同一個已載入的轉錄器
+        self._delegates: Dict[str, BaseTranscriber] = {}
+        self._calibrations: Dict[str, Dict[str, Any]] = {}
+        self._instances: Dict[str, BaseTranscriber] = {}
+        self._load_calibrated(config.DEFAULT_LANGUAGE)
+
+    def _use(self, language: str, calibration: Optional[Dict[str, Any]]):
+        """切換為該語言選出的轉錄器 (沒有校準結果時為預設的快速轉錄器)"""
+        from .transcriber_tuning import Candidate, create_transcriber
+
+        if calibration is None:
+            key = "fast"
+            if key not in self._instances:
+                self._instances[key] = TranscriberFactory.create('fast', device=self.device)
+        else:
+            selected = Candidate(**calibration["selected"])
+            key = selected.label
+            if key not in self._instances:
+                self._instances[key] = create_transcriber(selected, self.device)
+            self._calibrations[language] = calibration
+        self._delegates[language] = self._instances[key]
+        self.delegate = self._delegates[language]
+        self.calibration = calibration
+
+    def _load_calibrated(self, language: str) -> bool:
+        from .transcriber_tuning import Candidate, discover_candidates, load_calibration
+
+        calibration = load_calibration(discover_candidates(language), language)
+        if calibration is None:
+            return False
+        selected = Candidate(**calibration["selected"])
+        print(f"使用本機校準結果 ({language}): {selected.label}，即時倍率 {calibration['selected_rtf']:.3f}")
+        self._use(language, calibration)
+        return True
+
+    def _ensure_delegate(self, audio_path: str, language: str):
+        """依語言取得選出的轉錄器；該語言沒有有效的校準結果時先校準"""
+        from .transcriber_tuning import discover_candidates, calibrate, calibration_lock, save_calibration
+
+        if language in self._delegates:
+            self.delegate = self._delegates[language]
+            self.calibration = self._calibrations.get(language)
+            return
+        with calibration_lock():
+            # 等待鎖定期間其他 worker 可能已完成校準
+            if self._load_calibrated(language):
+                return
+            candidates = discover_candidates(language)
+            calibration = calibrate(candidates, config.AUTO_TRANSCRIBER_FIXTURE or audio_path, language, self.device) if candidates else None
+            if calibration is None:
+                print("無法校準轉錄器，使用預設的快速轉錄器")
+            else:
+                save_calibration(calibration)
+        self._use(language, calibration)
+
+    @property
+    def backend(self) -> str:
+        return self.delegate.backend if self.delegate else "auto"
+
+    @property
+    def model_id(self) -> str:
+        return self.delegate.model_id if self.delegate else "auto"
+
+    @property
+    def timestamp_scale(self) -> float:
+        return self.delegate.timestamp_scale if self.delegate else 1.0
+
+    @property
+    def last_decode_seconds(self) -> Optional[float]:
+        return self.delegate.last_decode_seconds if self.delegate else None
+
+    @last_decode_seconds.setter
+    def last_decode_seconds(self, value: Optional[float]):
+        if self.delegate:
+            self.delegate.last_decode_seconds = value
+
+    def transcribe(self, audio_path: str, language: str = None, return_timestamps: bool = True,
+                   progress_callback: Optional[ProgressCallback] = None,
+                   cancel_token: Optional[CancelToken] = None) -> Optional[Dict[str, Any]]:
+        language = language or config.DEFAULT_LANGUAGE
+        try:
+            self._ensure_delegate(audio_path, language)
+        except Exception as e:
+            print(f"校準轉錄器時發生錯誤: {e}")
+            return None
+        return self.delegate.transcribe(audio_path, language=language, return_timestamps=return_timestamps,
+                                        progress_callback=progress_callback, cancel_token=cancel_token)
+
+    @classmethod
+    def output_path(cls, audio_path: str) -> Path:
+        """選用的後端由校準決定：任一後端的逐字稿已存在即視為已轉錄，否則為標準後端的路徑"""
+        paths = [transcriber.output_path(audio_path)
+                 for transcriber in (SpeechTranscriber, FastSpeechTranscriber, CTranslate2Transcriber)]
+        return next((path for path in paths if path.exists()), paths[0])
+
+    def save_transcription(self, result: Dict[str, Any], audio_path: str) -> str:
+        return self.delegate.save_transcription(result, audio_path)
+
+    def save_segments(self, result: Dict[str, Any], audio_path: str) -> Optional[str]:
+        return self.delegate.save_segments(result, audio_path)
+
+
 class TranscriberFactory:
+    @staticmethod
+    def transcriber_class(transcriber_type: str = 'fast') -> type:
+        """不載入模型，回傳 create 會建立的轉錄器類別 (已考慮後端未安裝時的回退)"""
+        transcriber_type = transcriber_type.lower()
+        if transcriber_type == 'fast':
+            return FastSpeechTranscriber if PYWHISPERCPP_AVAILABLE else SpeechTranscriber
+        elif transcriber_type == 'ctranslate2':
+            return CTranslate2Transcriber if FASTER_WHISPER_AVAILABLE else SpeechTranscriber
+        elif transcriber_type == 'standard':
+            return SpeechTranscriber
+        elif transcriber_type == 'auto':
+            return AutoTranscriber
+        else:
+            raise ValueError(f"不支援的轉錄器類型: {transcriber_type}")
+
     @staticmethod
     def create(transcriber_type: str = 'fast', **kwargs) -> BaseTranscriber:
         if transcriber_type.lower() == 'fast':
@@ -291,7 +756,15 @@ class TranscriberFactory:
             else:
                 print("快速轉錄器不可用，回退到標準轉錄器")
                 return SpeechTranscriber(**kwargs)
+        elif transcriber_type.lower() == 'ctranslate2':
+            if FASTER_WHISPER_AVAILABLE:
+                return CTranslate2Transcriber(**kwargs)
+            else:
+                print("CTranslate2 轉錄器不可用 (pip install faster-whisper)，回退到標準轉錄器")
+                return SpeechTranscriber(**{key: value for key, value in kwargs.items() if key in ("model_id", "device")})
         elif transcriber_type.lower() == 'standard':
             return SpeechTranscriber(**kwargs)
+        elif transcriber_type.lower() == 'auto':
+            return AutoTranscriber(**{key: value for key, value in kwargs.items() if key in ("model_id", "device")})
         else:
             raise ValueError(f"不支援的轉錄器類型: {transcriber_type}")
@@ -0,0 +1,289 @@
+# -*- coding: utf-8 -*-
+"""
+轉錄器自動調校 - 量測本機可用的後端 / 模型 / 執行緒數組合，選出符合即時倍率目標中最準確的一個
+
+只量測已安裝的後端與已下載的模型 (校準不會觸發模型下載)。同一後端與執行緒數由小模型往大模型量測，
+某個模型超過目標後不再量測更大的模型。結果依主機保存，主機、候選組合、目標值或語言改變時才重新校準。
+"""
+import contextlib
+import gc
+import io
+import json
+import os
+import platform
+import re
+import socket
+import tempfile
+import time
+import wave
+from dataclasses import dataclass, asdict
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Tuple
+
+from ..core.config import config
+from ..utils.audio import SAMPLE_RATE, can_stream_windows, iter_audio_windows
+
+try:
+    import fcntl
+except ImportError:  # Windows：不鎖定，多個 worker 可能同時校準
+    fcntl = None
+
+# 模型大小的準確度排序 (同一排序內以精度區分；distil 模型略低於同名的完整模型)
+_SIZE_RANK = {
+    "tiny": 1, "base": 2, "small": 3, "medium": 4,
+    "large-v3-turbo": 5, "turbo": 5, "large-v1": 5,
+    "large": 6, "large-v2": 6, "large-v3": 6,
+}
+# 權重精度的準確度排序
+_PRECISION_RANK = {"f16": 2, "float16": 2, "float32": 2, "bfloat16": 2, "q8_0": 1, "int8": 1, "int8_float32": 1, "int8_float16": 1}
+_QUANTIZATION = re.compile(r"-(q\d_\d)$")
+# 暖機片段長度 (秒)，排除首次推論的初始化成本
+_WARMUP_SECONDS = 2.0
+
+@dataclass
+class Candidate:
+    backend: str
+    model: str
+    compute_type: str
+    threads: Optional[int] = None
+
+    @property
+    def label(self) -> str:
+        threads = f", {self.threads} 執行緒" if self.threads else ""
+        return f"{self.backend} {self.model} ({self.compute_type}{threads})"
+
+    @property
+    def quality(self) -> Tuple[float, int]:
+        """推估的準確度 (模型大小, 精度)，越大越準確"""
+        name = self.model.split("/")[-1].lower()
+        size = name.split("whisper-")[-1].replace(".en", "")
+        distil = "distil" in name
+        size = _QUANTIZATION.sub("", size.replace("distil-", ""))
+        rank = _SIZE_RANK.get(size, 0) - (0.5 if distil else 0)
+        return rank, _PRECISION_RANK.get(self.compute_type, 0)
+
+def cached_hf_models(keyword: str = "whisper") -> List[str]:
+    """Hugging Face 快取中的模型 (models--openai--whisper-small → openai/whisper-small)"""
+    cache = os.environ.get("HF_HUB_CACHE") or os.path.join(
+        os.environ.get("HF_HOME", os.path.expanduser("~/.cache/huggingface")), "hub"
+    )
+    if not os.path.isdir(cache):
+        return []
+    return [name[len("models--"):].replace("--", "/") for name in sorted(os.listdir(cache))
+            if name.startswith("models--") and keyword in name.lower()]
+
+def cached_ggml_models() -> List[str]:
+    """pywhispercpp 已下載的 ggml 模型 (ggml-small-q5_1.bin → small-q5_1)"""
+    try:
+        from pywhispercpp.constants import MODELS_DIR
+    except ImportError:
+        return []
+    if not os.path.isdir(MODELS_DIR):
+        return []
+    return sorted(name[len("ggml-"):-len(".bin")] for name in os.listdir(MODELS_DIR)
+                  if name.startswith("ggml-") and name.endswith(".bin"))
+
+def thread_options() -> List[int]:
+    if config.AUTO_TRANSCRIBER_THREADS:
+        return sorted(set(config.AUTO_TRANSCRIBER_THREADS))
+    cores = os.cpu_count() or 1
+    return sorted({cores, max(1, cores // 2)})
+
+def discover_candidates(language: str) -> List[Candidate]:
+    """列出本機可量測的組合 (已安裝的後端 × 已下載的模型 × 執行緒數)"""
+    from .transcriber import PYWHISPERCPP_AVAILABLE, FASTER_WHISPER_AVAILABLE
+
+    english = language.lower() in ("english", "en")
+    candidates = []
+    backends = config.AUTO_TRANSCRIBER_BACKENDS
+    if "whisper.cpp" in backends and PYWHISPERCPP_AVAILABLE:
+        for model in cached_ggml_models():
+            if ".en" in model and not english:
+                continue
+            # whisper.cpp 的精度由模型檔決定 (例如 small-q5_1)
+            match = _QUANTIZATION.search(model)
+            compute_type = match.group(1) if match else "f16"
+            candidates.extend(Candidate("whisper.cpp", model, compute_type, threads) for threads in thread_options())
+    if "ctranslate2" in backends and FASTER_WHISPER_AVAILABLE:
+        for model in cached_hf_models("faster-"):
+            if ".en" in model and not english:
+                continue
+            candidates.extend(Candidate("ctranslate2", model, config.CTRANSLATE2_COMPUTE_TYPE, threads)
+                              for threads in thread_options())
+    if "transformers" in backends:
+        # transformers 的執行緒數為整個行程共用的設定，不分別量測
+        candidates.extend(Candidate("transformers", model, "float32") for model in cached_hf_models("whisper")
+                          if "faster-" not in model and "ggml" not in model and (english or ".en" not in model))
+    return candidates
+
+def create_transcriber(candidate: Candidate, device: str = None):
+    from .transcriber import SpeechTranscriber, FastSpeechTranscriber, CTranslate2Transcriber
+
+    if candidate.backend == "whisper.cpp":
+        return FastSpeechTranscriber(model_id=candidate.model, threads=candidate.threads)
+    if candidate.backend == "ctranslate2":
+        return CTranslate2Transcriber(model_id=candidate.model, compute_type=candidate.compute_type,
+                                      cpu_threads=candidate.threads or 0)
+    return SpeechTranscriber(model_id=candidate.model, device=device)
+
+def host_fingerprint() -> Dict[str, Any]:
+    return {
+        "hostname": socket.gethostname(),
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "cpu_count": os.cpu_count(),
+    }
+
+def calibration_path(language: str) -> Path:
+    """各語言分開保存校準結果，交替處理不同語言的任務時不會互相覆寫"""
+    slug = re.sub(r"[^\w-]", "_", (language or "auto").lower())
+    return config.CALIBRATION_DIR / f"transcriber_{socket.gethostname()}_{slug}.json"
+
+def load_calibration(candidates: List[Candidate], language: str) -> Optional[Dict[str, Any]]:
+    """讀取本機保存的校準結果；主機、候選組合、目標值或語言改變時返回 None"""
+    path = calibration_path(language)
+    if not path.exists():
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"讀取校準結果失敗，將重新校準: {e}")
+        return None
+    if (data.get("host") != host_fingerprint() or data.get("language") != language
+            or data.get("rtf_target") != config.AUTO_TRANSCRIBER_RTF_TARGET
+            or data.get("candidates") != [asdict(candidate) for candidate in candidates]
+            or not data.get("selected")):
+        return None
+    return data
+
+def save_calibration(data: Dict[str, Any]):
+    path = calibration_path(data["language"])
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+@contextlib.contextmanager
+def calibration_lock():
+    """同一主機的 worker 依序校準，避免同時量測互相拖慢"""
+    path = config.CALIBRATION_DIR / f"transcriber_{socket.gethostname()}.lock"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w") as f:
+        if fcntl:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+def _write_wav(path: Path, samples):
+    import numpy as np
+
+    with wave.open(str(path), "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(SAMPLE_RATE)
+        f.writeframes((np.clip(samples, -1.0, 1.0) * 32767).astype(np.int16).tobytes())
+
+def prepare_clips(audio_path: str, directory: Path) -> Optional[Tuple[Path, Path, float]]:
+    """從音檔開頭取出校準片段與暖機片段 (16kHz WAV)，返回 (校準片段, 暖機片段, 校準片段秒數)"""
+    if not can_stream_windows():
+        print("未安裝 ffmpeg，無法取出校準片段")
+        return None
+    windows = iter_audio_windows(audio_path, config.AUTO_TRANSCRIBER_CALIBRATION_SECONDS)
+    try:
+        _, samples = next(windows, (0.0, None))
+    finally:
+        windows.close()
+    if samples is None or not len(samples):
+        print(f"校準音檔沒有內容: {audio_path}")
+        return None
+    clip_path = directory / "calibration.wav"
+    warmup_path = directory / "warmup.wav"
+    _write_wav(clip_path, samples)
+    _write_wav(warmup_path, samples[:int(_WARMUP_SECONDS * SAMPLE_RATE)])
+    return clip_path, warmup_path, len(samples) / SAMPLE_RATE
+
+def measure(candidate: Candidate, clip_path: Path, warmup_path: Path, clip_seconds: float,
+            language: str, device: str = None) -> Dict[str, Any]:
+    """載入組合並量測校準片段的即時倍率"""
+    result = {"candidate": asdict(candidate), "rtf": None, "load_seconds": None, "error": None}
+    transcriber = None
+    try:
+        # 各組合載入與轉錄的訊息不輸出，只顯示量測結果
+        with contextlib.redirect_stdout(io.StringIO()):
+            started = time.monotonic()
+            transcriber = create_transcriber(candidate, device)
+            result["load_seconds"] = round(time.monotonic() - started, 3)
+            transcriber.transcribe(str(warmup_path), language=language, return_timestamps=False)
+            started = time.monotonic()
+            output = transcriber.transcribe(str(clip_path), language=language, return_timestamps=False)
+            elapsed = time.monotonic() - started
+        if output is None:
+            result["error"] = "轉錄失敗"
+        else:
+            result["rtf"] = round(elapsed / clip_seconds, 4)
+    except Exception as e:
+        result["error"] = str(e)
+    finally:
+        del transcriber
+        gc.collect()
+    return result
+
+def calibrate(candidates: List[Candidate], audio_path: str, language: str, device: str = None) -> Optional[Dict[str, Any]]:
+    """
+    量測候選組合並選出符合目標的最準確組合
+
+    Returns:
+        校準結果 (含各組合的即時倍率與選出的組合)，無法取得校準片段或沒有組合可量測時返回 None
+    """
+    target = config.AUTO_TRANSCRIBER_RTF_TARGET
+    with tempfile.TemporaryDirectory(prefix="videotonote_calibration_") as directory:
+        clips = prepare_clips(audio_path, Path(directory))
+        if clips is None:
+            return None
+        clip_path, warmup_path, clip_seconds = clips
+        print(f"開始校準轉錄器: {len(candidates)} 個組合，片段 {clip_seconds:.1f}s，即時倍率目標 {target}")
+
+        results = []
+        # 同一後端與執行緒數中，超過目標的最小模型大小 (更大的模型不再量測)
+        too_slow: Dict[Tuple[str, Optional[int]], float] = {}
+        for candidate in sorted(candidates, key=lambda c: c.quality):
+            group = (candidate.backend, candidate.threads)
+            if candidate.quality[0] > too_slow.get(group, float("inf")):
+                results.append({"candidate": asdict(candidate), "rtf": None, "load_seconds": None, "error": None, "skipped": True})
+                continue
+            result = measure(candidate, clip_path, warmup_path, clip_seconds, language, device)
+            results.append(result)
+            if result["rtf"] is None:
+                print(f"  {candidate.label}: 失敗 ({result['error']})")
+                continue
+            print(f"  {candidate.label}: 即時倍率 {result['rtf']:.3f}")
+            if result["rtf"] > target:
+                too_slow[group] = min(too_slow.get(group, float("inf")), candidate.quality[0])
+
+    measured = [(Candidate(**result["candidate"]), result) for result in results if result["rtf"] is not None]
+    if not measured:
+        return None
+    passing = [(candidate, result) for candidate, result in measured if result["rtf"] <= target]
+    if passing:
+        selected, selected_result = max(passing, key=lambda item: (item[0].quality, -item[1]["rtf"]))
+    else:
+        selected, selected_result = min(measured, key=lambda item: item[1]["rtf"])
+        print(f"沒有組合符合即時倍率目標 {target}，改用最快的組合")
+    print(f"選用轉錄器: {selected.label}，即時倍率 {selected_result['rtf']:.3f}")
+    return {
+        "created_at": time.time(),
+        "host": host_fingerprint(),
+        "language": language,
+        "rtf_target": target,
+        "clip_seconds": round(clip_seconds, 3),
+        "candidates": [asdict(candidate) for candidate in candidates],
+        "results": results,
+        "selected": asdict(selected),
+        "selected_rtf": selected_result["rtf"],
+        "meets_target": selected_result["rtf"] <= target,
+    }
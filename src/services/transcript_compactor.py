@@ -0,0 +1,229 @@
+# -*- coding: utf-8 -*-
+"""
+逐字稿精簡服務 - 在送出筆記生成前移除幻覺迴圈、段落邊界重複與贅詞
+"""
+import re
+from dataclasses import dataclass
+from typing import Dict, Any, List, Tuple, Optional
+from ..core.config import config
+from .token_estimator import estimate_tokens
+
+_CJK = r'぀-ヿ㐀-䶿一-鿿가-힯豈-﫿'
+# 以單一中日韓文字、英數單字或單一標點為最小比對單位
+_TOKEN_PATTERN = re.compile(rf'[{_CJK}]|[^\W{_CJK}]+(?:\'[^\W{_CJK}]+)?|[^\w\s]')
+_CJK_CHAR = re.compile(rf'[{_CJK}]')
+_SENTENCE_PATTERN = re.compile(r'[^。！？!?\.\n]*[。！？!?\.\n]+|[^。！？!?\.\n]+')
+_PAUSE_PUNCTUATION = {',', '，', '、', '.', '。', '…'}
+
+FILLER_WORDS = {
+    "嗯", "呃", "額", "欸", "誒", "唔",
+    "um", "umm", "uh", "uhh", "erm", "hmm", "mm",
+}
+
+@dataclass
+class CompactionStats:
+    original_chars: int = 0
+    compacted_chars: int = 0
+    original_tokens: int = 0
+    compacted_tokens: int = 0
+    collapsed_repeats: int = 0
+    dropped_boundary: int = 0
+    dropped_fillers: int = 0
+
+    @property
+    def token_reduction(self) -> float:
+        if not self.original_tokens:
+            return 0.0
+        return 1 - self.compacted_tokens / self.original_tokens
+
+    def summary(self) -> str:
+        return (
+            f"逐字稿精簡: {self.original_tokens} → {self.compacted_tokens} tokens "
+            f"(減少 {self.token_reduction:.1%})，折疊重複 {self.collapsed_repeats} 處，"
+            f"移除邊界重複 {self.dropped_boundary} 段，移除贅詞 {self.dropped_fillers} 個"
+        )
+
+# (token, 前方是否有空白)
+Token = Tuple[str, bool]
+
+class TranscriptCompactor:
+    """
+    決定性的逐字稿精簡器
+
+    - 折疊連續重複超過 max_repeats 次的 n-gram（Whisper 幻覺迴圈）
+    - 移除與前一段完全相同或重疊的段落開頭（切塊邊界重複）
+    - 正規化空白，並可選擇移除贅詞
+    """
+
+    def __init__(self, max_ngram: int = None, max_repeats: int = None, strip_fillers: bool = None, min_overlap: int = 4,
+                 min_cjk_overlap: int = 12):
+        self.max_ngram = max_ngram or config.COMPACT_MAX_NGRAM
+        self.max_repeats = max_repeats or config.COMPACT_MAX_REPEATS
+        self.strip_fillers = config.COMPACT_STRIP_FILLERS if strip_fillers is None else strip_fillers
+        self.min_overlap = min_overlap
+        # 中日韓文字以單字為 token，幾個字的重疊多半只是同一個詞 (例如「機器學習」)，需以字數另訂門檻
+        self.min_cjk_overlap = min_cjk_overlap
+
+    def compact(self, transcription: Dict[str, Any]) -> Tuple[Dict[str, Any], CompactionStats]:
+        """
+        精簡轉錄結果
+
+        Args:
+            transcription: 轉錄結果字典 ({"text", "chunks"})
+
+        Returns:
+            (精簡後的轉錄結果, 統計資訊)
+        """
+        text = transcription.get('text', str(transcription)) if isinstance(transcription, dict) else str(transcription)
+        stats = CompactionStats(original_chars=len(text), original_tokens=estimate_tokens(text))
+        chunks = transcription.get('chunks') if isinstance(transcription, dict) else None
+
+        if chunks:
+            compacted_chunks = self._compact_chunks(chunks, stats)
+            compacted_text = self._join_segments(chunk['text'] for chunk in compacted_chunks)
+            result = dict(transcription, text=compacted_text, chunks=compacted_chunks)
+        else:
+            sentences = self._drop_repeated_segments(_SENTENCE_PATTERN.findall(text), stats)
+            compacted_text = self._compact_text(''.join(sentences), stats)
+            result = dict(transcription, text=compacted_text) if isinstance(transcription, dict) else {"text": compacted_text}
+
+        stats.compacted_chars = len(result['text'])
+        stats.compacted_tokens = estimate_tokens(result['text'])
+        return result, stats
+
+    def _compact_chunks(self, chunks: List[Dict[str, Any]], stats: CompactionStats) -> List[Dict[str, Any]]:
+        compacted = []
+        previous_tokens: List[Token] = []
+        for chunk in chunks:
+            tokens = self._process_tokens(self._tokenize(chunk.get('text', '')), stats)
+            if not tokens:
+                continue
+            overlap = self._boundary_overlap(previous_tokens, tokens)
+            if overlap == len(tokens):
+                stats.dropped_boundary += 1
+                continue
+            if overlap:
+                stats.dropped_boundary += 1
+                tokens = tokens[overlap:]
+            compacted.append(dict(chunk, text=self._detokenize(tokens)))
+            previous_tokens = tokens
+        return compacted
+
+    def _compact_text(self, text: str, stats: CompactionStats) -> str:
+        return self._detokenize(self._process_tokens(self._tokenize(text), stats))
+
+    def _process_tokens(self, tokens: List[Token], stats: CompactionStats) -> List[Token]:
+        if self.strip_fillers:
+            tokens = self._drop_fillers(tokens, stats)
+        return self._collapse_repeats(tokens, stats)
+
+    def _collapse_repeats(self, tokens: List[Token], stats: CompactionStats) -> List[Token]:
+        """將連續重複超過 max_repeats 次的 n-gram 折疊為一次"""
+        keys = [token.lower() for token, _ in tokens]
+        n = len(keys)
+        output: List[Token] = []
+        i = 0
+        while i < n:
+            collapsed_end = None
+            for size in range(1, self.max_ngram + 1):
+                if i + size * (self.max_repeats + 1) > n:
+                    break
+                # 先比對下一個單位的首字，避免大部分位置建立切片
+                if keys[i] != keys[i + size]:
+                    continue
+                unit = keys[i:i + size]
+                end = i + size
+                while keys[end:end + size] == unit:
+                    end += size
+                if (end - i) // size > self.max_repeats:
+                    collapsed_end = end
+                    output.extend(tokens[i:i + self._occurrence_size(tokens, i, end, size)])
+                    stats.collapsed_repeats += 1
+                    break
+            if collapsed_end is None:
+                output.append(tokens[i])
+                i += 1
+            else:
+                i = collapsed_end
+        return output
+
+    def _occurrence_size(self, tokens: List[Token], start: int, end: int, size: int) -> int:
+        """
+        折疊時保留的長度：以最短重複單位偵測迴圈，但保留一個完整的詞
+
+        原文以空白分隔的重複 (「謝謝 謝謝 謝謝」) 保留到下一個空白前的完整單位；
+        沒有空白的單一中日韓文字重複 (「哈哈哈哈」) 保留疊字兩次。
+        """
+        word = next((offset for offset in range(1, end - start) if tokens[start + offset][1]), None)
+        if word is not None and word % size == 0 and word <= self.max_ngram:
+            return word
+        if word is None and size == 1 and _CJK_CHAR.match(tokens[start][0]):
+            return 2
+        return size
+
+    def _drop_fillers(self, tokens: List[Token], stats: CompactionStats) -> List[Token]:
+        output: List[Token] = []
+        skip_pause = False
+        for token, space in tokens:
+            if token.lower() in FILLER_WORDS:
+                stats.dropped_fillers += 1
+                skip_pause = True
+                continue
+            if skip_pause and token in _PAUSE_PUNCTUATION:
+                continue
+            skip_pause = False
+            output.append((token, space))
+        return output
+
+    def _boundary_overlap(self, previous: List[Token], current: List[Token]) -> int:
+        """回傳 current 開頭與 previous 結尾重疊的 token 數"""
+        if not previous:
+            return 0
+        prev_keys = [token.lower() for token, _ in previous]
+        cur_keys = [token.lower() for token, _ in current]
+        if cur_keys == prev_keys:
+            return len(cur_keys)
+        for size in range(min(len(prev_keys), len(cur_keys)), self.min_overlap - 1, -1):
+            if prev_keys[-size:] == cur_keys[:size]:
+                if size < self.min_cjk_overlap and any(_CJK_CHAR.match(key) for key in cur_keys[:size]):
+                    continue
+                return size
+        return 0
+
+    def _drop_repeated_segments(self, segments: List[str], stats: CompactionStats) -> List[str]:
+        """移除與前一句完全相同的句子（超出 n-gram 長度的重複迴圈）"""
+        output = []
+        previous = None
+        for segment in segments:
+            key = re.sub(r'\s+', '', segment).lower()
+            if key and key == previous:
+                stats.dropped_boundary += 1
+                continue
+            output.append(segment)
+            previous = key
+        return output
+
+    @staticmethod
+    def _tokenize(text: str) -> List[Token]:
+        return [(match.group(), match.start() > 0 and text[match.start() - 1].isspace())
+                for match in _TOKEN_PATTERN.finditer(text)]
+
+    @staticmethod
+    def _detokenize(tokens: List[Token]) -> str:
+        parts = []
+        previous = None
+        for token, space in tokens:
+            # 中日韓文字之間不補空白，其餘沿用原文的空白位置
+            if previous is not None and space and not (_CJK_CHAR.match(token) and _CJK_CHAR.match(previous)):
+                parts.append(' ')
+            parts.append(token)
+            previous = token
+        return ''.join(parts)
+
+    @staticmethod
+    def _join_segments(texts) -> str:
+        return ' '.join(text for text in texts if text)
+
+def compact_transcription(transcription: Dict[str, Any], strip_fillers: Optional[bool] = None) -> Tuple[Dict[str, Any], CompactionStats]:
+    """以預設設定精簡轉錄結果"""
+    return TranscriptCompactor(strip_fillers=strip_fillers).compact(transcription)
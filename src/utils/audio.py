@@ -0,0 +1,57 @@
+"""
+音訊工具 - 以 ffmpeg 串流解碼音檔並切成固定長度的視窗
+"""
+import shutil
+import subprocess
+from typing import Iterator, Tuple, Optional, Any
+
+SAMPLE_RATE = 16000
+_BYTES_PER_SAMPLE = 4  # float32
+
+def can_stream_windows() -> bool:
+    return shutil.which('ffmpeg') is not None
+
+def iter_audio_windows(audio_path: str, window_seconds: float, sample_rate: int = SAMPLE_RATE) -> Iterator[Tuple[float, Any]]:
+    """
+    逐段解碼音檔，每次產生 (起始秒數, float32 單聲道取樣)
+
+    解碼輸出以管線逐段讀取，長音檔也只需保留一個視窗的取樣在記憶體中；
+    迭代提前結束 (例如任務取消) 時會終止 ffmpeg。
+    """
+    import numpy as np
+
+    command = [
+        'ffmpeg', '-nostdin', '-v', 'error', '-i', str(audio_path),
+        '-f', 'f32le', '-ac', '1', '-ar', str(sample_rate), '-'
+    ]
+    window_bytes = int(window_seconds * sample_rate) * _BYTES_PER_SAMPLE
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    try:
+        offset = 0.0
+        while True:
+            data = _read_exactly(process.stdout, window_bytes)
+            if not data:
+                break
+            samples = np.frombuffer(data[:len(data) - len(data) % _BYTES_PER_SAMPLE], dtype=np.float32)
+            yield offset, samples
+            offset += len(samples) / sample_rate
+            if len(data) < window_bytes:
+                break
+        if process.wait() != 0:
+            raise RuntimeError(f"ffmpeg 解碼失敗: {audio_path}")
+    finally:
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+        process.stdout.close()
+
+def _read_exactly(stream, size: int) -> Optional[bytes]:
+    chunks = []
+    remaining = size
+    while remaining > 0:
+        chunk = stream.read(remaining)
+        if not chunk:
+            break
+        chunks.append(chunk)
+        remaining -= len(chunk)
+    return b''.join(chunks)
@@ -0,0 +1,59 @@
+"""
+取消工具 - 在下載、轉錄與筆記生成之間傳遞取消請求
+"""
+import threading
+from typing import Callable, List
+
+class TaskCancelled(Exception):
+    """任務已被取消"""
+    pass
+
+class CancelToken:
+    """
+    跨執行緒的取消旗標
+
+    長時間執行的步驟可在安全的中斷點呼叫 raise_if_cancelled()，
+    或以 on_cancel() 註冊回呼 (例如終止子行程、關閉連線) 以立即中止。
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks: List[Callable[[], None]] = []
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def cancel(self):
+        with self._lock:
+            if self._event.is_set():
+                return
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                print(f"取消回呼發生錯誤: {e}")
+
+    def on_cancel(self, callback: Callable[[], None]) -> Callable[[], None]:
+        """註冊取消時執行的回呼 (已取消則立即執行)，回傳取消註冊的函式"""
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return lambda: self._unregister(callback)
+        callback()
+        return lambda: None
+
+    def _unregister(self, callback: Callable[[], None]):
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
+    def raise_if_cancelled(self):
+        if self._event.is_set():
+            raise TaskCancelled()
+
+    def wait(self, timeout: float) -> bool:
+        return self._event.wait(timeout)
@@ -2,6 +2,8 @@
 檔案管理工具
 """
 import os
+import shutil
+import subprocess
 from pathlib import Path
 from typing import Optional
 from ..core.config import config
@@ -52,3 +54,18 @@ class FileManager:
         except Exception as e:
             print(f"儲存檔案失敗: {e}")
             return False
+    
+    @staticmethod
+    def get_audio_duration(file_path: str) -> Optional[float]:
+        """以 ffprobe 讀取音檔長度 (秒)；未安裝 ffprobe 或讀取失敗時返回 None"""
+        if not shutil.which('ffprobe'):
+            return None
+        try:
+            result = subprocess.run(
+                ['ffprobe', '-v', 'error', '-show_entries', 'format=duration',
+                 '-of', 'default=noprint_wrappers=1:nokey=1', str(file_path)],
+                capture_output=True, text=True, check=True, timeout=30
+            )
+            return float(result.stdout.strip())
+        except (subprocess.SubprocessError, ValueError, OSError):
+            return None
@@ -0,0 +1,29 @@
+"""
+字幕格式工具
+"""
+from typing import List, Dict, Any
+
+def format_timestamp(seconds: float) -> str:
+    """將秒數轉為 SRT 時間格式 (HH:MM:SS,mmm)"""
+    milliseconds = int(round(max(0.0, seconds) * 1000))
+    hours, milliseconds = divmod(milliseconds, 3600 * 1000)
+    minutes, milliseconds = divmod(milliseconds, 60 * 1000)
+    secs, milliseconds = divmod(milliseconds, 1000)
+    return f"{hours:02d}:{minutes:02d}:{secs:02d},{milliseconds:03d}"
+
+def to_srt(segments: List[Dict[str, Any]]) -> str:
+    """
+    將片段轉為 SRT 字幕
+
+    Args:
+        segments: [{"start", "end", "text"}]，時間單位為秒；缺少結束時間時沿用下一段的開始時間
+    """
+    blocks = []
+    for index, segment in enumerate(segments):
+        start = segment.get("start") or 0.0
+        end = segment.get("end")
+        if end is None:
+            following = segments[index + 1].get("start") if index + 1 < len(segments) else None
+            end = following if following is not None else start + 2.0
+        blocks.append(f"{len(blocks) + 1}\n{format_timestamp(start)} --> {format_timestamp(end)}\n{segment.get('text', '').strip()}\n")
+    return "\n".join(blocks)
@@ -0,0 +1,11 @@
+"""
+轉錄後端離線效能測試
+
+以固定亂數種子產生不同長度、靜音比例與取樣率的測試音檔 (可另外放入附有參考文字的錄音)，
+對每個可用的後端 / 模型 / 精度組合量測載入時間、即時倍率、記憶體峰值與錯誤率，
+結果存成 JSON 並可與基準結果比較以找出效能退步。
+
+    python -m tests.benchmark.run_benchmark                      # 執行並保存結果
+    python -m tests.benchmark.run_benchmark --baseline base.json # 執行後與基準比較
+    python -m tests.benchmark.compare current.json base.json     # 比較兩份結果
+"""
@@ -0,0 +1,119 @@
+"""
+效能測試結果比較 - 找出相對基準結果退步的組合
+
+以 (後端, 模型, 精度) 對應兩份結果，逐一比較即時倍率、錯誤率、載入時間與記憶體峰值；
+有任何指標超過容許範圍時以非零狀態結束，可用於 CI。
+"""
+import argparse
+import json
+import sys
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Tuple
+
+# 指標 → (容許的增加量, 是否為相對比例)
+DEFAULT_TOLERANCES = {
+    "rtf": (0.10, True),
+    "wer": (0.02, False),
+    "load_seconds": (0.15, True),
+    "peak_rss_bytes": (0.15, True),
+}
+
+def _key(run: Dict[str, Any]) -> Tuple[str, str, str]:
+    return run["backend"], run["model"], run["compute_type"]
+
+def _exceeds(current: Optional[float], baseline: Optional[float], tolerance: float, relative: bool) -> bool:
+    if current is None or baseline is None:
+        return False
+    if relative:
+        return baseline > 0 and (current - baseline) / baseline > tolerance
+    return current - baseline > tolerance
+
+def _compare_metrics(label: str, current: Dict[str, Any], baseline: Dict[str, Any],
+                     tolerances: Dict[str, Tuple[float, bool]]) -> List[Dict[str, Any]]:
+    rows = []
+    for metric, (tolerance, relative) in tolerances.items():
+        if metric not in current and metric not in baseline:
+            continue
+        value, base = current.get(metric), baseline.get(metric)
+        rows.append({
+            "target": label,
+            "metric": metric,
+            "baseline": base,
+            "current": value,
+            "regression": _exceeds(value, base, tolerance, relative),
+        })
+    return rows
+
+def compare_reports(current: Dict[str, Any], baseline: Dict[str, Any],
+                    tolerances: Dict[str, Tuple[float, bool]] = None) -> List[Dict[str, Any]]:
+    """回傳每個 (組合/音檔, 指標) 的比較結果；基準有但這次失敗的組合也視為退步"""
+    tolerances = tolerances or DEFAULT_TOLERANCES
+    baseline_runs = {_key(run): run for run in baseline.get("runs", [])}
+    rows = []
+    for run in current.get("runs", []):
+        base = baseline_runs.get(_key(run))
+        label = " / ".join(_key(run))
+        if base is None:
+            continue
+        if run.get("status") != "ok":
+            rows.append({"target": label, "metric": "status", "baseline": base.get("status"),
+                         "current": run.get("status"), "regression": base.get("status") == "ok"})
+            continue
+        rows.extend(_compare_metrics(label, run, base, tolerances))
+        # 逐音檔比較，找出只在特定長度或靜音比例下退步的情況
+        base_results = {row["fixture"]: row for row in base.get("results", [])}
+        per_fixture = {metric: value for metric, value in tolerances.items() if metric in ("rtf", "wer")}
+        for row in run.get("results", []):
+            if row["fixture"] in base_results:
+                rows.extend(_compare_metrics(f"{label} [{row['fixture']}]", row, base_results[row["fixture"]], per_fixture))
+    return rows
+
+def _format(metric: str, value: Optional[float]) -> str:
+    if value is None:
+        return "-"
+    if metric == "peak_rss_bytes":
+        return f"{value / 1024 ** 2:.0f}MB"
+    if isinstance(value, str):
+        return value
+    return f"{value:.3f}"
+
+def print_comparison(rows: List[Dict[str, Any]], show_all: bool = False):
+    regressions = [row for row in rows if row["regression"]]
+    for row in (rows if show_all else regressions):
+        mark = "退步" if row["regression"] else "    "
+        print(f"{mark} {row['target']} {row['metric']}: "
+              f"{_format(row['metric'], row['baseline'])} → {_format(row['metric'], row['current'])}")
+    if regressions:
+        print(f"❌ 共 {len(regressions)} 項指標超過容許範圍")
+    else:
+        print(f"✅ 比較了 {len(rows)} 項指標，沒有退步")
+
+def main():
+    parser = argparse.ArgumentParser(description="比較兩份轉錄效能測試結果")
+    parser.add_argument("current", help="這次的結果 JSON")
+    parser.add_argument("baseline", help="基準結果 JSON")
+    parser.add_argument("--rtf-tolerance", type=float, default=DEFAULT_TOLERANCES["rtf"][0],
+                        help="即時倍率容許的相對增加 (預設: 0.10)")
+    parser.add_argument("--wer-tolerance", type=float, default=DEFAULT_TOLERANCES["wer"][0],
+                        help="錯誤率容許的絕對增加 (預設: 0.02)")
+    parser.add_argument("--load-tolerance", type=float, default=DEFAULT_TOLERANCES["load_seconds"][0],
+                        help="載入時間容許的相對增加 (預設: 0.15)")
+    parser.add_argument("--rss-tolerance", type=float, default=DEFAULT_TOLERANCES["peak_rss_bytes"][0],
+                        help="記憶體峰值容許的相對增加 (預設: 0.15)")
+    parser.add_argument("--all", action="store_true", help="列出所有指標而不只是退步的項目")
+    args = parser.parse_args()
+
+    tolerances = {
+        "rtf": (args.rtf_tolerance, True),
+        "wer": (args.wer_tolerance, False),
+        "load_seconds": (args.load_tolerance, True),
+        "peak_rss_bytes": (args.rss_tolerance, True),
+    }
+    current = json.loads(Path(args.current).read_text(encoding="utf-8"))
+    baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8"))
+    rows = compare_reports(current, baseline, tolerances)
+    print_comparison(rows, show_all=args.all)
+    sys.exit(1 if any(row["regression"] for row in rows) else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""
+測試音檔產生 - 以固定亂數種子產生可重現的音檔
+
+- synthetic: 類語音的諧波與雜訊 (無參考文字，用來量測速度與模型在非語音上產生的幻覺字數)
+- speech: 本機有 espeak-ng / espeak 時以固定句子合成語音，附參考文字可計算錯誤率
+- 自備錄音: fixtures/ 資料夾內的音檔，同名 .txt 為參考文字
+"""
+import hashlib
+import json
+import shutil
+import subprocess
+import wave
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Iterable, Tuple
+
+import numpy as np
+
+FIXTURE_DIR = Path(__file__).parent / "fixtures"
+AUDIO_EXTENSIONS = {'.wav', '.mp3', '.m4a', '.flac', '.ogg'}
+
+# 合成語音使用的參考句子 (英文，espeak 內建語音即可發音)
+SENTENCES = [
+    "The quick brown fox jumps over the lazy dog.",
+    "Please write down the main points of this lecture.",
+    "Speech recognition converts spoken words into text.",
+    "We measured the real time factor on every backend.",
+    "Long recordings are split into windows before decoding.",
+    "The meeting will continue after a short break.",
+]
+
+PROFILES = {
+    "quick": {"lengths": [10, 60], "silence_ratios": [0.0, 0.5], "sample_rates": [16000, 44100]},
+    "full": {"lengths": [10, 60, 300, 1200], "silence_ratios": [0.0, 0.3, 0.7], "sample_rates": [16000, 44100]},
+}
+
+def _write_wav(path: Path, samples: np.ndarray, sample_rate: int):
+    pcm = (np.clip(samples, -1.0, 1.0) * 32767).astype("<i2")
+    with wave.open(str(path), "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(sample_rate)
+        f.writeframes(pcm.tobytes())
+
+def _read_wav(path: Path) -> Tuple[np.ndarray, int]:
+    with wave.open(str(path), "rb") as f:
+        data = np.frombuffer(f.readframes(f.getnframes()), dtype="<i2").astype(np.float32) / 32768
+        if f.getnchannels() > 1:
+            data = data.reshape(-1, f.getnchannels()).mean(axis=1)
+        return data, f.getframerate()
+
+def _resample(samples: np.ndarray, source_rate: int, target_rate: int) -> np.ndarray:
+    if source_rate == target_rate:
+        return samples
+    length = int(len(samples) * target_rate / source_rate)
+    return np.interp(np.linspace(0, len(samples) - 1, length), np.arange(len(samples)), samples).astype(np.float32)
+
+def _apply_silence(samples: np.ndarray, sample_rate: int, silence_ratio: float, rng: np.random.Generator) -> np.ndarray:
+    """把約 silence_ratio 比例的 2 秒區塊靜音 (保留極小的底噪)"""
+    if silence_ratio <= 0:
+        return samples
+    block = 2 * sample_rate
+    blocks = max(1, len(samples) // block)
+    muted = rng.choice(blocks, size=int(round(blocks * silence_ratio)), replace=False)
+    samples = samples.copy()
+    for index in muted:
+        start = index * block
+        samples[start:start + block] = rng.normal(0, 1e-4, size=len(samples[start:start + block]))
+    return samples
+
+def synthetic_audio(seconds: float, sample_rate: int, rng: np.random.Generator) -> np.ndarray:
+    """類語音訊號：音高與振幅隨音節起伏的諧波，加上少量雜訊"""
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    pitch = 140 + 40 * np.sin(2 * np.pi * 0.3 * t + rng.uniform(0, np.pi))
+    phase = 2 * np.pi * np.cumsum(pitch) / sample_rate
+    voice = sum(np.sin(k * phase) / k for k in range(1, 6))
+    syllables = np.clip(np.sin(2 * np.pi * 4 * t + rng.uniform(0, np.pi)), 0, None)
+    signal = 0.2 * voice * syllables + rng.normal(0, 0.01, size=len(t))
+    return signal.astype(np.float32)
+
+def _tts_command() -> Optional[str]:
+    for name in ("espeak-ng", "espeak"):
+        if shutil.which(name):
+            return name
+    return None
+
+def _speech_audio(seconds: float, cache_dir: Path) -> Optional[Tuple[np.ndarray, int, str]]:
+    """重複合成參考句子直到達到指定長度，回傳 (取樣, 取樣率, 參考文字)；沒有 TTS 時回傳 None"""
+    command = _tts_command()
+    if command is None:
+        return None
+    pieces, words, sample_rate, total = [], [], None, 0.0
+    index = 0
+    while total < seconds:
+        sentence = SENTENCES[index % len(SENTENCES)]
+        path = cache_dir / f"tts_{index % len(SENTENCES)}.wav"
+        if not path.exists():
+            subprocess.run([command, "-w", str(path), sentence], check=True, capture_output=True)
+        samples, sample_rate = _read_wav(path)
+        pieces.append(samples)
+        pieces.append(np.zeros(int(0.3 * sample_rate), dtype=np.float32))
+        words.append(sentence)
+        total += len(samples) / sample_rate + 0.3
+        index += 1
+    return np.concatenate(pieces), sample_rate, " ".join(words)
+
+def generate_fixtures(output_dir: Path, lengths: Iterable[float], silence_ratios: Iterable[float],
+                      sample_rates: Iterable[int], seed: int = 0) -> List[Dict[str, Any]]:
+    """
+    產生 (或沿用已產生的) 測試音檔，回傳各音檔的資訊
+
+    參數與種子相同時產生的內容完全相同，檔名包含參數雜湊，可安全重複使用。
+    """
+    output_dir.mkdir(parents=True, exist_ok=True)
+    fixtures = []
+    kinds = ["synthetic"] + (["speech"] if _tts_command() else [])
+    for kind in kinds:
+        for seconds in lengths:
+            for silence_ratio in silence_ratios:
+                for sample_rate in sample_rates:
+                    params = {"kind": kind, "seconds": seconds, "silence_ratio": silence_ratio,
+                              "sample_rate": sample_rate, "seed": seed}
+                    digest = hashlib.sha1(json.dumps(params, sort_keys=True).encode()).hexdigest()[:8]
+                    name = f"{kind}_{int(seconds)}s_sil{int(silence_ratio * 100)}_{sample_rate // 1000}k_{digest}"
+                    path = output_dir / f"{name}.wav"
+                    meta_path = output_dir / f"{name}.json"
+                    if not path.exists() or not meta_path.exists():
+                        rng = np.random.default_rng(seed)
+                        reference = ""
+                        if kind == "speech":
+                            samples, source_rate, reference = _speech_audio(seconds, output_dir)
+                            samples = _resample(samples, source_rate, sample_rate)
+                        else:
+                            samples = synthetic_audio(seconds, sample_rate, rng)
+                        samples = _apply_silence(samples, sample_rate, silence_ratio, rng)
+                        _write_wav(path, samples, sample_rate)
+                        meta_path.write_text(json.dumps(dict(params, reference=reference, duration=len(samples) / sample_rate),
+                                                        ensure_ascii=False), encoding="utf-8")
+                    meta = json.loads(meta_path.read_text(encoding="utf-8"))
+                    fixtures.append(dict(meta, name=name, path=str(path)))
+    return fixtures
+
+def recorded_fixtures(directory: Path = FIXTURE_DIR) -> List[Dict[str, Any]]:
+    """自備的錄音 (同名 .txt 為參考文字，可選同名 .lang 指定語言)"""
+    if not directory.is_dir():
+        return []
+    fixtures = []
+    for path in sorted(directory.iterdir()):
+        if path.suffix.lower() not in AUDIO_EXTENSIONS:
+            continue
+        reference_path = path.with_suffix(".txt")
+        language_path = path.with_suffix(".lang")
+        fixtures.append({
+            "name": path.stem,
+            "path": str(path),
+            "kind": "recorded",
+            "reference": reference_path.read_text(encoding="utf-8").strip() if reference_path.exists() else "",
+            "language": language_path.read_text(encoding="utf-8").strip() if language_path.exists() else None,
+            "duration": None,
+        })
+    return fixtures
@@ -0,0 +1,259 @@
+"""
+轉錄後端效能測試 - 對每個可用的後端 / 模型 / 精度組合量測載入時間、即時倍率、記憶體峰值與錯誤率
+
+每個組合在獨立的子行程中執行，載入時間與記憶體峰值互不影響；子行程設定離線模式，
+只使用本機已快取的模型。
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Callable
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from src.services.transcriber_tuning import cached_hf_models, cached_ggml_models
+from tests.benchmark.fixtures import PROFILES, generate_fixtures, recorded_fixtures
+from tests.benchmark.wer import error_rate, token_count
+
+DEFAULT_OUTPUT_DIR = PROJECT_ROOT / "data" / "benchmarks"
+# 產生的測試音檔語言 (合成語音為英文)
+GENERATED_LANGUAGE = "english"
+
+def _importable(module: str) -> bool:
+    try:
+        __import__(module)
+        return True
+    except ImportError:
+        return False
+
+def _transformers_combinations(models: Optional[List[str]], compute_types: Optional[List[str]]) -> List[Dict[str, Any]]:
+    if not (_importable("torch") and _importable("transformers")):
+        return []
+    import torch
+    compute_types = compute_types or (["float32"] + (["float16"] if torch.cuda.is_available() else []))
+    return [{"backend": "transformers", "model": model, "compute_type": compute_type}
+            for model in (models or [model for model in cached_hf_models() if "faster-whisper" not in model])
+            for compute_type in compute_types if compute_type in ("float32", "float16", "bfloat16")]
+
+def _whisper_cpp_combinations(models: Optional[List[str]], compute_types: Optional[List[str]]) -> List[Dict[str, Any]]:
+    if not _importable("pywhispercpp"):
+        return []
+    combinations = []
+    for model in models or cached_ggml_models():
+        # whisper.cpp 的精度由模型檔決定 (例如 small-q5_1)
+        quantization = model.rsplit("-", 1)[1] if "-q" in model else "f16"
+        if not compute_types or quantization in compute_types:
+            combinations.append({"backend": "whisper.cpp", "model": model, "compute_type": quantization})
+    return combinations
+
+def _ctranslate2_combinations(models: Optional[List[str]], compute_types: Optional[List[str]]) -> List[Dict[str, Any]]:
+    if not _importable("faster_whisper"):
+        return []
+    import ctranslate2
+    supported = ["int8", "int8_float32", "float32"] + (["float16", "int8_float16"] if ctranslate2.get_cuda_device_count() else [])
+    compute_types = [compute_type for compute_type in compute_types or ["int8", "int8_float32"] if compute_type in supported]
+    # 已轉換的模型 (models--Systran--faster-whisper-small → Systran/faster-whisper-small)
+    models = models or [model for model in cached_hf_models() if "faster-whisper" in model]
+    return [{"backend": "ctranslate2", "model": model, "compute_type": compute_type}
+            for model in models for compute_type in compute_types]
+
+def _create_transformers(combo: Dict[str, Any]):
+    from src.services.transcriber import SpeechTranscriber
+    return SpeechTranscriber(model_id=combo["model"], compute_type=combo["compute_type"])
+
+def _create_whisper_cpp(combo: Dict[str, Any]):
+    from src.services.transcriber import FastSpeechTranscriber
+    return FastSpeechTranscriber(model_id=combo["model"])
+
+def _create_ctranslate2(combo: Dict[str, Any]):
+    from src.services.transcriber import CTranslate2Transcriber
+    return CTranslate2Transcriber(model_id=combo["model"], compute_type=combo["compute_type"])
+
+# 後端名稱 → (列出可用組合, 建立轉錄器)；新增後端時在此註冊
+BACKENDS: Dict[str, Dict[str, Callable]] = {
+    "transformers": {"combinations": _transformers_combinations, "create": _create_transformers},
+    "whisper.cpp": {"combinations": _whisper_cpp_combinations, "create": _create_whisper_cpp},
+    "ctranslate2": {"combinations": _ctranslate2_combinations, "create": _create_ctranslate2},
+}
+
+def discover_combinations(backends: Optional[List[str]] = None, models: Optional[List[str]] = None,
+                          compute_types: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    combinations = []
+    for name, backend in BACKENDS.items():
+        if backends is None or name in backends:
+            combinations.extend(backend["combinations"](models, compute_types))
+    return combinations
+
+def run_combination(combo: Dict[str, Any], fixtures: List[Dict[str, Any]], repeat: int = 1,
+                    warmup: bool = True) -> Dict[str, Any]:
+    """在目前行程載入模型並轉錄所有測試音檔 (由子行程呼叫)"""
+    from src.core.metrics import peak_rss_bytes
+    from src.utils.file_manager import FileManager
+
+    result: Dict[str, Any] = dict(combo, status="ok", error=None, results=[])
+    started = time.monotonic()
+    transcriber = BACKENDS[combo["backend"]]["create"](combo)
+    result["load_seconds"] = time.monotonic() - started
+    result["rss_after_load_bytes"] = peak_rss_bytes()
+
+    if warmup and fixtures:
+        # 第一次推論包含初始化與快取配置，不列入量測
+        shortest = min(fixtures, key=lambda fixture: fixture.get("duration") or float("inf"))
+        transcriber.transcribe(shortest["path"], language=shortest.get("language") or GENERATED_LANGUAGE)
+
+    for fixture in fixtures:
+        duration = fixture.get("duration") or FileManager.get_audio_duration(fixture["path"])
+        timings = []
+        text = ""
+        for _ in range(max(1, repeat)):
+            fixture_started = time.monotonic()
+            output = transcriber.transcribe(fixture["path"], language=fixture.get("language") or GENERATED_LANGUAGE)
+            timings.append(time.monotonic() - fixture_started)
+            text = (output or {}).get("text", "")
+        elapsed = statistics.median(timings)
+        result["results"].append({
+            "fixture": fixture["name"],
+            "kind": fixture.get("kind"),
+            "duration": duration,
+            "elapsed": elapsed,
+            "rtf": elapsed / duration if duration else None,
+            "wer": error_rate(fixture.get("reference") or "", text),
+            # 沒有參考文字的音檔 (非語音或靜音) 上產生的字數，即模型的幻覺量
+            "hypothesis_tokens": token_count(text),
+            "text": text,
+        })
+    result["peak_rss_bytes"] = peak_rss_bytes()
+    _summarize(result)
+    return result
+
+def _summarize(result: Dict[str, Any]):
+    rows = result["results"]
+    audio = sum(row["duration"] or 0 for row in rows if row["rtf"] is not None)
+    elapsed = sum(row["elapsed"] for row in rows if row["rtf"] is not None)
+    wers = [row["wer"] for row in rows if row["wer"] is not None]
+    result["rtf"] = elapsed / audio if audio else None
+    result["wer"] = statistics.mean(wers) if wers else None
+    result["hallucinated_tokens"] = sum(row["hypothesis_tokens"] for row in rows if row["wer"] is None)
+
+def _run_in_subprocess(combo: Dict[str, Any], fixtures: List[Dict[str, Any]], repeat: int, warmup: bool,
+                       timeout: float) -> Dict[str, Any]:
+    with tempfile.TemporaryDirectory() as tmp:
+        spec = Path(tmp) / "spec.json"
+        output = Path(tmp) / "result.json"
+        spec.write_text(json.dumps({"combo": combo, "fixtures": fixtures, "repeat": repeat, "warmup": warmup}))
+        python_path = os.pathsep.join(filter(None, [str(PROJECT_ROOT), os.environ.get("PYTHONPATH")]))
+        env = dict(os.environ, HF_HUB_OFFLINE="1", TRANSFORMERS_OFFLINE="1", PYTHONPATH=python_path)
+        try:
+            process = subprocess.run(
+                [sys.executable, "-m", "tests.benchmark.run_benchmark", "--worker", str(spec), str(output)],
+                cwd=str(PROJECT_ROOT), env=env, capture_output=True, text=True, timeout=timeout
+            )
+        except subprocess.TimeoutExpired:
+            return dict(combo, status="timeout", error=f"超過 {timeout:.0f} 秒", results=[])
+        if process.returncode != 0 or not output.exists():
+            error = (process.stderr or process.stdout).strip().splitlines()[-5:]
+            return dict(combo, status="failed", error="\n".join(error), results=[])
+        return json.loads(output.read_text())
+
+def host_info() -> Dict[str, Any]:
+    info = {"platform": platform.platform(), "python": platform.python_version(), "cpu_count": os.cpu_count()}
+    for module in ("torch", "transformers", "pywhispercpp", "ctranslate2", "faster_whisper"):
+        try:
+            info[module] = getattr(__import__(module), "__version__", "installed")
+        except ImportError:
+            pass
+    try:
+        import torch
+        info["cuda"] = torch.cuda.get_device_name(0) if torch.cuda.is_available() else None
+    except ImportError:
+        pass
+    return info
+
+def run_benchmark(combinations: List[Dict[str, Any]], fixtures: List[Dict[str, Any]], repeat: int = 1,
+                  warmup: bool = True, timeout: float = 3600) -> Dict[str, Any]:
+    runs = []
+    for index, combo in enumerate(combinations, 1):
+        label = f"{combo['backend']} / {combo['model']} / {combo['compute_type']}"
+        print(f"[{index}/{len(combinations)}] {label} ...", flush=True)
+        run = _run_in_subprocess(combo, fixtures, repeat, warmup, timeout)
+        if run["status"] == "ok":
+            wer = f"{run['wer']:.3f}" if run["wer"] is not None else "-"
+            rtf = f"{run['rtf']:.3f}" if run["rtf"] is not None else "-"
+            print(f"    載入 {run['load_seconds']:.1f}s，RTF {rtf}，WER {wer}，"
+                  f"記憶體峰值 {(run['peak_rss_bytes'] or 0) / 1024 ** 2:.0f}MB，幻覺字數 {run['hallucinated_tokens']}")
+        else:
+            print(f"    {run['status']}: {run['error']}")
+        runs.append(run)
+    return {
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "host": host_info(),
+        "fixtures": [{key: value for key, value in fixture.items() if key != "path"} for fixture in fixtures],
+        "runs": runs,
+    }
+
+def _split(value: Optional[str]) -> Optional[List[str]]:
+    return [item.strip() for item in value.split(",") if item.strip()] if value else None
+
+def main(argv: Optional[List[str]] = None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv[:1] == ["--worker"]:
+        spec = json.loads(Path(argv[1]).read_text())
+        result = run_combination(spec["combo"], spec["fixtures"], spec["repeat"], spec["warmup"])
+        Path(argv[2]).write_text(json.dumps(result, ensure_ascii=False))
+        return
+
+    parser = argparse.ArgumentParser(description="轉錄後端離線效能測試")
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="quick", help="測試音檔組合 (預設: quick)")
+    parser.add_argument("--lengths", type=str, default=None, help="覆寫音檔長度 (秒)，以逗號分隔")
+    parser.add_argument("--backends", type=str, default=None, help=f"只測試這些後端 ({', '.join(BACKENDS)})")
+    parser.add_argument("--models", type=str, default=None, help="只測試這些模型 (預設: 本機已快取的模型)")
+    parser.add_argument("--compute-types", type=str, default=None, help="只測試這些精度 (例如 float32,float16,q5_1)")
+    parser.add_argument("--repeat", type=int, default=1, help="每個音檔重複次數，取中位數 (預設: 1)")
+    parser.add_argument("--no-warmup", action="store_true", help="不先進行一次暖機推論")
+    parser.add_argument("--no-recorded", action="store_true", help="不使用 fixtures/ 資料夾內的自備錄音")
+    parser.add_argument("--timeout", type=float, default=3600, help="每個組合的時間上限 (秒)")
+    parser.add_argument("--output", type=str, default=None, help="結果 JSON 路徑 (預設: data/benchmarks/benchmark_<時間>.json)")
+    parser.add_argument("--baseline", type=str, default=None, help="執行後與此基準結果比較，有退步時以非零狀態結束")
+    parser.add_argument("--list", action="store_true", help="只列出可用的組合")
+    args = parser.parse_args(argv)
+
+    combinations = discover_combinations(_split(args.backends), _split(args.models), _split(args.compute_types))
+    if args.list or not combinations:
+        for combo in combinations:
+            print(f"{combo['backend']} / {combo['model']} / {combo['compute_type']}")
+        if not combinations:
+            print("找不到可用的後端與已快取的模型 (可用 --models 指定)")
+            sys.exit(0 if args.list else 1)
+        return
+
+    profile = dict(PROFILES[args.profile])
+    if args.lengths:
+        profile["lengths"] = [float(value) for value in _split(args.lengths)]
+    fixtures = generate_fixtures(DEFAULT_OUTPUT_DIR / "fixtures", **profile)
+    if not args.no_recorded:
+        fixtures += recorded_fixtures()
+    print(f"測試音檔 {len(fixtures)} 個，組合 {len(combinations)} 個")
+
+    report = run_benchmark(combinations, fixtures, repeat=args.repeat, warmup=not args.no_warmup, timeout=args.timeout)
+    output = Path(args.output) if args.output else DEFAULT_OUTPUT_DIR / f"benchmark_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+    print(f"結果已保存到: {output}")
+
+    if args.baseline:
+        from tests.benchmark.compare import compare_reports, print_comparison
+        regressions = compare_reports(report, json.loads(Path(args.baseline).read_text(encoding="utf-8")))
+        print_comparison(regressions)
+        sys.exit(1 if any(row["regression"] for row in regressions) else 0)
+
+if __name__ == "__main__":
+    main()
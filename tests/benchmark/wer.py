@@ -0,0 +1,40 @@
+"""
+錯誤率計算 - 以編輯距離比較轉錄結果與參考文字
+
+含中日韓文字的參考文字以字為單位 (CER)，其他語言以詞為單位 (WER)。
+"""
+import re
+import unicodedata
+from typing import List, Optional
+
+_CJK = re.compile(r'[぀-ヿ㐀-䶿一-鿿가-힯]')
+
+def _normalize(text: str) -> str:
+    text = unicodedata.normalize("NFKC", text).lower()
+    return "".join(" " if unicodedata.category(char).startswith("P") else char for char in text)
+
+def tokenize(text: str, by_character: bool) -> List[str]:
+    text = _normalize(text)
+    if by_character:
+        return [char for char in text if not char.isspace()]
+    return text.split()
+
+def edit_distance(reference: List[str], hypothesis: List[str]) -> int:
+    previous = list(range(len(hypothesis) + 1))
+    for i, ref_token in enumerate(reference, 1):
+        current = [i] + [0] * len(hypothesis)
+        for j, hyp_token in enumerate(hypothesis, 1):
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ref_token != hyp_token))
+        previous = current
+    return previous[-1]
+
+def error_rate(reference: str, hypothesis: str) -> Optional[float]:
+    """參考文字為空時回傳 None (改以幻覺字數衡量)"""
+    by_character = bool(_CJK.search(reference))
+    ref_tokens = tokenize(reference, by_character)
+    if not ref_tokens:
+        return None
+    return edit_distance(ref_tokens, tokenize(hypothesis, by_character)) / len(ref_tokens)
+
+def token_count(text: str) -> int:
+    return len(tokenize(text, bool(_CJK.search(text))))
@@ -1,3 +1,4 @@
+import json
 import time
 import requests
 import sys
@@ -59,6 +60,9 @@ def poll_task_status(task_id: str):
             print("\n❌ 轉錄失敗:")
             print(data.get("error", "未知錯誤"))
             break
+        elif status == "cancelled":
+            print("\n🛑 任務已取消")
+            break
         elif status == "pending":
             print("🔸 任務還在排隊中 (pending)...")
         elif status == "processing":
@@ -67,6 +71,47 @@ def poll_task_status(task_id: str):
         # 等待 5 秒後再問一次
         time.sleep(5)
 
+def stream_task_events(task_id: str) -> bool:
+    """透過 SSE 即時接收任務進度；伺服器不支援時回傳 False 改用輪詢"""
+    print("\n📡 訂閱任務進度串流...")
+    try:
+        response = requests.get(f"{BASE_URL}/video/events/{task_id}", stream=True, timeout=(5, 60))
+    except requests.exceptions.RequestException as e:
+        print("⚠️ 無法連線到進度串流:", e)
+        return False
+    if response.status_code != 200:
+        return False
+
+    event = None
+    for line in response.iter_lines(decode_unicode=True):
+        if line.startswith("event: "):
+            event = line[len("event: "):]
+        elif line.startswith("data: "):
+            data = json.loads(line[len("data: "):])
+            if event == "status":
+                print(f"🔹 狀態: {data['status']}")
+                if data["status"] == "completed":
+                    print("\n🎉 轉錄完成！")
+                    print("檔案存放位置:")
+                    print(data.get("result", {}))
+                elif data["status"] == "failed":
+                    print("\n❌ 轉錄失敗:")
+                    print(data.get("error", "未知錯誤"))
+                elif data["status"] == "cancelled":
+                    print("\n🛑 任務已取消")
+            elif event == "stage":
+                print(f"▶️ 階段 {data['stage']} {data['event']}")
+            elif event == "progress":
+                detail = f"{data['percent']:.1f}%" if data.get("percent") is not None else ""
+                if data.get("seconds") is not None:
+                    detail += f" ({data['seconds']:.0f}s / {data.get('total') or '?'}s)"
+                if data.get("requests_done") is not None:
+                    detail += f" 請求 {data['requests_done']}/{data['requests_planned']}，輸出約 {data['output_tokens']} tokens"
+                print(f"   {data['stage']}: {detail.strip()}")
+            elif event == "segment":
+                print(f"   📝 {data.get('text', '').strip()}")
+    return True
+
 def main():
     print("--- VideoToNote API 測試用戶端 ---")
     
@@ -80,8 +125,8 @@ def main():
     # 3. 送出任務取得 task_id
     task_id = submit_video_task(test_url)
     
-    # 4. 如果成功取得 task_id，就開始追蹤進度
-    if task_id:
+    # 4. 如果成功取得 task_id，就開始追蹤進度 (優先使用 SSE 串流，失敗時改用輪詢)
+    if task_id and not stream_task_events(task_id):
         poll_task_status(task_id)
 
 if __name__ == "__main__":
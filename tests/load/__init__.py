@@ -0,0 +1,10 @@
+"""
+壓力測試
+
+以本機的模擬伺服器取代實際的 LLM 供應商，量測筆記生成在不同並行數下的吞吐量、延遲與重試行為；
+以模擬處理器取代 VideoProcessor 啟動完整的 API，量測 API 層的送出延遲、佇列等待、完成時間與事件迴圈延遲。
+
+    python -m tests.load.llm_stub_server                 # 單獨啟動模擬伺服器
+    python -m tests.load.llm_load --concurrency 1,4,16   # 以模擬伺服器對各生成器施壓
+    python -m tests.load.api_load --rate 5 --duration 60 # 以模擬處理器對 API 施壓
+"""
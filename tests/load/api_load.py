@@ -0,0 +1,315 @@
+"""
+API 壓力測試 - 以模擬處理器啟動完整的 API (FastAPI + 任務佇列 + worker 行程)，依目標到達率送出任務並追蹤到完成
+
+worker 使用 tests.load.stub_processor 取代 VideoProcessor，各階段只依設定的時間等待，
+因此量測到的是 API 層 (請求處理、任務資料庫、佇列與 worker 排程) 本身的延遲與擴展性。
+
+量測項目:
+- 送出延遲: POST /process 的回應時間 (含 429 拒絕)
+- 查詢延遲: GET /status 的回應時間
+- 佇列等待: 任務建立到 worker 取出 (伺服器端時間)
+- 完成時間: 任務建立到完成 (伺服器端時間) 與用戶端觀察到完成的時間
+- 事件迴圈延遲: API 行程的 asyncio 迴圈比預期晚醒來的時間 (回應阻塞的指標)
+
+    python -m tests.load.api_load --rate 5 --duration 60 --job-workers 4 --transcribe 2 --notes 1
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import List, Dict, Any
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from tests.load.stats import distribution
+from tests.load.stub_processor import STAGES_ENV, DEFAULT_STAGES
+
+API_PREFIX = "/api/v1"
+DEFAULT_OUTPUT_DIR = PROJECT_ROOT / "data" / "loadtests"
+STUB_FACTORY = "tests.load.stub_processor:StubProcessor"
+# 事件迴圈延遲的取樣間隔與寫出間隔 (秒)
+_LAG_INTERVAL = 0.05
+_LAG_FLUSH_INTERVAL = 2.0
+FINISHED = {"completed", "failed", "cancelled"}
+
+# --- 伺服器端 ---
+
+async def _monitor_loop_lag(output_path: Path):
+    """每隔固定時間醒來，記錄比預期晚醒來的秒數，並定期寫入檔案 (每個 API 行程一個檔案)"""
+    samples: List[List[float]] = []
+    loop = asyncio.get_running_loop()
+    last_flush = loop.time()
+    try:
+        while True:
+            expected = loop.time() + _LAG_INTERVAL
+            await asyncio.sleep(_LAG_INTERVAL)
+            samples.append([time.time(), max(0.0, loop.time() - expected)])
+            if loop.time() - last_flush >= _LAG_FLUSH_INTERVAL:
+                last_flush = loop.time()
+                output_path.write_text(json.dumps(samples))
+    finally:
+        output_path.write_text(json.dumps(samples))
+
+def create_app():
+    """載入 API 並在 lifespan 中加入事件迴圈延遲的量測 (uvicorn factory)"""
+    from src.api.main import app
+    from src.core.config import config
+
+    lifespan = app.router.lifespan_context
+
+    @asynccontextmanager
+    async def lifespan_with_lag_monitor(app_):
+        monitor = asyncio.create_task(_monitor_loop_lag(config.DATA_DIR / f"loop_lag_{os.getpid()}.json"))
+        try:
+            async with lifespan(app_) as state:
+                yield state
+        finally:
+            monitor.cancel()
+
+    app.router.lifespan_context = lifespan_with_lag_monitor
+    return app
+
+def serve(host: str, port: int, api_workers: int):
+    """在子行程中啟動 API (環境變數已由父行程設定資料目錄、模擬處理器與 worker 數)"""
+    import uvicorn
+    if api_workers <= 1:
+        uvicorn.run("tests.load.api_load:create_app", factory=True, host=host, port=port, log_level="warning")
+        return
+    # 與 main.py api --workers 相同：轉錄 worker 由本行程統一啟動，API worker 只負責接收請求
+    from src.api.routers.video import job_queue
+    job_queue.start(preload=False)
+    os.environ["VIDEOTONOTE_JOB_WORKERS"] = "0"
+    try:
+        uvicorn.run("tests.load.api_load:create_app", factory=True, host=host, port=port, workers=api_workers,
+                    log_level="warning")
+    finally:
+        job_queue.stop()
+
+def start_server(args, data_dir: Path) -> subprocess.Popen:
+    stages = {"download": args.download, "transcribe": args.transcribe, "notes": args.notes,
+              "jitter": args.jitter, "cpu": args.cpu, "failure_rate": args.failure_rate}
+    python_path = os.pathsep.join(filter(None, [str(PROJECT_ROOT), os.environ.get("PYTHONPATH")]))
+    env = dict(
+        os.environ,
+        PYTHONPATH=python_path,
+        VIDEOTONOTE_DATA_DIR=str(data_dir),
+        VIDEOTONOTE_PROCESSOR_FACTORY=STUB_FACTORY,
+        VIDEOTONOTE_JOB_WORKERS=str(args.job_workers),
+        VIDEOTONOTE_MAX_QUEUE_DEPTH=str(args.max_queue_depth),
+        **{STAGES_ENV: json.dumps(stages)},
+    )
+    command = [sys.executable, "-m", "tests.load.api_load", "--serve", "--host", args.host, "--port", str(args.port),
+               "--api-workers", str(args.api_workers)]
+    log = open(data_dir / "server.log", "w")
+    return subprocess.Popen(command, cwd=str(PROJECT_ROOT), env=env, stdout=log, stderr=subprocess.STDOUT)
+
+def stop_server(process: subprocess.Popen):
+    # SIGINT 讓 uvicorn 正常結束 lifespan (停止 worker 並寫出事件迴圈延遲)
+    process.send_signal(signal.SIGINT)
+    try:
+        process.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+def read_loop_lag(data_dir: Path, since: float, until: float) -> List[float]:
+    lags = []
+    for path in data_dir.glob("loop_lag_*.json"):
+        try:
+            samples = json.loads(path.read_text())
+        except ValueError:
+            continue
+        lags.extend(lag for timestamp, lag in samples if since <= timestamp <= until)
+    return lags
+
+# --- 用戶端 ---
+
+async def _wait_ready(client, timeout: float = 60.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if (await client.get(f"{API_PREFIX}/health")).status_code == 200:
+                return
+        except Exception:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError("API 伺服器未在時限內啟動")
+
+async def _one_task(client, index: int, args) -> Dict[str, Any]:
+    payload = {"youtube_url": f"https://stub.invalid/watch?v={index}", "model": args.model,
+               "transcriber": args.transcriber, "language": "chinese"}
+    result: Dict[str, Any] = {"index": index, "status": None, "status_latencies": []}
+    started = time.monotonic()
+    try:
+        response = await client.post(f"{API_PREFIX}/video/process", json=payload)
+    except Exception as e:
+        result.update(status="submit_error", error=str(e), submit_latency=time.monotonic() - started)
+        return result
+    result["submit_latency"] = time.monotonic() - started
+    if response.status_code == 429:
+        result["status"] = "rejected"
+        return result
+    if response.status_code != 200:
+        result.update(status="submit_error", error=f"HTTP {response.status_code}")
+        return result
+    task_id = response.json()["task_id"]
+
+    while time.monotonic() - started < args.task_timeout:
+        await asyncio.sleep(args.poll_interval)
+        polled = time.monotonic()
+        try:
+            response = await client.get(f"{API_PREFIX}/video/status/{task_id}")
+        except Exception:
+            continue
+        result["status_latencies"].append(time.monotonic() - polled)
+        data = response.json()
+        if data["status"] in FINISHED:
+            result.update(
+                status=data["status"],
+                client_completion=time.monotonic() - started,
+                queue_wait=data.get("queue_wait"),
+                server_completion=(data["updated_at"] - data["created_at"]) if data.get("updated_at") else None,
+            )
+            return result
+    result["status"] = "timeout"
+    return result
+
+async def run_load(args) -> Dict[str, Any]:
+    """依到達率 (固定間隔或 Poisson) 送出任務，等待全部結束後回傳各任務的量測結果"""
+    import httpx
+
+    rng = random.Random(args.seed)
+    limits = httpx.Limits(max_connections=args.max_connections, max_keepalive_connections=args.max_connections)
+    base_url = f"http://{args.host}:{args.port}"
+    async with httpx.AsyncClient(base_url=base_url, timeout=30.0, limits=limits) as client:
+        await _wait_ready(client)
+        load_started_at = time.time()
+        started = time.monotonic()
+        offset = 0.0
+        tasks = []
+        while offset < args.duration:
+            await asyncio.sleep(max(0.0, started + offset - time.monotonic()))
+            tasks.append(asyncio.create_task(_one_task(client, len(tasks), args)))
+            offset += rng.expovariate(args.rate) if args.arrival == "poisson" else 1.0 / args.rate
+        submit_seconds = time.monotonic() - started
+        results = await asyncio.gather(*tasks)
+        return {
+            "results": results,
+            "load_started_at": load_started_at,
+            "load_finished_at": time.time(),
+            "submit_seconds": submit_seconds,
+            "wall_seconds": time.monotonic() - started,
+        }
+
+def summarize(run: Dict[str, Any], lags: List[float]) -> Dict[str, Any]:
+    results = run["results"]
+    counts: Dict[str, int] = {}
+    for result in results:
+        counts[result["status"]] = counts.get(result["status"], 0) + 1
+    finished = [result for result in results if result["status"] in FINISHED]
+    completed = [result for result in finished if result["status"] == "completed"]
+
+    def values(key: str, rows=finished) -> List[float]:
+        return [row[key] for row in rows if row.get(key) is not None]
+
+    return {
+        "tasks": len(results),
+        "statuses": counts,
+        "offered_rate": round(len(results) / run["submit_seconds"], 3) if run["submit_seconds"] else None,
+        "throughput": round(len(completed) / run["wall_seconds"], 3) if run["wall_seconds"] else None,
+        "wall_seconds": round(run["wall_seconds"], 3),
+        "submit_latency": distribution(values("submit_latency", results)),
+        "status_latency": distribution([latency for result in results for latency in result["status_latencies"]]),
+        "queue_wait": distribution(values("queue_wait")),
+        "completion_time": distribution(values("server_completion", completed)),
+        "client_completion_time": distribution(values("client_completion", completed)),
+        "event_loop_lag": distribution(lags),
+    }
+
+def print_summary(summary: Dict[str, Any]):
+    def fmt(dist: Dict[str, Any], scale: float = 1.0, unit: str = "s") -> str:
+        if not dist["count"]:
+            return "-"
+        return (f"p50 {dist['p50'] * scale:.3f}{unit}，p90 {dist['p90'] * scale:.3f}{unit}，"
+                f"p99 {dist['p99'] * scale:.3f}{unit}，最大 {dist['max'] * scale:.3f}{unit}")
+
+    statuses = "，".join(f"{status} {count}" for status, count in summary["statuses"].items())
+    print(f"任務 {summary['tasks']} 個 ({statuses})；到達率 {summary['offered_rate']}/s，"
+          f"完成吞吐量 {summary['throughput']}/s，共 {summary['wall_seconds']:.1f}s")
+    print(f"  送出延遲:     {fmt(summary['submit_latency'], 1000, 'ms')}")
+    print(f"  查詢延遲:     {fmt(summary['status_latency'], 1000, 'ms')}")
+    print(f"  佇列等待:     {fmt(summary['queue_wait'])}")
+    print(f"  完成時間:     {fmt(summary['completion_time'])}")
+    print(f"  事件迴圈延遲: {fmt(summary['event_loop_lag'], 1000, 'ms')}")
+
+def main():
+    parser = argparse.ArgumentParser(description="以模擬處理器對 API 施壓 (不需模型與網路)")
+    parser.add_argument("--rate", type=float, default=2.0, help="每秒送出的任務數 (預設: 2)")
+    parser.add_argument("--duration", type=float, default=30.0, help="送出任務的時間長度 (秒，預設: 30)")
+    parser.add_argument("--arrival", choices=["poisson", "constant"], default="poisson", help="到達間隔分布")
+    parser.add_argument("--job-workers", type=int, default=2, help="轉錄 worker 行程數 (預設: 2)")
+    parser.add_argument("--api-workers", type=int, default=1, help="uvicorn 行程數 (預設: 1)")
+    parser.add_argument("--max-queue-depth", type=int, default=10000, help="佇列上限，超過時回傳 429 (預設: 10000)")
+    parser.add_argument("--download", type=float, default=DEFAULT_STAGES["download"], help="模擬下載時間 (秒)")
+    parser.add_argument("--transcribe", type=float, default=DEFAULT_STAGES["transcribe"], help="模擬轉錄時間 (秒)")
+    parser.add_argument("--notes", type=float, default=DEFAULT_STAGES["notes"], help="模擬筆記生成時間 (秒)")
+    parser.add_argument("--jitter", type=float, default=DEFAULT_STAGES["jitter"], help="階段時間的隨機變動比例")
+    parser.add_argument("--cpu", action="store_true", help="模擬轉錄時佔用 CPU (否則以 sleep 等待)")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="各階段模擬失敗的比例")
+    parser.add_argument("--model", type=str, default="openai", help="任務的筆記模型 (只影響處理器分組)")
+    parser.add_argument("--transcriber", type=str, default="fast", help="任務的轉錄器 (只影響處理器分組)")
+    parser.add_argument("--poll-interval", type=float, default=1.0, help="查詢任務狀態的間隔 (秒)")
+    parser.add_argument("--task-timeout", type=float, default=600.0, help="單一任務等待完成的上限 (秒)")
+    parser.add_argument("--max-connections", type=int, default=200, help="用戶端連線數上限")
+    parser.add_argument("--host", type=str, default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--seed", type=int, default=0, help="到達間隔的亂數種子")
+    parser.add_argument("--data-dir", type=str, default=None, help="伺服器的資料目錄 (預設: 暫存目錄，結束後刪除)")
+    parser.add_argument("--output", type=str, default=None, help="結果 JSON 路徑 (預設: data/loadtests/api_load_<時間>.json)")
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.host, args.port, args.api_workers)
+        return
+
+    data_dir = Path(args.data_dir) if args.data_dir else Path(tempfile.mkdtemp(prefix="videotonote_load_"))
+    data_dir.mkdir(parents=True, exist_ok=True)
+    print(f"啟動 API (轉錄 worker {args.job_workers} 個，uvicorn {args.api_workers} 個)，資料目錄: {data_dir}")
+    server = start_server(args, data_dir)
+    try:
+        run = asyncio.run(run_load(args))
+    finally:
+        stop_server(server)
+    summary = summarize(run, read_loop_lag(data_dir, run["load_started_at"], run["load_finished_at"]))
+    print_summary(summary)
+    # 有任務未完成時保留資料目錄 (含伺服器記錄) 以便檢查
+    keep_data = bool(args.data_dir) or bool(set(summary["statuses"]) - {"completed", "rejected"})
+    if keep_data:
+        print(f"伺服器記錄: {data_dir / 'server.log'}")
+
+    output = Path(args.output) if args.output else DEFAULT_OUTPUT_DIR / f"api_load_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps({
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "settings": {key: value for key, value in vars(args).items() if key not in ("serve", "output")},
+        "summary": summary,
+        "tasks": run["results"],
+    }, ensure_ascii=False, indent=2), encoding="utf-8")
+    print(f"結果已保存到: {output}")
+    if not keep_data:
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+"""
+筆記生成壓力測試 - 以模擬伺服器取代 LLM 供應商，在不同並行數下對每個生成器施壓
+
+每個 (供應商, 並行數) 組合送出固定數量的 generate_notes 呼叫 (共用同一個生成器實例，與 API 模式相同)，
+量測吞吐量、p50 / p99 延遲，以及限流器的節流、429、重試與最終失敗次數，並與伺服器端實際收到的請求數對照。
+"""
+import argparse
+import contextlib
+import io
+import json
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import List, Dict, Any
+
+import requests
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from src.core.config import config
+from src.services.notes_generator import NotesGeneratorFactory, BaseNotesGenerator
+from src.services.rate_limiter import get_rate_limiter
+from src.utils.cancellation import CancelToken
+from tests.load.llm_stub_server import LLMStubServer, StubSettings
+from tests.load.stats import distribution
+
+PROVIDERS = ["openai", "deepseek", "gemini", "ollama"]
+DEFAULT_OUTPUT_DIR = PROJECT_ROOT / "data" / "loadtests"
+# 限流器統計中與重試行為有關的項目
+_LIMITER_KEYS = ["requests", "throttled", "rate_limited", "retries", "failures", "total_wait"]
+
+def point_generators_at(url: str):
+    """將所有供應商的 API 位址與金鑰改為模擬伺服器"""
+    config.OPENAI_BASE_URL = f"{url}/v1"
+    config.DEEPSEEK_BASE_URL = f"{url}/v1"
+    config.GEMINI_API_ENDPOINT = url
+    config.OLLAMA_API_URL = f"{url}/api/generate"
+    config.OPENAI_API_KEY = config.DEEPSEEK_API_KEY = config.GEMINI_API_KEY = "stub-key"
+    config.OLLAMA_PRELOAD = False
+
+def make_transcription(tokens: int) -> Dict[str, Any]:
+    sentence = "今天我們討論語音轉錄與筆記生成的效能，講者舉了幾個例子說明如何量測延遲。"
+    return {"text": sentence * max(1, tokens // len(sentence))}
+
+def _one_call(generator: BaseNotesGenerator, transcription: Dict[str, Any], stream: bool) -> Dict[str, Any]:
+    started = time.monotonic()
+    notes = generator.generate_notes(transcription, cancel_token=CancelToken() if stream else None)
+    return {
+        "latency": time.monotonic() - started,
+        "success": bool(notes),
+        "output_tokens": generator.token_estimator.count(notes) if notes else 0,
+    }
+
+def _limiter_delta(before: Dict[str, Any], after: Dict[str, Any]) -> Dict[str, Any]:
+    return {key: round(after[key] - before[key], 4) for key in _LIMITER_KEYS}
+
+def run_level(provider: str, concurrency: int, total_requests: int, transcription: Dict[str, Any],
+              stream: bool, stub_url: str, verbose: bool = False) -> Dict[str, Any]:
+    """以指定並行數送出 total_requests 次筆記生成"""
+    generator = NotesGeneratorFactory.create(provider)
+    limiter = get_rate_limiter(provider)
+    requests.post(f"{stub_url}/reset", timeout=5)
+    before = limiter.stats()
+    output = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO())
+    started = time.monotonic()
+    with output, ThreadPoolExecutor(max_workers=concurrency) as executor:
+        calls = list(executor.map(lambda _: _one_call(generator, transcription, stream), range(total_requests)))
+    wall = time.monotonic() - started
+    server = requests.get(f"{stub_url}/stats", timeout=5).json()
+
+    latencies = [call["latency"] for call in calls if call["success"]]
+    succeeded = len(latencies)
+    return {
+        "provider": provider,
+        "concurrency": concurrency,
+        "stream": stream,
+        "requests": total_requests,
+        "succeeded": succeeded,
+        "failed": total_requests - succeeded,
+        "wall_seconds": round(wall, 3),
+        "throughput_rps": round(succeeded / wall, 3) if wall else None,
+        "output_tokens_per_second": round(sum(call["output_tokens"] for call in calls) / wall, 1) if wall else None,
+        "latency": distribution(latencies),
+        "client": _limiter_delta(before, limiter.stats()),
+        "server": {key: server[key] for key in ("requests", "rate_limited", "errors", "completed")},
+    }
+
+def print_row(row: Dict[str, Any]):
+    latency, client, server = row["latency"], row["client"], row["server"]
+    p50 = f"{latency['p50']:.2f}s" if latency["p50"] is not None else "-"
+    p99 = f"{latency['p99']:.2f}s" if latency["p99"] is not None else "-"
+    print(
+        f"{row['provider']:<9} 並行 {row['concurrency']:>3}: 成功 {row['succeeded']}/{row['requests']}，"
+        f"{row['throughput_rps']:.2f} req/s，{row['output_tokens_per_second']:.0f} tok/s，p50 {p50}，p99 {p99}，"
+        f"節流 {client['throttled']} 次 (共 {client['total_wait']:.1f}s)，429 {client['rate_limited']}，"
+        f"重試 {client['retries']}，最終失敗 {client['failures']}，伺服器收到 {server['requests']} 個請求"
+    )
+
+def _split(value: str) -> List[str]:
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+def main():
+    defaults = StubSettings()
+    parser = argparse.ArgumentParser(description="以模擬伺服器對筆記生成器施壓")
+    parser.add_argument("--providers", type=str, default=",".join(PROVIDERS), help="要測試的供應商，以逗號分隔")
+    parser.add_argument("--concurrency", type=str, default="1,4,16", help="並行數，以逗號分隔 (預設: 1,4,16)")
+    parser.add_argument("--requests", type=int, default=20, help="每個並行數送出的筆記數 (預設: 20)")
+    parser.add_argument("--stream", action="store_true", help="以串流請求生成 (與 API 任務可取消的路徑相同)")
+    parser.add_argument("--transcript-tokens", type=int, default=500, help="逐字稿長度 (約略字數)")
+    parser.add_argument("--url", type=str, default=None, help="使用已啟動的模擬伺服器，而不在本行程內啟動")
+    parser.add_argument("--latency", type=float, default=defaults.latency, help="模擬首個 token 延遲 (秒)")
+    parser.add_argument("--tokens-per-second", type=float, default=defaults.tokens_per_second, help="模擬生成速度")
+    parser.add_argument("--output-tokens", type=int, default=defaults.output_tokens, help="模擬每次回應的 token 數")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="模擬 500 的比例")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="模擬 429 的比例")
+    parser.add_argument("--rate-limit-every", type=int, default=0, help="每 N 個請求模擬一次 429")
+    parser.add_argument("--retry-after", type=float, default=defaults.retry_after, help="模擬 429 的 Retry-After 秒數")
+    parser.add_argument("--seed", type=int, default=0, help="錯誤注入的亂數種子")
+    parser.add_argument("--max-retries", type=int, default=None, help="覆寫重試次數上限")
+    parser.add_argument("--retry-base-delay", type=float, default=None, help="覆寫退避基礎秒數")
+    parser.add_argument("--no-client-limits", action="store_true", help="停用用戶端限流 (只觀察伺服器端 429 的處理)")
+    parser.add_argument("--output", type=str, default=None, help="結果 JSON 路徑 (預設: data/loadtests/llm_load_<時間>.json)")
+    parser.add_argument("--verbose", action="store_true", help="顯示生成器的輸出訊息")
+    args = parser.parse_args()
+
+    server = None
+    stub_url = args.url
+    if stub_url is None:
+        server = LLMStubServer(settings=StubSettings(
+            latency=args.latency, tokens_per_second=args.tokens_per_second, output_tokens=args.output_tokens,
+            error_rate=args.error_rate, rate_limit_rate=args.rate_limit_rate, rate_limit_every=args.rate_limit_every,
+            retry_after=args.retry_after, seed=args.seed,
+        )).start()
+        stub_url = server.url
+    stub_url = stub_url.rstrip("/")
+    point_generators_at(stub_url)
+    if args.max_retries is not None:
+        config.LLM_MAX_RETRIES = args.max_retries
+    if args.retry_base_delay is not None:
+        config.LLM_RETRY_BASE_DELAY = args.retry_base_delay
+    if args.no_client_limits:
+        config.RATE_LIMITS = {}
+
+    transcription = make_transcription(args.transcript_tokens)
+    rows = []
+    try:
+        for provider in _split(args.providers):
+            for concurrency in (int(value) for value in _split(args.concurrency)):
+                row = run_level(provider, concurrency, args.requests, transcription, args.stream, stub_url, args.verbose)
+                print_row(row)
+                rows.append(row)
+    finally:
+        if server is not None:
+            server.stop()
+
+    output = Path(args.output) if args.output else DEFAULT_OUTPUT_DIR / f"llm_load_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps({
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "settings": {key: value for key, value in vars(args).items() if key not in ("output", "verbose")},
+        "results": rows,
+    }, ensure_ascii=False, indent=2), encoding="utf-8")
+    print(f"結果已保存到: {output}")
+
+if __name__ == "__main__":
+    main()
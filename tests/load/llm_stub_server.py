@@ -0,0 +1,340 @@
+"""
+LLM 模擬伺服器 - 在本機模擬 OpenAI / DeepSeek (chat completions)、Gemini (generateContent) 與 Ollama (/api/generate)
+
+可設定首個 token 延遲、生成速度、錯誤與 429 比例，串流與非串流回應皆依各供應商的格式輸出，
+讓筆記生成在不消耗 API 額度的情況下進行壓力測試。
+
+    python -m tests.load.llm_stub_server --port 8765 --latency 0.5 --tokens-per-second 50 --rate-limit-rate 0.1
+
+    OpenAI / DeepSeek: base_url = http://127.0.0.1:8765/v1
+    Gemini:            api_endpoint = http://127.0.0.1:8765
+    Ollama:            api_url = http://127.0.0.1:8765/api/generate
+"""
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from dataclasses import dataclass, asdict
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Dict, Any, Iterator, Optional
+from urllib.parse import urlparse, parse_qs
+
+# 輸出內容由這些詞循環組成 (每個詞視為一個 token)
+_WORDS = ["##", "重點", "整理", "\n-", "講者", "說明", "了", "主要", "概念", "，", "並", "舉例", "。"]
+
+@dataclass
+class StubSettings:
+    latency: float = 0.2             # 首個 token 前的延遲 (秒)，模擬排隊與 prompt 評估
+    tokens_per_second: float = 100.0 # 生成速度 (0 表示不限速)
+    output_tokens: int = 200         # 每次回應的 token 數
+    error_rate: float = 0.0          # 回傳 500 的比例
+    rate_limit_rate: float = 0.0     # 回傳 429 的比例
+    rate_limit_every: int = 0        # 每 N 個請求固定回傳一次 429 (0 不使用)
+    retry_after: Optional[float] = 1.0  # 429 回應的 Retry-After 秒數 (None 不帶標頭)
+    seed: Optional[int] = None
+
+class StubStats:
+    """各端點的請求、錯誤與串流次數"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.counts: Dict[str, int] = {"requests": 0, "streams": 0, "rate_limited": 0, "errors": 0, "completed": 0}
+            self.by_api: Dict[str, int] = {}
+
+    def inc(self, key: str, api: Optional[str] = None):
+        with self._lock:
+            self.counts[key] += 1
+            if api:
+                self.by_api[api] = self.by_api.get(api, 0) + 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self.counts, by_api=dict(self.by_api))
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: "LLMStubServer"
+
+    def log_message(self, format, *args):
+        pass
+
+    # --- 路由 ---
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        if path == "/stats":
+            self._send_json(200, self.server.stats.snapshot())
+        elif path in ("/", "/health"):
+            self._send_json(200, {"status": "ok"})
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        body = self._read_body()
+        if url.path == "/reset":
+            self.server.stats.reset()
+            self._send_json(200, {"status": "ok"})
+        elif url.path == "/settings":
+            for key, value in body.items():
+                if hasattr(self.server.settings, key):
+                    setattr(self.server.settings, key, value)
+            self._send_json(200, asdict(self.server.settings))
+        elif url.path.endswith("/chat/completions"):
+            self._handle("openai", body, bool(body.get("stream")), self._openai)
+        elif url.path == "/api/generate":
+            # 沒有 prompt 的請求是預先載入模型
+            if not body.get("prompt"):
+                self._send_json(200, self._ollama_done(body, 0, load_duration=0.0))
+                return
+            self._handle("ollama", body, body.get("stream", True), self._ollama)
+        elif ":generateContent" in url.path or ":streamGenerateContent" in url.path:
+            stream = ":streamGenerateContent" in url.path
+            sse = parse_qs(url.query).get("alt", [""])[0] == "sse"
+            self._handle("gemini", body, stream, lambda stream_: self._gemini(stream_, sse))
+        else:
+            self._send_json(404, {"error": f"unknown endpoint {url.path}"})
+
+    # --- 共用流程 ---
+
+    def _handle(self, api: str, body: Dict[str, Any], stream: bool, respond):
+        stats, settings = self.server.stats, self.server.settings
+        stats.inc("requests", api)
+        failure = self.server.pick_failure()
+        if failure == 429:
+            stats.inc("rate_limited")
+            headers = {"retry-after": str(settings.retry_after)} if settings.retry_after is not None else {}
+            self._send_json(429, self._error_body(api, 429, "Rate limit exceeded"), headers)
+            return
+        if failure == 500:
+            stats.inc("errors")
+            self._send_json(500, self._error_body(api, 500, "Internal server error"))
+            return
+        if settings.latency > 0:
+            time.sleep(settings.latency)
+        if stream:
+            stats.inc("streams")
+        try:
+            respond(stream)
+            stats.inc("completed")
+        except (BrokenPipeError, ConnectionResetError):
+            # 用戶端取消串流
+            pass
+
+    def _tokens(self) -> Iterator[str]:
+        settings = self.server.settings
+        delay = 1.0 / settings.tokens_per_second if settings.tokens_per_second > 0 else 0.0
+        for index in range(settings.output_tokens):
+            if delay:
+                time.sleep(delay)
+            yield _WORDS[index % len(_WORDS)]
+
+    def _text(self) -> str:
+        return "".join(self._tokens())
+
+    # --- OpenAI / DeepSeek ---
+
+    def _openai(self, stream: bool):
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        created = int(time.time())
+        model = "stub"
+        if not stream:
+            text = self._text()
+            self._send_json(200, {
+                "id": completion_id, "object": "chat.completion", "created": created, "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": 0, "completion_tokens": self.server.settings.output_tokens,
+                          "total_tokens": self.server.settings.output_tokens},
+            })
+            return
+
+        def chunk(delta: Dict[str, Any], finish_reason: Optional[str] = None) -> bytes:
+            data = {"id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                    "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]}
+            return f"data: {json.dumps(data, ensure_ascii=False)}\n\n".encode()
+
+        self._start_stream("text/event-stream")
+        self._write(chunk({"role": "assistant", "content": ""}))
+        for token in self._tokens():
+            self._write(chunk({"content": token}))
+        self._write(chunk({}, "stop"))
+        self._write(b"data: [DONE]\n\n")
+
+    # --- Ollama ---
+
+    def _ollama_done(self, body: Dict[str, Any], eval_count: int, load_duration: float = 0.0,
+                     eval_seconds: float = 0.0, response: str = "") -> Dict[str, Any]:
+        latency = self.server.settings.latency
+        return {
+            "model": body.get("model", "stub"), "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ"),
+            "response": response, "done": True, "done_reason": "stop",
+            "total_duration": int((latency + eval_seconds) * 1e9), "load_duration": int(load_duration * 1e9),
+            "prompt_eval_count": len(body.get("prompt", "")) // 4, "prompt_eval_duration": int(latency * 1e9),
+            "eval_count": eval_count, "eval_duration": int(eval_seconds * 1e9),
+        }
+
+    def _ollama(self, stream: bool):
+        body = self._body
+        started = time.monotonic()
+        if not stream:
+            text = self._text()
+            self._send_json(200, self._ollama_done(body, self.server.settings.output_tokens,
+                                                   eval_seconds=time.monotonic() - started, response=text))
+            return
+        self._start_stream("application/x-ndjson")
+        for token in self._tokens():
+            line = {"model": body.get("model", "stub"), "response": token, "done": False}
+            self._write(f"{json.dumps(line, ensure_ascii=False)}\n".encode())
+        done = self._ollama_done(body, self.server.settings.output_tokens, eval_seconds=time.monotonic() - started)
+        self._write(f"{json.dumps(done)}\n".encode())
+
+    # --- Gemini ---
+
+    @staticmethod
+    def _gemini_chunk(text: str, finished: bool) -> Dict[str, Any]:
+        candidate = {"content": {"parts": [{"text": text}], "role": "model"}, "index": 0}
+        if finished:
+            candidate["finishReason"] = "STOP"
+        return {"candidates": [candidate]}
+
+    def _gemini(self, stream: bool, sse: bool):
+        if not stream:
+            self._send_json(200, self._gemini_chunk(self._text(), True))
+            return
+        # REST 用戶端預設讀取 JSON 陣列串流，?alt=sse 時為 SSE
+        self._start_stream("text/event-stream" if sse else "application/json")
+        if not sse:
+            self._write(b"[")
+        first = True
+        for token in self._tokens():
+            data = json.dumps(self._gemini_chunk(token, False), ensure_ascii=False)
+            if sse:
+                self._write(f"data: {data}\n\n".encode())
+            else:
+                self._write(f"{'' if first else ','}{data}".encode())
+            first = False
+        final = json.dumps(self._gemini_chunk("", True))
+        self._write(f"data: {final}\n\n".encode() if sse else f"{'' if first else ','}{final}]".encode())
+
+    # --- HTTP 輔助 ---
+
+    def _read_body(self) -> Dict[str, Any]:
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+        try:
+            self._body = json.loads(raw) if raw else {}
+        except ValueError:
+            self._body = {}
+        return self._body
+
+    @staticmethod
+    def _error_body(api: str, status: int, message: str) -> Dict[str, Any]:
+        if api == "gemini":
+            return {"error": {"code": status, "message": message,
+                              "status": "RESOURCE_EXHAUSTED" if status == 429 else "INTERNAL"}}
+        if api == "ollama":
+            return {"error": message}
+        return {"error": {"message": message, "type": "rate_limit_error" if status == 429 else "server_error",
+                          "code": None}}
+
+    def _send_json(self, status: int, data: Dict[str, Any], headers: Optional[Dict[str, str]] = None):
+        payload = json.dumps(data, ensure_ascii=False).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _start_stream(self, content_type: str):
+        # 不帶 Content-Length，以關閉連線表示串流結束
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+    def _write(self, data: bytes):
+        self.wfile.write(data)
+        self.wfile.flush()
+
+class LLMStubServer(ThreadingHTTPServer):
+    """多執行緒的模擬伺服器，每個連線一個執行緒"""
+    daemon_threads = True
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, settings: Optional[StubSettings] = None):
+        super().__init__((host, port), _Handler)
+        self.settings = settings or StubSettings()
+        self.stats = StubStats()
+        self._random = random.Random(self.settings.seed)
+        self._random_lock = threading.Lock()
+        self._requests = 0
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def pick_failure(self) -> Optional[int]:
+        """依設定決定這個請求是否注入 429 或 500"""
+        settings = self.settings
+        with self._random_lock:
+            self._requests += 1
+            if settings.rate_limit_every and self._requests % settings.rate_limit_every == 0:
+                return 429
+            roll = self._random.random()
+        if roll < settings.rate_limit_rate:
+            return 429
+        if roll < settings.rate_limit_rate + settings.error_rate:
+            return 500
+        return None
+
+    def start(self) -> "LLMStubServer":
+        """在背景執行緒啟動"""
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+def main():
+    defaults = StubSettings()
+    parser = argparse.ArgumentParser(description="LLM 模擬伺服器 (OpenAI / DeepSeek / Gemini / Ollama)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=defaults.latency, help="首個 token 前的延遲 (秒)")
+    parser.add_argument("--tokens-per-second", type=float, default=defaults.tokens_per_second, help="生成速度 (0 不限速)")
+    parser.add_argument("--output-tokens", type=int, default=defaults.output_tokens, help="每次回應的 token 數")
+    parser.add_argument("--error-rate", type=float, default=defaults.error_rate, help="回傳 500 的比例")
+    parser.add_argument("--rate-limit-rate", type=float, default=defaults.rate_limit_rate, help="回傳 429 的比例")
+    parser.add_argument("--rate-limit-every", type=int, default=defaults.rate_limit_every, help="每 N 個請求回傳一次 429")
+    parser.add_argument("--retry-after", type=float, default=defaults.retry_after, help="429 的 Retry-After 秒數")
+    parser.add_argument("--seed", type=int, default=None, help="錯誤注入的亂數種子")
+    args = parser.parse_args()
+
+    settings = StubSettings(
+        latency=args.latency, tokens_per_second=args.tokens_per_second, output_tokens=args.output_tokens,
+        error_rate=args.error_rate, rate_limit_rate=args.rate_limit_rate, rate_limit_every=args.rate_limit_every,
+        retry_after=args.retry_after, seed=args.seed,
+    )
+    server = LLMStubServer(args.host, args.port, settings)
+    print(f"LLM 模擬伺服器已啟動: {server.url} (GET /stats 查看統計，POST /reset 清除)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,23 @@
+"""
+壓力測試共用的統計函式
+"""
+import statistics
+from typing import List, Dict, Optional
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    """最近秩百分位數"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(q / 100 * len(ordered) + 0.5)) - 1))]
+
+def distribution(values: List[float]) -> Dict[str, Optional[float]]:
+    """p50 / p90 / p99 / 最大值 / 平均值"""
+    return {
+        "count": len(values),
+        "p50": percentile(values, 50),
+        "p90": percentile(values, 90),
+        "p99": percentile(values, 99),
+        "max": max(values) if values else None,
+        "mean": statistics.mean(values) if values else None,
+    }
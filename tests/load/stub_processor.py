@@ -0,0 +1,101 @@
+"""
+模擬處理器 - 取代 VideoProcessor，不載入模型也不連網，各階段依設定的時間等待後寫出小型輸出檔
+
+由 worker 以 JOB_PROCESSOR_FACTORY = "tests.load.stub_processor:StubProcessor" 建立；
+各階段時間由環境變數 VIDEOTONOTE_STUB_STAGES (JSON) 設定，例如:
+
+    {"download": 0.5, "transcribe": 2.0, "notes": 1.0, "jitter": 0.2, "cpu": false, "failure_rate": 0.0}
+
+jitter 為時間的隨機變動比例；cpu 為 true 時轉錄階段以忙碌迴圈佔用 CPU (模擬實際推論)，否則以 sleep 等待。
+"""
+import json
+import os
+import random
+import time
+import uuid
+from typing import Optional, Dict, Any, Callable, Tuple
+
+from src.core.config import config
+from src.utils.file_manager import FileManager
+from src.utils.cancellation import CancelToken
+
+STAGES_ENV = "VIDEOTONOTE_STUB_STAGES"
+DEFAULT_STAGES = {"download": 0.5, "transcribe": 2.0, "notes": 1.0, "jitter": 0.2, "cpu": False, "failure_rate": 0.0}
+# 等待期間檢查取消的間隔與回報進度的間隔 (秒)
+_TICK = 0.1
+_PROGRESS_INTERVAL = 1.0
+
+def stage_settings() -> Dict[str, Any]:
+    return dict(DEFAULT_STAGES, **json.loads(os.environ.get(STAGES_ENV) or "{}"))
+
+def _wait(seconds: float, busy: bool, cancel_token: Optional[CancelToken],
+          progress_callback: Optional[Callable[[Dict[str, Any]], None]] = None):
+    """等待指定時間 (可取消)，期間定期回報進度"""
+    started = reported = time.monotonic()
+    while True:
+        if cancel_token:
+            cancel_token.raise_if_cancelled()
+        elapsed = time.monotonic() - started
+        if elapsed >= seconds:
+            return
+        tick = min(_TICK, seconds - elapsed)
+        if busy:
+            deadline = time.monotonic() + tick
+            while time.monotonic() < deadline:
+                pass
+        else:
+            time.sleep(tick)
+        if progress_callback and time.monotonic() - reported >= _PROGRESS_INTERVAL:
+            reported = time.monotonic()
+            progress_callback({"seconds": round(time.monotonic() - started, 2), "total": seconds})
+
+class StubDownloader:
+    def __init__(self, processor: "StubProcessor"):
+        self.processor = processor
+
+    def download_audio(self, url: str, progress_callback=None, cancel_token: Optional[CancelToken] = None) -> Optional[str]:
+        _wait(self.processor.duration("download"), False, cancel_token, progress_callback)
+        if self.processor.should_fail():
+            return None
+        output_path = config.MP3_DIR / f"stub_{uuid.uuid4().hex[:12]}.mp3"
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        output_path.write_bytes(b"")
+        return str(output_path)
+
+class StubProcessor:
+    """與 VideoProcessor 相同的任務佇列介面 (downloader / transcribe_audio / create_notes)"""
+
+    def __init__(self, model_choice: str = "openai", transcriber_type: str = "fast", transcriber=None, **kwargs):
+        self.model_choice = model_choice
+        self.transcriber_type = transcriber_type
+        self.settings = stage_settings()
+        self._random = random.Random()
+        self.downloader = StubDownloader(self)
+
+    def duration(self, stage: str) -> float:
+        base = float(self.settings.get(stage) or 0.0)
+        jitter = float(self.settings.get("jitter") or 0.0)
+        return max(0.0, base * (1 + self._random.uniform(-jitter, jitter)))
+
+    def should_fail(self) -> bool:
+        return self._random.random() < float(self.settings.get("failure_rate") or 0.0)
+
+    def transcribe_audio(self, audio_path: str, language: Optional[str] = None, progress_callback=None,
+                         cancel_token: Optional[CancelToken] = None) -> Tuple[Optional[Dict[str, Any]], Dict[str, Optional[str]]]:
+        seconds = self.duration("transcribe")
+        _wait(seconds, bool(self.settings.get("cpu")), cancel_token, progress_callback)
+        if self.should_fail():
+            return None, {}
+        transcription = {"text": "模擬逐字稿", "chunks": [{"timestamp": (0.0, seconds), "text": "模擬逐字稿"}]}
+        transcription_path = FileManager.generate_output_path(audio_path, config.TRANSCRIPTION_DIR, "_transcription")
+        FileManager.save_text_file(transcription["text"], transcription_path)
+        return transcription, {"transcription_path": str(transcription_path), "segments_path": None}
+
+    def create_notes(self, transcription: Dict[str, Any], audio_path: str, progress_callback=None,
+                     cancel_token: Optional[CancelToken] = None) -> Optional[str]:
+        _wait(self.duration("notes"), False, cancel_token)
+        if self.should_fail():
+            return None
+        notes_path = FileManager.generate_output_path(audio_path, config.NOTES_DIR, "_notes")
+        FileManager.save_text_file("# 模擬筆記\n", notes_path)
+        return str(notes_path)
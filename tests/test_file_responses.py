@@ -0,0 +1,133 @@
+"""
+結果檔案回應測試
+"""
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from src.api import file_responses
+from src.api.file_responses import _choose_encoding, _etag_matches, _parse_range
+from src.api.routers import video
+from src.core.task_store import TaskStore
+
+ETAG = "0123456789abcdef0123456789abcdef"
+NOTES = "# 筆記\n\n" + "重點內容。\n" * 20
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("bytes=0-9", (0, 9)),
+    ("bytes=10-", (10, 99)),
+    ("bytes=90-200", (90, 99)),
+    ("bytes=-10", (90, 99)),
+    ("bytes=-500", (0, 99)),
+    (" bytes=5-5 ", (5, 5)),
+])
+def test_parse_range(header, expected):
+    assert _parse_range(header, 100) == expected
+
+
+@pytest.mark.parametrize("header", ["bytes=-", "bytes=0-1,5-6", "items=0-1", "bytes=a-b"])
+def test_parse_range_ignores_unsupported_headers(header):
+    assert _parse_range(header, 100) is None
+
+
+@pytest.mark.parametrize("header, size", [
+    ("bytes=-0", 100),
+    ("bytes=100-", 100),
+    ("bytes=150-200", 100),
+    ("bytes=10-5", 100),
+    ("bytes=0-", 0),
+])
+def test_parse_range_rejects_unsatisfiable_ranges(header, size):
+    with pytest.raises(ValueError):
+        _parse_range(header, size)
+
+
+@pytest.mark.parametrize("header, expected", [
+    (None, False),
+    ("", False),
+    ("*", True),
+    (f'"{ETAG}"', True),
+    (f'W/"{ETAG}"', True),
+    (f'"{ETAG}-gzip"', True),
+    (f'"other", W/"{ETAG}-zstd"', True),
+    ('"other"', False),
+    (f'"{ETAG[:-1]}"', False),
+])
+def test_etag_matches(header, expected):
+    assert _etag_matches(header, ETAG) is expected
+
+
+@pytest.mark.parametrize("header, expected", [
+    (None, None),
+    ("", None),
+    ("gzip", "gzip"),
+    ("gzip, deflate, br", "gzip"),
+    ("GZIP;q=0.5", "gzip"),
+    ("gzip;q=0", None),
+    ("gzip;q=.", None),
+    ("deflate, br", None),
+    ("*", "gzip"),
+    ("*;q=0", None),
+    ("*, gzip;q=0", None),
+    ("identity", None),
+])
+def test_choose_encoding(monkeypatch, header, expected):
+    monkeypatch.setattr(file_responses, "ZSTD_AVAILABLE", False)
+    assert _choose_encoding(header) == expected
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("gzip, zstd", "zstd"),
+    ("*", "zstd"),
+    ("zstd;q=0.5, gzip", "gzip"),
+    ("zstd;q=0, *", "gzip"),
+])
+def test_choose_encoding_prefers_zstd_when_available(monkeypatch, header, expected):
+    monkeypatch.setattr(file_responses, "ZSTD_AVAILABLE", True)
+    assert _choose_encoding(header) == expected
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    store = TaskStore(tmp_path / "tasks.db")
+    notes_path = tmp_path / "notes.md"
+    notes_path.write_text(NOTES, encoding="utf-8")
+    store.enqueue_task("t1", {})
+    store.update_status("t1", "completed", result={"file_paths": {"notes_path": str(notes_path)}})
+    monkeypatch.setattr(video, "task_store", store)
+
+    app = FastAPI()
+    app.include_router(video.router)
+    return TestClient(app)
+
+
+def test_notes_not_modified(client):
+    etag = client.get("/result/t1/notes").headers["etag"]
+    response = client.get("/result/t1/notes", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+
+
+def test_notes_partial_content(client):
+    response = client.get("/result/t1/notes", headers={"Range": "bytes=0-9", "Accept-Encoding": "gzip"})
+    size = len(NOTES.encode("utf-8"))
+    assert response.status_code == 206
+    assert response.headers["content-range"] == f"bytes 0-9/{size}"
+    assert response.headers["content-length"] == "10"
+    assert "content-encoding" not in response.headers
+    assert response.content == NOTES.encode("utf-8")[:10]
+
+
+def test_notes_range_not_satisfiable(client):
+    size = len(NOTES.encode("utf-8"))
+    response = client.get("/result/t1/notes", headers={"Range": f"bytes={size}-"})
+    assert response.status_code == 416
+    assert response.headers["content-range"] == f"bytes */{size}"
+
+
+def test_notes_if_range_mismatch_returns_full_content(client):
+    response = client.get("/result/t1/notes", headers={"Range": "bytes=0-9", "If-Range": '"stale"',
+                                                         "Accept-Encoding": "identity"})
+    assert response.status_code == 200
+    assert response.content == NOTES.encode("utf-8")
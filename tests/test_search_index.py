@@ -0,0 +1,33 @@
+"""
+逐字稿搜尋索引測試
+"""
+import json
+
+from src.core.search_index import TranscriptIndex, index_terms
+
+
+def _write_transcript(directory, name, segments):
+    text = " ".join(segment["text"] for segment in segments)
+    (directory / f"{name}_transcription.txt").write_text(text, encoding="utf-8")
+    (directory / f"{name}_segments.json").write_text(
+        json.dumps({"text": text, "segments": segments}, ensure_ascii=False), encoding="utf-8"
+    )
+
+
+def test_cjk_and_latin_runs_split_at_boundary():
+    terms = index_terms("我們用Python寫AI模型")
+    assert "python" in terms and "ai" in terms and "模型" in terms
+
+
+def test_mixed_script_transcript_found_by_each_part(tmp_path):
+    _write_transcript(tmp_path, "talk", [
+        {"start": 0.0, "end": 4.0, "text": "我們用Python寫AI模型"},
+        {"start": 4.0, "end": 8.0, "text": "2024年的報告"},
+    ])
+    index = TranscriptIndex(tmp_path / "search.db")
+    index.update_library(tmp_path)
+
+    for query, start in [("模型", 0.0), ("python", 0.0), ("AI模型", 0.0), ("用Python寫", 0.0),
+                         ("報告", 4.0), ("2024", 4.0), ("年的", 4.0), ("2024年", 4.0)]:
+        results = index.search(query)
+        assert [result["start"] for result in results] == [start], query
@@ -0,0 +1,139 @@
+"""
+任務儲存測試
+"""
+import time
+
+import pytest
+
+from src.core.task_store import TaskStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    return TaskStore(tmp_path / "tasks.db")
+
+
+def test_reclaimed_task_rejects_previous_owner_writes(store):
+    store.enqueue_task("t1", {})
+    assert store.claim_next("worker-a", lease_seconds=0.01)["task_id"] == "t1"
+    time.sleep(0.02)
+    # 租約過期後由另一個 worker 收回並重新取得
+    assert store.claim_next("worker-b", lease_seconds=60)["task_id"] == "t1"
+
+    assert not store.update_status("t1", "completed", result={"by": "a"}, worker_id="worker-a")
+    assert not store.requeue_task("t1", worker_id="worker-a")
+    task = store.get_task("t1")
+    assert task["status"] == "processing" and task["worker_id"] == "worker-b" and task["result"] is None
+
+    assert store.update_status("t1", "completed", result={"by": "b"}, worker_id="worker-b")
+    assert store.get_task("t1")["result"] == {"by": "b"}
+
+
+def test_enqueue_rejects_tasks_beyond_max_depth(store):
+    assert store.enqueue_task("t1", {}, max_depth=2)
+    assert store.enqueue_task("t2", {}, max_depth=2)
+    assert not store.enqueue_task("t3", {}, max_depth=2)
+    assert store.get_task("t3") is None
+    assert store.queue_depth() == 2
+
+    # 取出的任務不再計入深度
+    store.claim_next("worker-a")
+    assert store.enqueue_task("t3", {}, max_depth=2)
+
+
+def test_claim_next_orders_by_priority_then_fifo(store):
+    store.enqueue_task("low", {}, priority=0)
+    store.enqueue_task("high-1", {}, priority=5)
+    store.enqueue_task("high-2", {}, priority=5)
+
+    claimed = [store.claim_next("worker-a")["task_id"] for _ in range(3)]
+    assert claimed == ["high-1", "high-2", "low"]
+    assert store.claim_next("worker-a") is None
+
+
+def test_claim_next_fifo_ignores_priority(store):
+    store.enqueue_task("first", {}, priority=0)
+    store.enqueue_task("second", {}, priority=5)
+    assert store.claim_next("worker-a", order="fifo")["task_id"] == "first"
+
+
+def test_claim_next_filters_by_capabilities(store):
+    store.enqueue_task("standard", {"transcriber": "standard", "model": "openai"})
+    store.enqueue_task("default", {})
+    store.enqueue_task("ollama", {"transcriber": "fast", "model": "ollama"})
+
+    # 未指定轉錄器與模型的任務視為 fast / openai
+    assert store.claim_next("worker-a", capabilities={"transcribers": ["fast"], "models": ["openai"]})["task_id"] == "default"
+    assert store.claim_next("worker-a", capabilities={"transcribers": ["fast"], "models": ["openai"]}) is None
+    assert store.claim_next("worker-b", capabilities={"models": ["ollama"]})["task_id"] == "ollama"
+    assert store.claim_next("worker-c", capabilities={"transcribers": []}) is None
+    task = store.claim_next("worker-c", capabilities=None)
+    assert task["task_id"] == "standard" and task["worker_id"] == "worker-c"
+
+
+def test_expired_lease_is_requeued_with_event(store):
+    store.enqueue_task("t1", {})
+    store.claim_next("worker-a", lease_seconds=0.01)
+    time.sleep(0.02)
+
+    # 其他 worker 取任務時收回過期租約；不符合能力的 worker 也會收回
+    assert store.claim_next("worker-b", capabilities={"transcribers": []}) is None
+    task = store.get_task("t1")
+    assert task["status"] == "pending" and task["worker_id"] is None
+    assert store.events_since("t1")[-1]["data"] == {"status": "pending", "requeued": True}
+
+
+def test_renewed_lease_is_not_requeued(store):
+    store.enqueue_task("t1", {})
+    store.claim_next("worker-a", lease_seconds=0.05)
+    assert store.renew_leases("worker-a", ["t1"], 60) == ["t1"]
+    time.sleep(0.06)
+    assert store.claim_next("worker-b") is None
+    assert store.get_task("t1")["worker_id"] == "worker-a"
+
+
+def test_request_cancel(store):
+    store.enqueue_task("processing", {})
+    store.claim_next("worker-a")
+    store.enqueue_task("pending", {})
+
+    assert store.request_cancel("missing") is None
+
+    assert store.request_cancel("pending") == "cancelled"
+    task = store.get_task("pending")
+    assert task["status"] == "cancelled" and task["finished_at"] is not None
+    assert store.events_since("pending")[-1]["data"]["status"] == "cancelled"
+
+    # 處理中的任務只記錄請求，由 worker 中止後標記為取消
+    assert store.request_cancel("processing") == "processing"
+    assert store.get_task("processing")["status"] == "processing"
+    assert store.cancel_requested(["pending", "processing"]) == ["processing"]
+
+    store.update_status("processing", "completed")
+    assert store.request_cancel("processing") == "completed"
+
+
+def test_requeue_after_cancel_request_marks_cancelled(store):
+    store.enqueue_task("t1", {})
+    store.claim_next("worker-a")
+    store.request_cancel("t1")
+    assert store.requeue_task("t1", worker_id="worker-a")
+    assert store.get_task("t1")["status"] == "cancelled"
+
+
+def test_cleanup_expired_measures_ttl_from_finished_at(store):
+    for task_id in ("finished-recently", "finished-long-ago", "pending"):
+        store.enqueue_task(task_id, {})
+    store.update_status("finished-recently", "completed")
+    store.update_status("finished-long-ago", "failed", error="boom")
+    store.add_event("finished-long-ago", "progress", {})
+    conn = store._connect()
+    # 全部在兩小時前建立；只有一個在兩小時前結束
+    conn.execute("UPDATE tasks SET created_at = created_at - 7200")
+    conn.execute("UPDATE tasks SET finished_at = finished_at - 7200 WHERE task_id = 'finished-long-ago'")
+
+    assert store.cleanup_expired(ttl_seconds=3600) == 1
+    assert store.get_task("finished-long-ago") is None
+    assert store.events_since("finished-long-ago") == []
+    assert store.get_task("finished-recently") is not None
+    assert store.get_task("pending")["status"] == "pending"
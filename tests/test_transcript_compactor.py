@@ -0,0 +1,71 @@
+"""
+逐字稿精簡測試
+"""
+import pytest
+
+from src.services.transcript_compactor import TranscriptCompactor
+
+
+@pytest.fixture
+def compactor():
+    return TranscriptCompactor(max_ngram=16, max_repeats=3, strip_fillers=False)
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("謝謝 謝謝 謝謝 謝謝 謝謝", "謝謝"),
+    ("謝謝謝謝謝謝謝謝謝謝", "謝謝"),
+    ("哈哈哈哈", "哈哈"),
+    ("the the the the the ok", "the ok"),
+    ("I think I think I think I think so", "I think so"),
+])
+def test_collapses_repeat_loops(compactor, text, expected):
+    result, stats = compactor.compact({"text": text})
+    assert result["text"] == expected
+    assert stats.collapsed_repeats >= 1
+
+
+@pytest.mark.parametrize("text", ["謝謝你謝謝你謝謝你", "哈哈", "哈哈哈", "one two three"])
+def test_keeps_repeats_within_limit(compactor, text):
+    result, stats = compactor.compact({"text": text})
+    assert result["text"] == text
+    assert stats.collapsed_repeats == 0
+
+
+def _chunk_texts(compactor, *texts):
+    result, stats = compactor.compact({"text": "", "chunks": [{"text": text} for text in texts]})
+    return [chunk["text"] for chunk in result["chunks"]], stats
+
+
+def test_short_cjk_overlap_is_kept(compactor):
+    # 「機器學習」只有四個字，是同一個詞而非切塊邊界重複
+    texts, stats = _chunk_texts(compactor, "今天介紹機器學習", "機器學習的基本概念")
+    assert texts == ["今天介紹機器學習", "機器學習的基本概念"]
+    assert stats.dropped_boundary == 0
+
+
+def test_long_cjk_overlap_is_trimmed(compactor):
+    overlap = "接下來我們要介紹機器學習模型的訓練流程與評估方法"
+    assert len(overlap) >= compactor.min_cjk_overlap
+    texts, stats = _chunk_texts(compactor, "開始 " + overlap, overlap + "以及資料")
+    assert texts[1] == "以及資料"
+    assert stats.dropped_boundary == 1
+
+
+def test_cjk_overlap_threshold_boundary():
+    compactor = TranscriptCompactor(max_ngram=16, max_repeats=3, strip_fillers=False, min_cjk_overlap=6)
+    texts, _ = _chunk_texts(compactor, "今天談談深度學習模型", "深度學習模型的應用")
+    assert texts[1] == "的應用"
+    texts, _ = _chunk_texts(compactor, "今天談談學習模型", "學習模型的應用")
+    assert texts[1] == "學習模型的應用"
+
+
+def test_english_overlap_uses_word_threshold(compactor):
+    texts, stats = _chunk_texts(compactor, "we will talk about the model", "talk about the model and data")
+    assert texts == ["we will talk about the model", "and data"]
+    assert stats.dropped_boundary == 1
+
+
+def test_duplicate_chunk_is_dropped(compactor):
+    texts, stats = _chunk_texts(compactor, "今天介紹機器學習的基本概念", "今天介紹機器學習的基本概念")
+    assert texts == ["今天介紹機器學習的基本概念"]
+    assert stats.dropped_boundary == 1